@@ -0,0 +1,209 @@
+"""Startup Sandbox - AI Call Accounting
+
+ثبت هر فراخوانی AI در جدول ai_calls (دیتابیس global) و گزارش هزینه:
+
+- هر ردیف: purpose (scenario, story, ...)، game_id، provider/model، outcome
+  (ok, invalid_json, timeout, error, fallback)، latency، تعداد توکن ورودی/خروجی
+  (از usage metadata خود provider؛ اگر نیامد NULL) و طول متن‌ها به کاراکتر.
+- نوشتن از مسیر درخواست بیرون است: record() فقط در صف می‌گذارد و thread
+  پس‌زمینه BatchWriter هر flush_interval ثانیه (یا با پر شدن batch) صف را با یک
+  executemany می‌نویسد. اگر صف پر باشد ردیف دور ریخته و در stats شمرده می‌شود.
+
+گزارش (درصدهای latency، نرخ fallback، هزینه هر بازی و هر مود):
+    python ai_accounting.py [--db startup.db] [--shards N] [--hours 24]
+                            [--prompt-price 0.10] [--response-price 0.40]
+
+قیمت‌ها به دلار برای هر یک میلیون توکن است؛ ردیف بدون توکن با
+chars / --chars-per-token تخمین زده و در گزارش علامت‌گذاری می‌شود.
+این ماژول (جز گزارش) به Flask وابسته نیست.
+"""
+
+import argparse
+import math
+import os
+import sqlite3
+import sys
+import time
+
+from batch_writer import BatchWriter
+
+OUTCOMES = ("ok", "invalid_json", "timeout", "error", "fallback")
+COLUMNS = (
+    "created_at", "game_id", "purpose", "provider", "model", "outcome", "latency_ms",
+    "prompt_tokens", "response_tokens", "prompt_chars", "response_chars",
+)
+
+
+# ========== Writer ==========
+
+class AICallRecorder:
+    """نویسنده دسته‌ای ai_calls روی BatchWriter.
+
+    get_pool: تابعی که ConnectionPool دیتابیس global را می‌دهد.
+    thread در اولین record() شروع می‌شود (در worker، بعد از fork).
+    """
+
+    def __init__(self, get_pool, batch_size: int = 200, flush_interval: float = 2.0, max_pending: int = 10000):
+        self.get_pool = get_pool
+        self._writer = BatchWriter(
+            self._write, "ai-accounting", batch_size, flush_interval, max_pending,
+            errors=(sqlite3.Error,), accepted="recorded", what="ai_calls", unit="ردیف",
+        )
+        self.stats = self._writer.stats
+
+    def record(self, **row) -> None:
+        """ثبت یک فراخوانی (بدون I/O)؛ کلیدها زیرمجموعه COLUMNS."""
+        row.setdefault("created_at", time.time())
+        self._writer.put(tuple(row.get(col) for col in COLUMNS))
+
+    def _write(self, batch: list) -> None:
+        with self.get_pool().connection() as conn:
+            conn.executemany(
+                f"INSERT INTO ai_calls ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+                batch,
+            )
+            conn.commit()
+
+    def flush(self) -> int:
+        """نوشتن همه ردیف‌های صف (دسته‌های batch_size تایی)؛ تعداد نوشته‌شده."""
+        return self._writer.flush()
+
+    def close(self) -> None:
+        self._writer.close()
+
+
+# ========== Report ==========
+
+def percentile(values: list, q: float):
+    """nearest-rank؛ None برای لیست خالی."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+
+def call_cost(row: dict, prompt_price: float, response_price: float, chars_per_token: float) -> tuple[float, bool]:
+    """(هزینه دلاری، تخمینی بودن) یک ردیف؛ قیمت‌ها برای هر میلیون توکن."""
+    estimated = False
+    tokens = []
+    for kind in ("prompt", "response"):
+        count = row[f"{kind}_tokens"]
+        if count is None:
+            count = (row[f"{kind}_chars"] or 0) / chars_per_token
+            estimated = True
+        tokens.append(count)
+    return (tokens[0] * prompt_price + tokens[1] * response_price) / 1_000_000, estimated
+
+
+def load_calls(db_path: str, since: float | None = None) -> list[dict]:
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    try:
+        sql = f"SELECT {', '.join(COLUMNS)} FROM ai_calls"
+        rows = conn.execute(sql + " WHERE created_at >= ?", (since,)) if since else conn.execute(sql)
+        return [dict(row) for row in rows]
+    finally:
+        conn.close()
+
+
+def load_game_modes(paths: list[str], game_ids: set) -> dict:
+    """game_id -> mode؛ بازی‌ها ممکن است در هر shard باشند."""
+    modes = {}
+    ids = sorted(game_ids)
+    for path in dict.fromkeys(paths):
+        if not os.path.exists(path):
+            continue
+        conn = sqlite3.connect(path)
+        try:
+            for i in range(0, len(ids), 500):
+                chunk = ids[i:i + 500]
+                modes.update(conn.execute(
+                    f"SELECT id, mode FROM games WHERE id IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall())
+        finally:
+            conn.close()
+    return modes
+
+
+def build_report(calls: list[dict], modes: dict, prompt_price: float = 0.0, response_price: float = 0.0,
+                 chars_per_token: float = 4.0) -> dict:
+    """آمار هر purpose، هزینه هر بازی و هر مود (dict آماده چاپ یا JSON)."""
+    report = {"calls": len(calls), "estimated_tokens": 0, "purposes": {}, "games": {}, "modes": {}}
+    by_purpose: dict[str, list] = {}
+    game_cost: dict = {}
+    for row in calls:
+        by_purpose.setdefault(row["purpose"] or "-", []).append(row)
+        cost, estimated = call_cost(row, prompt_price, response_price, chars_per_token)
+        report["estimated_tokens"] += estimated
+        if row["game_id"] is not None:
+            game_cost[row["game_id"]] = game_cost.get(row["game_id"], 0.0) + cost
+
+    for purpose, rows in sorted(by_purpose.items()):
+        latencies = [r["latency_ms"] for r in rows if r["outcome"] != "fallback" and r["latency_ms"] is not None]
+        report["purposes"][purpose] = {
+            "calls": len(rows),
+            "outcomes": {o: n for o in OUTCOMES if (n := sum(r["outcome"] == o for r in rows))},
+            "fallback_rate": round(sum(r["outcome"] != "ok" for r in rows) / len(rows), 4),
+            "latency_ms": {f"p{int(q * 100)}": percentile(latencies, q) for q in (0.5, 0.9, 0.99)},
+        }
+
+    costs = list(game_cost.values())
+    report["games"] = {
+        "count": len(costs),
+        "cost_mean": round(sum(costs) / len(costs), 6) if costs else None,
+        "cost_p50": percentile(costs, 0.5),
+        "cost_p90": percentile(costs, 0.9),
+    }
+    by_mode: dict[str, list] = {}
+    for game_id, cost in game_cost.items():
+        by_mode.setdefault(modes.get(game_id) or "classic", []).append(cost)
+    for mode, values in sorted(by_mode.items()):
+        report["modes"][mode] = {
+            "games": len(values),
+            "cost_total": round(sum(values), 6),
+            "cost_per_game": round(sum(values) / len(values), 6),
+        }
+    return report
+
+
+def print_report(report: dict) -> None:
+    print("=" * 60)
+    print(f"AI calls: {report['calls']}  (تخمین توکن از طول متن: {report['estimated_tokens']})")
+    for purpose, data in report["purposes"].items():
+        lat = data["latency_ms"]
+        print(f"  {purpose:<22} calls={data['calls']:<6} fallback={data['fallback_rate']:.1%}  "
+              f"p50={lat['p50']} p90={lat['p90']} p99={lat['p99']} ms  {data['outcomes']}")
+    games = report["games"]
+    print(f"games: {games['count']}  cost/game mean={games['cost_mean']} p50={games['cost_p50']} p90={games['cost_p90']}")
+    for mode, data in report["modes"].items():
+        print(f"  {mode:<10} games={data['games']:<5} total=${data['cost_total']}  per game=${data['cost_per_game']}")
+    print("=" * 60)
+
+
+def main(argv=None) -> int:
+    from storage import shard_paths_for
+
+    parser = argparse.ArgumentParser(description="گزارش هزینه و latency فراخوانی‌های AI (جدول ai_calls)")
+    parser.add_argument("--db", default=os.getenv("STARTUP_DB_PATH", "startup.db"))
+    parser.add_argument("--shards", type=int, default=int(os.getenv("STORAGE_SHARDS", "1") or 1))
+    parser.add_argument("--hours", type=float, default=0, help="فقط N ساعت اخیر (0 = همه)")
+    parser.add_argument("--prompt-price", type=float, default=float(os.getenv("AI_PROMPT_PRICE_PER_M", "0") or 0),
+                        help="دلار برای هر میلیون توکن ورودی")
+    parser.add_argument("--response-price", type=float, default=float(os.getenv("AI_RESPONSE_PRICE_PER_M", "0") or 0),
+                        help="دلار برای هر میلیون توکن خروجی")
+    parser.add_argument("--chars-per-token", type=float, default=4.0)
+    args = parser.parse_args(argv)
+
+    try:
+        calls = load_calls(args.db, time.time() - args.hours * 3600 if args.hours else None)
+        paths = [args.db] + (shard_paths_for(args.db, args.shards) if args.shards > 1 else [])
+        modes = load_game_modes(paths, {c["game_id"] for c in calls if c["game_id"] is not None})
+    except sqlite3.Error as e:
+        print(f"❌ خطا در خواندن ai_calls: {e}")
+        return 1
+    print_report(build_report(calls, modes, args.prompt_price, args.response_price, args.chars_per_token))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
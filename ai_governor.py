@@ -0,0 +1,193 @@
+"""Startup Sandbox - AI Spend Governor
+
+کنترل پذیرش فراخوانی‌های AI با token bucket، تا یک کلاینت با تکرار /new_game یا
+/next_turn سهمیه Gemini را تمام نکند:
+
+- سه نوع bucket: global (کل اپ)، user (username در session) و ip.
+- هر فراخوانی از همه bucketهای مربوط یک توکن برمی‌دارد؛ اگر یکی خالی باشد
+  هیچ‌کدام کم نمی‌شود و فراخوانی رد می‌شود. رد شدن یعنی مسیر fallback
+  (سناریوساز محلی / داستان پیش‌فرض)، نه خطا برای بازیکن.
+- وضعیت bucketها در جدول ai_buckets دیتابیس global است؛ پس همه workerهای
+  gunicorn همان سقف را می‌بینند. به‌روزرسانی در یک تراکنش BEGIN IMMEDIATE
+  انجام می‌شود (خواندن + پر شدن بر اساس زمان + کم کردن، اتمیک).
+- فراخوانی‌های پس‌زمینه (speculation) از همان bucketها برمی‌دارند ولی فقط تا
+  وقتی که بخش رزرو bucket (background_reserve × capacity) دست‌نخورده بماند؛ پس
+  speculation هیچ‌وقت سهمیه فراخوانی‌هایی را که بازیکن منتظرشان است تمام نمی‌کند.
+- اگر خود دیتابیس خطا دهد (مثلاً قفل طولانی)، فراخوانی پذیرفته می‌شود: governor
+  نباید به تنهایی AI را از کار بیندازد.
+
+این ماژول به Flask وابسته نیست.
+"""
+
+import sqlite3
+import threading
+import time
+
+
+class Bucket:
+    """تعریف یک bucket: capacity توکن (burst) و rate توکن در ثانیه."""
+
+    __slots__ = ("key", "capacity", "rate")
+
+    def __init__(self, key: str, capacity: float, rate: float):
+        self.key = key  # "<kind>:<ident>"
+        self.capacity = float(capacity)
+        self.rate = float(rate)
+
+    @property
+    def kind(self) -> str:
+        return self.key.split(":", 1)[0]
+
+    def level(self, tokens: float, updated_at: float, now: float) -> float:
+        return min(self.capacity, tokens + max(0.0, now - updated_at) * self.rate)
+
+
+class SQLiteBucketStore:
+    """وضعیت bucketها در جدول ai_buckets (key, kind, tokens, updated_at).
+
+    get_pool: تابعی که ConnectionPool دیتابیس global را می‌دهد (مثل
+    backend.global_pool که schema را در اولین استفاده می‌سازد).
+    """
+
+    def __init__(self, get_pool):
+        self.get_pool = get_pool
+
+    def take(self, buckets: list[Bucket], cost: float = 1.0, now: float | None = None,
+             reserve: float = 0.0) -> Bucket | None:
+        """برداشتن cost از همه bucketها؛ bucket خالی (علت رد) یا None یعنی پذیرفته شد.
+
+        reserve: کسری از capacity که باید بعد از برداشتن باقی بماند (برای
+        فراخوانی‌های پس‌زمینه)؛ bucketی که به این حد برسد خالی حساب می‌شود.
+        """
+        now = time.time() if now is None else now
+        keys = [b.key for b in buckets]
+        with self.get_pool().connection() as conn:
+            # قفل نوشتن از اول: دو worker نمی‌توانند هم‌زمان یک توکن را بردارند
+            conn.execute("BEGIN IMMEDIATE")
+            rows = {
+                row[0]: (row[1], row[2])
+                for row in conn.execute(
+                    f"SELECT key, tokens, updated_at FROM ai_buckets WHERE key IN ({','.join('?' * len(keys))})",
+                    keys,
+                )
+            }
+            levels = []
+            for bucket in buckets:
+                tokens, updated_at = rows.get(bucket.key, (bucket.capacity, now))
+                level = bucket.level(tokens, updated_at, now)
+                if level - cost < bucket.capacity * reserve:
+                    conn.rollback()
+                    return bucket
+                levels.append((bucket.key, bucket.kind, level - cost, now))
+            conn.executemany('''
+                INSERT INTO ai_buckets (key, kind, tokens, updated_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated_at = excluded.updated_at
+            ''', levels)
+            conn.commit()
+        return None
+
+    def lowest(self, kind: str, limit: int = 10) -> list[tuple]:
+        """(key, tokens, updated_at) با کمترین توکن ذخیره‌شده (بدون پر شدن بر اساس زمان)."""
+        with self.get_pool().connection() as conn:
+            return [tuple(row) for row in conn.execute(
+                "SELECT key, tokens, updated_at FROM ai_buckets WHERE kind = ? ORDER BY tokens LIMIT ?",
+                (kind, limit),
+            )]
+
+    def prune(self, before: float) -> int:
+        """حذف bucketهایی که از before به بعد استفاده نشده‌اند (تا الان دوباره پر شده‌اند)."""
+        with self.get_pool().connection() as conn:
+            deleted = conn.execute("DELETE FROM ai_buckets WHERE updated_at < ?", (before,)).rowcount
+            conn.commit()
+        return deleted
+
+
+class AIGovernor:
+    """پذیرش فراخوانی AI بر اساس bucketهای global، user و ip.
+
+    limits: {"global"|"user"|"ip": (capacity, per_minute)}؛ نوعی که نباشد یا
+    per_minute آن صفر باشد اعمال نمی‌شود. background_reserve: کسری از هر bucket که
+    فقط برای فراخوانی‌های پیش‌زمینه نگه داشته می‌شود (admit(..., background=True)
+    به آن دست نمی‌زند).
+    """
+
+    PRUNE_EVERY = 1000
+
+    def __init__(self, store: SQLiteBucketStore, limits: dict, background_reserve: float = 0.5):
+        self.store = store
+        self.background_reserve = min(max(float(background_reserve), 0.0), 1.0)
+        self.limits = {kind: (float(cap), float(per_min) / 60.0)
+                       for kind, (cap, per_min) in limits.items() if per_min}
+        self._lock = threading.Lock()
+        self._calls = 0
+        self.stats = {"admitted": 0, "denied": {kind: 0 for kind in self.limits}, "deferred": 0,
+                      "errors": 0, "pruned": 0}
+
+    def buckets(self, user: str | None = None, ip: str | None = None) -> list[Bucket]:
+        buckets = []
+        for kind, ident in (("global", ""), ("user", user), ("ip", ip)):
+            if kind in self.limits and ident is not None:
+                capacity, rate = self.limits[kind]
+                buckets.append(Bucket(f"{kind}:{ident}", capacity, rate))
+        return buckets
+
+    def admit(self, user: str | None = None, ip: str | None = None, background: bool = False) -> bool:
+        """background=True: فراخوانی کم‌اولویت که بخش رزرو bucketها را مصرف نمی‌کند."""
+        buckets = self.buckets(user, ip)
+        if not buckets:
+            return True
+        try:
+            empty = self.store.take(buckets, reserve=self.background_reserve if background else 0.0)
+        except sqlite3.Error as e:
+            with self._lock:
+                self.stats["errors"] += 1
+            print(f"⚠️ خطا در governor AI (فراخوانی پذیرفته شد): {e}")
+            return True
+
+        with self._lock:
+            self._calls += 1
+            prune = self._calls % self.PRUNE_EVERY == 0
+            if empty is None:
+                self.stats["admitted"] += 1
+            elif background:
+                self.stats["deferred"] += 1
+            else:
+                self.stats["denied"][empty.kind] += 1
+        if prune:
+            self._prune()
+        if empty is not None and not background:
+            print(f"⚠️ سقف AI برای {empty.key} پر است؛ مسیر fallback")
+        return empty is None
+
+    def _prune(self) -> None:
+        # bucketی که capacity/rate ثانیه استفاده نشده، دوباره پر است و ردیفش لازم نیست
+        idle = max((cap / rate for cap, rate in self.limits.values() if rate), default=0.0)
+        try:
+            deleted = self.store.prune(time.time() - idle)
+        except sqlite3.Error as e:
+            print(f"⚠️ خطا در پاک‌سازی ai_buckets: {e}")
+            return
+        with self._lock:
+            self.stats["pruned"] += deleted
+
+    def snapshot(self, lowest: int = 5) -> dict:
+        """آمار و سطح فعلی bucketها برای /metrics (عمومی است).
+
+        برای userها/ipها فقط سطح کم‌توکن‌ترین bucketها (صعودی) می‌آید، بدون username
+        یا IP؛ شناسه‌ها فقط در جدول ai_buckets هستند.
+        """
+        now = time.time()
+        with self._lock:
+            snap = {"admitted": self.stats["admitted"], "denied": dict(self.stats["denied"]),
+                    "deferred": self.stats["deferred"], "errors": self.stats["errors"],
+                    "pruned": self.stats["pruned"], "levels": {}}
+        try:
+            for kind, (capacity, rate) in self.limits.items():
+                rows = self.store.lowest(kind, lowest)
+                snap["levels"][kind] = {"capacity": capacity, "lowest": sorted(
+                    round(Bucket(key, capacity, rate).level(tokens, updated_at, now), 2)
+                    for key, tokens, updated_at in rows
+                )}
+        except sqlite3.Error as e:
+            snap["levels"] = {"error": type(e).__name__}
+        return snap
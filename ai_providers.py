@@ -0,0 +1,337 @@
+"""Startup Sandbox - AI Providers & Hedged Requests
+
+لایه provider پشت call_ai_api:
+
+- Provider: هر سرویس AI یک stream(contents, temperature) دارد که تکه‌های متن را
+  yield می‌کند (Gemini در app.py، OpenRouter اینجا، stubها در تست‌ها).
+- LatencyTracker: تأخیر اخیر هر provider برای محاسبه p90.
+- HedgedRouter: درخواست به provider اصلی می‌رود؛ اگر تا p90 تأخیرش جواب نداد،
+  همان پرامپت به provider دوم هم فرستاده می‌شود. اولین پاسخ معتبر برنده است و
+  درخواست دیگر لغو می‌شود (stream بسته می‌شود).
+
+آمار (نرخ hedge، برد هر provider، هزینه اضافه) با snapshot() در دسترس است.
+این ماژول به Flask وابسته نیست.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+
+
+# ========== Providers ==========
+
+class Usage:
+    """مصرف توکن گزارش‌شده توسط provider؛ stream می‌تواند آن را بین تکه‌های متن yield کند.
+
+    مقدار آخر برنده است (Gemini در هر تکه مصرف تجمعی را می‌فرستد).
+    """
+
+    __slots__ = ("prompt_tokens", "response_tokens", "model")
+
+    def __init__(self, prompt_tokens=None, response_tokens=None, model=None):
+        self.prompt_tokens = prompt_tokens
+        self.response_tokens = response_tokens
+        self.model = model
+
+
+class Provider:
+    """یک سرویس AI؛ زیرکلاس‌ها stream را پیاده می‌کنند.
+
+    stream تکه‌های متن (str) و در صورت وجود Usage را yield می‌کند.
+    """
+
+    name = "provider"
+    model = None
+    # هزینه تقریبی هر ۱۰۰۰ کاراکتر (ورودی + خروجی) برای گزارش هزینه اضافه hedge
+    cost_per_1k_chars = 0.0
+
+    def available(self) -> bool:
+        return True
+
+    def stream(self, contents: str, temperature: float):
+        raise NotImplementedError
+
+
+class CallableProvider(Provider):
+    """provider از روی یک تابع stream (مثلاً Gemini در app.py یا stub در تست)."""
+
+    def __init__(self, name: str, stream_fn, available=None, cost_per_1k_chars: float = 0.0, model=None):
+        self.name = name
+        self.model = model
+        self._stream_fn = stream_fn
+        self._available = available
+        self.cost_per_1k_chars = cost_per_1k_chars
+
+    def available(self) -> bool:
+        return self._available() if self._available is not None else True
+
+    def stream(self, contents: str, temperature: float):
+        return self._stream_fn(contents, temperature)
+
+
+class OpenRouterProvider(Provider):
+    """OpenRouter (API سازگار با OpenAI) با stream از نوع SSE."""
+
+    name = "openrouter"
+    url = "https://openrouter.ai/api/v1/chat/completions"
+
+    def __init__(self, api_key: str | None = None, model: str | None = None, cost_per_1k_chars: float = 0.0):
+        self.api_key = api_key if api_key is not None else os.getenv("OPENROUTER_API_KEY")
+        self.model = model or os.getenv("OPENROUTER_MODEL", "openrouter/free")
+        self.site_url = os.getenv("OPENROUTER_SITE_URL", "http://localhost:5000")
+        self.app_name = os.getenv("OPENROUTER_APP_NAME", "sandbox")
+        self.cost_per_1k_chars = cost_per_1k_chars
+
+    def available(self) -> bool:
+        return bool(self.api_key)
+
+    def stream(self, contents: str, temperature: float):
+        import requests  # lazy: فقط وقتی این provider فعال شود
+
+        response = requests.post(
+            self.url,
+            headers={
+                "Authorization": f"Bearer {self.api_key}",
+                "Content-Type": "application/json",
+                "HTTP-Referer": self.site_url,
+                "X-Title": self.app_name,
+            },
+            json={
+                "model": self.model,
+                "messages": [{"role": "user", "content": contents}],
+                "temperature": temperature,
+                "stream": True,
+            },
+            stream=True,
+            timeout=45,
+        )
+        try:
+            response.raise_for_status()
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                event = json.loads(data)
+                usage = event.get("usage")
+                if usage:
+                    # OpenRouter مصرف را در آخرین event می‌فرستد
+                    yield Usage(usage.get("prompt_tokens"), usage.get("completion_tokens"), event.get("model"))
+                choices = event.get("choices") or [{}]
+                delta = choices[0].get("delta", {}).get("content")
+                if delta:
+                    yield delta
+        finally:
+            # بستن generator (لغو hedge) اتصال را هم می‌بندد
+            response.close()
+
+
+# ========== Latency ==========
+
+class LatencyTracker:
+    """تأخیرهای اخیر هر provider (پنجره ثابت) برای تعیین زمان hedge."""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.window = window
+        self.min_samples = min_samples
+        self._samples: dict[str, deque] = {}
+        self._lock = threading.Lock()
+
+    def record(self, provider: str, seconds: float) -> None:
+        with self._lock:
+            self._samples.setdefault(provider, deque(maxlen=self.window)).append(seconds)
+
+    def quantile(self, provider: str, q: float):
+        """None اگر هنوز نمونه کافی نیست."""
+        with self._lock:
+            samples = sorted(self._samples.get(provider, ()))
+        if len(samples) < self.min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def p90(self, provider: str):
+        return self.quantile(provider, 0.9)
+
+
+# ========== Hedging ==========
+
+class HedgedRouter:
+    """ارسال درخواست به providerها با hedging (اولین پاسخ معتبر برنده است).
+
+    attempt(provider, cancelled) -> (ok, text, payload) را فراخواننده می‌دهد: stream را
+    می‌خواند، اعتبارسنجی می‌کند و با set شدن cancelled زودتر برمی‌گردد.
+    text (متن دریافتی) برای حساب هزینه اضافه و payload برای فراخواننده است.
+    """
+
+    def __init__(self, providers: list[Provider], hedge: bool = True, tracker: LatencyTracker | None = None,
+                 default_delay: float = 2.0, min_delay: float = 0.05):
+        self.providers = list(providers)
+        self.hedge = hedge
+        self.tracker = tracker or LatencyTracker()
+        self.default_delay = default_delay
+        self.min_delay = min_delay
+        self._inflight: set[threading.Thread] = set()
+        self._inflight_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.stats = {
+            "calls": 0, "hedged": 0, "failover": 0, "failed": 0,
+            "wins": {}, "cancelled": 0, "extra_chars": 0, "extra_cost": 0.0,
+        }
+
+    def _run(self, attempt, provider: Provider, cancelled: threading.Event) -> tuple[Future, float]:
+        """یک thread جدا برای هر تلاش (بدون pool مشترک، پس بدون صف و سقف همزمانی).
+
+        (future، زمان شروع واقعی attempt)؛ وقتی برمی‌گردد attempt شروع شده است.
+        """
+        future, began = Future(), threading.Event()
+        start = [0.0]
+
+        def run():
+            future.set_running_or_notify_cancel()
+            start[0] = time.perf_counter()
+            began.set()
+            try:
+                future.set_result(attempt(provider, cancelled))
+            except BaseException as e:
+                future.set_exception(e)
+            finally:
+                with self._inflight_lock:
+                    self._inflight.discard(thread)
+
+        thread = threading.Thread(target=run, name=f"ai-hedge-{provider.name}", daemon=True)
+        with self._inflight_lock:
+            self._inflight.add(thread)
+        thread.start()
+        began.wait()
+        return future, start[0]
+
+    def available(self) -> list[Provider]:
+        return [p for p in self.providers if p.available()]
+
+    def hedge_delay(self, provider: Provider) -> float:
+        p90 = self.tracker.p90(provider.name)
+        return max(self.min_delay, self.default_delay if p90 is None else p90)
+
+    def _count(self, key: str, amount=1) -> None:
+        with self._stats_lock:
+            self.stats[key] += amount
+
+    def _win(self, provider: Provider) -> None:
+        with self._stats_lock:
+            self.stats["wins"][provider.name] = self.stats["wins"].get(provider.name, 0) + 1
+
+    def call(self, contents: str, attempt):
+        """(نام provider برنده یا None، text، payload) — در صورت شکست، از آخرین تلاش.
+
+        بدون provider دوم (یا hedge خاموش) همان درخواست تکی بدون thread اضافه است.
+        """
+        providers = self.available()
+        if not providers:
+            return None, None, None
+        self._count("calls")
+        primary = providers[0]
+
+        if not self.hedge or len(providers) < 2:
+            t0 = time.perf_counter()
+            ok, text, payload = attempt(primary, threading.Event())
+            if ok:
+                self.tracker.record(primary.name, time.perf_counter() - t0)
+                self._win(primary)
+                return primary.name, text, payload
+            self._count("failed")
+            return None, text, payload
+
+        return self._call_hedged(contents, attempt, providers)
+
+    def _call_hedged(self, contents: str, attempt, providers: list[Provider]):
+        running = {}  # future -> (provider, cancelled event, start)
+
+        def launch(provider):
+            cancelled = threading.Event()
+            future, start = self._run(attempt, provider, cancelled)
+            running[future] = (provider, cancelled, start)
+            return start
+
+        primary, backups = providers[0], list(providers[1:])
+        # زمان hedge از شروع واقعی درخواست اصلی شمرده می‌شود
+        hedge_at = launch(primary) + self.hedge_delay(primary)
+        last = (None, None)
+        winner = None
+
+        while running and winner is None:
+            timeout = None if hedge_at is None else max(0.0, hedge_at - time.perf_counter())
+            done, _ = wait(list(running), timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                # provider اصلی تا p90 جواب نداده: hedge
+                if backups:
+                    self._count("hedged")
+                    launch(backups.pop(0))
+                hedge_at = None
+                continue
+            for future in done:
+                provider, _, start = running.pop(future)
+                try:
+                    ok, text, payload = future.result()
+                except Exception as e:
+                    print(f"⚠️ خطا در provider {provider.name}: {e}")
+                    ok, text, payload = False, None, None
+                if text is not None:
+                    last = (text, payload)
+                if ok and winner is None:
+                    self.tracker.record(provider.name, time.perf_counter() - start)
+                    winner = (provider, text, payload)
+                elif not ok and backups and not running:
+                    # پاسخ نامعتبر قبل از hedge: بلافاصله provider بعدی
+                    self._count("failover")
+                    launch(backups.pop(0))
+                    hedge_at = None
+
+        # بقیه درخواست‌ها لغو می‌شوند؛ هزینه‌شان هزینه اضافه hedge است
+        for future, (provider, cancelled, start) in list(running.items()):
+            cancelled.set()
+            self._count("cancelled")
+            future.add_done_callback(lambda f, p=provider: self._settle_loser(p, contents, f))
+
+        if winner is None:
+            self._count("failed")
+            return (None, *last)
+        self._win(winner[0])
+        return winner[0].name, winner[1], winner[2]
+
+    def _settle_loser(self, provider: Provider, contents: str, future) -> None:
+        """درخواست لغوشده: فقط کاراکترهای مصرف‌شده (هزینه اضافه) ثبت می‌شوند.
+
+        زمان تا لغو نمونه تأخیر نیست؛ ثبتش p90 provider کند را پایین می‌کشید و hedge زودتر می‌شد.
+        """
+        try:
+            received = len(future.result()[1] or "")
+        except Exception:
+            received = 0
+        chars = len(contents) + received
+        self._count("extra_chars", chars)
+        self._count("extra_cost", chars / 1000 * provider.cost_per_1k_chars)
+
+    def snapshot(self) -> dict:
+        """آمار برای /metrics."""
+        with self._stats_lock:
+            stats = {**self.stats, "wins": dict(self.stats["wins"])}
+        calls = stats["calls"] or 1
+        stats["hedge_rate"] = round(stats["hedged"] / calls, 4)
+        stats["extra_cost"] = round(stats["extra_cost"], 6)
+        stats["p90_seconds"] = {
+            p.name: (round(v, 4) if (v := self.tracker.p90(p.name)) is not None else None)
+            for p in self.providers
+        }
+        return stats
+
+    def shutdown(self, wait: bool = False) -> None:
+        """wait=True: منتظر تلاش‌های در جریان (مثلاً بازنده‌های لغوشده) می‌ماند."""
+        if wait:
+            with self._inflight_lock:
+                threads = list(self._inflight)
+            for thread in threads:
+                thread.join()
@@ -3,12 +3,15 @@
 شبیه‌ساز پیشرفته تصمیم‌گیری برای استارتاپ‌ها
 """
 
-from flask import Flask, render_template, request, redirect, url_for, session
+from flask import Flask, render_template, request, redirect, url_for, session, current_app, has_app_context, has_request_context, jsonify, send_from_directory, abort, g, before_render_template, template_rendered
 import sqlite3
+import contextvars
 import json
+import mimetypes
 import os
-import requests
-from google import genai
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
 
 
 """Startup Sandbox (Flask)
@@ -37,20 +40,47 @@ try:
 except Exception:
     migrate_database = None
 
+from storage import GameRepository, make_backend
+from replay import prompt_hash
+from speculation import SpeculationManager
+from json_stream import IncrementalJSONParser, ScenarioStreamValidator, StreamAbort
+from ai_providers import CallableProvider, HedgedRouter, OpenRouterProvider, Provider, Usage
+from procedural import ProceduralScenarioGenerator
+from maintenance import MaintenanceScheduler, RequestActivity
+from db_backup import backup_all
+from build_assets import DIST_DIR, load_manifest
+from page_cache import PageCache, render_version
+from ai_governor import AIGovernor, SQLiteBucketStore
+from corpus_snapshot import SnapshotReader
+from telemetry import TelemetryLog
+import stat_history
+import tracing
+from tracing import JSONLExporter, Tracer
 
 
-app = Flask(__name__)
-
-# در محیط production باید از متغیر محیطی استفاده شود
-app.secret_key = os.getenv('FLASK_SECRET_KEY', 'dev_secret_key_change_me')
 
 # 🔴 تنظیمات حیاتی (فقط از ENV)
 # اگر کلید ست نشده باشد یا خالی باشد، AI غیرفعال است و سیستم روی fallback کار می‌کند.
 GEMINI_API_KEY = (os.getenv("GEMINI_API_KEY", "gemini-3-flash-preview").strip() or None)
 GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
 
-# Client key را از env می‌گیرد اگر GEMINI_API_KEY ست باشد
-gemini_client = genai.Client()
+# کلاینت Gemini در زمان import ساخته نمی‌شود:
+# SDK سنگین است و بدون credential هنگام ساخت Client خطا می‌دهد.
+# اولین فراخوانی AI هم import و هم ساخت Client را انجام می‌دهد.
+_gemini_client = None
+_gemini_client_lock = threading.Lock()
+
+
+def get_gemini_client():
+    """ساخت تنبل (lazy) کلاینت Gemini در اولین استفاده."""
+    global _gemini_client
+    if _gemini_client is None:
+        with _gemini_client_lock:
+            if _gemini_client is None:
+                from google import genai  # import سنگین؛ فقط در اولین فراخوانی AI
+                # Client key را از env می‌گیرد اگر GEMINI_API_KEY ست باشد
+                _gemini_client = genai.Client()
+    return _gemini_client
 
 # OPENROUTER_MODEL = os.getenv("OPENROUTER_MODEL", "openrouter/free")
 # OPENROUTER_SITE_URL = os.getenv("OPENROUTER_SITE_URL", "http://localhost:5000")
@@ -78,6 +108,7 @@ PROXY_URL = os.getenv('HTTP_PROXY') or os.getenv('HTTPS_PROXY') or None
 #         "max_tokens": max_tokens,
 #     }
 
+#     import requests  # lazy: فقط وقتی این provider فعال شود
 #     r = requests.post(url, headers=headers, json=payload, timeout=45)
 #     r.raise_for_status()
 #     data = r.json()
@@ -85,6 +116,7 @@ PROXY_URL = os.getenv('HTTP_PROXY') or os.getenv('HTTPS_PROXY') or None
 
 
 # مسیر دیتابیس (برای تست و چند محیط)
+# مقدار پیش‌فرض برای اسکریپت‌ها؛ داخل اپ از app.config["DB_PATH"] خوانده می‌شود.
 DB_PATH = os.getenv('STARTUP_DB_PATH', 'startup.db')
 
 # ========== Constants ==========
@@ -109,32 +141,46 @@ INITIAL_MORALE = 80
 
 # ========== Database Functions ==========
 
-_db_schema_initialized = False
+# مسیرهایی که در این پروسس migrate شده‌اند
+_db_schema_initialized: set[str] = set()
+
+
+def _db_path() -> str:
+    """مسیر دیتابیس اپ فعلی (یا مقدار پیش‌فرض خارج از app context)."""
+    if has_app_context():
+        return current_app.config.get("DB_PATH", DB_PATH)
+    return DB_PATH
+
 
-def _ensure_db_schema() -> None:
+def _ensure_db_schema(db_path: str) -> None:
     """اطمینان از سازگاری اسکیما برای دیتابیس‌های قدیمی.
 
     - اگر db_setup.py قبلاً اجرا شده باشد، این تابع فقط migrationهای سبک را اعمال می‌کند.
     - اگر migrate_db موجود نباشد، چیزی انجام نمی‌دهد.
     """
-    # فقط یک بار در هر پروسس
-    global _db_schema_initialized
-    if _db_schema_initialized:
+    # فقط یک بار برای هر مسیر در هر پروسس
+    if db_path in _db_schema_initialized:
         return
     if migrate_database is None:
         return
     try:
-        migrate_database(DB_PATH)
-        _db_schema_initialized = True
+        migrate_database(db_path)
+        _db_schema_initialized.add(db_path)
     except Exception as e:
         # اجازه بده برنامه بالا بیاید؛ fallbackها در تولید سناریو کمک می‌کنند
         print(f"⚠️ خطا در migrate_database: {e}")
 
 
+def get_repository() -> GameRepository:
+    """repository اپ فعلی (در create_app ساخته می‌شود)."""
+    return current_app.extensions["repository"]
+
+
 def get_db_connection():
-    """ایجاد اتصال به دیتابیس با تنظیمات بهینه"""
-    _ensure_db_schema()
-    conn = sqlite3.connect(DB_PATH)
+    """ایجاد اتصال به دیتابیس با تنظیمات بهینه (برای اسکریپت‌ها؛ routeها از repository استفاده می‌کنند)"""
+    db_path = _db_path()
+    _ensure_db_schema(db_path)
+    conn = sqlite3.connect(db_path)
     conn.row_factory = sqlite3.Row
     # فعال‌سازی foreign keys
     conn.execute('PRAGMA foreign_keys = ON')
@@ -181,15 +227,211 @@ def _extract_json_object(text: str) -> str | None:
     return None
 
 
-def call_ai_api(prompt_text: str, json_mode: bool = False, temperature: float = 0.3):
+def _stream_text(contents: str, temperature: float):
+    """فراخوانی شبکه‌ای Gemini به صورت stream؛ تکه‌های متن پاسخ به ترتیب رسیدن.
+
+    بستن (close) generator قبل از پایان، اتصال را قطع و تولید را لغو می‌کند.
+    """
+    stream = get_gemini_client().models.generate_content_stream(
+        model=GEMINI_MODEL,
+        contents=contents
+    )
+    for chunk in stream:
+        meta = getattr(chunk, "usage_metadata", None)
+        if meta is not None:
+            # قبل از متن: اگر validator با همین تکه کامل شود، مصرف از دست نمی‌رود
+            yield Usage(meta.prompt_token_count, meta.candidates_token_count,
+                        getattr(chunk, "model_version", None) or GEMINI_MODEL)
+        text = getattr(chunk, "text", None)
+        if text:
+            yield text
+
+
+def _read_stream(chunks, validator, cancelled=None, usage=None):
+    """خواندن تکه‌ها با اعتبارسنجی هم‌زمان؛ (متن دریافتی، دلیل توقف زودهنگام یا None).
+
+    به محض StreamAbort (یا کامل شدن آبجکت JSON، یا لغو hedge با cancelled)
+    خواندن متوقف و stream بسته می‌شود. Usageهای stream (اگر usage داده شود)
+    در همان dict نوشته می‌شوند.
     """
-    Gemini call (replaces Groq/OpenRouter).
+    parts = []
+    parse_ns = 0
+    try:
+        for chunk in chunks:
+            if cancelled is not None and cancelled.is_set():
+                return "".join(parts), "cancelled"
+            if isinstance(chunk, Usage):
+                if usage is not None:
+                    usage.update(prompt_tokens=chunk.prompt_tokens, response_tokens=chunk.response_tokens,
+                                 model=chunk.model)
+                continue
+            if not chunk:
+                continue
+            parts.append(chunk)
+            if validator is not None:
+                t0 = time.perf_counter_ns()
+                complete = validator.feed(chunk)
+                parse_ns += time.perf_counter_ns() - t0
+                if complete:
+                    break
+        if validator is not None and parts:
+            validator.finish()
+        return "".join(parts), None
+    except StreamAbort as e:
+        return "".join(parts), str(e)
+    finally:
+        if validator is not None:
+            # parse تکه‌به‌تکه لابه‌لای دریافت است؛ فقط جمع زمانش روی span تلاش ثبت می‌شود
+            tracing.annotate(**{"json.parse_ms": round(parse_ns / 1e6, 3), "ai.chunks": len(parts)})
+        close = getattr(chunks, "close", None)
+        if close is not None:
+            close()
+
+
+def _record_ai_response(game_id, purpose, key: str, text) -> None:
+    """ثبت پاسخ خام AI در replay log (برای بازپخش قطعی بازی)."""
+    if game_id is None or not has_app_context() or not current_app.config.get("AI_RECORD", True):
+        return
+    try:
+        get_repository().record_ai_response(game_id, purpose, key, text)
+    except Exception as e:
+        print(f"⚠️ خطا در ثبت replay log: {e}")
+
+
+def default_ai_providers() -> list[Provider]:
+    """Gemini (اصلی) و OpenRouter (برای hedge، فقط اگر OPENROUTER_API_KEY ست باشد)."""
+    return [
+        CallableProvider(
+            "gemini",
+            lambda contents, temperature: _stream_text(contents, temperature),
+            available=lambda: bool(os.getenv("GEMINI_API_KEY")),
+            cost_per_1k_chars=float(os.getenv("GEMINI_COST_PER_1K", "0") or 0),
+            model=GEMINI_MODEL,
+        ),
+        OpenRouterProvider(cost_per_1k_chars=float(os.getenv("OPENROUTER_COST_PER_1K", "0") or 0)),
+    ]
+
+
+_default_ai_router = None
+
+
+def get_ai_router() -> HedgedRouter:
+    """router اپ فعلی؛ خارج از app context یک router پیش‌فرض بدون تنظیمات اپ."""
+    global _default_ai_router
+    if has_app_context():
+        return current_app.extensions["ai_router"]
+    if _default_ai_router is None:
+        _default_ai_router = HedgedRouter(default_ai_providers())
+    return _default_ai_router
+
+
+# کاربر/IP درخواستی که فراخوانی AI از آن آمده؛ jobهای پس‌زمینه (speculation،
+# deadline) آن را از درخواست اصلی با خود می‌برند
+_ai_client = contextvars.ContextVar("ai_client", default=None)
+# jobهای speculation کم‌اولویت‌اند: governor برایشان بخش رزرو bucket را نگه می‌دارد
+_ai_background = contextvars.ContextVar("ai_background", default=False)
+
+
+def current_ai_client() -> tuple:
+    """(username, ip) برای bucketهای governor."""
+    client = _ai_client.get()
+    if client is not None:
+        return client
+    if has_request_context():
+        return session.get("username"), request.remote_addr
+    return None, None
+
+
+def _with_ai_client(job, background: bool = False):
+    """job پس‌زمینه با همان کاربر/IP درخواست فعلی (برای سهمیه AI).
+
+    background=True برای کارهایی که بازیکن منتظرشان نیست (speculation)؛ فقط از
+    سهمیه‌ای برمی‌دارند که برای فراخوانی‌های پیش‌زمینه رزرو نشده است.
+    """
+    client = current_ai_client()
+
+    def run():
+        _ai_client.set(client)
+        _ai_background.set(background)
+        return job()
+    return run
+
+
+def admit_ai_call() -> bool:
+    """governor: False یعنی سهمیه AI پر است و باید مسیر fallback برود."""
+    if not has_app_context():
+        return True
+    governor = current_app.extensions.get("ai_governor")
+    if governor is None:
+        return True
+    return governor.admit(*current_ai_client(), background=_ai_background.get())
+
+
+def _ai_exception_outcome(exc: Exception) -> str:
+    # requests.Timeout/ReadTimeout، socket.timeout و ... همه timeout حساب می‌شوند
+    return "timeout" if isinstance(exc, TimeoutError) or "Timeout" in type(exc).__name__ else "error"
+
+
+def _record_ai_call(game_id, purpose, outcome, started, contents="", text=None, info=None) -> None:
+    """ثبت یک فراخوانی در ai_calls (صف ناهمگام؛ نوشتن دیتابیس خارج از مسیر درخواست)."""
+    if not has_app_context():
+        return
+    recorder = current_app.extensions.get("ai_calls")
+    if recorder is None:
+        return
+    info = info or {}
+    provider = info.get("provider")
+    usage = info.get("usage") or {}
+    recorder.record(
+        game_id=game_id,
+        purpose=purpose,
+        provider=provider.name if provider else None,
+        model=usage.get("model") or (getattr(provider, "model", None) if provider else None),
+        outcome=outcome,
+        latency_ms=round((time.perf_counter() - started) * 1000, 2),
+        prompt_tokens=usage.get("prompt_tokens"),
+        response_tokens=usage.get("response_tokens"),
+        prompt_chars=len(contents),
+        response_chars=len(text or ""),
+    )
+
+
+def call_ai_api(prompt_text: str, json_mode: bool = False, temperature: float = 0.3,
+                *, game_id=None, purpose=None):
+    """
+    AI call (Gemini, with optional hedging to a second provider).
     - json_mode=True => expects JSON-only output, validates it, otherwise returns None (so fallback works)
+    - پاسخ stream می‌شود و در json_mode هم‌زمان parse می‌شود؛ با اولین خطای
+      قطعی تولید لغو و None برگردانده می‌شود.
+    - هر پاسخ خام با hash پرامپت در replay log ثبت می‌شود؛ اگر AI_REPLAY_SOURCE
+      در config ست شده باشد، پاسخ به جای شبکه از همان log خوانده می‌شود.
+    """
+    text, _ = _ai_request(prompt_text, json_mode, temperature, game_id=game_id, purpose=purpose)
+    return text
+
+
+@tracing.traced("ai.request")
+def _ai_request(prompt_text: str, json_mode: bool, temperature: float,
+                *, game_id=None, purpose=None, validator_factory=None):
+    """(متن پاسخ یا None، validator پاسخ برنده)؛ هسته call_ai_api.
+
+    validator_factory برای هر تلاش (هر provider) یک validator تازه می‌سازد.
     """
+    if json_mode and validator_factory is None:
+        validator_factory = IncrementalJSONParser
+    tracing.annotate(**{"ai.purpose": purpose, "ai.json_mode": json_mode, "game.id": game_id})
+    request_span = tracing.current()
     try:
-        # اگر کلید ست نشده باشد، بگذار fallback کار کند
-        if not os.getenv("GEMINI_API_KEY"):
-            return None
+        replay_source = current_app.config.get("AI_REPLAY_SOURCE") if has_app_context() else None
+        router = get_ai_router()
+
+        # اگر هیچ providerی کلید نداشته باشد، بگذار fallback کار کند
+        if replay_source is None and not router.available():
+            return None, None
+        # سهمیه کاربر/IP/کل اپ پر است: همان مسیر fallback (replay هزینه‌ای ندارد)
+        if replay_source is None and not admit_ai_call():
+            _record_ai_call(game_id, purpose, "fallback", time.perf_counter())
+            return None, None
 
         system_rules = (
             "تو یک راوی شبیه‌ساز مدیریت استارتاپ هستی. "
@@ -201,33 +443,66 @@ def call_ai_api(prompt_text: str, json_mode: bool = False, temperature: float =
         # Gemini: contents را مثل یک متن ترکیبی می‌فرستیم (system + user)
         contents = f"{system_rules}\n\n{prompt_text}"
 
-        resp = gemini_client.models.generate_content(
-            model=GEMINI_MODEL,
-            contents=contents
-        )
-
-        text = getattr(resp, "text", None)
-        if not text:
-            return None
+        attempts = {}  # نام provider -> provider، usage و علت شکست (برای ai_calls)
+
+        def attempt(provider, cancelled):
+            validator = validator_factory() if validator_factory else None
+            info = attempts[provider.name] = {"provider": provider, "usage": {}, "failure": None}
+            # با hedge در thread دیگری اجرا می‌شود؛ parent صریح است نه span جاری
+            with tracing.span("ai.attempt", parent=request_span, kind=tracing.CLIENT,
+                              **{"ai.provider": provider.name}) as span:
+                try:
+                    text, aborted = _read_stream(provider.stream(contents, temperature), validator, cancelled,
+                                                 info["usage"])
+                except Exception as e:
+                    info["failure"] = _ai_exception_outcome(e)
+                    raise
+                if aborted and aborted != "cancelled":
+                    info["failure"] = "invalid_json"
+                    print(f"⚠️ پاسخ {provider.name} نامعتبر بود، تولید زودتر متوقف شد: {aborted}")
+                if span is not None:
+                    span.set(**{"ai.aborted": aborted, "ai.response_chars": len(text or "")})
+            return bool(text) and not aborted, text, validator
+
+        key = prompt_hash(contents, json_mode)
+        if replay_source is not None:
+            recorded = replay_source.take(key)
+            validator = validator_factory() if validator_factory else None
+            text, aborted = _read_stream([recorded] if recorded else [], validator)
+            ok = bool(text) and not aborted
+        else:
+            text = winner = None
+            started = time.perf_counter()
+            try:
+                winner, text, validator = router.call(contents, attempt)
+                ok = winner is not None
+            finally:
+                # متن ناقص هم ثبت می‌شود تا replay همان توقف زودهنگام را بازتولید کند
+                _record_ai_response(game_id, purpose, key, text)
+                tried = list(attempts.values())
+                info = attempts.get(winner) or (tried[-1] if tried else None)
+                failure = next((i["failure"] for i in reversed(tried) if i["failure"]), "error")
+                _record_ai_call(game_id, purpose, "ok" if winner else failure, started, contents, text, info)
+                tracing.annotate(**{"ai.outcome": "ok" if winner else failure, "ai.provider": winner})
+
+        if not ok:
+            return None, None
 
         if not json_mode:
-            return text
+            return text, None
 
-        candidate = _extract_json_object(text)
-        if not candidate:
-            return None
-
-        json.loads(candidate)  # validate
-        return candidate
+        # validator آبجکت را parse کرده؛ فقط همان بخش JSON برگردانده می‌شود
+        with tracing.span("json.extract"):
+            return _extract_json_object(text[:validator.consumed]), validator
 
     except Exception as e:
-        print(f"❌ خطا در اتصال به Gemini: {e}")
-        return None
+        print(f"❌ خطا در اتصال به AI: {e}")
+        return None, None
 
 
 # ========== Game Logic Functions ==========
 def check_game_over(game):
-    """بررسی شرایط پایان بازی"""
+    """بررسی شرایط پایان بازی (Game یا dict وضعیت خروجی apply_choice)"""
     reasons = []
     
     if game['budget'] <= MIN_BUDGET:
@@ -280,29 +555,48 @@ def get_scenario_type_weights(turn_number, current_budget, current_reputation, c
         return {"CRISIS": 4, "OPPORTUNITY": 3, "NORMAL": 2, "DILEMMA": 3, "EXTREME_CRISIS": 2}
 
 # ========== Scenario Generation ==========
-def generate_dynamic_scenario(game_id, startup_name, turn_number, current_budget, current_reputation, current_morale):
-    """تولید سناریوی پویا و چالشی با AI"""
-    conn = get_db_connection()
+def game_rng(seed, turn_number) -> random.Random:
+    """RNG قطعی هر نوبت بازی (seed بازی + شماره نوبت) برای replay تکرارپذیر."""
+    return random.Random(f"{seed}:{turn_number}")
+
+
+def new_game_seed() -> int:
+    """seed بازی جدید؛ RNG_SEED در config (مثلاً در replay) آن را ثابت می‌کند."""
+    forced = current_app.config.get("RNG_SEED") if has_app_context() else None
+    if forced is not None:
+        return int(forced)
+    return random.SystemRandom().randrange(2 ** 31)
+
+
+def plan_scenario(game_id, startup_name, turn_number, current_budget, current_reputation, current_morale,
+                  rng_seed=None, pending_history=None):
+    """نوع، سختی و پرامپت سناریوی یک نوبت را تعیین می‌کند (بدون فراخوانی AI).
+
+    rng_seed: seed ذخیره‌شده بازی؛ بدون آن (بازی‌های قدیمی) از random سراسری استفاده می‌شود.
+    pending_history: سناریوهایی که هنوز در logs ثبت نشده‌اند (برای تولید speculative).
+    """
+    repo = get_repository()
     
     try:
-        # دریافت تاریخچه سناریوهای قبلی
-        previous_logs = conn.execute('''
-            SELECT scenario_title, scenario_type 
-            FROM logs 
-            WHERE game_id = ? 
-            ORDER BY turn_number DESC 
-            LIMIT 5
-        ''', (game_id,)).fetchall()
+        # دریافت تاریخچه سناریوهای قبلی (از cache حافظه؛ فقط بار اول از دیتابیس)
+        previous_logs = repo.recent_history(game_id, 5)
         
-        previous_titles = ", ".join([f"{row['scenario_title']} ({row['scenario_type']})" for row in previous_logs])
-    except:
+        previous_titles = ", ".join(
+            f"{title} ({scenario_type})" if scenario_type else title
+            for title, scenario_type in previous_logs if title
+        )
+    except Exception as e:
+        print(f"⚠️ خطا در خواندن تاریخچه سناریوها: {e}")
         previous_titles = ""
+    if pending_history:
+        previous_titles = ", ".join(filter(None, [*pending_history, previous_titles]))
     
     # تعیین نوع سناریو
-    scenario_types = ["CRISIS", "OPPORTUNITY", "NORMAL", "DILEMMA", "EXTREME_CRISIS"]
+    scenario_types = SCENARIO_TYPES
     weights = get_scenario_type_weights(turn_number, current_budget, current_reputation, current_morale)
     weights_list = [weights.get(st, 1) for st in scenario_types]
-    selected_type = random.choices(scenario_types, weights=weights_list, k=1)[0]
+    rng = game_rng(rng_seed, turn_number) if rng_seed is not None else random
+    selected_type = rng.choices(scenario_types, weights=weights_list, k=1)[0]
     
     difficulty = calculate_difficulty(turn_number, current_budget, current_reputation)
     
@@ -402,75 +696,436 @@ def generate_dynamic_scenario(game_id, startup_name, turn_number, current_budget
 - برای OPPORTUNITY، حداقل یک گزینه باید cost مثبت داشته باشد
 - برای DILEMMA، همه گزینه‌ها باید trade-off داشته باشند (هیچ گزینه کاملاً مثبت نباشد)
 """
+    return selected_type, difficulty, prompt_text
+
+
+def _strip_code_fence(raw_text: str) -> str:
+    # پاک کردن markdown code blocks اگر وجود دارد
+    if "```json" in raw_text:
+        raw_text = raw_text.split("```json")[1].split("```")[0].strip()
+    elif "```" in raw_text:
+        raw_text = raw_text.split("```")[1].split("```")[0].strip()
+    return raw_text
+
+
+def parse_scenario_response(raw_text: str) -> dict:
+    """پاسخ AI را به سناریوی معتبر با گزینه‌های محدودشده تبدیل می‌کند (یا خطا می‌دهد)."""
+    return validate_scenario_data(json.loads(_strip_code_fence(raw_text)))
+
+
+def request_scenario(prompt_text: str, *, game_id=None, purpose="scenario"):
+    """یک سناریو از AI با اعتبارسنجی اسکیما هم‌زمان با stream؛ سناریوی معتبر یا None.
+
+    خروجی parseشده validator مستقیم استفاده می‌شود (بدون json.loads دوباره).
+    """
+    raw_text, validator = _ai_request(prompt_text, True, 0.85, game_id=game_id, purpose=purpose,
+                                      validator_factory=ScenarioStreamValidator)
+    if not raw_text:
+        return None
+    try:
+        with tracing.span("json.validate"):
+            return validate_scenario_data(validator.value)
+    except Exception as e:
+        print(f"❌ خطا در پردازش سناریو: {e}")
+        return None
+
+
+def validate_scenario_data(scenario_data) -> dict:
+    """اعتبارسنجی و clamp یک سناریو (مشترک بین تولید تکی و batch)."""
+    if not isinstance(scenario_data, dict):
+        raise ValueError("سناریو باید آبجکت JSON باشد")
     
-    # درخواست از AI
-    raw_text = call_ai_api(prompt_text, json_mode=True, temperature=0.85)
+    # اعتبارسنجی داده‌ها
+    if not scenario_data.get('title') or not scenario_data.get('description'):
+        raise ValueError("عنوان یا توضیحات خالی است")
     
-    if raw_text:
+    if len(scenario_data.get('options', [])) < 3:
+        raise ValueError("حداقل 3 گزینه لازم است")
+    
+    options = []
+    for opt in scenario_data['options']:
+        # محدود کردن مقادیر
+        options.append({
+            "text": opt['text'],
+            "cost": clamp_stat(opt.get('cost', 0), -1000, 2000),
+            "reputation": clamp_stat(opt.get('reputation', 0), -50, 50),
+            "morale": clamp_stat(opt.get('morale', 0), -50, 50),
+            "risk": clamp_stat(opt.get('risk_level', 3), 1, 5),
+        })
+    return {"title": scenario_data['title'], "description": scenario_data['description'], "options": options}
+
+
+# ========== Batched Generation ==========
+SCENARIO_TYPES = ["CRISIS", "OPPORTUNITY", "NORMAL", "DILEMMA", "EXTREME_CRISIS"]
+
+
+def batch_specs(selected_type, difficulty, weights, batch_size):
+    """نوع/سختی سناریوهای یک batch: نوع انتخاب‌شده و بعد محتمل‌ترین انواع نوبت‌های بعد."""
+    by_weight = sorted(SCENARIO_TYPES, key=lambda t: weights.get(t, 1), reverse=True)
+    others = [t for t in by_weight if t != selected_type]
+    specs = [(selected_type, difficulty)]
+    i = 0
+    while len(specs) < batch_size:
+        specs.append((others[i % len(others)], difficulty))
+        i += 1
+    return specs
+
+
+def build_batch_prompt(prompt_text, specs):
+    """پرامپت تکی + درخواست چند سناریو در یک آرایه JSON (دستورالعمل‌ها فقط یک بار ارسال می‌شوند)."""
+    wanted = "\n".join(f"{i + 1}. type={t}, difficulty={d}" for i, (t, d) in enumerate(specs))
+    return f"""{prompt_text}
+
+**حالت چندتایی (مهم‌تر از فرمت بالا):**
+به جای یک سناریو، دقیقاً {len(specs)} سناریوی کاملاً متفاوت بساز، به همین ترتیب:
+{wanted}
+
+هر سناریو همان فیلدهای فرمت بالا را دارد به علاوه "type" و "difficulty".
+خروجی فقط این JSON باشد:
+{{"scenarios": [{{"type": "...", "difficulty": 1, "title": "...", "description": "...", "options": [...]}}]}}
+"""
+
+
+def parse_scenario_batch(raw_text: str) -> list[dict]:
+    """هر آیتم batch جداگانه اعتبارسنجی می‌شود؛ آیتم‌های نامعتبر کنار گذاشته می‌شوند."""
+    data = json.loads(_strip_code_fence(raw_text))
+    items = data.get("scenarios", []) if isinstance(data, dict) else data
+    valid = []
+    for item in items if isinstance(items, list) else []:
         try:
-            # پاک کردن markdown code blocks اگر وجود دارد
-            if "```json" in raw_text:
-                raw_text = raw_text.split("```json")[1].split("```")[0].strip()
-            elif "```" in raw_text:
-                raw_text = raw_text.split("```")[1].split("```")[0].strip()
-            
-            scenario_data = json.loads(raw_text)
-            
-            # اعتبارسنجی داده‌ها
-            if not scenario_data.get('title') or not scenario_data.get('description'):
-                raise ValueError("عنوان یا توضیحات خالی است")
-            
-            if len(scenario_data.get('options', [])) < 3:
-                raise ValueError("حداقل 3 گزینه لازم است")
-            
-            # ذخیره در دیتابیس
-            cursor = conn.cursor()
-            cursor.execute("""
-                INSERT INTO scenarios (game_id, scenario_type, title, description, difficulty_level, turn_number) 
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (game_id, selected_type, scenario_data['title'], scenario_data['description'], difficulty, turn_number))
-            scenario_id = cursor.lastrowid
-            
-            for opt in scenario_data['options']:
-                # محدود کردن مقادیر
-                cost = clamp_stat(opt.get('cost', 0), -1000, 2000)
-                reputation = clamp_stat(opt.get('reputation', 0), -50, 50)
-                morale = clamp_stat(opt.get('morale', 0), -50, 50)
-                risk = clamp_stat(opt.get('risk_level', 3), 1, 5)
-                
-                cursor.execute("""
-                    INSERT INTO choices (scenario_id, text, cost_impact, reputation_impact, morale_impact, risk_level) 
-                    VALUES (?, ?, ?, ?, ?, ?)
-                """, (scenario_id, opt['text'], cost, reputation, morale, risk))
-            
-            conn.commit()
-            return scenario_id
-            
-        except json.JSONDecodeError as e:
-            print(f"❌ خطای JSON: {e}")
-            print(f"متن دریافتی: {raw_text[:200]}")
+            scenario = validate_scenario_data(item)
         except Exception as e:
-            print(f"❌ خطا در پردازش سناریو: {e}")
-        finally:
-            # conn را نبندیم چون ممکن است fallback نیاز داشته باشد
-            pass
+            print(f"⚠️ آیتم نامعتبر در batch: {e}")
+            continue
+        scenario_type = item.get("type") if item.get("type") in SCENARIO_TYPES else None
+        if scenario_type is None:
+            continue
+        try:
+            item_difficulty = clamp_stat(int(item.get("difficulty", 1)), 1, 5)
+        except (TypeError, ValueError):
+            item_difficulty = 1
+        scenario.update(scenario_type=scenario_type, difficulty=item_difficulty)
+        valid.append(scenario)
+    return valid
+
+
+def generate_scenario_batch(game_id, selected_type, difficulty, weights, prompt_text, batch_size):
+    """یک فراخوانی AI برای چند سناریو؛ سناریوی این نوبت برگردانده و بقیه در صف بازی ذخیره می‌شوند."""
+    specs = batch_specs(selected_type, difficulty, weights, batch_size)
+    raw_text = call_ai_api(build_batch_prompt(prompt_text, specs), json_mode=True, temperature=0.85,
+                           game_id=game_id, purpose="scenario_batch")
+    if not raw_text:
+        return None
+    try:
+        with tracing.span("json.parse", **{"scenario.batch": len(specs)}):
+            items = parse_scenario_batch(raw_text)
+    except Exception as e:
+        print(f"❌ خطا در پردازش batch سناریو: {e}")
+        return None
+
+    primary = next(
+        (it for it in items if it["scenario_type"] == selected_type and it["difficulty"] == difficulty),
+        None
+    )
+    surplus = [it for it in items if it is not primary]
+    if surplus:
+        get_repository().enqueue_scenarios(game_id, surplus)
+    return primary
+
+
+@tracing.traced("scenario.generate")
+def generate_dynamic_scenario(game_id, startup_name, turn_number, current_budget, current_reputation, current_morale,
+                              rng_seed=None):
+    """تولید سناریوی پویا و چالشی با AI
+
+    اگر این نوبت قبلاً به صورت speculative (در زمان فکر کردن بازیکن) تولید شده باشد،
+    همان نتیجه ذخیره می‌شود و فراخوانی AI تکرار نمی‌شود.
+    """
+    repo = get_repository()
+    selected_type, difficulty, prompt_text = plan_scenario(
+        game_id, startup_name, turn_number, current_budget, current_reputation, current_morale,
+        rng_seed=rng_seed
+    )
+    
+    speculated = take_speculated_scenario(game_id, turn_number, (current_budget, current_reputation, current_morale))
+    if speculated and is_near_duplicate(game_id, speculated, "speculation"):
+        speculated = None
+    if speculated:
+        tracing.annotate(**{"scenario.source": "speculation"})
+        return repo.add_scenario(
+            game_id, speculated['scenario_type'], speculated['title'], speculated['description'],
+            speculated['difficulty'], turn_number, speculated['options']
+        )
+    
+    # سناریوی اضافه batchهای قبلی (اگر با نوع و سختی این نوبت بخواند)
+    queued = repo.pop_queued_scenario(game_id, selected_type, difficulty)
+    source = "queue"
+    if queued is not None and is_near_duplicate(game_id, queued, "queue"):
+        queued = None
+    weights = get_scenario_type_weights(turn_number, current_budget, current_reputation, current_morale)
+    if queued is None and use_procedural(rng_seed, turn_number):
+        queued = procedural_scenario(selected_type, difficulty, turn_number, startup_name, rng_seed, weights)
+        source = "procedural"
+    batch_size = current_app.config.get("SCENARIO_BATCH_SIZE", 1)
+    if queued is None and batch_size > 1:
+        queued = generate_scenario_batch(game_id, selected_type, difficulty, weights, prompt_text, batch_size)
+        source = "batch"
+        if queued is not None and is_near_duplicate(game_id, queued, "batch"):
+            queued = None
+    if queued:
+        tracing.annotate(**{"scenario.source": source})
+        return repo.add_scenario(
+            game_id, selected_type, queued['title'], queued['description'],
+            difficulty, turn_number, queued['options']
+        )
+    
+    # درخواست از AI
+    scenario_data = None
+    if batch_size <= 1:
+        if current_app.config.get("PROCEDURAL_POLICY") == "on_timeout":
+            scenario_data = request_scenario_with_deadline(prompt_text, game_id, selected_type, difficulty)
+        else:
+            scenario_data = request_scenario(prompt_text, game_id=game_id, purpose="scenario")
+    if scenario_data and is_near_duplicate(game_id, scenario_data, "ai"):
+        scenario_data = None
+    
+    if scenario_data:
+        tracing.annotate(**{"scenario.source": "ai"})
+        # ذخیره در دیتابیس
+        return repo.add_scenario(
+            game_id, selected_type, scenario_data['title'], scenario_data['description'],
+            difficulty, turn_number, scenario_data['options']
+        )
     
     # Fallback: استفاده از سناریوی پیش‌فرض
     print("⚠️ استفاده از سناریوی fallback")
-    # اطمینان از اینکه conn باز است
+    tracing.annotate(**{"scenario.source": "fallback"})
+    return create_fallback_scenario(game_id, selected_type, difficulty, turn_number,
+                                    startup_name=startup_name, rng_seed=rng_seed, weights=weights)
+
+
+def is_near_duplicate(game_id, data, source, corpus=False) -> bool:
+    """سناریوی تقریباً تکراری همین بازی رد می‌شود تا منبع بعدی جایگزینش کند.
+
+    سناریوی تولیدشده برای یک بازی فقط با همان بازی مقایسه می‌شود: شباهت به corpus
+    عمومی (مثلاً شاخه‌های هم‌نوبت که در commit بازیافت شده‌اند) برای بازیکن تکرار
+    نیست. corpus=True برای نوشتن در خود corpus است (recycle).
+
+    با DEDUP_ENABLED=0 یا خطای دیتابیس همیشه False (تشخیص تکراری نباید نوبت را بشکند).
+    """
+    if not has_app_context() or not current_app.config.get("DEDUP_ENABLED", True):
+        return False
+    try:
+        dup = get_repository().find_near_duplicate(game_id, data["title"], data["description"], corpus=corpus)
+    except Exception as e:
+        print(f"⚠️ خطا در تشخیص سناریوی تکراری: {e}")
+        return False
+    if dup:
+        print(f"♻️ سناریوی تقریباً تکراری ({source}) رد شد: «{data['title']}» ≈ «{dup['title']}» "
+              f"({dup['similarity']:.2f}, {dup['scope']})")
+    return bool(dup)
+
+
+# ========== Procedural Generation ==========
+PROCEDURAL_POLICIES = ("fallback", "always", "on_timeout", "percent")
+
+_background_executor = None
+_background_executor_lock = threading.Lock()
+
+
+def get_procedural() -> ProceduralScenarioGenerator:
+    return current_app.extensions["procedural"]
+
+
+def procedural_scenario(scenario_type, difficulty, turn_number, startup_name, rng_seed=None, weights=None) -> dict:
+    """سناریوی محلی (بدون شبکه)؛ با seed بازی برای هر نوبت قطعی است."""
+    rng = random.Random(f"{rng_seed}:{turn_number}:procedural") if rng_seed is not None else random.Random()
+    return get_procedural().generate(rng, scenario_type, difficulty, startup_name or "استارتاپ شما", weights)
+
+
+def use_procedural(rng_seed, turn_number) -> bool:
+    """policy سناریوساز محلی: always همیشه، percent برای درصدی از نوبت‌ها (قطعی با seed)."""
+    policy = current_app.config.get("PROCEDURAL_POLICY", "fallback")
+    if policy == "always":
+        return True
+    if policy == "percent":
+        rng = random.Random(f"{rng_seed}:{turn_number}:route") if rng_seed is not None else random
+        return rng.random() * 100 < current_app.config.get("PROCEDURAL_PERCENT", 0)
+    return False
+
+
+def _background() -> ThreadPoolExecutor:
+    global _background_executor
+    if _background_executor is None:
+        with _background_executor_lock:
+            if _background_executor is None:
+                _background_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="ai-deadline")
+    return _background_executor
+
+
+def request_scenario_with_deadline(prompt_text, game_id, scenario_type, difficulty):
+    """request_scenario با سقف زمانی PROCEDURAL_AI_TIMEOUT.
+
+    اگر AI دیر کند None برمی‌گردد (نوبت با سناریوی محلی ادامه می‌یابد)؛ پاسخ دیررس
+    دور ریخته نمی‌شود و برای نوبت‌های بعد در scenario_queue همین بازی می‌ماند.
+    """
+    flask_app = current_app._get_current_object()
+
+    def job():
+        with flask_app.app_context():
+            return request_scenario(prompt_text, game_id=game_id, purpose="scenario")
+
+    future = _background().submit(_with_ai_client(job))
+    try:
+        return future.result(timeout=current_app.config.get("PROCEDURAL_AI_TIMEOUT", 4.0))
+    except FutureTimeout:
+        get_procedural().stats["ai_timeouts"] += 1
+
+    def keep_late(f):
+        try:
+            late = f.result()
+        except Exception:
+            return
+        if late:
+            late.update(scenario_type=scenario_type, difficulty=difficulty)
+            with flask_app.app_context():
+                get_repository().enqueue_scenarios(game_id, [late])
+
+    future.add_done_callback(keep_late)
+    return None
+
+# ========== Speculative Generation ==========
+def get_speculation() -> SpeculationManager:
+    return current_app.extensions["speculation"]
+
+
+def _speculation_enabled() -> bool:
+    """speculation فقط وقتی معنی دارد که AI فعال باشد (fallback خودش فوری است)."""
+    if not current_app.config.get("SPECULATION_ENABLED", True):
+        return False
+    if current_app.config.get("PROCEDURAL_POLICY") == "always":
+        return False  # همه نوبت‌ها محلی‌اند؛ تولید AI از قبل هدر می‌رود
+    return bool(current_app.config.get("AI_REPLAY_SOURCE") is not None or get_ai_router().available())
+
+
+def apply_choice(game, choice, mode_key):
+    """اثر یک گزینه روی وضعیت بازی با ضریب‌های مود و clamp_stat."""
+    mult = GAME_MODES.get(mode_key, GAME_MODES["classic"])
+    cost_impact = int(round(choice.cost_impact * mult["budget"]))
+    rep_impact = int(round(choice.reputation_impact * mult["rep"]))
+    morale_impact = int(round(choice.morale_impact * mult["morale"]))
+    return {
+        "cost_impact": cost_impact,
+        "rep_impact": rep_impact,
+        "morale_impact": morale_impact,
+        "budget": clamp_stat(game.budget + cost_impact, MIN_BUDGET, MAX_BUDGET),
+        "reputation": clamp_stat(game.reputation + rep_impact, MIN_REPUTATION, MAX_REPUTATION),
+        "morale": clamp_stat(game.morale + morale_impact, MIN_MORALE, MAX_MORALE),
+    }
+
+
+def _speculative_job(flask_app, game, scenario, state):
+    """کار یک شاخه: سناریوی نوبت بعد برای وضعیت بعد از انتخاب (در thread کم‌اولویت)."""
+    def job():
+        with flask_app.app_context():
+            turn_number = game.turn + 1
+            selected_type, difficulty, prompt_text = plan_scenario(
+                game.id, game.startup_name, turn_number, *state,
+                rng_seed=game.rng_seed,
+                pending_history=[f"{scenario.title} ({scenario.scenario_type})"],
+            )
+            payload = request_scenario(prompt_text, game_id=game.id, purpose="speculative_scenario")
+            if payload is None:
+                return None
+            payload.update(scenario_type=selected_type, difficulty=difficulty, state=state)
+            return payload
+    return _with_ai_client(job, background=True)
+
+
+def start_speculation(game, scenario, choices, mode_key) -> int:
+    """برای شاخه‌هایی که بازی را تمام نمی‌کنند، سناریوی نوبت بعد را از قبل تولید کن."""
+    if not _speculation_enabled():
+        return 0
+    flask_app = current_app._get_current_object()
+    branches = []
+    for choice in choices:
+        after = apply_choice(game, choice, mode_key)
+        if check_game_over(after):
+            continue  # این شاخه نوبت بعدی ندارد
+        state = (after["budget"], after["reputation"], after["morale"])
+        branches.append((choice.id, _speculative_job(flask_app, game, scenario, state)))
+    return get_speculation().speculate(game.id, game.turn + 1, branches)
+
+
+def commit_speculation(game_id, turn_number, choice_id) -> None:
+    """انتخاب بازیکن قطعی شد: شاخه‌های دیگر لغو یا به corpus بازیافت می‌شوند."""
+    repo = get_repository()
+
+    def recycle(payload):
+        if is_near_duplicate(None, payload, "recycle", corpus=True):
+            return
+        repo.add_corpus_scenario(payload['scenario_type'], payload['title'], payload['description'],
+                                 payload['difficulty'], payload['options'])
+
+    get_speculation().commit(game_id, turn_number, choice_id, recycle=recycle)
+
+
+def finish_game(game_id, reasons) -> None:
+    """ثبت پایان بازی و رها کردن شاخه‌های speculative آن."""
+    get_repository().mark_game_over(game_id, ", ".join(reasons))
+    if "speculation" in current_app.extensions:
+        get_speculation().forget(game_id)
+
+
+def take_speculated_scenario(game_id, turn_number, state):
+    """نتیجه شاخه انتخاب‌شده، فقط اگر دقیقاً برای همین وضعیت تولید شده باشد."""
+    if not has_app_context() or "speculation" not in current_app.extensions:
+        return None
+    payload = get_speculation().take(game_id, turn_number, timeout=current_app.config.get("SPECULATION_WAIT", 0.0))
+    if payload and tuple(payload.get("state", ())) == tuple(state):
+        return payload
+    return None
+
+
+def corpus_scenario(game_id, scenario_type, difficulty, turn_number, rng_seed=None) -> dict | None:
+    """سناریوی corpus از snapshot مشترک (mmap)؛ None اگر snapshot یا bucket خالی است."""
+    corpus = current_app.extensions.get("corpus") if has_app_context() else None
+    if corpus is None:
+        return None
+    rng = random.Random(f"{rng_seed}:{turn_number}:corpus") if rng_seed is not None else random.Random()
     try:
-        if conn:
-            conn.execute("SELECT 1")
-    except:
-        conn = get_db_connection()
-    if not conn:
-        conn = get_db_connection()
-    scenario_id = create_fallback_scenario(conn, game_id, selected_type, difficulty, turn_number)
-    conn.close()
-    return scenario_id
-
-def create_fallback_scenario(conn, game_id, scenario_type, difficulty, turn_number):
-    """ایجاد سناریوی fallback در صورت خطای AI"""
+        recent = {title for title, _ in get_repository().recent_history(game_id)}
+        data = corpus.pick(scenario_type, difficulty, rng, exclude_titles=recent)
+    except Exception as e:
+        print(f"⚠️ خطا در corpus: {e}")
+        return None
+    # خود سناریو در corpus است؛ فقط با سناریوهای همین بازی مقایسه می‌شود
+    if data and is_near_duplicate(game_id, data, "corpus"):
+        return None
+    return data
+
+
+def create_fallback_scenario(game_id, scenario_type, difficulty, turn_number,
+                             startup_name=None, rng_seed=None, weights=None):
+    """ایجاد سناریوی fallback در صورت خطای AI
+
+    اگر snapshot corpus (CORPUS_SNAPSHOT) باشد، اول یک سناریوی corpus با همین نوع و
+    سختی (و عنوانی غیر از نوبت‌های اخیر)؛ وگرنه سناریوساز محلی تا بازیکن یک سناریوی
+    ثابت را مدام نبیند. جدول ثابت زیر فقط اگر آن هم خطا داد استفاده می‌شود.
+    """
+    data = corpus_scenario(game_id, scenario_type, difficulty, turn_number, rng_seed)
+    if data:
+        return get_repository().add_scenario(
+            game_id, scenario_type, data["title"], data["description"], difficulty, turn_number, data["options"]
+        )
+    try:
+        data = procedural_scenario(scenario_type, difficulty, turn_number, startup_name, rng_seed, weights)
+        return get_repository().add_scenario(
+            game_id, scenario_type, data["title"], data["description"], difficulty, turn_number, data["options"]
+        )
+    except Exception as e:
+        print(f"⚠️ خطا در سناریوساز محلی: {e}")
+
     fallback_scenarios = {
         "CRISIS": {
             "title": "مشکل نقدینگی فوری",
@@ -521,54 +1176,87 @@ def create_fallback_scenario(conn, game_id, scenario_type, difficulty, turn_numb
     
     scenario_data = fallback_scenarios.get(scenario_type, fallback_scenarios["CRISIS"])
     
-    # بررسی وجود فیلد game_id
+    # اسکیما (game_id و risk_level) توسط migrate_database تضمین می‌شود
     try:
-        cursor = conn.cursor()
-        cursor.execute("PRAGMA table_info(scenarios)")
-        columns = [row[1] for row in cursor.fetchall()]
-        has_game_id = 'game_id' in columns
-        
-        if has_game_id:
-            cursor.execute("""
-                INSERT INTO scenarios (game_id, scenario_type, title, description, difficulty_level, turn_number) 
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (game_id, scenario_type, scenario_data["title"], scenario_data["description"], difficulty, turn_number))
-        else:
-            # اگر فیلد game_id وجود ندارد، بدون آن insert کن
-            cursor.execute("""
-                INSERT INTO scenarios (scenario_type, title, description, difficulty_level) 
-                VALUES (?, ?, ?, ?)
-            """, (scenario_type, scenario_data["title"], scenario_data["description"], difficulty))
-        
-        scenario_id = cursor.lastrowid
-        
-        # بررسی وجود فیلد risk_level
-        cursor.execute("PRAGMA table_info(choices)")
-        choice_columns = [row[1] for row in cursor.fetchall()]
-        has_risk_level = 'risk_level' in choice_columns
-        
-        for opt in scenario_data["options"]:
-            if has_risk_level:
-                cursor.execute("""
-                    INSERT INTO choices (scenario_id, text, cost_impact, reputation_impact, morale_impact, risk_level) 
-                    VALUES (?, ?, ?, ?, ?, ?)
-                """, (scenario_id, opt["text"], opt["cost"], opt["rep"], opt["morale"], opt["risk"]))
-            else:
-                cursor.execute("""
-                    INSERT INTO choices (scenario_id, text, cost_impact, reputation_impact, morale_impact) 
-                    VALUES (?, ?, ?, ?, ?)
-                """, (scenario_id, opt["text"], opt["cost"], opt["rep"], opt["morale"]))
-        
-        conn.commit()
-        return scenario_id
-        
+        return get_repository().add_scenario(
+            game_id, scenario_type, scenario_data["title"], scenario_data["description"],
+            difficulty, turn_number,
+            [
+                {"text": opt["text"], "cost": opt["cost"], "reputation": opt["rep"],
+                 "morale": opt["morale"], "risk": opt["risk"]}
+                for opt in scenario_data["options"]
+            ]
+        )
     except Exception as e:
         print(f"❌ خطا در ایجاد fallback scenario: {e}")
-        conn.rollback()
         raise
 
 # ========== Routes ==========
-@app.route("/mode", methods=["GET", "POST"])
+# routeها در زمان import فقط ثبت می‌شوند و create_app آن‌ها را روی هر اپ جدید نصب می‌کند.
+_routes = []
+
+
+def route(rule, **options):
+    """معادل app.route برای ثبت view روی اپ‌هایی که create_app می‌سازد."""
+    def decorator(view):
+        _routes.append((rule, view, options))
+        return view
+    return decorator
+
+
+# ========== Page Cache ==========
+# صفحه بازی تمام‌شده دیگر عوض نمی‌شود: مرورگر هم می‌تواند نگهش دارد
+FINAL_PAGE_CACHE = "private, max-age=31536000"
+# صفحه بازی در جریان: هر بار با If-None-Match اعتبارسنجی (304 بدون رندر)
+LIVE_PAGE_CACHE = "private, no-cache"
+
+
+def get_page_cache() -> PageCache:
+    return current_app.extensions["page_cache"]
+
+
+def cached_page(key: tuple, render, final: bool = False, browser_cache: bool = True):
+    """پاسخ HTML از cache صفحه‌ها؛ render فقط در miss صدا زده می‌شود.
+
+    key باید نسخه داده (turn، updated_at، ...) را داشته باشد تا با تغییر بازی
+    خودبه‌خود کلید تازه ساخته شود. ETag از همین key و نسخه templateها/assetها
+    ساخته می‌شود، پس If-None-Match قبل از هر رندری (حتی در miss) جواب 304 می‌گیرد.
+    ETag نسخه gzip با پسوند -gz جداست (ETag قوی برای هر Content-Encoding یکتاست).
+    browser_cache=False: حتی برای final فقط no-cache (URLهایی مثل /game که به
+    session وابسته‌اند و ممکن است بعداً بازی دیگری نشان دهند).
+    """
+    cache = get_page_cache()
+    enabled = current_app.config["PAGE_CACHE_ENABLED"]
+    gzip_ok = bool(request.accept_encodings["gzip"])
+    base_etag = PageCache.etag_for_key(key, current_app.extensions["page_version"])
+    etag = base_etag + "-gz" if gzip_ok else base_etag
+
+    if request.if_none_match.contains(etag):
+        cache.stats["not_modified"] += 1
+        response = current_app.response_class(status=304)
+    else:
+        entry = cache.get(key) if enabled else None
+        if entry is None:
+            body = render()
+            if not isinstance(body, str):
+                return body  # redirect یا پاسخ آماده
+            data = body.encode("utf-8")
+            if enabled:
+                entry = cache.put(key, data, final=final, etag=base_etag)
+            else:
+                entry = PageCache.entry_for(data, final=final, etag=base_etag)
+        if gzip_ok:
+            response = current_app.response_class(entry.body_gz, content_type=entry.content_type)
+            response.headers["Content-Encoding"] = "gzip"
+        else:
+            response = current_app.response_class(entry.body(), content_type=entry.content_type)
+    response.set_etag(etag)
+    response.headers["Vary"] = "Accept-Encoding"
+    response.headers["Cache-Control"] = FINAL_PAGE_CACHE if final and browser_cache else LIVE_PAGE_CACHE
+    return response
+
+
+@route("/mode", methods=["GET", "POST"])
 def mode():
     if "game_id" not in session:
         return redirect(url_for("index"))
@@ -578,19 +1266,24 @@ def mode():
         if selected not in GAME_MODES:
             selected = "classic"
         session["mode"] = selected
+        # مود روی بازی هم ذخیره می‌شود (برای replay و گزارش‌ها)
+        try:
+            get_repository().set_game_mode(session["game_id"], selected)
+        except Exception as e:
+            print(f"⚠️ خطا در ذخیره مود: {e}")
         return redirect(url_for("game"))
 
     return render_template("mode.html")
 
 
 
-@app.route("/", methods=["GET"])
+@route("/", methods=["GET"])
 def index():
     return render_template("index.html")
 
 
 
-@app.route('/new_game', methods=['POST'])
+@route('/new_game', methods=['POST'])
 def new_game():
     """شروع بازی جدید"""
     username = request.form.get('username', '').strip()
@@ -599,55 +1292,46 @@ def new_game():
     if not username or not startup_name:
         return redirect(url_for('index'))
     
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    repo = get_repository()
     
     try:
         # ایجاد یا به‌روزرسانی کاربر
-        cursor.execute('SELECT id FROM users WHERE username = ?', (username,))
-        user = cursor.fetchone()
-        if user:
-            user_id = user['id']
-        else:
-            cursor.execute('INSERT INTO users (username) VALUES (?)', (username,))
-            user_id = cursor.lastrowid
+        user_id = repo.get_or_create_user(username)
         
         # ایجاد بازی جدید
-        cursor.execute('''
-            INSERT INTO games (user_id, startup_name, budget, reputation, morale, turn) 
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (user_id, startup_name, INITIAL_BUDGET, INITIAL_REPUTATION, INITIAL_MORALE, 1))
-        game_id = cursor.lastrowid
-        
-        conn.commit()
+        if 'game_id' in session:
+            # بازی قبلی این session رها شد؛ شاخه‌هایش دیگر برداشته نمی‌شوند
+            get_speculation().forget(session['game_id'])
+        rng_seed = new_game_seed()
+        game_id = repo.create_game(user_id, startup_name, INITIAL_BUDGET, INITIAL_REPUTATION, INITIAL_MORALE,
+                                   rng_seed=rng_seed)
         session['game_id'] = game_id
+        session['username'] = username
         
         # تولید اولین سناریو
         generate_dynamic_scenario(
             game_id, startup_name, 1, 
-            INITIAL_BUDGET, INITIAL_REPUTATION, INITIAL_MORALE
+            INITIAL_BUDGET, INITIAL_REPUTATION, INITIAL_MORALE,
+            rng_seed=rng_seed
         )
         
         return redirect(url_for('mode'))
         
     except Exception as e:
         print(f"❌ خطا در ایجاد بازی: {e}")
-        conn.rollback()
         return redirect(url_for('index'))
-    finally:
-        conn.close()
 
-@app.route('/game')
+@route('/game')
 def game():
     """صفحه اصلی بازی"""
     if 'game_id' not in session:
         return redirect(url_for('index'))
     
     game_id = session['game_id']
-    conn = get_db_connection()
+    repo = get_repository()
     
     try:
-        game = conn.execute('SELECT * FROM games WHERE id = ?', (game_id,)).fetchone()
+        game = repo.get_game(game_id)
         
         if not game:
             return redirect(url_for('index'))
@@ -655,119 +1339,123 @@ def game():
         # بررسی شرایط پایان بازی
         game_over_reasons = check_game_over(game)
         if game_over_reasons:
-            # به‌روزرسانی وضعیت بازی
-            reason_text = ", ".join(game_over_reasons)
-            conn.execute('''
-                UPDATE games 
-                SET is_game_over = 1, game_over_reason = ?, updated_at = CURRENT_TIMESTAMP 
-                WHERE id = ?
-            ''', (reason_text, game_id))
-            conn.commit()
-            conn.close()
-            return render_template('game_over.html', game=game, reasons=game_over_reasons)
+            # به‌روزرسانی وضعیت بازی (فقط یک بار؛ هر بار updated_at را جلو نمی‌بریم)
+            if not game.is_game_over:
+                finish_game(game_id, game_over_reasons)
+            return cached_page(
+                ("game_over", game_id, game.turn),
+                lambda: render_template('game_over.html', game=game, reasons=game_over_reasons),
+                final=True, browser_cache=False,
+            )
         
         # دریافت سناریوی فعلی
-        scenario = conn.execute('''
-            SELECT * FROM scenarios 
-            WHERE game_id = ? 
-            ORDER BY id DESC 
-            LIMIT 1
-        ''', (game_id,)).fetchone()
+        scenario = repo.latest_scenario(game_id)
         
         # اگر سناریو وجود ندارد، ایجاد کن
         if not scenario:
             generate_dynamic_scenario(
-                game_id, game['startup_name'], game['turn'],
-                game['budget'], game['reputation'], game['morale']
+                game_id, game.startup_name, game.turn,
+                game.budget, game.reputation, game.morale,
+                rng_seed=game.rng_seed
             )
-            scenario = conn.execute('''
-                SELECT * FROM scenarios 
-                WHERE game_id = ? 
-                ORDER BY id DESC 
-                LIMIT 1
-            ''', (game_id,)).fetchone()
+            scenario = repo.latest_scenario(game_id)
         
-        # دریافت گزینه‌ها
-        choices = conn.execute('''
-            SELECT * FROM choices 
-            WHERE scenario_id = ? 
-            ORDER BY id
-        ''', (scenario['id'],)).fetchall()
+        def render():
+            # دریافت گزینه‌ها
+            choices = repo.list_choices(game_id, scenario.id)
+            
+            # تا بازیکن فکر می‌کند، سناریوی نوبت بعد را برای شاخه‌های محتمل آماده کن
+            # (در cache hit همان speculation رندر اول در جریان است)
+            try:
+                start_speculation(game, scenario, choices, session.get("mode", "classic"))
+            except Exception as e:
+                print(f"⚠️ خطا در speculation: {e}")
+            
+            return render_template('game.html', game=game, scenario=scenario, choices=choices)
         
-        conn.close()
-        return render_template('game.html', game=game, scenario=scenario, choices=choices)
+        # /next_turn سناریو را بدون تغییر turn عوض می‌کند؛ پس id سناریو هم در کلید است
+        return cached_page(("game", game_id, game.turn, game.updated_at, scenario.id), render)
         
     except Exception as e:
         print(f"❌ خطا در بازی: {e}")
-        conn.close()
         return redirect(url_for('index'))
 
-@app.route('/action', methods=['POST'])
-def action():
-    """پردازش تصمیم کاربر"""
-    if 'game_id' not in session:
-        return redirect(url_for('index'))
 
-    
-    game_id = session['game_id']
-    choice_id = request.form.get('choice_id')
-    
-    if not choice_id:
-        return redirect(url_for('game'))
-    
-    conn = get_db_connection()
-    
-    try:
-        # دریافت اطلاعات        
-        choice = conn.execute('SELECT * FROM choices WHERE id = ?', (choice_id,)).fetchone()
-        if not choice:
-            return redirect(url_for('game'))
-        
-        scenario = conn.execute('SELECT * FROM scenarios WHERE id = ?', (choice['scenario_id'],)).fetchone()
-        game = conn.execute('SELECT * FROM games WHERE id = ?', (game_id,)).fetchone()
+class TurnRejected(Exception):
+    """تصمیمی که نباید اعمال شود؛ status همان کد HTTP پاسخ /api/turn است."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
 
-        # --- Phase B: apply mode multipliers ---
-        mode_key = session.get("mode", "classic")
-        mult = GAME_MODES.get(mode_key, GAME_MODES["classic"])
 
-        cost_impact = int(round(choice["cost_impact"] * mult["budget"]))
-        rep_impact  = int(round(choice["reputation_impact"] * mult["rep"]))
-        morale_impact = int(round(choice["morale_impact"] * mult["morale"]))
+@tracing.traced("turn.play")
+def play_turn(game_id, choice_id, mode_key):
+    """اعمال تصمیم بازیکن (مشترک بین /action و /api/turn).
 
+    (game به‌روزشده، choice، داستان). TurnRejected اگر بازی نباشد یا تمام شده باشد
+    (404/409)، گزینه مال این بازی نباشد (404) یا مال سناریوی جاری نباشد (409، مثلاً
+    ارسال دوباره گزینه نوبت قبل).
+    """
+    repo = get_repository()
 
-        new_budget = clamp_stat(game['budget'] + cost_impact, MIN_BUDGET, MAX_BUDGET)
-        new_reputation = clamp_stat(game['reputation'] + rep_impact, MIN_REPUTATION, MAX_REPUTATION)
-        new_morale = clamp_stat(game['morale'] + morale_impact, MIN_MORALE, MAX_MORALE)
+    # دریافت اطلاعات
+    game = repo.get_game(game_id)
+    if not game:
+        raise TurnRejected(404, "بازی پیدا نشد")
+    if game.is_game_over:
+        raise TurnRejected(409, "بازی تمام شده است")
 
-        # محاسبه مقادیر جدید
-        # new_budget = clamp_stat(game['budget'] + choice['cost_impact'], MIN_BUDGET, MAX_BUDGET)
-        # new_reputation = clamp_stat(game['reputation'] + choice['reputation_impact'], MIN_REPUTATION, MAX_REPUTATION)
-        # new_morale = clamp_stat(game['morale'] + choice['morale_impact'], MIN_MORALE, MAX_MORALE)
-        
-        new_turn = game['turn'] + 1
+    choice = repo.get_choice(game_id, choice_id)
+    scenario = repo.get_scenario(game_id, choice.scenario_id) if choice else None
+    if not scenario or scenario.game_id != game_id:
+        raise TurnRejected(404, "گزینه نامعتبر است")
+    latest = repo.latest_scenario(game_id)
+    # بعد از اعمال تصمیم و قبل از /next_turn سناریوی آخر هنوز همین است، اما turn جلو رفته
+    if not latest or scenario.id != latest.id or scenario.turn_number != game.turn:
+        raise TurnRejected(409, "این گزینه مال نوبت جاری نیست")
 
-        
+    # --- Phase B: apply mode multipliers ---
+    after = apply_choice(game, choice, mode_key)
 
-        
-        # ذخیره مقادیر قبل از تغییر
-        budget_before = game['budget']
-        reputation_before = game['reputation']
-        morale_before = game['morale']
-        
-        # به‌روزرسانی بازی
-        conn.execute('''
-            UPDATE games 
-            SET budget = ?, reputation = ?, morale = ?, turn = ?, updated_at = CURRENT_TIMESTAMP 
-            WHERE id = ?
-        ''', (new_budget, new_reputation, new_morale, new_turn, game_id))
-        
-        # تولید داستان نتیجه با AI
-        prompt_story = f"""تو راوی یک بازی شبیه‌ساز استارتاپ هستی. یک داستان کوتاه، جذاب و واقع‌گرایانه بنویس.
+    cost_impact = after["cost_impact"]
+    rep_impact  = after["rep_impact"]
+    morale_impact = after["morale_impact"]
+
+
+    new_budget = after["budget"]
+    new_reputation = after["reputation"]
+    new_morale = after["morale"]
+
+    # شاخه انتخاب‌شده نگه داشته می‌شود؛ بقیه لغو/بازیافت
+    try:
+        commit_speculation(game_id, game.turn + 1, choice.id)
+    except Exception as e:
+        print(f"⚠️ خطا در commit speculation: {e}")
+
+    # محاسبه مقادیر جدید
+    # new_budget = clamp_stat(game.budget + choice.cost_impact, MIN_BUDGET, MAX_BUDGET)
+    # new_reputation = clamp_stat(game.reputation + choice.reputation_impact, MIN_REPUTATION, MAX_REPUTATION)
+    # new_morale = clamp_stat(game.morale + choice.morale_impact, MIN_MORALE, MAX_MORALE)
+    
+    new_turn = game.turn + 1
+
+    
+
+    
+    # ذخیره مقادیر قبل از تغییر
+    budget_before = game.budget
+    reputation_before = game.reputation
+    morale_before = game.morale
+    
+    # تولید داستان نتیجه با AI
+    prompt_story = f"""تو راوی یک بازی شبیه‌ساز استارتاپ هستی. یک داستان کوتاه، جذاب و واقع‌گرایانه بنویس.
 
 **وضعیت:**
-- استارتاپ: {game['startup_name']}
-- چالش: {scenario['title']}
-- تصمیم کاربر: {choice['text']}
+- استارتاپ: {game.startup_name}
+- چالش: {scenario.title}
+- تصمیم کاربر: {choice.text}
 
 **تأثیرات:**
 - بودجه: {budget_before}$ → {new_budget}$ ({cost_impact:+d}$)
@@ -783,173 +1471,524 @@ def action():
 - به فارسی و طبیعی بنویس
 
 **فقط داستان را بنویس، بدون توضیح اضافی:**"""
-        
-        ai_story = call_ai_api(prompt_story, json_mode=False, temperature=0.9)
-        if not ai_story:
-            ai_story = f"تصمیم شما اعمال شد. بودجه: {new_budget}$, شهرت: {new_reputation}%, روحیه: {new_morale}%"
-        
-        # ذخیره لاگ
-        conn.execute('''
-            INSERT INTO logs 
-            (game_id, turn, scenario_id, scenario_title, user_choice, choice_id,
-             budget_before, reputation_before, morale_before,
-             budget_after, reputation_after, morale_after, ai_response)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            game_id, game['turn'], scenario['id'], scenario['title'], scenario['scenario_type'],
-            choice['text'], choice_id,
-            budget_before, reputation_before, morale_before,
-            new_budget, new_reputation, new_morale, ai_story
-        ))
-        
-        conn.commit()
-
-        conn.execute("""
-        INSERT INTO logs (game_id, turn, scenario_id, scenario_title, choice_id, choice_text,
-                          cost_impact, reputation_impact, morale_impact)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            game_id,
-            game["turn"],               # یا new_turn بسته به کدت
-            scenario["id"],
-            scenario["title"],
-            choice["id"],
-            choice["text"],
-            cost_impact,
-            rep_impact,
-            morale_impact
-        ))
-        conn.commit()
+    
+    ai_story = call_ai_api(prompt_story, json_mode=False, temperature=0.9, game_id=game_id, purpose="story")
+    if not ai_story:
+        ai_story = f"تصمیم شما اعمال شد. بودجه: {new_budget}$, شهرت: {new_reputation}%, روحیه: {new_morale}%"
+    
+    # به‌روزرسانی بازی و ذخیره لاگ در یک تراکنش کوتاه (بعد از فراخوانی AI،
+    # تا قفل writer در طول انتظار برای AI نگه داشته نشود)
+    recorded = repo.record_turn(game_id, new_budget, new_reputation, new_morale, new_turn, {
+        "turn": game.turn,
+        "scenario_id": scenario.id,
+        "scenario_title": scenario.title,
+        "scenario_type": scenario.scenario_type,
+        "choice_id": choice.id,
+        "choice_text": choice.text,
+        "cost_impact": cost_impact,
+        "reputation_impact": rep_impact,
+        "morale_impact": morale_impact,
+        "ai_response": ai_story,
+    })
+    if not recorded:
+        # درخواست همزمان دیگری همین نوبت را زودتر ثبت کرده است
+        raise TurnRejected(409, "این نوبت قبلاً ثبت شده است")
+
+    # وضعیت جدید همین‌جا معلوم است؛ نیازی به خواندن دوباره از دیتابیس نیست
+    game = game.replace(budget=new_budget, reputation=new_reputation, morale=new_morale, turn=new_turn)
+    return game, choice, ai_story
+
+
+@route('/action', methods=['POST'])
+def action():
+    """پردازش تصمیم کاربر"""
+    if 'game_id' not in session:
+        return redirect(url_for('index'))
 
-        
-        # به‌روزرسانی بازی برای نمایش
-        game = conn.execute('SELECT * FROM games WHERE id = ?', (game_id,)).fetchone()
-        conn.close()
-        
+    
+    game_id = session['game_id']
+    choice_id = request.form.get('choice_id')
+    
+    if not choice_id:
+        return redirect(url_for('game'))
+    
+    try:
+        game, choice, ai_story = play_turn(game_id, choice_id, session.get("mode", "classic"))
         return render_template('result.html', story=ai_story, game=game, choice=choice)
-        
+
+    except TurnRejected as e:
+        print(f"⚠️ تصمیم رد شد: {e.message}")
+        if e.status == 404 and not get_repository().get_game(game_id):
+            session.pop('game_id', None)
+            return redirect(url_for('index'))
+        return redirect(url_for('game'))
     except Exception as e:
         print(f"❌ خطا در پردازش تصمیم: {e}")
-        conn.rollback()
-        conn.close()
         return redirect(url_for('game'))
 
-@app.route('/next_turn')
+
+def _game_state(game) -> dict:
+    return {
+        "turn": game.turn, "budget": game.budget, "reputation": game.reputation,
+        "morale": game.morale, "score": game.score or 0,
+    }
+
+
+@route('/api/turn', methods=['POST'])
+def api_turn():
+    """یک نوبت کامل در یک درخواست JSON: اعمال تصمیم + داستان + سناریوی بعدی.
+
+    همان کار POST /action، GET /next_turn و GET /game بدون redirect و رندر HTML؛
+    static/script.js با پاسخ همین صفحه را به‌روز می‌کند.
+    """
+    if 'game_id' not in session:
+        return jsonify({"error": "بازی فعالی وجود ندارد", "redirect": url_for('index')}), 401
+
+    game_id = session['game_id']
+    payload = request.get_json(silent=True)
+    if payload is None:
+        payload = {}
+    if not isinstance(payload, dict):
+        return jsonify({"error": "بدنه درخواست باید آبجکت JSON باشد"}), 400
+    choice_id = payload.get('choice_id') or request.form.get('choice_id')
+    if not choice_id:
+        return jsonify({"error": "choice_id لازم است"}), 400
+    try:
+        choice_id = int(choice_id)
+    except (TypeError, ValueError):
+        return jsonify({"error": "choice_id باید عدد باشد"}), 400
+
+    repo = get_repository()
+    mode_key = session.get("mode", "classic")
+    try:
+        game, choice, ai_story = play_turn(game_id, choice_id, mode_key)
+
+        result = {"story": ai_story, "choice_id": choice.id, "game": _game_state(game)}
+        game_over_reasons = check_game_over(game)
+        if game_over_reasons:
+            finish_game(game_id, game_over_reasons)
+            result.update(game_over=True, reasons=game_over_reasons, redirect=url_for('game'))
+            return jsonify(result)
+
+        generate_dynamic_scenario(
+            game_id, game.startup_name, game.turn,
+            game.budget, game.reputation, game.morale,
+            rng_seed=game.rng_seed
+        )
+        scenario = repo.latest_scenario(game_id)
+        choices = repo.list_choices(game_id, scenario.id)
+        try:
+            start_speculation(game, scenario, choices, mode_key)
+        except Exception as e:
+            print(f"⚠️ خطا در speculation: {e}")
+
+        result["game_over"] = False
+        result["scenario"] = {"id": scenario.id, "title": scenario.title, "description": scenario.description}
+        result["choices"] = [
+            {"id": c.id, "text": c.text, "cost_impact": c.cost_impact,
+             "reputation_impact": c.reputation_impact, "morale_impact": c.morale_impact}
+            for c in choices
+        ]
+        return jsonify(result)
+
+    except TurnRejected as e:
+        return jsonify({"error": e.message, "redirect": url_for('game')}), e.status
+    except Exception as e:
+        print(f"❌ خطا در نوبت API: {e}")
+        return jsonify({"error": "خطا در پردازش نوبت"}), 500
+
+@route('/next_turn')
 def next_turn():
     """تولید سناریوی جدید برای نوبت بعدی"""
     if 'game_id' not in session:
         return redirect(url_for('index'))
     
     game_id = session['game_id']
-    conn = get_db_connection()
     
     try:
-        game = conn.execute('SELECT * FROM games WHERE id = ?', (game_id,)).fetchone()
+        game = get_repository().get_game(game_id)
         
         if not game:
             return redirect(url_for('index'))
         
         # بررسی شرایط پایان بازی
         if check_game_over(game):
-            conn.close()
             return redirect(url_for('game'))
         
         # تولید سناریوی جدید
         generate_dynamic_scenario(
-            game_id, game['startup_name'], game['turn'],
-            game['budget'], game['reputation'], game['morale']
+            game_id, game.startup_name, game.turn,
+            game.budget, game.reputation, game.morale,
+            rng_seed=game.rng_seed
         )
         
-        conn.close()
         return redirect(url_for('game'))
         
     except Exception as e:
         print(f"❌ خطا در نوبت بعدی: {e}")
-        conn.close()
         return redirect(url_for('game'))
 
-def _pct_series(values, clamp_min=0, clamp_max=100):
-    # values -> list[int]
-    out = []
-    for v in values:
-        v2 = v
-        if clamp_min is not None:
-            v2 = max(clamp_min, v2)
-        if clamp_max is not None:
-            v2 = min(clamp_max, v2)
-        pct = 0 if clamp_max == 0 else int(round((v2 - (clamp_min or 0)) / ((clamp_max - (clamp_min or 0)) or 1) * 100))
-        out.append({"v": v, "pct": max(0, min(100, pct))})
-    return out
-
-
-@app.route("/report/<int:game_id>")
+# تعداد تصمیم‌های آخر در Timeline گزارش
+REPORT_TIMELINE = 10
+
+
+@route("/report/<int:game_id>")
 def report(game_id):
-    conn = get_db_connection()
-    game = conn.execute("SELECT * FROM games WHERE id = ?", (game_id,)).fetchone()
+    repo = get_repository()
+    game = repo.get_game(game_id)
     if not game:
-        conn.close()
         return redirect(url_for("index"))
 
-    # Timeline از logs (اگر ستون‌ها دقیق نبود، fallback نرم)
+    mode = session.get("mode", "classic")
+    # logها فقط با record_turn عوض می‌شوند که turn و updated_at را هم جلو می‌برد
+    key = ("report", game_id, game.turn, game.updated_at, bool(game.is_game_over), mode)
+    return cached_page(key, lambda: _render_report(repo, game, mode), final=bool(game.is_game_over))
+
+
+def _render_report(repo, game, mode) -> str:
+    game_id = game.id
+    history = game.stat_history
+    # یک نقطه شروع + یک نقطه برای هر نوبت؛ بازی‌های قبل از stat_history کامل نیستند
+    complete = bool(history) and len(history) == game.turn * len(stat_history.FIELDS) * 4
     try:
-        rows = conn.execute(
-            "SELECT * FROM logs WHERE game_id = ? ORDER BY id ASC",
-            (game_id,)
-        ).fetchall()
+        rows = repo.list_logs(game_id, limit=None if not complete else REPORT_TIMELINE)
     except Exception:
         rows = []
-
+    if not complete:
+        history = stat_history.from_logs(
+            (game.budget, game.reputation, game.morale),
+            [(r.cost_impact, r.reputation_impact, r.morale_impact) for r in rows],
+        )
 
     timeline = []
-    rep_series = []
-    morale_series = []
-    budget_series = []
-
-    # تلاش برای گرفتن مقادیر از لاگ‌ها، اگر نبود فقط از game نهایی پر می‌کنیم
-    turn = 0
-    for r in rows[-10:]:
-        turn += 1
-        scenario_title = r["scenario_title"] if "scenario_title" in r.keys() else "سناریو"
-        choice_text = r["choice_text"] if "choice_text" in r.keys() else (r["choice"] if "choice" in r.keys() else "انتخاب")
-        db = r["budget_impact"] if "budget_impact" in r.keys() else (r["cost_impact"] if "cost_impact" in r.keys() else 0)
-        dr = r["reputation_impact"] if "reputation_impact" in r.keys() else 0
-        dm = r["morale_impact"] if "morale_impact" in r.keys() else 0
-
+    for i, r in enumerate(rows[-REPORT_TIMELINE:], start=1):
         timeline.append({
-            "turn": r["turn"] if "turn" in r.keys() else turn,
-            "scenario_title": scenario_title,
-            "choice_text": choice_text,
-            "db": f"{db:+d}",
-            "dr": f"{dr:+d}",
-            "dm": f"{dm:+d}",
+            "turn": r.turn if r.turn is not None else i,
+            "scenario_title": r.scenario_title or "سناریو",
+            "choice_text": r.choice_text or "انتخاب",
+            "db": f"{r.cost_impact or 0:+d}",
+            "dr": f"{r.reputation_impact or 0:+d}",
+            "dm": f"{r.morale_impact or 0:+d}",
         })
 
-        # اگر ستون‌های “بعد از اعمال” نداریم، فعلاً سری‌ها رو از impactها می‌سازیم
-        rep_series.append(int(dr))
-        morale_series.append(int(dm))
-        budget_series.append(int(db))
-
-    conn.close()
-
-    # اگر سری‌ها بر اساس impact ساخته شده، فقط نمودار “شدت تصمیم‌ها” می‌شه؛ برای دانشجویی خوبه.
-    # Clamp برای rep/morale: 0..100، budget: 0..2000
-    rep_points = _pct_series([abs(x) for x in rep_series], 0, 100)
-    morale_points = _pct_series([abs(x) for x in morale_series], 0, 100)
-    budget_points = _pct_series([abs(x) for x in budget_series], 0, 2000)
+    # مسیر کامل بازی، کاهش‌یافته به حداکثر CHART_POINTS نقطه؛ بودجه با بیشینه خود سری مقیاس می‌شود
+    series = stat_history.chart_series(history, {
+        "budget": (MIN_BUDGET, None),
+        "reputation": (MIN_REPUTATION, MAX_REPUTATION),
+        "morale": (MIN_MORALE, MAX_MORALE),
+    })
 
     return render_template(
         "report.html",
-        mode=session.get("mode", "classic"),
-        turns=len(rows),
-        final_budget=game["budget"],
-        final_rep=game["reputation"],
-        final_morale=game["morale"],
+        mode=mode,
+        turns=game.turn - 1 if complete else len(rows),
+        final_budget=game.budget,
+        final_rep=game.reputation,
+        final_morale=game.morale,
         timeline=timeline,
-        rep_series=rep_points,
-        morale_series=morale_points,
-        budget_series=budget_points
+        budget_series=series.get("budget"),
+        rep_series=series.get("reputation"),
+        morale_series=series.get("morale"),
+    )
+
+
+# ========== Player History ==========
+HISTORY_PAGE_SIZE = 20
+
+
+@route("/history/<username>")
+def history(username):
+    """همه بازی‌های یک کاربر، جدیدترین اول؛ صفحه‌بندی keyset با ?before=<id آخرین بازی صفحه قبل>.
+
+    خلاصه هر بازی (امتیاز، تعداد تصمیم‌ها، دلیل پایان) در mark_game_over ذخیره شده؛
+    پس هر صفحه فقط یک کوئری ایندکس‌دار روی games است و به logs دست نمی‌زند.
+    """
+    repo = get_repository()
+    user_id = repo.find_user_id(username)
+    if user_id is None:
+        abort(404)
+    before = request.args.get("before", type=int)
+    # یک ردیف بیشتر: وجود صفحه بعد بدون COUNT
+    games = repo.list_user_games(user_id, before_id=before, limit=HISTORY_PAGE_SIZE + 1)
+    next_before = games[HISTORY_PAGE_SIZE - 1].id if len(games) > HISTORY_PAGE_SIZE else None
+    return render_template(
+        "history.html",
+        username=username,
+        games=games[:HISTORY_PAGE_SIZE],
+        first_page=before is None,
+        next_before=next_before,
+    )
+
+
+# ========== Static Assets ==========
+# پسوند فایل از پیش فشرده -> Content-Encoding (به ترتیب ترجیح)
+ASSET_ENCODINGS = ((".br", "br"), (".gz", "gzip"))
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+
+
+@route("/static/dist/<path:filename>")
+def built_asset(filename):
+    """فایل‌های build_assets.py: نام hash‌دار پس cache دائمی، و نسخه فشرده مناسب کلاینت."""
+    dist = os.path.join(current_app.static_folder, DIST_DIR)
+    if not os.path.isfile(os.path.join(dist, filename)):
+        abort(404)
+    served, encoding = filename, None
+    for suffix, name in ASSET_ENCODINGS:
+        if request.accept_encodings[name] and os.path.isfile(os.path.join(dist, filename + suffix)):
+            served, encoding = filename + suffix, name
+            break
+    # mimetype از نام اصلی (نه .gz)
+    response = send_from_directory(dist, served, mimetype=mimetypes.guess_type(filename)[0])
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    response.headers["Vary"] = "Accept-Encoding"
+    response.headers["Cache-Control"] = IMMUTABLE_CACHE
+    return response
+
+
+@route("/metrics")
+def metrics():
+    """آمار عملیاتی (JSON): hedging/providerهای AI و speculation."""
+    return jsonify({
+        "ai": get_ai_router().snapshot(),
+        "speculation": {**get_speculation().stats, "tracked": get_speculation().tracked()},
+        "procedural": dict(get_procedural().stats),
+        "maintenance": dict(current_app.extensions["maintenance"].stats),
+        "page_cache": dict(get_page_cache().stats),
+        "ai_calls": dict(current_app.extensions["ai_calls"].stats),
+        "corpus": dict(current_app.extensions["corpus"].stats) if current_app.extensions["corpus"] else None,
+        "dedup": dict(current_app.extensions["dedup"].stats),
+        "telemetry": dict(current_app.extensions["telemetry"].stats) if current_app.extensions["telemetry"] else None,
+        "tracing": _tracing_stats(current_app.extensions["tracer"]),
+        "ai_governor": current_app.extensions["ai_governor"].snapshot() if current_app.extensions["ai_governor"] else None,
+    })
+
+
+# ========== App Factory ==========
+# ========== Tracing ==========
+# یک نوبت: /action (شروع trace) -> /next_turn -> /game (پایان)؛ trace id در session.
+# نوبت sample‌نشده در session نمی‌رود؛ /next_turn و /game آن نوبت trace جدا (با همان نسبت) می‌گیرند
+TRACE_START = {"new_game", "action"}
+TRACE_CONTINUE = {"next_turn", "game"}
+
+
+def _install_tracing(flask_app: Flask, tracer: Tracer) -> None:
+    """span ریشه هر درخواست و span رندر قالب‌ها (سیگنال‌های Flask)."""
+
+    @flask_app.before_request
+    def _trace_begin():
+        carried = session.get("trace") if request.endpoint in TRACE_CONTINUE else None
+        trace_id, parent_id = carried or (None, None)
+        rule = request.url_rule.rule if request.url_rule else request.path
+        root = tracer.begin(f"{request.method} {rule}", trace_id=trace_id, parent_id=parent_id,
+                            **{"http.method": request.method, "http.route": rule})
+        g.trace_root = root
+        # نوشتن در session یعنی امضای دوباره cookie؛ فقط برای نوبت‌های sample‌شده
+        if request.endpoint == "game":
+            if "trace" in session:
+                session.pop("trace")
+        elif root.recording and (request.endpoint in TRACE_START or carried):
+            session["trace"] = [root.trace_id, root.span_id]
+
+    @flask_app.after_request
+    def _trace_status(response):
+        root = g.get("trace_root")
+        if root is not None:
+            root.set(**{"http.status_code": response.status_code})
+        return response
+
+    @flask_app.teardown_request
+    def _trace_end(exc=None):
+        root = g.pop("trace_root", None)
+        if root is not None:
+            root.end(error=exc)
+
+    def _template_begin(sender, template, context, **extra):
+        tracing.start_span("template.render", template=template.name)
+
+    def _template_end(sender, template, context, **extra):
+        span = tracing.current()
+        if span is not None and span.name == "template.render":
+            span.end()
+
+    before_render_template.connect(_template_begin, flask_app, weak=False)
+    template_rendered.connect(_template_end, flask_app, weak=False)
+
+
+def _tracing_stats(tracer: Tracer | None) -> dict | None:
+    if tracer is None:
+        return None
+    return {**tracer.stats, "sample_rate": tracer.sample_rate, **tracer.exporter.stats}
+
+
+def create_app(config: dict | None = None) -> Flask:
+    """ساخت یک اپ Flask تازه (برای gunicorn، تست‌ها و اسکریپت‌ها).
+
+    تنظیمات از ENV خوانده می‌شوند و `config` آن‌ها را override می‌کند؛
+    تست‌ها به جای importlib.reload هر بار یک اپ جدید می‌سازند.
+    """
+    flask_app = Flask(__name__)
+    # در محیط production باید از متغیر محیطی استفاده شود
+    flask_app.secret_key = os.getenv('FLASK_SECRET_KEY', 'dev_secret_key_change_me')
+    flask_app.config["DB_PATH"] = os.getenv('STARTUP_DB_PATH', DB_PATH)
+    # تعداد shardهای داده بازی (1 = همان یک فایل DB_PATH)
+    flask_app.config["STORAGE_SHARDS"] = int(os.getenv('STORAGE_SHARDS', '1') or 1)
+    flask_app.config["STORAGE_POOL_SIZE"] = int(os.getenv('STORAGE_POOL_SIZE', '4') or 4)
+    # speculation: تولید سناریوی نوبت بعد در زمان فکر کردن بازیکن (سقف هزینه برای هر نوبت)
+    flask_app.config["SPECULATION_ENABLED"] = os.getenv('SPECULATION_ENABLED', '1') == '1'
+    flask_app.config["SPECULATION_BUDGET"] = int(os.getenv('SPECULATION_BUDGET', '6') or 0)
+    flask_app.config["SPECULATION_WORKERS"] = int(os.getenv('SPECULATION_WORKERS', '2') or 1)
+    flask_app.config["SPECULATION_WAIT"] = float(os.getenv('SPECULATION_WAIT', '5') or 0)
+    # تعداد سناریو در هر درخواست AI (1 = تولید تکی مثل قبل)
+    flask_app.config["SCENARIO_BATCH_SIZE"] = int(os.getenv('SCENARIO_BATCH_SIZE', '1') or 1)
+    # hedging: اگر provider اصلی تا p90 تأخیرش جواب نداد، provider دوم هم فراخوانی می‌شود
+    flask_app.config["AI_HEDGE_ENABLED"] = os.getenv('AI_HEDGE_ENABLED', '1') == '1'
+    flask_app.config["AI_HEDGE_DEFAULT_DELAY"] = float(os.getenv('AI_HEDGE_DEFAULT_DELAY', '2') or 2)
+    flask_app.config["AI_PROVIDERS"] = None  # None = default_ai_providers()
+    # سهمیه AI (token bucket مشترک بین workerها در دیتابیس global): ظرفیت burst و نرخ در دقیقه؛
+    # نرخ 0 = آن نوع bucket خاموش. بیش از سهمیه = مسیر fallback
+    flask_app.config["AI_GOVERNOR_ENABLED"] = os.getenv('AI_GOVERNOR_ENABLED', '1') == '1'
+    flask_app.config["AI_BUDGET_GLOBAL"] = (float(os.getenv('AI_BUDGET_GLOBAL_BURST', '120') or 0),
+                                            float(os.getenv('AI_BUDGET_GLOBAL_PER_MIN', '60') or 0))
+    flask_app.config["AI_BUDGET_USER"] = (float(os.getenv('AI_BUDGET_USER_BURST', '20') or 0),
+                                          float(os.getenv('AI_BUDGET_USER_PER_MIN', '6') or 0))
+    flask_app.config["AI_BUDGET_IP"] = (float(os.getenv('AI_BUDGET_IP_BURST', '40') or 0),
+                                        float(os.getenv('AI_BUDGET_IP_PER_MIN', '12') or 0))
+    # کسری از هر bucket که speculation به آن دست نمی‌زند
+    flask_app.config["AI_BACKGROUND_RESERVE"] = float(os.getenv('AI_BACKGROUND_RESERVE', '0.5') or 0)
+    # snapshot باینری corpus (python corpus_snapshot.py) برای fallback؛ خالی = خاموش
+    flask_app.config["CORPUS_SNAPSHOT"] = os.getenv('CORPUS_SNAPSHOT', '')
+    # رد سناریوی تقریباً تکراری (MinHash/LSH روی عنوان + توضیح؛ near_duplicates.py)
+    flask_app.config["DEDUP_ENABLED"] = os.getenv('DEDUP_ENABLED', '1') == '1'
+    flask_app.config["DEDUP_THRESHOLD"] = float(os.getenv('DEDUP_THRESHOLD', '0.6') or 0.6)
+    flask_app.config["AI_CALLS_FLUSH_INTERVAL"] = float(os.getenv('AI_CALLS_FLUSH_INTERVAL', '2') or 2)
+    # telemetry نوبت‌ها (segmentهای NDJSON، بارگذاری با python telemetry.py)؛ خالی = خاموش
+    flask_app.config["TELEMETRY_DIR"] = os.getenv('TELEMETRY_DIR', '')
+    flask_app.config["TELEMETRY_SEGMENT_MB"] = float(os.getenv('TELEMETRY_SEGMENT_MB', '4') or 4)
+    flask_app.config["TELEMETRY_FLUSH_INTERVAL"] = float(os.getenv('TELEMETRY_FLUSH_INTERVAL', '1') or 1)
+    # spanهای درخواست (tracing.py)؛ '' یعنی خاموش
+    flask_app.config["TRACING_DIR"] = os.getenv('TRACING_DIR', '')
+    flask_app.config["TRACING_SAMPLE_RATE"] = float(os.getenv('TRACING_SAMPLE_RATE', '1') or 0)
+    # سناریوساز محلی: fallback (فقط وقتی AI نیست)، always، on_timeout یا percent
+    flask_app.config["PROCEDURAL_POLICY"] = os.getenv('PROCEDURAL_POLICY', 'fallback')
+    flask_app.config["PROCEDURAL_PERCENT"] = float(os.getenv('PROCEDURAL_PERCENT', '0') or 0)
+    flask_app.config["PROCEDURAL_AI_TIMEOUT"] = float(os.getenv('PROCEDURAL_AI_TIMEOUT', '4') or 4)
+    # نگهداری SQLite (checkpoint/optimize) در یک thread کم‌اولویت، فقط در یک worker
+    flask_app.config["MAINTENANCE_ENABLED"] = os.getenv('MAINTENANCE_ENABLED', '1') == '1'
+    flask_app.config["MAINTENANCE_INTERVAL"] = float(os.getenv('MAINTENANCE_INTERVAL', '60') or 60)
+    flask_app.config["MAINTENANCE_WAL_MB"] = float(os.getenv('MAINTENANCE_WAL_MB', '4') or 4)
+    flask_app.config["MAINTENANCE_OPTIMIZE_EVERY"] = float(os.getenv('MAINTENANCE_OPTIMIZE_EVERY', '3600') or 3600)
+    flask_app.config["MAINTENANCE_IDLE_SECONDS"] = float(os.getenv('MAINTENANCE_IDLE_SECONDS', '30') or 30)
+    # backup آنلاین دوره‌ای (خالی = خاموش؛ دستی: python db_backup.py)
+    flask_app.config["BACKUP_DIR"] = os.getenv('BACKUP_DIR', '')
+    flask_app.config["BACKUP_EVERY"] = float(os.getenv('BACKUP_EVERY', str(6 * 3600)) or 6 * 3600)
+    flask_app.config["BACKUP_KEEP"] = int(os.getenv('BACKUP_KEEP', '7') or 7)
+    # static/dist از build_assets.py (نام hash‌دار، gzip/br، cache دائمی)؛ 0 = فایل‌های خام
+    flask_app.config["ASSETS_BUILT"] = os.getenv('ASSETS_BUILT', '1') == '1'
+    # cache صفحه‌های رندرشده /game و /report (gzip، سقف بر حسب بایت فشرده)
+    flask_app.config["PAGE_CACHE_ENABLED"] = os.getenv('PAGE_CACHE_ENABLED', '1') == '1'
+    flask_app.config["PAGE_CACHE_MB"] = float(os.getenv('PAGE_CACHE_MB', '8') or 8)
+    if config:
+        flask_app.config.update(config)
+
+    flask_app.extensions["repository"] = GameRepository(make_backend(
+        flask_app.config["DB_PATH"],
+        flask_app.config["STORAGE_SHARDS"],
+        flask_app.config["STORAGE_POOL_SIZE"],
+    ))
+    flask_app.extensions["speculation"] = SpeculationManager(
+        max_workers=flask_app.config["SPECULATION_WORKERS"],
+        budget_per_turn=flask_app.config["SPECULATION_BUDGET"],
     )
 
+    if flask_app.config["PROCEDURAL_POLICY"] not in PROCEDURAL_POLICIES:
+        raise ValueError(f"PROCEDURAL_POLICY نامعتبر: {flask_app.config['PROCEDURAL_POLICY']}")
+    flask_app.extensions["procedural"] = ProceduralScenarioGenerator()
+    flask_app.extensions["corpus"] = (SnapshotReader(flask_app.config["CORPUS_SNAPSHOT"])
+                                      if flask_app.config["CORPUS_SNAPSHOT"] else None)
+    flask_app.extensions["page_cache"] = PageCache(int(flask_app.config["PAGE_CACHE_MB"] * 1024 * 1024))
+    flask_app.extensions["ai_router"] = HedgedRouter(
+        flask_app.config["AI_PROVIDERS"] or default_ai_providers(),
+        hedge=flask_app.config["AI_HEDGE_ENABLED"],
+        default_delay=flask_app.config["AI_HEDGE_DEFAULT_DELAY"],
+    )
+
+    backend = flask_app.extensions["repository"].backend
+    # هر فراخوانی AI در ai_calls (نوشتن دسته‌ای در thread پس‌زمینه)
+    flask_app.extensions["ai_calls"] = flask_app.extensions["repository"].ai_calls
+    flask_app.extensions["ai_calls"].flush_interval = flask_app.config["AI_CALLS_FLUSH_INTERVAL"]
+    if flask_app.config["TELEMETRY_DIR"]:
+        flask_app.extensions["repository"].telemetry = TelemetryLog(
+            flask_app.config["TELEMETRY_DIR"],
+            segment_bytes=int(flask_app.config["TELEMETRY_SEGMENT_MB"] * 1024 * 1024),
+            flush_interval=flask_app.config["TELEMETRY_FLUSH_INTERVAL"],
+        )
+    flask_app.extensions["telemetry"] = flask_app.extensions["repository"].telemetry
+    flask_app.extensions["dedup"] = flask_app.extensions["repository"].dedup
+    tracer = None
+    if flask_app.config["TRACING_DIR"]:
+        tracer = Tracer(JSONLExporter(flask_app.config["TRACING_DIR"]), flask_app.config["TRACING_SAMPLE_RATE"])
+    flask_app.extensions["tracer"] = tracer
+    flask_app.extensions["dedup"].threshold = flask_app.config["DEDUP_THRESHOLD"]
+    flask_app.extensions["ai_governor"] = None
+    if flask_app.config["AI_GOVERNOR_ENABLED"]:
+        flask_app.extensions["ai_governor"] = AIGovernor(SQLiteBucketStore(backend.global_pool), {
+            "global": flask_app.config["AI_BUDGET_GLOBAL"],
+            "user": flask_app.config["AI_BUDGET_USER"],
+            "ip": flask_app.config["AI_BUDGET_IP"],
+        }, background_reserve=flask_app.config["AI_BACKGROUND_RESERVE"])
+    db_paths = [backend.global_path, *backend.shard_paths]
+    backup = None
+    if flask_app.config["BACKUP_DIR"]:
+        backup_dir, keep = flask_app.config["BACKUP_DIR"], flask_app.config["BACKUP_KEEP"]
+        backup = lambda: backup_all(db_paths, backup_dir, keep=keep)
+    activity = RequestActivity(flask_app.config["MAINTENANCE_IDLE_SECONDS"])
+    maintenance = MaintenanceScheduler(
+        db_paths,
+        interval=flask_app.config["MAINTENANCE_INTERVAL"],
+        wal_bytes=int(flask_app.config["MAINTENANCE_WAL_MB"] * 1024 * 1024),
+        optimize_every=flask_app.config["MAINTENANCE_OPTIMIZE_EVERY"],
+        is_idle=activity.idle,
+        backup=backup,
+        backup_every=flask_app.config["BACKUP_EVERY"],
+    )
+    flask_app.extensions["maintenance"] = maintenance
+    run_maintenance = flask_app.config["MAINTENANCE_ENABLED"] and not flask_app.config.get("TESTING")
+
+    @flask_app.before_request
+    def _track_request_start():
+        activity.begin()
+        if run_maintenance:
+            # thread در اولین درخواست (داخل worker، بعد از fork) شروع می‌شود
+            maintenance.start()
+
+    @flask_app.teardown_request
+    def _track_request_end(exc=None):
+        activity.end()
+
+    if tracer is not None:
+        _install_tracing(flask_app, tracer)
+
+    manifest = load_manifest(flask_app.static_folder) if flask_app.config["ASSETS_BUILT"] else {}
+    flask_app.extensions["asset_manifest"] = manifest
+    # بخشی از ETag صفحه‌ها (cached_page): deploy تازه یعنی ETag تازه
+    flask_app.extensions["page_version"] = render_version(
+        os.path.join(flask_app.root_path, flask_app.template_folder), manifest
+    )
+
+    @flask_app.url_defaults
+    def _hashed_static_url(endpoint, values):
+        # url_for('static', filename='style.css') -> /static/dist/style.<hash>.css
+        if endpoint == "static" and values.get("filename") in manifest:
+            values["filename"] = manifest[values["filename"]]
+
+    for rule, view, options in _routes:
+        flask_app.add_url_rule(rule, view.__name__, view, **options)
+    return flask_app
+
+
+app = create_app()
+
 
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
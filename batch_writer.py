@@ -0,0 +1,121 @@
+"""Startup Sandbox - Background Batch Writer
+
+صف محدود + یک thread پس‌زمینه که صف را دسته‌دسته به یک تابع نوشتن می‌دهد؛ پایه
+مشترک نویسنده‌هایی که نباید مسیر درخواست را کند کنند (ai_calls، spanهای tracing،
+رویدادهای telemetry نوبت):
+
+- put() فقط در صف می‌گذارد (بدون I/O)؛ اگر صف پر باشد False برمی‌گرداند و در
+  stats شمرده می‌شود.
+- thread در اولین put() ساخته می‌شود (در worker، بعد از fork) و هر flush_interval
+  ثانیه یا با پر شدن یک دسته بیدار می‌شود؛ atexit صف را قبل از خروج خالی می‌کند.
+- write(batch) برای هر دسته یک بار صدا زده می‌شود (زیر lock؛ flush دستی و thread
+  هم‌زمان نمی‌نویسند). خطای نوع errors یعنی آن دسته از دست رفت؛ هیچ خطایی
+  thread را نمی‌کشد.
+
+این ماژول به Flask وابسته نیست.
+"""
+
+import atexit
+import queue
+import threading
+
+
+class BatchWriter:
+    """صف + thread نویسنده دسته‌ای.
+
+    write: تابعی که یک list از آیتم‌ها را می‌نویسد. name: نام thread.
+    accepted/batches: نام کلیدهای stats برای آیتم پذیرفته‌شده و دسته نوشته‌شده
+    (هر نویسنده نام‌های قبلی خودش را در /metrics نگه می‌دارد). extra_stats: کلیدهای
+    اضافه‌ای که صاحب writer با count() زیاد می‌کند. what/unit: برای پیام خطا.
+    """
+
+    def __init__(self, write, name: str, batch_size: int = 200, flush_interval: float = 1.0,
+                 max_pending: int = 10000, errors: tuple = (OSError,), accepted: str = "queued",
+                 batches: str = "batches", extra_stats: tuple = (), what: str = "", unit: str = "آیتم"):
+        self.write = write
+        self.name = name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.errors = errors
+        self.what = what or name
+        self.unit = unit
+        self._accepted = accepted
+        self._batches = batches
+        self._queue: queue.Queue = queue.Queue(maxsize=max_pending)
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._start_lock = threading.Lock()
+        # write فقط زیر این قفل (thread نویسنده یا flush/close دستی)
+        self.lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.stats = {accepted: 0, "written": 0, batches: 0, "dropped": 0, "errors": 0,
+                      **{key: 0 for key in extra_stats}}
+
+    def count(self, key: str, amount: int = 1) -> None:
+        with self._stats_lock:
+            self.stats[key] += amount
+
+    def put(self, item) -> bool:
+        """گذاشتن در صف (بدون I/O)؛ False یعنی صف پر بود و item دور ریخته شد."""
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self.count("dropped")
+            return False
+        self.count(self._accepted)
+        if self._queue.qsize() >= self.batch_size:
+            self._wake.set()
+        self._ensure_thread()
+        return True
+
+    def _ensure_thread(self) -> None:
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name=self.name, daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                self.count("errors")
+                print(f"⚠️ خطای پیش‌بینی‌نشده در نوشتن {self.what}: {e}")
+
+    def flush(self) -> int:
+        """نوشتن همه آیتم‌های صف (دسته‌های batch_size تایی)؛ تعداد نوشته‌شده."""
+        written = 0
+        with self.lock:
+            while True:
+                batch = []
+                while len(batch) < self.batch_size:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                if not batch:
+                    return written
+                try:
+                    self.write(batch)
+                except self.errors as e:
+                    self.count("errors")
+                    print(f"⚠️ خطا در نوشتن {self.what} ({len(batch)} {self.unit} از دست رفت): {e}")
+                    return written
+                written += len(batch)
+                self.count("written", len(batch))
+                self.count(self._batches)
+
+    def close(self) -> None:
+        """توقف thread و نوشتن باقی‌مانده صف."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self.flush()
@@ -0,0 +1,103 @@
+"""Startup Sandbox - Static asset benchmark
+
+بایت و round-trip هر بازدید صفحه (/game) با فایل‌های خام static در برابر خروجی
+build_assets.py (minify + gzip/br + Cache-Control: immutable):
+
+- cold: اولین بازدید (cache خالی)
+- warm: بازدیدهای بعدی؛ فایل خام با هر صفحه revalidate می‌شود (304)، فایل
+  hash‌دار immutable اصلاً درخواست نمی‌شود
+
+زمان تا تعامل (TTI) با یک مدل ساده شبکه تخمین زده می‌شود (مرورگر واقعی اجرا
+نمی‌شود): RTT صفحه + انتقال HTML + (RTT + انتقال موازی assetها).
+
+اجرا:
+    python benchmarks/bench_assets.py
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+from unittest import mock
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import app as app_module
+import build_assets
+
+# (نام، RTT ثانیه، پهنای باند بایت بر ثانیه)
+NETWORKS = (("slow-3g", 0.4, 50_000), ("4g", 0.1, 1_000_000))
+ASSET_NAMES = ("style.css", "script.js")
+
+
+def _size(response) -> int:
+    return len(response.get_data()) + sum(len(k) + len(v) + 4 for k, v in response.headers.items())
+
+
+def _page_view(client, warm: bool, built: dict) -> tuple[int, int, int, int]:
+    """(بایت HTML، بایت assetها، تعداد درخواست asset، تعداد revalidation)"""
+    page = client.get("/game")
+    html = _size(page)
+    asset_bytes = requests = revalidations = 0
+    for name in ASSET_NAMES:
+        if name in built:
+            if warm:
+                continue  # immutable: از cache مرورگر
+            r = client.get(f"/static/{built[name]}", headers={"Accept-Encoding": "gzip, br"})
+        elif warm:
+            first = client.get(f"/static/{name}")
+            r = client.get(f"/static/{name}", headers={"If-None-Match": first.headers["ETag"]})
+            revalidations += 1
+        else:
+            r = client.get(f"/static/{name}", headers={"Accept-Encoding": "gzip, br"})
+        requests += 1
+        asset_bytes += _size(r)
+    return html, asset_bytes, requests, revalidations
+
+
+def _tti(html: int, assets: int, requests: int, rtt: float, bandwidth: float) -> float:
+    total = rtt + html / bandwidth
+    if requests:
+        total += rtt + assets / bandwidth
+    return total * 1000
+
+
+def main(argv=None) -> int:
+    argparse.ArgumentParser(description="benchmark فایل‌های static خام در برابر build شده").parse_args(argv)
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp, contextlib.redirect_stdout(io.StringIO()), \
+            mock.patch.dict(os.environ, {"GEMINI_API_KEY": "", "OPENROUTER_API_KEY": ""}):
+        static = os.path.join(tmp, "static")
+        shutil.copytree(os.path.join(PROJECT_ROOT, "static"), static,
+                        ignore=shutil.ignore_patterns(build_assets.DIST_DIR))
+        for label, build in (("قبل (خام)", False), ("بعد (build)", True)):
+            flask_app = app_module.create_app({"DB_PATH": os.path.join(tmp, f"{build}.db"), "TESTING": True,
+                                               "SPECULATION_ENABLED": False})
+            flask_app.static_folder = static
+            manifest = flask_app.extensions["asset_manifest"]
+            manifest.clear()
+            if build:
+                manifest.update(build_assets.build(static))
+            client = flask_app.test_client()
+            client.post("/new_game", data={"username": "bench", "startup_name": "BenchCo"})
+            for state, warm in (("cold", False), ("warm", True)):
+                rows.append((label, state, *_page_view(client, warm, dict(manifest))))
+            flask_app.extensions["repository"].close()
+
+    print("=" * 72)
+    for label, state, html, assets, requests, revalidations in rows:
+        tti = "  ".join(f"{name}={_tti(html, assets, requests, rtt, bw):6.0f} ms" for name, rtt, bw in NETWORKS)
+        print(f"  {label:<12} {state:<5} bytes={html + assets:6d} (html {html}, assets {assets}) "
+              f"asset requests={requests} (304: {revalidations})  TTI≈ {tti}")
+    print("=" * 72)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
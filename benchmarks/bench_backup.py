@@ -0,0 +1,88 @@
+"""Startup Sandbox - Online backup benchmark
+
+backup آنلاین (db_backup.py) روی یک دیتابیس بزرگ در حالی که یک writer مثل /action
+پشت سر هم لاگ ثبت می‌کند:
+
+- توان backup (MB/s)، تعداد گام‌ها و شروع‌های دوباره
+- بیشترین و p99 تأخیر commitهای writer در طول backup، در مقایسه با بدون backup،
+  کنار max_writer_wait_ms که خود backup با probe بین گام‌ها اندازه می‌گیرد
+
+اجرا:
+    python benchmarks/bench_backup.py [--rows 200000] [--pages 256] [--sleep 0.01]
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from db_backup import backup_database
+
+
+def _writer(db_path: str, stop: threading.Event, stalls: list) -> None:
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.execute('PRAGMA synchronous = NORMAL')
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        conn.execute("INSERT INTO logs (game_id, turn, ai_response) VALUES (1, 1, 'داستان')")
+        conn.commit()
+        stalls.append((time.perf_counter() - t0) * 1000)
+        time.sleep(0.005)
+    conn.close()
+
+
+def _summary(stalls: list) -> str:
+    stalls = sorted(stalls)
+    return f"commits={len(stalls)} p99={stalls[int(0.99 * len(stalls))]:.2f} ms max={stalls[-1]:.2f} ms"
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="benchmark backup آنلاین در کنار writer")
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--pages", type=int, default=256)
+    parser.add_argument("--sleep", type=float, default=0.01)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        conn = sqlite3.connect(db_path)
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('CREATE TABLE logs (id INTEGER PRIMARY KEY, game_id INTEGER, turn INTEGER, ai_response TEXT)')
+        conn.executemany('INSERT INTO logs (game_id, turn, ai_response) VALUES (?, ?, ?)',
+                         [(i % 1000, i, "داستان " * 20) for i in range(args.rows)])
+        conn.commit()
+        conn.close()
+
+        results = {}
+        for name in ("بدون backup", "با backup"):
+            stop, stalls = threading.Event(), []
+            thread = threading.Thread(target=_writer, args=(db_path, stop, stalls))
+            thread.start()
+            if name == "با backup":
+                stats = backup_database(db_path, os.path.join(tmp, "copy.db"), pages=args.pages, sleep=args.sleep)
+            else:
+                time.sleep(1.0)
+            stop.set()
+            thread.join()
+            results[name] = _summary(stalls)
+
+    print("=" * 60)
+    print(f"rows={args.rows} size={stats['bytes'] // 1024 // 1024} MB pages/step={args.pages} sleep={args.sleep}")
+    print(f"  backup: {stats['seconds']} s، {stats['mb_per_s']} MB/s، steps={stats['steps']} "
+          f"restarts={stats['restarts']} single_step={stats['single_step']} max_step={stats['max_step_ms']} ms "
+          f"max_writer_wait={stats['max_writer_wait_ms']} ms")
+    for name, line in results.items():
+        print(f"  writer {name:<12} {line}")
+    print("=" * 60)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+"""Startup Sandbox - Batched scenario generation benchmark
+
+توکن و latency به ازای هر سناریو: تولید تکی در برابر batch (K سناریو در یک درخواست).
+
+- اگر GEMINI_API_KEY ست باشد، درخواست واقعی فرستاده می‌شود و توکن‌ها از
+  usage_metadata خوانده می‌شوند.
+- بدون کلید (یا با --offline) فقط اندازه پرامپت اندازه‌گیری و توکن‌ها تخمین زده
+  می‌شوند (~۴ کاراکتر برای هر توکن)؛ latency گزارش نمی‌شود.
+
+اجرا:
+    python benchmarks/bench_batch_generation.py [--sizes 1 3 5] [--rounds 3] [--offline]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import app as app_module
+
+
+def _prompt_for(batch_size: int) -> tuple[str, int]:
+    """پرامپت واقعی یک نوبت (و در صورت batch، نسخه چندتایی آن)."""
+    selected_type, difficulty, prompt_text = app_module.plan_scenario(
+        1, "BenchCo", 6, 800, 45, 60, rng_seed=42
+    )
+    if batch_size <= 1:
+        return prompt_text, 1
+    weights = app_module.get_scenario_type_weights(6, 800, 45, 60)
+    specs = app_module.batch_specs(selected_type, difficulty, weights, batch_size)
+    return app_module.build_batch_prompt(prompt_text, specs), len(specs)
+
+
+def _call(contents: str) -> tuple[float, int, int, int]:
+    """(latency ms، توکن پرامپت، توکن پاسخ، تعداد سناریوی معتبر)"""
+    t0 = time.perf_counter()
+    resp = app_module.get_gemini_client().models.generate_content(
+        model=app_module.GEMINI_MODEL, contents=contents
+    )
+    latency = (time.perf_counter() - t0) * 1000
+    usage = getattr(resp, "usage_metadata", None)
+    prompt_tokens = getattr(usage, "prompt_token_count", 0) or 0
+    output_tokens = getattr(usage, "candidates_token_count", 0) or 0
+    text = getattr(resp, "text", "") or ""
+    try:
+        valid = len(app_module.parse_scenario_batch(text))
+    except Exception:
+        try:
+            app_module.parse_scenario_response(text)
+            valid = 1
+        except Exception:
+            valid = 0
+    return latency, prompt_tokens, output_tokens, valid
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="benchmark تولید batch سناریو")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 3, 5])
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--offline", action="store_true", help="بدون فراخوانی AI، فقط اندازه پرامپت")
+    args = parser.parse_args(argv)
+    online = bool(os.getenv("GEMINI_API_KEY")) and not args.offline
+
+    with tempfile.TemporaryDirectory() as tmp, contextlib.redirect_stdout(io.StringIO()):
+        flask_app = app_module.create_app({"DB_PATH": os.path.join(tmp, "bench.db"), "TESTING": True})
+        with flask_app.app_context():
+            prompts = {k: _prompt_for(k) for k in args.sizes}
+        flask_app.extensions["repository"].close()
+
+    print("=" * 60)
+    print(f"mode: {'online (Gemini)' if online else 'offline (prompt size only)'}")
+    for k in args.sizes:
+        contents, n = prompts[k]
+        line = f"K={k:<2} prompt chars/scenario={len(contents) / n:7.0f}  est tokens/scenario={len(contents) / 4 / n:6.0f}"
+        if online:
+            rows = [_call(contents) for _ in range(args.rounds)]
+            valid = sum(r[3] for r in rows) or 1
+            line += (
+                f"  latency/scenario={statistics.median(r[0] for r in rows) * len(rows) / valid:7.0f} ms"
+                f"  in tok/scenario={sum(r[1] for r in rows) / valid:6.0f}"
+                f"  out tok/scenario={sum(r[2] for r in rows) / valid:6.0f}"
+                f"  valid={valid}/{n * len(rows)}"
+            )
+        print(line)
+    print("=" * 60)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
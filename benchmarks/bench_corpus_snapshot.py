@@ -0,0 +1,142 @@
+"""Startup Sandbox - Corpus snapshot memory benchmark
+
+حافظه هر worker برای corpus سناریوها در دو حالت:
+
+1. cache در حافظه هر worker: کل corpus به dict/list پایتون خوانده می‌شود
+2. snapshot mmap‌شده (corpus_snapshot.py): همه workerها یک فایل را map می‌کنند
+
+برای هر حالت N پروسس fork می‌شود (مثل workerهای gunicorn)، هر کدام همه bucketها
+را پیمایش می‌کند و از /proc/self/smaps_rollup گزارش می‌دهد:
+    RSS     کل صفحه‌های مقیم
+    Private صفحه‌هایی که فقط مال همین worker است (هزینه واقعی هر worker اضافه)
+    PSS     سهم متناسب از صفحه‌های مشترک
+مقدارها منهای baseline پروسس خالی (قبل از بارگذاری corpus) هستند. فقط لینوکس.
+
+اجرا:
+    python benchmarks/bench_corpus_snapshot.py [--scenarios 20000] [--workers 4]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from corpus_snapshot import CorpusSnapshot, build_snapshot, load_corpus
+from migrate_db import migrate_database
+
+TYPES = ("CRISIS", "OPPORTUNITY", "DILEMMA", "TEAM", "MARKET")
+
+
+def _memory_kb() -> dict:
+    fields = {}
+    with open("/proc/self/smaps_rollup") as fh:
+        for line in fh:
+            parts = line.split()
+            if len(parts) >= 2 and parts[1].isdigit():
+                fields[parts[0].rstrip(":")] = int(parts[1])
+    private = fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)
+    return {"rss": fields.get("Rss", 0), "private": private, "pss": fields.get("Pss", 0)}
+
+
+def _seed(db_path: str, count: int) -> None:
+    with contextlib.redirect_stdout(io.StringIO()):
+        migrate_database(db_path)
+    rnd = random.Random(1)
+    conn = sqlite3.connect(db_path)
+    for i in range(count):
+        cur = conn.execute(
+            "INSERT INTO scenarios (game_id, scenario_type, title, description, difficulty_level) "
+            "VALUES (NULL, ?, ?, ?, ?)",
+            (rnd.choice(TYPES), f"سناریوی شماره {i}", "شرح موقعیت استارتاپ " * rnd.randint(10, 30),
+             rnd.randint(1, 5)),
+        )
+        conn.executemany(
+            "INSERT INTO choices (scenario_id, text, cost_impact, reputation_impact, morale_impact, risk_level) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            [(cur.lastrowid, f"گزینه {j} برای سناریوی {i}", rnd.randint(-500, 500), rnd.randint(-20, 20),
+              rnd.randint(-20, 20), rnd.randint(1, 5)) for j in range(3)],
+        )
+    conn.commit()
+    conn.close()
+
+
+def _worker(mode: str, db_path: str, snapshot_path: str, write_fd: int) -> None:
+    base = _memory_kb()
+    t0 = time.perf_counter()
+    picked = 0
+    if mode == "cache":
+        buckets: dict = {}
+        for sc in load_corpus(db_path):
+            buckets.setdefault((sc["type"], sc["difficulty"]), []).append(sc)
+        load_ms = (time.perf_counter() - t0) * 1000
+        for items in buckets.values():
+            picked += sum(len(sc["title"]) for sc in items)
+    else:
+        snap = CorpusSnapshot(snapshot_path)
+        load_ms = (time.perf_counter() - t0) * 1000
+        for i in range(snap.size):
+            picked += len(snap.record(i)["title"])
+    mem = _memory_kb()
+    delta = {k: mem[k] - base[k] for k in mem}
+    os.write(write_fd, f"{delta['rss']} {delta['private']} {delta['pss']} {load_ms:.1f} {picked}\n".encode())
+    os._exit(0)
+
+
+def _run(mode: str, workers: int, db_path: str, snapshot_path: str) -> list[tuple]:
+    results = []
+    pipes = []
+    for _ in range(workers):
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            _worker(mode, db_path, snapshot_path, write_fd)
+        os.close(write_fd)
+        pipes.append((pid, read_fd))
+    for pid, read_fd in pipes:
+        with os.fdopen(read_fd) as fh:
+            rss, private, pss, load_ms, _ = fh.read().split()
+        os.waitpid(pid, 0)
+        results.append((int(rss), int(private), int(pss), float(load_ms)))
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="benchmark حافظه corpus: cache هر worker در برابر mmap")
+    parser.add_argument("--scenarios", type=int, default=20000)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args(argv)
+    if not os.path.exists("/proc/self/smaps_rollup") or not hasattr(os, "fork"):
+        print("⚠️ این benchmark به لینوکس (fork و /proc/self/smaps_rollup) نیاز دارد")
+        return 1
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "corpus.db")
+        snapshot_path = os.path.join(tmp, "corpus.snapshot")
+        _seed(db_path, args.scenarios)
+        stats = build_snapshot(db_path, snapshot_path)
+        rows = {mode: _run(mode, args.workers, db_path, snapshot_path) for mode in ("cache", "mmap")}
+
+    print("=" * 60)
+    print(f"scenarios={args.scenarios}  workers={args.workers}  snapshot={stats['bytes'] // 1024} KB "
+          f"(build {stats['seconds']} s)")
+    for mode, results in rows.items():
+        n = len(results)
+        rss, private, pss, load_ms = (sum(r[i] for r in results) / n for i in range(4))
+        print(f"  {mode:<6} per worker: RSS +{rss / 1024:7.1f} MB  Private +{private / 1024:7.1f} MB  "
+              f"PSS +{pss / 1024:7.1f} MB  load {load_ms:7.1f} ms   total private {private * n / 1024:.1f} MB")
+    print("=" * 60)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
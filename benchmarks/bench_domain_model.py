@@ -0,0 +1,109 @@
+"""Startup Sandbox - Domain model benchmark
+
+مقایسه sqlite3.Row با اشیای __slots__ در models.py:
+
+1. خواندن همه لاگ‌های یک بازی (پیش‌فرض 10k ردیف): زمان و حافظه نگه‌داشته‌شده
+2. درخواست‌های واقعی Flask (/report و /game): زمان و تخصیص حافظه هر درخواست با tracemalloc
+
+اجرا:
+    python benchmarks/bench_domain_model.py [--logs 10000] [--repeat 20]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import app as app_module
+from models import LogEntry, row_factory
+
+
+def _seed(repo, logs: int) -> int:
+    user_id = repo.get_or_create_user("bench")
+    game_id = repo.create_game(user_id, "BenchCo", 1000, 50, 80, rng_seed=1)
+    with repo.backend.shard_pool(game_id).connection() as conn:
+        conn.executemany('''
+            INSERT INTO logs (game_id, turn, scenario_title, choice_text,
+                              cost_impact, reputation_impact, morale_impact, ai_response)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', [
+            (game_id, i + 1, f"سناریو {i}", f"گزینه {i % 3}", -(i % 200), i % 7 - 3, 2 - i % 5, "داستان " * 30)
+            for i in range(logs)
+        ])
+        conn.commit()
+    return game_id
+
+
+def _measure(fn, repeat: int) -> tuple[float, int, int]:
+    """(میانه ms، peak تخصیص KB، تعداد بلاک‌های نگه‌داشته‌شده توسط نتیجه)"""
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t0) * 1000)
+    tracemalloc.start()
+    result = fn()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return statistics.median(times), peak // 1024, current // 1024
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="benchmark مدل دامنه (__slots__) در برابر sqlite3.Row")
+    parser.add_argument("--logs", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp, contextlib.redirect_stdout(io.StringIO()) as quiet:
+        flask_app = app_module.create_app({
+            "DB_PATH": os.path.join(tmp, "bench.db"), "TESTING": True, "SPECULATION_ENABLED": False,
+        })
+        repo = flask_app.extensions["repository"]
+        game_id = _seed(repo, args.logs)
+        pool = repo.backend.shard_pool(game_id)
+        sql = "SELECT * FROM logs WHERE game_id = ? ORDER BY id ASC"
+
+        def fetch_rows():
+            with pool.connection() as conn:
+                return conn.execute(sql, (game_id,)).fetchall()
+
+        def fetch_entries():
+            with pool.connection() as conn:
+                cur = conn.execute(sql, (game_id,))
+                cur.row_factory = row_factory(LogEntry, cur.description)
+                return cur.fetchall()
+
+        client = flask_app.test_client()
+        with client.session_transaction() as sess:
+            sess["game_id"] = game_id
+        client.get("/game")  # سناریوی نوبت اول (fallback) ساخته شود
+
+        results = {
+            "fetch sqlite3.Row": _measure(fetch_rows, args.repeat),
+            "fetch LogEntry": _measure(fetch_entries, args.repeat),
+            "GET /report": _measure(lambda: client.get(f"/report/{game_id}"), args.repeat),
+            "GET /game": _measure(lambda: client.get("/game"), args.repeat),
+        }
+        repo.close()
+
+    print("=" * 60)
+    print(f"logs={args.logs} repeat={args.repeat}")
+    for name, (ms, peak_kb, kept_kb) in results.items():
+        print(f"  {name:<18} median={ms:8.2f} ms  peak={peak_kb:7d} KB  retained={kept_kb:7d} KB")
+    print("=" * 60)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
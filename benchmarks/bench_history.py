@@ -0,0 +1,92 @@
+"""Startup Sandbox - Player history pagination benchmark
+
+زمان یک صفحه /history برای کاربری با ده‌ها هزار بازی:
+
+1. keyset (list_user_games با before_id) در صفحه اول، وسط و آخر
+2. همان صفحه با OFFSET (روش قدیمی) برای مقایسه
+
+با keyset زمان صفحه باید مستقل از عمق صفحه و تعداد بازی‌های کاربر باشد.
+
+اجرا:
+    python benchmarks/bench_history.py [--games 50000] [--page 20] [--repeat 50]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from ai_accounting import percentile
+from storage import GameRepository, make_backend
+
+
+def _seed(repo: GameRepository, games: int) -> int:
+    with contextlib.redirect_stdout(io.StringIO()):
+        heavy = repo.get_or_create_user("heavy")
+        other = repo.get_or_create_user("other")
+    with repo.backend.global_pool().connection() as conn:
+        # بازی‌های دو کاربر در هم (مثل ترافیک واقعی)
+        conn.executemany(
+            "INSERT INTO games (user_id, startup_name, turn, score, decisions, is_game_over, game_over_reason) "
+            "VALUES (?, ?, 12, 150, 11, 1, 'BUDGET')",
+            [(heavy if i % 2 else other, f"Co{i}") for i in range(games * 2)])
+        conn.commit()
+    return heavy
+
+
+def _timed(fn, repeat: int) -> list:
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t0) * 1000)
+    return times
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="benchmark صفحه‌بندی تاریخچه بازی‌ها")
+    parser.add_argument("--games", type=int, default=50000, help="بازی‌های کاربر پرکار")
+    parser.add_argument("--page", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        repo = GameRepository(make_backend(os.path.join(tmp, "bench.db")))
+        user_id = _seed(repo, args.games)
+        with repo.backend.global_pool().connection() as conn:
+            ids = [row[0] for row in conn.execute(
+                "SELECT id FROM games WHERE user_id = ? ORDER BY id DESC", (user_id,))]
+
+            def offset_page(offset):
+                return conn.execute('''
+                    SELECT id, startup_name, mode, budget, reputation, morale, turn, score, decisions,
+                           is_game_over, game_over_reason, created_at, finished_at
+                    FROM games WHERE user_id = ? ORDER BY id DESC LIMIT ? OFFSET ?
+                ''', (user_id, args.page, offset)).fetchall()
+
+            results = []
+            for name, offset in (("first", 0), ("middle", len(ids) // 2), ("last", len(ids) - args.page)):
+                before = ids[offset - 1] if offset else None
+                keyset = _timed(lambda: repo.list_user_games(user_id, before, args.page), args.repeat)
+                paged = _timed(lambda: offset_page(offset), args.repeat)
+                results.append((name, keyset, paged))
+        repo.close()
+
+    print("=" * 60)
+    print(f"user games={args.games}  page={args.page}")
+    for name, keyset, paged in results:
+        print(f"  {name:<7} keyset p50 {percentile(keyset, 0.5):6.3f} ms  p99 {percentile(keyset, 0.99):6.3f} ms   "
+              f"OFFSET p50 {percentile(paged, 0.5):7.3f} ms")
+    print("=" * 60)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,70 @@
+"""Startup Sandbox - Maintenance benchmark
+
+تأخیر درخواست‌های واقعی (/game و /report) با و بدون thread نگهداری.
+برای بدترین حالت، نگهداری هر --interval ثانیه checkpoint و optimize می‌زند.
+
+اجرا:
+    python benchmarks/bench_maintenance.py [--requests 400] [--interval 0.02]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import app as app_module
+from maintenance import MaintenanceScheduler
+
+
+def _latencies(client, game_id: int, requests: int) -> list[float]:
+    times = []
+    for i in range(requests):
+        t0 = time.perf_counter()
+        client.get("/game" if i % 2 else f"/report/{game_id}")
+        times.append((time.perf_counter() - t0) * 1000)
+    return times
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="benchmark اثر نگهداری SQLite روی تأخیر درخواست‌ها")
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--interval", type=float, default=0.02)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp, contextlib.redirect_stdout(io.StringIO()):
+        db_path = os.path.join(tmp, "bench.db")
+        flask_app = app_module.create_app({"DB_PATH": db_path, "TESTING": True, "SPECULATION_ENABLED": False})
+        client = flask_app.test_client()
+        client.post("/new_game", data={"username": "bench", "startup_name": "BenchCo"})
+        with client.session_transaction() as sess:
+            game_id = sess["game_id"]
+        _latencies(client, game_id, 20)  # warm-up
+
+        baseline = _latencies(client, game_id, args.requests)
+        scheduler = MaintenanceScheduler([db_path], interval=args.interval, wal_bytes=0, optimize_every=0,
+                                         lock_path=os.path.join(tmp, "bench.lock"))
+        scheduler.start()
+        loaded = _latencies(client, game_id, args.requests)
+        scheduler.stop()
+        flask_app.extensions["repository"].close()
+
+    print("=" * 60)
+    print(f"requests={args.requests} maintenance runs={scheduler.stats['runs']}")
+    for name, times in (("بدون نگهداری", baseline), ("با نگهداری", loaded)):
+        times.sort()
+        print(f"  {name:<14} p50={statistics.median(times):7.2f} ms  p99={times[int(0.99 * len(times))]:7.2f} ms")
+    print(f"  آخرین زمان کارها (ms): {scheduler.stats['last_ms']}")
+    print("=" * 60)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+"""Startup Sandbox - game_logs migration benchmark
+
+مهاجرت game_logs -> logs (migrate_game_logs.py) هم‌زمان با یک writer زنده که مثل
+/action هر چند میلی‌ثانیه یک تراکنش کوچک (UPDATE games + INSERT logs) می‌زند.
+
+برای هر duty: توان مهاجرت، طولانی‌ترین تکه، و p50/p99/max انتظار writer.
+همچنین بیشترین RSS پروسس (حافظه باید با اندازه تکه محدود بماند، نه با حجم جدول).
+
+اجرا:
+    python benchmarks/bench_migrate_game_logs.py [--rows 200000] [--chunk 1000] [--duties 1,0.5,0.2]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import resource
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from ai_accounting import percentile
+from db_setup import create_database
+from migrate_db import migrate_database
+from migrate_game_logs import migrate_game_logs
+
+
+def _seed(db_path: str, rows: int) -> None:
+    with contextlib.redirect_stdout(io.StringIO()):
+        create_database(db_path)
+        migrate_database(db_path)
+    conn = sqlite3.connect(db_path)
+    conn.execute("INSERT INTO games (id, user_id, startup_name) VALUES (1, 1, 'LiveCo')")
+    story = "داستان نتیجه تصمیم " * 25
+    for start in range(0, rows, 10000):
+        conn.executemany('''
+            INSERT INTO game_logs (game_id, turn_number, scenario_title, user_choice,
+                                   budget_before, budget_after, ai_response)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', [(10 + i // 20, 1 + i % 20, f"سناریو {i}", "گزینه", 1000, 990, story)
+              for i in range(start, min(rows, start + 10000))])
+    conn.commit()
+    conn.close()
+
+
+def _live_writer(db_path: str, stop: threading.Event, waits: list) -> None:
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.execute("PRAGMA journal_mode = WAL")
+    turn = 0
+    while not stop.is_set():
+        turn += 1
+        t0 = time.perf_counter()
+        conn.execute("UPDATE games SET turn = ? WHERE id = 1", (turn,))
+        conn.execute("INSERT INTO logs (game_id, turn, ai_response) VALUES (1, ?, 'x')", (turn,))
+        conn.commit()
+        waits.append((time.perf_counter() - t0) * 1000)
+        time.sleep(0.005)
+    conn.close()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="benchmark مهاجرت game_logs با writer زنده")
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--chunk", type=int, default=1000)
+    parser.add_argument("--duties", default="1,0.5,0.2")
+    args = parser.parse_args(argv)
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        seed_path = os.path.join(tmp, "seed.db")
+        _seed(seed_path, args.rows)
+        size_mb = os.path.getsize(seed_path) / 1024 / 1024
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        for duty in (float(d) for d in args.duties.split(",")):
+            db_path = os.path.join(tmp, f"run-{duty}.db")
+            shutil.copy(seed_path, db_path)
+            stop, waits = threading.Event(), []
+            writer = threading.Thread(target=_live_writer, args=(db_path, stop, waits))
+            writer.start()
+            stats = migrate_game_logs(db_path, chunk=args.chunk, duty=duty)
+            stop.set()
+            writer.join()
+            results.append((duty, stats, waits))
+            os.remove(db_path)
+        rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    print("=" * 60)
+    print(f"rows={args.rows}  chunk={args.chunk}  legacy db {size_mb:.0f} MB  "
+          f"peak RSS growth during runs {(rss_after - rss_before) / 1024:.1f} MB")
+    for duty, stats, waits in results:
+        ok = "ok" if stats["validation"] and stats["validation"]["ok"] else "MISMATCH"
+        print(f"  duty {duty:<4} {stats['rows'] / stats['seconds']:8.0f} rows/s  chunk max {stats['max_chunk_ms']:6.1f} ms  "
+              f"writer p50 {percentile(waits, 0.5):5.2f} ms  p99 {percentile(waits, 0.99):6.2f} ms  "
+              f"max {max(waits):6.1f} ms  ({len(waits)} writes, {ok})")
+    print("=" * 60)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+"""Startup Sandbox - Near-duplicate lookup benchmark
+
+زمان find_near_duplicate روی corpus بزرگ سناریو (MinHash + LSH در SQLite):
+
+1. متن بازنویسی‌شده یک سناریوی موجود (باید تکراری تشخیص داده شود)
+2. متن تازه (بدون تکراری)
+
+همچنین: زمان امضای هر سناریو، حجم ایندکس و دقت (تشخیص درست بازنویسی‌ها).
+سناریوها از یک واژگان ساختگی ساخته و مستقیم با امضایشان درج می‌شوند.
+
+اجرا:
+    python benchmarks/bench_near_duplicates.py [--scenarios 50000] [--queries 500]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from ai_accounting import percentile
+from near_duplicates import band_keys, pack, signature
+from storage import GameRepository, make_backend
+
+LETTERS = "ابپتثجچحخدذرزژسشصضطظعغفقکگلمنوهی"
+_vocab = random.Random(0)
+WORDS = ["".join(_vocab.choices(LETTERS, k=_vocab.randint(2, 7))) for _ in range(5000)]
+
+
+def _text(rng: random.Random) -> tuple[str, str]:
+    return " ".join(rng.choices(WORDS, k=4)), " ".join(rng.choices(WORDS, k=35))
+
+
+def _reword(rng: random.Random, description: str) -> str:
+    """چند کلمه عوض می‌شود (مثل خروجی دوباره AI برای همان موقعیت)."""
+    words = description.split()
+    for i in rng.sample(range(len(words)), 4):
+        words[i] = rng.choice(WORDS)
+    return " ".join(words)
+
+
+def _seed(repo: GameRepository, count: int, rng: random.Random) -> tuple[list, float]:
+    texts = []
+    sign_seconds = 0.0
+    with repo.backend.global_pool().connection() as conn:
+        for start in range(0, count, 5000):
+            rows, sigs = [], []
+            for _ in range(min(5000, count - start)):
+                title, description = _text(rng)
+                t0 = time.perf_counter()
+                sigs.append(signature(title, description))
+                sign_seconds += time.perf_counter() - t0
+                rows.append((title, description, pack(sigs[-1])))
+                texts.append((title, description))
+            first = conn.execute("SELECT COALESCE(MAX(id), 0) FROM scenarios").fetchone()[0] + 1
+            conn.executemany(
+                "INSERT INTO scenarios (game_id, scenario_type, title, description, minhash) "
+                "VALUES (NULL, 'CRISIS', ?, ?, ?)", rows)
+            conn.executemany(
+                "INSERT INTO scenario_lsh (band_key, game_id, scenario_id) VALUES (?, NULL, ?)",
+                [(key, first + offset) for offset, sig in enumerate(sigs) for key in band_keys(sig)])
+            conn.commit()
+    return texts, sign_seconds / count * 1e6
+
+
+def _timed(fn, cases) -> tuple[list, list]:
+    results, times = [], []
+    for case in cases:
+        t0 = time.perf_counter()
+        results.append(fn(*case))
+        times.append((time.perf_counter() - t0) * 1000)
+    return results, times
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="benchmark تشخیص سناریوی تقریباً تکراری")
+    parser.add_argument("--scenarios", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=500)
+    args = parser.parse_args(argv)
+    rng = random.Random(7)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        repo = GameRepository(make_backend(db_path))
+        with contextlib.redirect_stdout(io.StringIO()):
+            repo.get_user(1)  # migrate
+        t0 = time.perf_counter()
+        texts, sign_us = _seed(repo, args.scenarios, rng)
+        seed_seconds = time.perf_counter() - t0
+
+        reworded = [(None, title, _reword(rng, description))
+                    for title, description in rng.sample(texts, args.queries)]
+        fresh = [(None, *_text(rng)) for _ in range(args.queries)]
+        found, dup_ms = _timed(repo.find_near_duplicate, reworded)
+        false_hits, fresh_ms = _timed(repo.find_near_duplicate, fresh)
+        stats = dict(repo.dedup.stats)
+        repo.close()
+        db_mb = os.path.getsize(db_path) / 1024 / 1024
+
+    print("=" * 60)
+    print(f"scenarios={args.scenarios}  seed {seed_seconds:.1f} s  signature {sign_us:.0f} us  db {db_mb:.1f} MB")
+    for name, times in (("reworded", dup_ms), ("fresh", fresh_ms)):
+        print(f"  {name:<9} p50 {percentile(times, 0.5):6.3f} ms  p99 {percentile(times, 0.99):6.3f} ms")
+    print(f"  recall {sum(1 for r in found if r) / len(found):.1%}  "
+          f"false positives {sum(1 for r in false_hits if r) / len(false_hits):.1%}  "
+          f"candidates/query {stats['candidates'] / max(1, stats['checked']):.1f}")
+    print("=" * 60)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+"""Startup Sandbox - Page cache benchmark
+
+بازدید مکرر /game و /report (مثلاً refresh یا برگشت به صفحه) در سه حالت:
+
+1. بدون cache (PAGE_CACHE_ENABLED=0): هر بار کوئری + رندر Jinja
+2. با cache: بدنه gzip آماده از حافظه
+3. اعتبارسنجی با If-None-Match: پاسخ 304 بدون بدنه
+
+برای هر حالت: زمان سرور و بایت‌های بدنه در هر درخواست.
+
+اجرا:
+    python benchmarks/bench_page_cache.py [--requests 300] [--turns 10]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+from unittest import mock
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import app as app_module
+
+
+def _played_client(tmp: str, turns: int, enabled: bool):
+    flask_app = app_module.create_app({
+        "DB_PATH": os.path.join(tmp, f"bench-{int(enabled)}.db"), "TESTING": True,
+        "SPECULATION_ENABLED": False, "PAGE_CACHE_ENABLED": enabled,
+    })
+    repo = flask_app.extensions["repository"]
+    client = flask_app.test_client()
+    client.post("/new_game", data={"username": "bench", "startup_name": "BenchCo"})
+    with client.session_transaction() as sess:
+        game_id = sess["game_id"]
+    for _ in range(turns):
+        client.get("/game")
+        choice = repo.list_choices(game_id, repo.latest_scenario(game_id).id)[0]
+        client.post("/api/turn", json={"choice_id": choice.id})
+    return flask_app, client, game_id
+
+
+def _measure(client, path: str, requests: int, headers: dict) -> tuple[float, float]:
+    client.get(path, headers=headers)  # گرم کردن
+    size = 0
+    t0 = time.perf_counter()
+    for _ in range(requests):
+        size += len(client.get(path, headers=headers).get_data())
+    return (time.perf_counter() - t0) / requests * 1000, size / requests
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="benchmark cache صفحه‌های رندرشده")
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--turns", type=int, default=10, help="نوبت‌های بازی‌شده قبل از اندازه‌گیری")
+    args = parser.parse_args(argv)
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp, contextlib.redirect_stdout(io.StringIO()), \
+            mock.patch.dict(os.environ, {"GEMINI_API_KEY": "", "OPENROUTER_API_KEY": ""}):
+        gz = {"Accept-Encoding": "gzip"}
+        for enabled in (False, True):
+            flask_app, client, game_id = _played_client(tmp, args.turns, enabled)
+            for path in ("/game", f"/report/{game_id}"):
+                label = "cache" if enabled else "no cache"
+                rows.append((path.split("/")[1], label, *_measure(client, path, args.requests, gz)))
+                if enabled:
+                    etag = client.get(path, headers=gz).headers["ETag"]
+                    rows.append((path.split("/")[1], "304", *_measure(
+                        client, path, args.requests, {**gz, "If-None-Match": etag})))
+            stats = dict(flask_app.extensions["page_cache"].stats)
+            flask_app.extensions["repository"].close()
+
+    print("=" * 60)
+    print(f"requests={args.requests}  turns={args.turns}  (Accept-Encoding: gzip)")
+    for page, label, ms, size in rows:
+        print(f"  /{page:<7} {label:<9} {ms:7.3f} ms/request  {size:8.0f} bytes/request")
+    print(f"  page_cache: {stats}")
+    print("=" * 60)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
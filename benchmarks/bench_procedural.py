@@ -0,0 +1,51 @@
+"""Startup Sandbox - Procedural generator benchmark
+
+سناریوساز محلی (procedural.py) در برابر مسیر AI:
+
+1. زمان تولید هر سناریو (میکروثانیه) برای هر نوع سناریو
+2. تنوع: نسبت توضیحات و ترکیب گزینه‌های یکتا در N سناریو
+
+اجرا:
+    python benchmarks/bench_procedural.py [--count 5000]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from procedural import PROBLEMS, ProceduralScenarioGenerator
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="benchmark سناریوساز محلی")
+    parser.add_argument("--count", type=int, default=5000)
+    args = parser.parse_args(argv)
+
+    gen = ProceduralScenarioGenerator()
+    print("=" * 60)
+    print(f"count={args.count}")
+    for scenario_type in PROBLEMS:
+        rng = random.Random(1)
+        times, descriptions, option_sets = [], set(), set()
+        for i in range(args.count):
+            t0 = time.perf_counter()
+            data = gen.generate(rng, scenario_type, 1 + i % 5, "BenchCo")
+            times.append((time.perf_counter() - t0) * 1_000_000)
+            descriptions.add(data["description"])
+            option_sets.add(tuple(sorted(o["text"] for o in data["options"])))
+        print(f"  {scenario_type:<15} median={statistics.median(times):6.1f} µs  "
+              f"p99={sorted(times)[int(0.99 * len(times))]:6.1f} µs  "
+              f"unique descriptions={len(descriptions) / args.count:6.1%}  option sets={len(option_sets)}")
+    print("=" * 60)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,93 @@
+"""Startup Sandbox - Report chart series benchmark
+
+هزینه ساخت سری‌های نمودار /report برای بازی‌های کوتاه و خیلی طولانی:
+
+1. logs: خواندن همه logهای بازی (list_logs) و ساخت مسیر از impactها (روش بدون stat_history)
+2. packed: get_game (ستون stat_history) + chart_series با کاهش به CHART_POINTS نقطه
+
+با stat_history زمان باید تقریباً مستقل از تعداد نوبت‌ها باشد.
+مسیر محاسبه: NumPy اگر نصب باشد، وگرنه array.
+
+اجرا:
+    python benchmarks/bench_report_series.py [--turns 50,500,5000] [--repeat 30]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import stat_history
+from ai_accounting import percentile
+from stat_history import chart_series, from_logs
+from storage import GameRepository, make_backend
+
+RANGES = {"budget": (0, None), "reputation": (0, 100), "morale": (0, 100)}
+
+
+def _play(repo: GameRepository, user_id: int, turns: int) -> int:
+    game_id = repo.create_game(user_id, f"Co{turns}", 1000, 50, 80)
+    budget = 1000
+    for turn in range(1, turns + 1):
+        budget = max(0, budget + (37 * turn % 101) - 50)
+        repo.record_turn(game_id, budget, 30 + turn % 60, 40 + turn % 50, turn + 1, {
+            "turn": turn, "scenario_title": f"s{turn}", "choice_text": "c",
+            "cost_impact": 1, "reputation_impact": 1, "morale_impact": -1, "ai_response": "داستان " * 20,
+        })
+    return game_id
+
+
+def _timed(fn, repeat: int) -> list:
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t0) * 1000)
+    return times
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="benchmark سری‌های نمودار گزارش")
+    parser.add_argument("--turns", default="50,500,5000")
+    parser.add_argument("--repeat", type=int, default=30)
+    args = parser.parse_args(argv)
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        repo = GameRepository(make_backend(os.path.join(tmp, "bench.db")))
+        with contextlib.redirect_stdout(io.StringIO()):
+            user_id = repo.get_or_create_user("bench")
+        for turns in (int(t) for t in args.turns.split(",")):
+            game_id = _play(repo, user_id, turns)
+
+            def from_log_rows():
+                game = repo.get_game(game_id)
+                rows = repo.list_logs(game_id)
+                impacts = [(r.cost_impact, r.reputation_impact, r.morale_impact) for r in rows]
+                return chart_series(from_logs((game.budget, game.reputation, game.morale), impacts), RANGES)
+
+            def from_packed():
+                return chart_series(repo.get_game(game_id).stat_history, RANGES)
+
+            blob = len(repo.get_game(game_id).stat_history)
+            results.append((turns, blob, _timed(from_log_rows, args.repeat), _timed(from_packed, args.repeat)))
+        repo.close()
+
+    print("=" * 60)
+    print(f"series path: {'numpy' if stat_history.np is not None else 'array'}  points={stat_history.CHART_POINTS}")
+    for turns, blob, logs_ms, packed_ms in results:
+        print(f"  turns {turns:<6} blob {blob:>6} B   logs p50 {percentile(logs_ms, 0.5):7.3f} ms   "
+              f"packed p50 {percentile(packed_ms, 0.5):6.3f} ms  p99 {percentile(packed_ms, 0.99):6.3f} ms")
+    print("=" * 60)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
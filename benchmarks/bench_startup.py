@@ -0,0 +1,80 @@
+"""Startup Sandbox - Startup time benchmark
+
+زمان import ماژول app را با `python -X importtime` اندازه می‌گیرد تا
+هزینه cold start (worker های gunicorn، تست‌ها) قابل پیگیری باشد.
+
+اجرا:
+    python benchmarks/bench_startup.py [--runs 5] [--top 15]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def _run_importtime(code: str) -> tuple[float, list[tuple[int, int, str]]]:
+    """یک پروسس تازه اجرا می‌کند و (زمان دیواری، ردیف‌های importtime) برمی‌گرداند."""
+    env = dict(os.environ)
+    # هیچ credentialی لازم نیست؛ import نباید به شبکه یا SDK دست بزند
+    env.pop("GEMINI_API_KEY", None)
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=PROJECT_ROOT, env=env, capture_output=True, text=True,
+    )
+    wall = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr[-2000:])
+
+    rows = []
+    for line in proc.stderr.splitlines():
+        # import time:       self [us] |   cumulative | imported package
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        try:
+            self_us, cum_us, name = line[len("import time:"):].split("|", 2)
+            rows.append((int(self_us), int(cum_us), name.rstrip()))
+        except ValueError:
+            continue
+    return wall, rows
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="benchmark زمان startup")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args(argv)
+
+    walls, app_cum = [], []
+    last_rows = []
+    for _ in range(args.runs):
+        wall, rows = _run_importtime("import app")
+        walls.append(wall * 1000)
+        app_cum.extend(cum for _, cum, name in rows if name.strip() == "app")
+        last_rows = rows
+
+    print("=" * 50)
+    print(f"runs: {args.runs}")
+    print(f"process wall time (ms): median={statistics.median(walls):.1f} min={min(walls):.1f}")
+    if app_cum:
+        print(f"import app cumulative (ms): median={statistics.median(app_cum) / 1000:.1f}")
+
+    heavy = [n.strip() for _, _, n in last_rows if n.strip().split(".")[0] in ("google", "requests", "httpx")]
+    print(f"heavy SDK modules imported at startup: {len(heavy)}")
+
+    print(f"\ntop {args.top} top-level imports by cumulative time:")
+    # ردیف‌های تو در تو با فاصله بیشتر (بعد از "|") تورفتگی دارند
+    top_level = [r for r in last_rows if not r[2].startswith("  ")]
+    for self_us, cum_us, name in sorted(top_level, key=lambda r: r[1], reverse=True)[:args.top]:
+        print(f"  {cum_us / 1000:8.1f} ms  {name.strip()}")
+    print("=" * 50)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
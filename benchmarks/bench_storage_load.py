@@ -0,0 +1,98 @@
+"""Startup Sandbox - Storage write-throughput benchmark
+
+چند پروسس (مثل workerهای gunicorn) هم‌زمان نوبت بازی ثبت می‌کنند
+(record_turn: UPDATE games + INSERT logs) و throughput برای تعداد shardهای
+مختلف مقایسه می‌شود.
+
+اجرا:
+    python benchmarks/bench_storage_load.py [--shards 1 2 4 8] [--workers 8] [--writes 400]
+"""
+
+import argparse
+import contextlib
+import io
+import multiprocessing as mp
+import os
+import random
+import sys
+import tempfile
+import time
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from storage import GameRepository, make_backend
+
+
+def _quiet_repo(db_path: str, shards: int) -> GameRepository:
+    repo = GameRepository(make_backend(db_path, shards, pool_size=2))
+    # migrate_database پر حرف است؛ خروجی benchmark را شلوغ نکند
+    with contextlib.redirect_stdout(io.StringIO()):
+        repo.backend.ensure_schema()
+    return repo
+
+
+def _worker(db_path: str, shards: int, game_ids: list[int], writes: int, seed: int, start_evt) -> int:
+    repo = _quiet_repo(db_path, shards)
+    rnd = random.Random(seed)
+    start_evt.wait()
+    # record_turn شرطی است: turn هر بازی باید همان turn فعلی‌اش باشد
+    turns = {game_id: repo.get_game(game_id).turn for game_id in game_ids}
+    for i in range(writes):
+        game_id = rnd.choice(game_ids)
+        turn = turns[game_id]
+        repo.record_turn(game_id, 1000 - i, 50, 80, turn + 1, {
+            "turn": turn, "scenario_title": "bench", "choice_text": "bench",
+            "cost_impact": -1, "ai_response": "x" * 200,
+        })
+        turns[game_id] = turn + 1
+    repo.close()
+    return writes
+
+
+def run(shards: int, workers: int, writes: int, games: int) -> float:
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "startup.db")
+        repo = _quiet_repo(db_path, shards)
+        user_id = repo.get_or_create_user("bench")
+        game_ids = [repo.create_game(user_id, f"Co{i}", 1000, 50, 80) for i in range(games)]
+        repo.close()
+
+        ctx = mp.get_context("spawn")
+        start_evt = ctx.Manager().Event()
+        with ctx.Pool(workers) as pool:
+            results = [
+                # هر worker بازی‌های خودش را دارد (record_turn شرطی روی turn است)
+                pool.apply_async(_worker, (db_path, shards, game_ids[seed::workers], writes, seed, start_evt))
+                for seed in range(workers)
+            ]
+            time.sleep(0.5)  # اجازه بده همه workerها آماده شوند
+            t0 = time.perf_counter()
+            start_evt.set()
+            total = sum(r.get() for r in results)
+            elapsed = time.perf_counter() - t0
+    return total / elapsed
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="benchmark throughput نوشتن بر اساس تعداد shard")
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--writes", type=int, default=400, help="تعداد نوبت برای هر worker")
+    parser.add_argument("--games", type=int, default=256)
+    args = parser.parse_args(argv)
+
+    print("=" * 50)
+    print(f"workers={args.workers} writes/worker={args.writes} games={args.games}")
+    baseline = None
+    for shards in args.shards:
+        tps = run(shards, args.workers, args.writes, args.games)
+        baseline = baseline or tps
+        print(f"  shards={shards:<3} {tps:9.0f} turns/s  (x{tps / baseline:.2f})")
+    print("=" * 50)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,122 @@
+"""Startup Sandbox - Streaming validation benchmark
+
+زمان رسیدن به fallback برای پاسخ‌های نامعتبر AI: صبر برای کل پاسخ و بعد
+json.loads (رفتار قبلی) در برابر parse هم‌زمان با stream و توقف زودهنگام.
+
+stream با تأخیر ثابت برای هر تکه شبیه‌سازی می‌شود (پیش‌فرض ۲۰ کاراکتر در ۲۵ms،
+تقریباً سرعت خروجی Gemini flash)؛ هیچ درخواست شبکه‌ای زده نمی‌شود.
+
+اجرا:
+    python benchmarks/bench_stream_validation.py [--chunk 20] [--delay-ms 25]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from json_stream import ScenarioStreamValidator, StreamAbort
+
+_OPTIONS = [
+    {"text": f"گزینه {i} - توضیح کوتاه و واضح درباره تصمیم", "cost": -150 * i, "reputation": 5 - i,
+     "morale": i * 3 - 4, "risk_level": 2 + i}
+    for i in range(3)
+]
+_DESCRIPTION = "یکی از مشتری‌های بزرگ قرارداد را لغو کرده و تیم فروش نگران است. " * 3
+
+CASES = {
+    "valid": {"title": "لغو قرارداد", "description": _DESCRIPTION, "options": _OPTIONS},
+    "string numbers": {"title": "لغو قرارداد", "description": _DESCRIPTION,
+                       "options": [{**o, "cost": str(o["cost"])} for o in _OPTIONS]},
+    "two options": {"title": "لغو قرارداد", "description": _DESCRIPTION, "options": _OPTIONS[:2]},
+    "options as object": {"title": "لغو قرارداد", "description": _DESCRIPTION, "options": {"a": _OPTIONS[0]}},
+}
+
+
+def _render(case: str) -> str:
+    text = "```json\n" + json.dumps(CASES[case], ensure_ascii=False, indent=2) + "\n```"
+    return text
+
+
+def _prose() -> str:
+    return "متاسفانه در حال حاضر نمی‌توانم سناریو بسازم، اما چند ایده کلی دارم. " * 12
+
+
+def _stream(text: str, chunk: int, delay: float):
+    for i in range(0, len(text), chunk):
+        time.sleep(delay)
+        yield text[i:i + chunk]
+
+
+def run_full(text: str, chunk: int, delay: float) -> tuple[float, int, bool]:
+    t0 = time.perf_counter()
+    received = "".join(_stream(text, chunk, delay))
+    try:
+        data = json.loads(received.split("```json")[1].split("```")[0]) if "```json" in received else json.loads(received)
+        ok = isinstance(data.get("options"), list) and len(data["options"]) >= 3 and all(
+            isinstance(o.get("cost"), (int, float)) for o in data["options"]
+        )
+    except Exception:
+        ok = False
+    return (time.perf_counter() - t0) * 1000, len(received), ok
+
+
+def run_streaming(text: str, chunk: int, delay: float) -> tuple[float, int, bool]:
+    t0 = time.perf_counter()
+    validator = ScenarioStreamValidator()
+    received = 0
+    ok = True
+    stream = _stream(text, chunk, delay)
+    try:
+        for part in stream:
+            received += len(part)
+            if validator.feed(part):
+                break
+        validator.finish()
+    except StreamAbort:
+        ok = False
+    finally:
+        stream.close()
+    return (time.perf_counter() - t0) * 1000, received, ok
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="benchmark اعتبارسنجی streaming پاسخ سناریو")
+    parser.add_argument("--chunk", type=int, default=20, help="کاراکتر در هر تکه stream")
+    parser.add_argument("--delay-ms", type=float, default=25.0, help="تأخیر هر تکه")
+    args = parser.parse_args(argv)
+    delay = args.delay_ms / 1000
+
+    texts = {name: _render(name) for name in CASES}
+    texts["prose"] = _prose()
+
+    print("=" * 72)
+    print(f"chunk={args.chunk} chars, delay={args.delay_ms:.0f} ms/chunk")
+    print(f"{'case':<18} {'full wait':>12} {'streaming':>12} {'chars read':>16} {'valid':>6}")
+    for name, text in texts.items():
+        full_ms, full_chars, full_ok = run_full(text, args.chunk, delay)
+        stream_ms, stream_chars, stream_ok = run_streaming(text, args.chunk, delay)
+        assert full_ok == stream_ok, name
+        print(f"{name:<18} {full_ms:9.0f} ms {stream_ms:9.0f} ms {stream_chars:7d}/{full_chars:<7d} {str(stream_ok):>6}")
+
+    # سربار parse افزایشی روی CPU (بدون تأخیر شبکه)
+    text = texts["valid"]
+    t0 = time.perf_counter()
+    rounds = 200
+    for _ in range(rounds):
+        validator = ScenarioStreamValidator()
+        for i in range(0, len(text), args.chunk):
+            validator.feed(text[i:i + args.chunk])
+    per_kb = (time.perf_counter() - t0) / rounds / (len(text.encode("utf-8")) / 1024) * 1e6
+    print(f"parser CPU: {per_kb:.0f} µs per KB of response")
+    print("=" * 72)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
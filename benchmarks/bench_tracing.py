@@ -0,0 +1,85 @@
+"""Startup Sandbox - Tracing overhead benchmark
+
+هزینه tracing روی یک نوبت کامل (POST /action -> GET /next_turn -> GET /game) با
+test client Flask و بدون AI (سناریو و داستان از fallback):
+
+1. off: TRACING_DIR خالی
+2. sample 0: tracer فعال ولی هیچ traceی ضبط نمی‌شود (هزینه hookها و ContextVar)
+3. sample 1: همه spanها ضبط و در صف exporter گذاشته می‌شوند
+
+هر تکرار یک /new_game (خارج از زمان‌گیری) هم دارد؛ تعداد span و حجم خروجی شامل آن است.
+
+اجرا:
+    python benchmarks/bench_tracing.py [--turns 200]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+from unittest import mock
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import app as app_module
+from ai_accounting import percentile
+
+
+def _run(tmp: str, name: str, turns: int, trace_dir: str, sample_rate: float) -> tuple[list, dict | None]:
+    flask_app = app_module.create_app({
+        'DB_PATH': os.path.join(tmp, f"{name}.db"), 'TESTING': True, 'SPECULATION_ENABLED': False,
+        'DEDUP_ENABLED': False, 'AI_GOVERNOR_ENABLED': False,
+        'TRACING_DIR': trace_dir, 'TRACING_SAMPLE_RATE': sample_rate,
+    })
+    repo = flask_app.extensions['repository']
+    client = flask_app.test_client()
+    times = []
+    for _ in range(turns):
+        client.post('/new_game', data={'username': 'bench', 'startup_name': 'BenchCo'}, follow_redirects=True)
+        with client.session_transaction() as sess:
+            game_id = sess['game_id']
+        choice = repo.list_choices(game_id, repo.latest_scenario(game_id).id)[0]
+        t0 = time.perf_counter()
+        client.post('/action', data={'choice_id': str(choice.id)})
+        client.get('/next_turn', follow_redirects=True)
+        times.append((time.perf_counter() - t0) * 1000)
+    tracer = flask_app.extensions['tracer']
+    stats = None
+    if tracer is not None:
+        tracer.close()
+        stats = dict(tracer.exporter.stats)
+    repo.close()
+    return times, stats
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="benchmark هزینه tracing روی یک نوبت")
+    parser.add_argument("--turns", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp, \
+            mock.patch.dict(os.environ, {'GEMINI_API_KEY': '', 'OPENROUTER_API_KEY': ''}), \
+            contextlib.redirect_stdout(io.StringIO()):
+        for name, trace_dir, rate in (("off", "", 1.0), ("sample 0", os.path.join(tmp, "t0"), 0.0),
+                                      ("sample 1", os.path.join(tmp, "t1"), 1.0)):
+            results.append((name, *_run(tmp, name.replace(" ", ""), args.turns, trace_dir, rate)))
+        size_kb = sum(os.path.getsize(os.path.join(tmp, "t1", f)) for f in os.listdir(os.path.join(tmp, "t1"))) / 1024
+
+    print("=" * 60)
+    print(f"turns={args.turns}  (POST /action + GET /next_turn + GET /game)")
+    for name, times, stats in results:
+        spans = f"  {stats['written'] / args.turns:.0f} span/iteration" if stats and stats["written"] else ""
+        print(f"  {name:<9} p50 {percentile(times, 0.5):6.2f} ms  p99 {percentile(times, 0.99):6.2f} ms{spans}")
+    print(f"  sample 1 output {size_kb / args.turns:.1f} KB/iteration")
+    print("=" * 60)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
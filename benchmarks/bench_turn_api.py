@@ -0,0 +1,103 @@
+"""Startup Sandbox - Turn flow benchmark
+
+هزینه یک نوبت در دو مسیر:
+
+1. HTML: POST /action (صفحه result) → GET /next_turn (302) → GET /game (صفحه کامل)
+2. JSON: POST /api/turn (static/script.js همان صفحه را به‌روز می‌کند)
+
+برای هر مسیر: تعداد round-trip، بایت‌های پاسخ (بدنه + هدرها) و زمان سرور در هر نوبت.
+assetها (style.css, script.js) جدا گزارش می‌شوند: هر صفحه HTML آن‌ها را دوباره
+لازم دارد (بدون cache یک درخواست کامل، با cache حداقل یک اعتبارسنجی).
+
+اجرا:
+    python benchmarks/bench_turn_api.py [--turns 30]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+from unittest import mock
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import app as app_module
+
+
+def _size(response) -> int:
+    headers = sum(len(k) + len(v) + 4 for k, v in response.headers.items())
+    return len(response.get_data()) + headers
+
+
+def _new_client(tmp: str, name: str):
+    flask_app = app_module.create_app({
+        "DB_PATH": os.path.join(tmp, f"{name}.db"), "TESTING": True, "SPECULATION_ENABLED": False,
+    })
+    client = flask_app.test_client()
+    client.post("/new_game", data={"username": name, "startup_name": "BenchCo"})
+    with client.session_transaction() as sess:
+        game_id = sess["game_id"]
+    client.get("/game")
+    return flask_app, client, game_id
+
+
+def _choice_id(repo, game_id: int) -> int:
+    return repo.list_choices(game_id, repo.latest_scenario(game_id).id)[0].id
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="benchmark نوبت HTML در برابر /api/turn")
+    parser.add_argument("--turns", type=int, default=30)
+    args = parser.parse_args(argv)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp, contextlib.redirect_stdout(io.StringIO()), \
+            mock.patch.dict(os.environ, {"GEMINI_API_KEY": "", "OPENROUTER_API_KEY": ""}):
+        flask_app, client, game_id = _new_client(tmp, "html")
+        repo = flask_app.extensions["repository"]
+        asset_bytes = sum(_size(client.get(f"/static/{name}")) for name in ("style.css", "script.js"))
+        trips = size = 0
+        seconds = 0.0
+        for _ in range(args.turns):
+            choice_id = _choice_id(repo, game_id)
+            t0 = time.perf_counter()
+            for response in (client.post("/action", data={"choice_id": str(choice_id)}),
+                             client.get("/next_turn"),
+                             client.get("/game")):
+                trips += 1
+                size += _size(response)
+            seconds += time.perf_counter() - t0
+        results["HTML"] = (trips, size, seconds, 2)
+        repo.close()
+
+        flask_app, client, game_id = _new_client(tmp, "api")
+        repo = flask_app.extensions["repository"]
+        trips = size = 0
+        seconds = 0.0
+        for _ in range(args.turns):
+            choice_id = _choice_id(repo, game_id)
+            t0 = time.perf_counter()
+            response = client.post("/api/turn", json={"choice_id": choice_id})
+            seconds += time.perf_counter() - t0
+            trips += 1
+            size += _size(response)
+        results["JSON"] = (trips, size, seconds, 0)
+        repo.close()
+
+    print("=" * 60)
+    print(f"turns={args.turns}  assets (style.css + script.js) = {asset_bytes} bytes")
+    for name, (trips, size, seconds, pages) in results.items():
+        print(f"  {name:<5} round-trips/turn={trips / args.turns:.0f}  bytes/turn={size / args.turns:8.0f}  "
+              f"server={seconds / args.turns * 1000:6.2f} ms  page loads/turn={pages} "
+              f"(+{pages * 2} asset revalidations, or +{pages * asset_bytes} bytes uncached)")
+    print("=" * 60)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+"""Startup Sandbox - Turn telemetry benchmark
+
+مسیر نوشتن نوبت (repo.record_turn) زیر رقابت چند thread روی یک فایل دیتابیس:
+
+1. بدون telemetry: ai_response و choice_text در همان تراکنش UPDATE games
+2. با telemetry (telemetry.py): تراکنش فقط وضعیت و ردیف کوچک logs؛ متن‌ها در segment NDJSON
+
+برای هر حالت: p50/p99 زمان record_turn، throughput، حجم دیتابیس (با WAL) و
+زمان بارگذاری بعدی segmentها با loader (کاری که از مسیر درخواست بیرون رفته).
+
+اجرا:
+    python benchmarks/bench_turn_telemetry.py [--threads 8] [--turns 300] [--story-chars 1500]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import threading
+import time
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from ai_accounting import percentile
+from storage import GameRepository, make_backend
+from telemetry import TelemetryLog, load_segments
+
+
+def _db_bytes(db_path: str) -> int:
+    return sum(os.path.getsize(p) for p in (db_path, db_path + "-wal") if os.path.exists(p))
+
+
+def _run(tmp: str, threads: int, turns: int, story: str, with_telemetry: bool) -> dict:
+    db_path = os.path.join(tmp, f"bench-{int(with_telemetry)}.db")
+    telemetry_dir = os.path.join(tmp, f"telemetry-{int(with_telemetry)}")
+    repo = GameRepository(make_backend(db_path, pool_size=threads))
+    if with_telemetry:
+        repo.telemetry = TelemetryLog(telemetry_dir)
+    with contextlib.redirect_stdout(io.StringIO()):
+        user_id = repo.get_or_create_user("bench")
+    game_ids = [repo.create_game(user_id, f"Co{i}", 1000, 50, 80) for i in range(threads)]
+    latencies: list[float] = []
+    lock = threading.Lock()
+
+    def worker(game_id: int) -> None:
+        local = []
+        for turn in range(1, turns + 1):
+            log = {"turn": turn, "scenario_title": "سناریو", "scenario_type": "CRISIS",
+                   "choice_text": "گزینه انتخاب‌شده " * 4, "cost_impact": -10, "ai_response": story}
+            t0 = time.perf_counter()
+            repo.record_turn(game_id, 1000 - turn, 50, 80, turn + 1, log)
+            local.append((time.perf_counter() - t0) * 1000)
+        with lock:
+            latencies.extend(local)
+
+    workers = [threading.Thread(target=worker, args=(g,)) for g in game_ids]
+    t0 = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - t0
+    size = _db_bytes(db_path)
+
+    load_seconds = None
+    if with_telemetry:
+        repo.telemetry.close()
+        t1 = time.perf_counter()
+        load_segments(telemetry_dir, repo)
+        load_seconds = time.perf_counter() - t1
+    repo.close()
+    return {
+        "p50": percentile(latencies, 0.5), "p99": percentile(latencies, 0.99),
+        "per_second": len(latencies) / elapsed, "db_kb": size // 1024, "load_seconds": load_seconds,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="benchmark تراکنش نوبت با و بدون telemetry")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--turns", type=int, default=300, help="نوبت برای هر thread")
+    parser.add_argument("--story-chars", type=int, default=1500)
+    args = parser.parse_args(argv)
+    story = ("داستان نتیجه تصمیم " * (args.story_chars // 18 + 1))[:args.story_chars]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        rows = {name: _run(tmp, args.threads, args.turns, story, enabled)
+                for name, enabled in (("inline", False), ("telemetry", True))}
+
+    print("=" * 60)
+    print(f"threads={args.threads}  turns/thread={args.turns}  story={args.story_chars} chars")
+    for name, r in rows.items():
+        line = (f"  {name:<10} record_turn p50 {r['p50']:6.2f} ms  p99 {r['p99']:6.2f} ms  "
+                f"{r['per_second']:8.0f} turns/s  db {r['db_kb']} KB")
+        if r["load_seconds"] is not None:
+            line += f"  (loader {r['load_seconds']:.2f} s)"
+        print(line)
+    print("=" * 60)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+"""Startup Sandbox - Static Asset Build
+
+ساخت نسخه production فایل‌های static (style.css, script.js):
+
+- minify محافظه‌کارانه (CSS: حذف کامنت و فاصله اضافه؛ JS: فقط تورفتگی، خطوط
+  خالی و کامنت‌های تک‌خطی — شکست خطوط حفظ می‌شود تا ASI دست نخورد)
+- نام فایل با hash محتوا: static/dist/style.3f2a9c1b0d.css
+- نسخه‌های از پیش فشرده .gz (و .br اگر پکیج brotli نصب باشد)
+- static/dist/manifest.json: نام اصلی -> مسیر hash‌دار
+
+اپ با وجود manifest، در url_for('static', ...) نام hash‌دار را می‌گذارد و فایل‌های
+dist را با Cache-Control: immutable و فشرده‌سازی مناسب Accept-Encoding سرو می‌کند.
+بدون build همه‌چیز مثل قبل از static/ سرو می‌شود.
+
+اجرا:
+    python build_assets.py [--static static]
+"""
+
+import argparse
+import glob
+import gzip
+import hashlib
+import json
+import os
+import re
+import sys
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ASSETS = ("style.css", "script.js")
+DIST_DIR = "dist"
+MANIFEST = "manifest.json"
+
+
+# ========== Minify ==========
+
+_CSS_STRING = re.compile(r"""("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')""")
+
+
+def _minify_css_code(code: str) -> str:
+    code = re.sub(r"\s+", " ", code)
+    return re.sub(r"\s*([{};,>])\s*", r"\1", code)
+
+
+def minify_css(text: str) -> str:
+    text = re.sub(r"/\*.*?\*/", "", text, flags=re.S)
+    # رشته‌ها (مثلاً data URI داخل url("...")) دست نمی‌خورند
+    parts = _CSS_STRING.split(text)
+    text = "".join(part if i % 2 else _minify_css_code(part) for i, part in enumerate(parts))
+    return text.replace(";}", "}").strip()
+
+
+def minify_js(text: str) -> str:
+    lines = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith("//"):
+            continue
+        lines.append(line)
+    return "\n".join(lines) + "\n"
+
+
+MINIFIERS = {".css": minify_css, ".js": minify_js}
+
+
+# ========== Build ==========
+
+def _write(path: str, data: bytes) -> None:
+    with open(path, "wb") as fh:
+        fh.write(data)
+
+
+def build(static_dir: str = "static") -> dict:
+    """ساخت dist و manifest؛ manifest را برمی‌گرداند. نسخه‌های قبلی پاک می‌شوند."""
+    dist = os.path.join(static_dir, DIST_DIR)
+    os.makedirs(dist, exist_ok=True)
+    for old in glob.glob(os.path.join(dist, "*")):
+        os.remove(old)
+
+    manifest = {}
+    for name in ASSETS:
+        src = os.path.join(static_dir, name)
+        if not os.path.exists(src):
+            continue
+        stem, ext = os.path.splitext(name)
+        with open(src, encoding="utf-8") as fh:
+            data = MINIFIERS[ext](fh.read()).encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()[:10]
+        hashed = f"{stem}.{digest}{ext}"
+        path = os.path.join(dist, hashed)
+        _write(path, data)
+        # mtime=0: خروجی gzip قطعی است (build دوباره = همان بایت‌ها)
+        _write(path + ".gz", gzip.compress(data, compresslevel=9, mtime=0))
+        if brotli is not None:
+            _write(path + ".br", brotli.compress(data, quality=11))
+        manifest[name] = f"{DIST_DIR}/{hashed}"
+        print(f"📦 {name}: {os.path.getsize(src)} → {len(data)} bytes ({hashed})")
+
+    with open(os.path.join(dist, MANIFEST), "w", encoding="utf-8") as fh:
+        json.dump(manifest, fh, indent=2)
+    return manifest
+
+
+def load_manifest(static_dir: str) -> dict:
+    """manifest ساخته‌شده یا {} اگر build اجرا نشده است."""
+    try:
+        with open(os.path.join(static_dir, DIST_DIR, MANIFEST), encoding="utf-8") as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return {}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="minify، hash و فشرده‌سازی فایل‌های static")
+    parser.add_argument("--static", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "static"))
+    args = parser.parse_args(argv)
+    build(args.static)
+    if brotli is None:
+        print("⚠️ پکیج brotli نصب نیست؛ فقط نسخه .gz ساخته شد")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,247 @@
+"""Startup Sandbox - Corpus Snapshot
+
+corpus سناریوهای عمومی (scenarios با game_id IS NULL و choices آن‌ها: seed اولیه
+و شاخه‌های speculative بازیافتی) در یک فایل باینری فشرده و فقط‌خواندنی:
+
+- همه workerهای gunicorn همان فایل را mmap می‌کنند؛ صفحه‌ها در page cache
+  سیستم‌عامل مشترک‌اند و هر worker فقط جدول کوچک bucketها را در حافظه دارد.
+- انتخاب بر اساس (نوع، سختی) O(1) است: bucket -> بازه‌ای از اندیس رکوردها.
+- ساخت دوباره در فایل موقت و os.replace (اتمیک)؛ خواننده‌ها با دیدن inode تازه
+  فایل جدید را map می‌کنند و map قبلی با آخرین ارجاع آزاد می‌شود.
+
+قالب فایل (little-endian):
+    header   HEADER
+    types    n_types × (str_off, str_len)
+    buckets  n_buckets × BUCKET (type_idx, difficulty, start, count) -> members
+    members  n_records × u32 (اندیس رکوردها، گروه‌بندی‌شده بر اساس bucket)
+    records  n_records × RECORD
+    choices  n_choices × CHOICE
+    strings  متن‌های UTF-8 پشت سر هم
+
+اجرا:
+    python corpus_snapshot.py [--db startup.db] [--out corpus.snapshot]
+"""
+
+import argparse
+import mmap
+import os
+import sqlite3
+import struct
+import sys
+import time
+
+MAGIC = b"SSCORP01"
+HEADER = struct.Struct("<8sIIIII")      # magic, n_types, n_buckets, n_records, n_choices, strings_offset
+STRING = struct.Struct("<II")            # offset, length
+BUCKET = struct.Struct("<HHII")          # type_idx, difficulty, start, count
+MEMBER = struct.Struct("<I")
+RECORD = struct.Struct("<IIIIHHII")      # title, description, type_idx, difficulty, first_choice, n_choices
+CHOICE = struct.Struct("<IIiiiI")        # text, cost, reputation, morale, risk
+
+
+class SnapshotError(Exception):
+    """فایل snapshot نامعتبر یا ناقص است."""
+
+
+# ========== Build ==========
+
+def load_corpus(db_path: str) -> list[dict]:
+    """سناریوهای corpus به همان شکل add_scenario: {type, difficulty, title, description, options}"""
+    conn = sqlite3.connect(db_path)
+    try:
+        scenarios = conn.execute('''
+            SELECT id, scenario_type, difficulty_level, title, description
+            FROM scenarios WHERE game_id IS NULL ORDER BY id
+        ''').fetchall()
+        choices: dict[int, list] = {}
+        for row in conn.execute('''
+            SELECT c.scenario_id, c.text, c.cost_impact, c.reputation_impact, c.morale_impact, c.risk_level
+            FROM choices c JOIN scenarios s ON s.id = c.scenario_id
+            WHERE s.game_id IS NULL ORDER BY c.id
+        '''):
+            choices.setdefault(row[0], []).append({
+                "text": row[1] or "", "cost": row[2] or 0, "reputation": row[3] or 0,
+                "morale": row[4] or 0, "risk": row[5] or 0,
+            })
+    finally:
+        conn.close()
+    return [
+        {"type": s[1] or "", "difficulty": s[2] or 0, "title": s[3] or "", "description": s[4] or "",
+         "options": choices.get(s[0], [])}
+        for s in scenarios if choices.get(s[0])
+    ]
+
+
+def encode(corpus: list[dict]) -> bytes:
+    strings = bytearray()
+    interned: dict[str, tuple] = {}
+
+    def put(text: str) -> tuple:
+        if text not in interned:
+            data = text.encode("utf-8")
+            interned[text] = (len(strings), len(data))
+            strings.extend(data)
+        return interned[text]
+
+    types = sorted({sc["type"] for sc in corpus})
+    type_idx = {name: i for i, name in enumerate(types)}
+    groups: dict[tuple, list] = {}
+    for i, sc in enumerate(corpus):
+        groups.setdefault((type_idx[sc["type"]], int(sc["difficulty"])), []).append(i)
+
+    body = bytearray()
+    for name in types:
+        body += STRING.pack(*put(name))
+    members = []
+    for (t, d), indices in sorted(groups.items()):
+        body += BUCKET.pack(t, d, len(members), len(indices))
+        members.extend(indices)
+    for i in members:
+        body += MEMBER.pack(i)
+
+    choice_rows = bytearray()
+    n_choices = 0
+    for sc in corpus:
+        body += RECORD.pack(*put(sc["title"]), *put(sc["description"]),
+                            type_idx[sc["type"]], int(sc["difficulty"]), n_choices, len(sc["options"]))
+        for opt in sc["options"]:
+            choice_rows += CHOICE.pack(*put(opt["text"]), int(opt["cost"]), int(opt["reputation"]),
+                                       int(opt["morale"]), int(opt["risk"]))
+            n_choices += 1
+    body += choice_rows
+
+    strings_offset = HEADER.size + len(body)
+    header = HEADER.pack(MAGIC, len(types), len(groups), len(corpus), n_choices, strings_offset)
+    return header + bytes(body) + bytes(strings)
+
+
+def build_snapshot(db_path: str, out_path: str) -> dict:
+    """ساخت snapshot از دیتابیس و جایگزینی اتمیک فایل قبلی؛ آمار ساخت."""
+    t0 = time.perf_counter()
+    corpus = load_corpus(db_path)
+    data = encode(corpus)
+    tmp_path = f"{out_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as fh:
+        fh.write(data)
+        fh.flush()
+        os.fsync(fh.fileno())
+    os.replace(tmp_path, out_path)
+    return {"scenarios": len(corpus), "bytes": len(data), "seconds": round(time.perf_counter() - t0, 4)}
+
+
+# ========== Read ==========
+
+class CorpusSnapshot:
+    """یک فایل snapshot map‌شده؛ فقط جدول bucketها در حافظه process است."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as fh:
+            self.stat = os.fstat(fh.fileno())
+            if self.stat.st_size < HEADER.size:
+                raise SnapshotError(f"{path}: فایل ناقص")
+            self._mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, n_types, n_buckets, self.size, n_choices, self._strings = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise SnapshotError(f"{path}: قالب ناشناخته")
+
+        pos = HEADER.size
+        types = []
+        for _ in range(n_types):
+            types.append(self._text(*STRING.unpack_from(self._mm, pos)))
+            pos += STRING.size
+        self.types = types
+        self._buckets: dict[tuple, tuple] = {}
+        for _ in range(n_buckets):
+            t, d, start, count = BUCKET.unpack_from(self._mm, pos)
+            self._buckets[(types[t], d)] = (start, count)
+            pos += BUCKET.size
+        self._members = pos
+        self._records = pos + self.size * MEMBER.size
+        self._choices = self._records + self.size * RECORD.size
+
+    def _text(self, offset: int, length: int) -> str:
+        start = self._strings + offset
+        return self._mm[start:start + length].decode("utf-8")
+
+    def count(self, scenario_type: str, difficulty: int) -> int:
+        return self._buckets.get((scenario_type, int(difficulty)), (0, 0))[1]
+
+    def record(self, index: int) -> dict:
+        t_off, t_len, d_off, d_len, type_idx, difficulty, first, n = RECORD.unpack_from(
+            self._mm, self._records + index * RECORD.size)
+        options = []
+        for c in range(first, first + n):
+            x_off, x_len, cost, rep, morale, risk = CHOICE.unpack_from(self._mm, self._choices + c * CHOICE.size)
+            options.append({"text": self._text(x_off, x_len), "cost": cost, "reputation": rep,
+                            "morale": morale, "risk": risk})
+        return {"title": self._text(t_off, t_len), "description": self._text(d_off, d_len),
+                "scenario_type": self.types[type_idx], "difficulty": difficulty, "options": options}
+
+    def pick(self, scenario_type: str, difficulty: int, rng, exclude_titles=()) -> dict | None:
+        """یک سناریوی تصادفی از bucket (نوع، سختی)؛ عنوان‌های exclude رد می‌شوند."""
+        start, count = self._buckets.get((scenario_type, int(difficulty)), (0, 0))
+        if not count:
+            return None
+        first = rng.randrange(count)
+        for step in range(count):
+            (index,) = MEMBER.unpack_from(self._mm, self._members + (start + (first + step) % count) * MEMBER.size)
+            data = self.record(index)
+            if data["title"] not in exclude_titles:
+                return data
+        return None
+
+
+class SnapshotReader:
+    """snapshot فعلی فایل path؛ حداکثر هر check_interval ثانیه inode فایل را چک می‌کند."""
+
+    def __init__(self, path: str, check_interval: float = 5.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._snapshot: CorpusSnapshot | None = None
+        self._checked = 0.0
+        self.stats = {"loads": 0, "hits": 0, "misses": 0, "errors": 0}
+
+    def current(self) -> CorpusSnapshot | None:
+        now = time.monotonic()
+        if self._snapshot is not None and now - self._checked < self.check_interval:
+            return self._snapshot
+        self._checked = now
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return self._snapshot
+        old = self._snapshot
+        if old is None or (st.st_ino, st.st_mtime_ns) != (old.stat.st_ino, old.stat.st_mtime_ns):
+            try:
+                # map قدیمی بسته نمی‌شود؛ threadی که هنوز از آن می‌خواند کارش را تمام می‌کند
+                self._snapshot = CorpusSnapshot(self.path)
+                self.stats["loads"] += 1
+            except (OSError, ValueError, struct.error, SnapshotError) as e:
+                self.stats["errors"] += 1
+                print(f"⚠️ snapshot corpus خوانده نشد: {e}")
+        return self._snapshot
+
+    def pick(self, scenario_type: str, difficulty: int, rng, exclude_titles=()) -> dict | None:
+        snapshot = self.current()
+        data = snapshot.pick(scenario_type, difficulty, rng, exclude_titles) if snapshot else None
+        self.stats["hits" if data else "misses"] += 1
+        return data
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="ساخت snapshot باینری corpus سناریوها (برای mmap)")
+    parser.add_argument("--db", default=os.getenv("STARTUP_DB_PATH", "startup.db"))
+    parser.add_argument("--out", default=os.getenv("CORPUS_SNAPSHOT") or "corpus.snapshot")
+    args = parser.parse_args(argv)
+    try:
+        stats = build_snapshot(args.db, args.out)
+    except sqlite3.Error as e:
+        print(f"❌ خطا در خواندن corpus: {e}")
+        return 1
+    print(f"📦 {args.out}: {stats['scenarios']} سناریو، {stats['bytes'] // 1024} KB در {stats['seconds']} s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
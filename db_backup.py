@@ -0,0 +1,173 @@
+"""Startup Sandbox - Online Backup
+
+نسخه پشتیبان زنده از دیتابیس‌ها (global و همه shardها) با backup API خود SQLite،
+به جای کپی فایل که وسط یک write ممکن است نسخه ناقص بسازد:
+
+- کپی صفحه‌به‌صفحه (pages در هر گام) با مکث کوتاه بین گام‌ها؛ قفل خواندن فقط
+  در طول یک گام نگه داشته می‌شود، پس writerهای /action منتظر نمی‌مانند.
+- تأخیر واقعی writer اندازه‌گیری می‌شود: بین گام‌ها یک اتصال جدا BEGIN IMMEDIATE
+  (و ROLLBACK بدون نوشتن) می‌زند و زمان گرفتن قفل نوشتن را ثبت می‌کند.
+- اگر دیتابیس مرتب تغییر کند، backup API از اول شروع می‌کند؛ بعد از چند بار
+  شروع دوباره، کل کپی در یک گام (یک snapshot) انجام می‌شود.
+- نسخه در فایل موقت ساخته، با PRAGMA integrity_check بررسی و بعد جایگزین می‌شود.
+- فقط keep نسخه آخر هر فایل نگه داشته می‌شود.
+
+اجرا:
+    python db_backup.py [--db startup.db] [--shards N] [--dest backups] [--keep 7]
+
+زمان‌بندی خودکار داخل اپ از طریق MaintenanceScheduler (BACKUP_DIR) انجام می‌شود.
+"""
+
+import argparse
+import glob
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime
+
+
+class BackupRestart(Exception):
+    """دیتابیس در طول backup بیش از حد تغییر کرد (برای رفتن به کپی یک‌گامی)."""
+
+
+class BackupError(Exception):
+    """نسخه پشتیبان ساخته شد اما integrity_check آن را تأیید نکرد."""
+
+
+def backup_database(src_path: str, dest_path: str, pages: int = 256, sleep: float = 0.01,
+                    max_restarts: int = 3, probe_timeout: float = 5.0) -> dict:
+    """backup آنلاین src_path در dest_path؛ آمار (حجم، توان، گام‌ها، انتظار writer) برمی‌گرداند.
+
+    max_step_ms: طولانی‌ترین گام کپی (مدت نگه داشتن قفل خواندن منبع؛ در WAL این قفل
+    writerها را نگه نمی‌دارد). max_writer_wait_ms: بیشترین زمانی که probe بین گام‌ها
+    برای گرفتن قفل نوشتن منبع صبر کرد؛ همان انتظاری که /action در آن لحظه می‌دید
+    (probe_timeout اگر قفل اصلاً آزاد نشد).
+    """
+    part_path = dest_path + ".part"
+    if os.path.exists(part_path):
+        os.remove(part_path)
+    os.makedirs(os.path.dirname(dest_path) or ".", exist_ok=True)
+
+    stats = {"path": dest_path, "restarts": 0, "steps": 0, "max_step_ms": 0.0, "max_writer_wait_ms": 0.0,
+             "single_step": False}
+    state = {"last": time.perf_counter(), "remaining": None, "probing": True}
+    probe = None
+
+    def probe_writer():
+        if not state["probing"]:
+            return
+        t = time.perf_counter()
+        try:
+            probe.execute("BEGIN IMMEDIATE")
+            probe.execute("ROLLBACK")
+        except sqlite3.OperationalError:
+            # قفل در probe_timeout آزاد نشد؛ همان زمان ثبت و probe خاموش می‌شود تا backup
+            # پشت یک تراکنش گیرکرده برای هر گام probe_timeout صبر نکند
+            state["probing"] = False
+        stats["max_writer_wait_ms"] = max(stats["max_writer_wait_ms"], (time.perf_counter() - t) * 1000)
+
+    def progress(status, remaining, total):
+        now = time.perf_counter()
+        # زمان بین دو callback منهای sleep = مدت یک گام
+        step_ms = max(0.0, (now - state["last"] - (sleep if stats["steps"] else 0)) * 1000)
+        stats["max_step_ms"] = max(stats["max_step_ms"], step_ms)
+        stats["steps"] += 1
+        if state["remaining"] is not None and remaining > state["remaining"]:
+            stats["restarts"] += 1
+            if stats["restarts"] > max_restarts:
+                raise BackupRestart()
+        state["remaining"] = remaining
+        probe_writer()
+        state["last"] = time.perf_counter()
+
+    t0 = time.perf_counter()
+    src = sqlite3.connect(src_path)
+    try:
+        # autocommit: فقط BEGIN IMMEDIATE/ROLLBACK صریح؛ بدون نوشتن، پس backup از اول شروع نمی‌شود
+        probe = sqlite3.connect(src_path, timeout=probe_timeout, isolation_level=None)
+        dest = sqlite3.connect(part_path)
+        try:
+            try:
+                src.backup(dest, pages=pages, progress=progress, sleep=sleep)
+            except BackupRestart:
+                # نوشتن مداوم: یک snapshot در یک گام (در WAL، writerها را بلاک نمی‌کند)
+                stats["single_step"] = True
+                step = time.perf_counter()
+                src.backup(dest, pages=-1)
+                stats["max_step_ms"] = max(stats["max_step_ms"], (time.perf_counter() - step) * 1000)
+                probe_writer()
+            result = dest.execute("PRAGMA integrity_check").fetchone()[0]
+        finally:
+            dest.close()
+    finally:
+        src.close()
+        if probe is not None:
+            probe.close()
+
+    if result != "ok":
+        os.remove(part_path)
+        raise BackupError(f"integrity_check نسخه {dest_path}: {result}")
+    os.replace(part_path, dest_path)
+
+    seconds = time.perf_counter() - t0
+    size = os.path.getsize(dest_path)
+    stats.update({
+        "bytes": size,
+        "seconds": round(seconds, 4),
+        "mb_per_s": round(size / 1024 / 1024 / seconds, 2) if seconds else None,
+        "max_step_ms": round(stats["max_step_ms"], 2),
+        "max_writer_wait_ms": round(stats["max_writer_wait_ms"], 2),
+    })
+    return stats
+
+
+def rotate(dest_dir: str, stem: str, keep: int) -> list[str]:
+    """حذف نسخه‌های قدیمی یک فایل؛ فقط keep نسخه آخر می‌ماند."""
+    copies = sorted(glob.glob(os.path.join(dest_dir, f"{glob.escape(stem)}-*.db")))
+    removed = copies[:-keep] if keep > 0 else []
+    for path in removed:
+        os.remove(path)
+    return removed
+
+
+def backup_all(paths: list[str], dest_dir: str, keep: int = 7, pages: int = 256, sleep: float = 0.01) -> list[dict]:
+    """backup همه فایل‌ها با یک برچسب زمانی مشترک و سپس rotate."""
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    results = []
+    for path in dict.fromkeys(paths):
+        if not os.path.exists(path):
+            continue
+        stem = os.path.splitext(os.path.basename(path))[0]
+        stats = backup_database(path, os.path.join(dest_dir, f"{stem}-{stamp}.db"), pages=pages, sleep=sleep)
+        stats["rotated"] = len(rotate(dest_dir, stem, keep))
+        print(f"💾 backup {os.path.basename(path)}: {stats['bytes'] // 1024} KB در {stats['seconds']} s "
+              f"({stats['mb_per_s']} MB/s، بیشترین گام {stats['max_step_ms']} ms، "
+              f"بیشترین انتظار writer {stats['max_writer_wait_ms']} ms)")
+        results.append(stats)
+    return results
+
+
+def main(argv=None) -> int:
+    from storage import shard_paths_for
+
+    parser = argparse.ArgumentParser(description="backup آنلاین دیتابیس‌های SQLite")
+    parser.add_argument("--db", default=os.getenv("STARTUP_DB_PATH", "startup.db"))
+    parser.add_argument("--shards", type=int, default=int(os.getenv("STORAGE_SHARDS", "1") or 1))
+    parser.add_argument("--dest", default=os.getenv("BACKUP_DIR") or "backups")
+    parser.add_argument("--keep", type=int, default=7)
+    parser.add_argument("--pages", type=int, default=256, help="صفحه در هر گام")
+    parser.add_argument("--sleep", type=float, default=0.01, help="مکث بین گام‌ها (ثانیه)")
+    args = parser.parse_args(argv)
+
+    paths = [args.db] + (shard_paths_for(args.db, args.shards) if args.shards > 1 else [])
+    try:
+        backup_all(paths, args.dest, keep=args.keep, pages=args.pages, sleep=args.sleep)
+    except (sqlite3.Error, BackupError) as e:
+        print(f"❌ backup ناموفق: {e}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
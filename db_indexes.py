@@ -0,0 +1,66 @@
+"""Startup Sandbox - Index Set
+
+مجموعه ایندکس‌های دیتابیس، یک‌جا و کنار کوئری‌ای که هر کدام پوشش می‌دهد.
+migrate_db.py و db_setup.py هر دو از همین لیست استفاده می‌کنند تا ایندکس‌ها
+بین دو اسکریپت اختلاف نداشته باشند.
+
+نکته SQLite: هر ایندکس معمولی rowid (همان id) را در انتها دارد؛ پس ایندکس
+(game_id) برای «WHERE game_id = ? ORDER BY id» هم بدون sort کافی است.
+
+tests/test_query_plans.py همه کوئری‌های واقعی اپ را با EXPLAIN QUERY PLAN روی یک
+دیتابیس بزرگ اجرا می‌کند و با دیدن full scan یا TEMP B-TREE شکست می‌خورد؛
+کوئری جدید = ایندکس مناسبش در این لیست.
+"""
+
+import sqlite3
+
+# (نام، جدول، تعریف) — کوئری مربوط در توضیح بالای هر مورد
+INDEXES = [
+    # get_or_create_user: SELECT id FROM users WHERE username = ?
+    ("idx_users_username", "users", "users(username)"),
+    # replay list: WHERE rng_seed IS NOT NULL ORDER BY id DESC LIMIT 50
+    ("idx_games_seeded", "games", "games(id) WHERE rng_seed IS NOT NULL"),
+    # list_user_games (/history): WHERE user_id = ? AND id < ? ORDER BY id DESC LIMIT ?
+    ("idx_games_user_recent", "games", "games(user_id, id DESC)"),
+    # latest_scenario: WHERE game_id = ? ORDER BY id DESC LIMIT 1
+    ("idx_scenarios_game_id", "scenarios", "scenarios(game_id)"),
+    # list_choices: WHERE scenario_id = ? ORDER BY id
+    ("idx_choices_scenario_id", "choices", "choices(scenario_id)"),
+    # list_logs: WHERE game_id = ? ORDER BY id
+    ("idx_logs_game_id", "logs", "logs(game_id)"),
+    # recent_history: WHERE game_id = ? ORDER BY turn DESC LIMIT ? (covering)
+    ("idx_logs_game_turn", "logs", "logs(game_id, turn DESC, scenario_id, scenario_title)"),
+    # ai_responses: WHERE game_id = ? ORDER BY id
+    ("idx_ai_replay_log_game_id", "ai_replay_log", "ai_replay_log(game_id)"),
+    # pop_queued_scenario: WHERE game_id = ? AND scenario_type = ? AND difficulty = ? ORDER BY id
+    ("idx_scenario_queue_lookup", "scenario_queue", "scenario_queue(game_id, scenario_type, difficulty, id)"),
+    # find_near_duplicate: WHERE band_key IN (...) AND game_id IS ? (covering)
+    ("idx_scenario_lsh_band", "scenario_lsh", "scenario_lsh(band_key, game_id, scenario_id)"),
+    # /metrics (ai_governor): WHERE kind = ? ORDER BY tokens LIMIT ?
+    ("idx_ai_buckets_kind_tokens", "ai_buckets", "ai_buckets(kind, tokens)"),
+]
+
+
+def ensure_indexes(cursor: sqlite3.Cursor) -> None:
+    """ساخت ایندکس‌های INDEXES (idempotent)؛ جدولی که وجود ندارد رد می‌شود.
+
+    ایندکس هم‌نامی که روی جدول دیگری ساخته شده (مثلاً idx_logs_game_id روی
+    game_logs در db_setup قدیمی) حذف و روی جدول درست ساخته می‌شود.
+    """
+    existing = dict(cursor.execute(
+        "SELECT name, tbl_name FROM sqlite_master WHERE type = 'index'"
+    ).fetchall())
+    tables = {row[0] for row in cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+    for name, table, definition in INDEXES:
+        if table not in tables:
+            continue
+        if name in existing:
+            if existing[name] == table:
+                continue
+            cursor.execute(f"DROP INDEX {name}")
+        try:
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {definition}")
+        except sqlite3.OperationalError as e:
+            # ستونی که در دیتابیس خیلی قدیمی هنوز نیست؛ بقیه ایندکس‌ها ساخته شوند
+            print(f"[WARNING] ایندکس {name} ساخته نشد: {e}")
@@ -6,6 +6,8 @@
 import sqlite3
 from datetime import datetime
 
+from db_indexes import ensure_indexes
+
 def create_database(db_path: str = 'startup.db'):
     """ساخت و بهینه‌سازی دیتابیس با ساختار کامل.
 
@@ -41,6 +43,12 @@ def create_database(db_path: str = 'startup.db'):
         turn INTEGER DEFAULT 1,
         is_game_over BOOLEAN DEFAULT 0,
         game_over_reason TEXT,
+        rng_seed INTEGER,
+        mode TEXT DEFAULT 'classic',
+        score INTEGER DEFAULT 0,
+        decisions INTEGER,
+        finished_at TIMESTAMP,
+        stat_history BLOB,
         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
         updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
         FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
@@ -128,6 +136,7 @@ def create_database(db_path: str = 'startup.db'):
         cost_impact INTEGER DEFAULT 0,
         reputation_impact INTEGER DEFAULT 0,
         morale_impact INTEGER DEFAULT 0,
+        ai_response TEXT,
         created_at TEXT DEFAULT CURRENT_TIMESTAMP
     )
     """)
@@ -137,12 +146,13 @@ def create_database(db_path: str = 'startup.db'):
     print("\n📊 در حال ایجاد ایندکس‌ها...")
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_games_user_id ON games(user_id)')
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_games_game_over ON games(is_game_over)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_scenarios_game_id ON scenarios(game_id)')
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_scenarios_type ON scenarios(scenario_type)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_choices_scenario_id ON choices(scenario_id)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_logs_game_id ON game_logs(game_id)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_logs_turn ON game_logs(turn_number)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_logs_scenario_type ON game_logs(scenario_type)')
+    # جدول قدیمی game_logs؛ نام‌ها با idx_logs_* (جدول logs) تداخل ندارند
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_game_logs_game_id ON game_logs(game_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_game_logs_turn ON game_logs(turn_number)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_game_logs_scenario_type ON game_logs(scenario_type)')
+    # ایندکس کوئری‌های اپ (مشترک با migrate_db.py)
+    ensure_indexes(cursor)
 
     print("✅ جدول‌ها و ایندکس‌ها ساخته شدند.")
     
@@ -0,0 +1,262 @@
+"""Startup Sandbox - Streaming JSON Validation
+
+پاسخ AI تکه‌تکه (stream) می‌رسد. به جای صبر برای کل متن و بعد json.loads،
+این ماژول هر تکه را همان لحظه parse می‌کند:
+
+- IncrementalJSONParser: parser افزایشی JSON؛ هر مقدار (رشته، عدد، آبجکت، آرایه)
+  به محض کامل شدن با مسیرش (مثلاً ("options", 1, "cost")) گزارش می‌شود.
+- ScenarioStreamValidator: اسکیمای سناریو (title, description و حداقل ۳ گزینه با
+  فیلدهای عددی) را فیلد به فیلد چک می‌کند.
+
+اولین نشانه قطعی خرابی (خطای syntax، نوع اشتباه، نبود '{' در ابتدای پاسخ) یک
+StreamAbort می‌دهد تا فراخواننده تولید را لغو کند و fallback زودتر شروع شود.
+بعد از بسته شدن آبجکت ریشه هم `done` برقرار است و ادامه stream لازم نیست.
+
+این ماژول به Flask و Gemini وابسته نیست.
+"""
+
+import json
+
+
+class StreamAbort(ValueError):
+    """خروجی قطعاً نامعتبر است؛ ادامه تولید فایده‌ای ندارد."""
+
+
+_WHITESPACE = " \t\r\n"
+_SCALAR_CHARS = set("+-0123456789.eEtruefalsn")
+
+
+class IncrementalJSONParser:
+    """parser افزایشی برای یک آبجکت JSON (متن قبل از '{' مثل ```json نادیده گرفته می‌شود).
+
+    on_start(path, kind): شروع یک آبجکت/آرایه ("object" یا "array")
+    on_value(path, value): کامل شدن هر مقدار؛ برای ریشه path == ()
+    """
+
+    def __init__(self, on_start=None, on_value=None, max_preamble: int = 500):
+        self.on_start = on_start
+        self.on_value = on_value
+        self.max_preamble = max_preamble
+        self.value = None
+        self.done = False
+        self.consumed = 0        # تعداد کاراکترهای خوانده‌شده تا پایان ریشه
+        self._preamble = 0
+        self._started = False
+        # هر frame: [container, کلید در والد, کلید در انتظار مقدار (فقط آبجکت)]
+        self._stack: list[list] = []
+        self._expect = "value"   # value | key_or_end | key | colon | comma_or_end | value_or_end
+        self._string: list[str] | None = None
+        self._escape = False
+        self._scalar: list[str] | None = None
+
+    # ---------- helpers ----------
+    def _fail(self, message: str):
+        raise StreamAbort(message)
+
+    def _path(self, key=None) -> tuple:
+        path = tuple(frame[1] for frame in self._stack[1:])
+        return path if key is None else path + (key,)
+
+    def _child_key(self):
+        container, _, pending = self._stack[-1]
+        return pending if isinstance(container, dict) else len(container)
+
+    def _start_container(self, container, kind: str) -> None:
+        key = self._child_key() if self._stack else None
+        self._stack.append([container, key, None])
+        if self.on_start:
+            self.on_start(self._path(), kind)
+        self._expect = "key_or_end" if kind == "object" else "value_or_end"
+
+    def _complete(self, value) -> None:
+        """یک مقدار کامل شد: در والد قرار بگیرد و گزارش شود."""
+        if not self._stack:
+            return
+        container, _, pending = self._stack[-1]
+        key = self._child_key()
+        if isinstance(container, dict):
+            container[pending] = value
+            self._stack[-1][2] = None
+        else:
+            container.append(value)
+        if self.on_value:
+            self.on_value(self._path(key), value)
+        self._expect = "comma_or_end"
+
+    def _close_container(self) -> None:
+        container, _, _ = self._stack.pop()
+        if not self._stack:
+            self.value = container
+            self.done = True
+            if self.on_value:
+                self.on_value((), container)
+            return
+        self._complete(container)
+
+    def _finish_scalar(self) -> None:
+        token = "".join(self._scalar)
+        self._scalar = None
+        try:
+            value = json.loads(token)
+        except ValueError:
+            self._fail(f"مقدار نامعتبر: {token[:20]}")
+        self._complete(value)
+
+    # ---------- feeding ----------
+    def feed(self, text: str) -> bool:
+        """خواندن یک تکه؛ True یعنی آبجکت ریشه کامل شده است."""
+        for ch in text:
+            if self.done:
+                break
+            self.consumed += 1
+
+            if not self._started:
+                if ch == "{":
+                    self._started = True
+                    self._start_container({}, "object")
+                    continue
+                self._preamble += 1
+                if self._preamble > self.max_preamble:
+                    self._fail("پاسخ با آبجکت JSON شروع نشد")
+                continue
+
+            if self._string is not None:
+                if self._escape:
+                    self._string.append(ch)
+                    self._escape = False
+                elif ch == "\\":
+                    self._string.append(ch)
+                    self._escape = True
+                elif ch == '"':
+                    try:
+                        value = json.loads('"' + "".join(self._string) + '"')
+                    except ValueError:
+                        self._fail("رشته نامعتبر")
+                    self._string = None
+                    if self._expect == "key":
+                        self._stack[-1][2] = value
+                        self._expect = "colon"
+                    else:
+                        self._complete(value)
+                elif ch < " ":
+                    self._fail("کاراکتر کنترلی داخل رشته")
+                else:
+                    self._string.append(ch)
+                continue
+
+            if self._scalar is not None:
+                if ch in _SCALAR_CHARS:
+                    self._scalar.append(ch)
+                    continue
+                self._finish_scalar()
+
+            if ch in _WHITESPACE:
+                continue
+            self._step(ch)
+        return self.done
+
+    def _step(self, ch: str) -> None:
+        expect = self._expect
+        if expect in ("key_or_end", "key"):
+            if ch == '"':
+                self._string = []
+                self._expect = "key"
+            elif ch == "}" and expect == "key_or_end":
+                self._close_container()
+            else:
+                self._fail(f"کلید آبجکت انتظار می‌رفت، '{ch}' آمد")
+        elif expect == "colon":
+            if ch != ":":
+                self._fail(f"':' انتظار می‌رفت، '{ch}' آمد")
+            self._expect = "value"
+        elif expect == "comma_or_end":
+            container = self._stack[-1][0]
+            if ch == ",":
+                self._expect = "key" if isinstance(container, dict) else "value"
+            elif ch == ("}" if isinstance(container, dict) else "]"):
+                self._close_container()
+            else:
+                self._fail(f"',' یا پایان انتظار می‌رفت، '{ch}' آمد")
+        else:  # value | value_or_end
+            if ch == "]" and expect == "value_or_end":
+                self._close_container()
+            elif ch == "{":
+                self._start_container({}, "object")
+            elif ch == "[":
+                self._start_container([], "array")
+            elif ch == '"':
+                self._string = []
+                self._expect = "value"
+            elif ch in _SCALAR_CHARS:
+                self._scalar = [ch]
+            else:
+                self._fail(f"مقدار JSON انتظار می‌رفت، '{ch}' آمد")
+
+    def finish(self) -> None:
+        """پایان stream؛ اگر ریشه کامل نشده باشد پاسخ ناقص است."""
+        if not self.done:
+            self._fail("پاسخ JSON ناقص تمام شد")
+
+
+# ========== Scenario schema ==========
+
+SCENARIO_NUMERIC_FIELDS = ("cost", "reputation", "morale", "risk_level")
+MIN_SCENARIO_OPTIONS = 3
+
+
+class ScenarioStreamValidator:
+    """اعتبارسنجی تدریجی اسکیمای سناریو هم‌زمان با رسیدن stream."""
+
+    def __init__(self, max_preamble: int = 500):
+        self.parser = IncrementalJSONParser(self._on_start, self._on_value, max_preamble)
+
+    @property
+    def done(self) -> bool:
+        return self.parser.done
+
+    @property
+    def value(self):
+        return self.parser.value
+
+    @property
+    def consumed(self) -> int:
+        return self.parser.consumed
+
+    def feed(self, text: str) -> bool:
+        return self.parser.feed(text)
+
+    def finish(self) -> None:
+        self.parser.finish()
+
+    @staticmethod
+    def _on_start(path: tuple, kind: str) -> None:
+        if path == ("options",) and kind != "array":
+            raise StreamAbort("options باید آرایه باشد")
+        if len(path) == 2 and path[0] == "options" and kind != "object":
+            raise StreamAbort("هر گزینه باید آبجکت باشد")
+        if len(path) == 3 and path[0] == "options":
+            raise StreamAbort(f"فیلد {path[2]} گزینه باید مقدار ساده باشد")
+
+    @staticmethod
+    def _on_value(path: tuple, value) -> None:
+        if path in (("title",), ("description",)):
+            if not isinstance(value, str) or not value.strip():
+                raise StreamAbort(f"{path[0]} خالی یا نامعتبر است")
+        elif path == ("options",):
+            if not isinstance(value, list) or len(value) < MIN_SCENARIO_OPTIONS:
+                raise StreamAbort(f"حداقل {MIN_SCENARIO_OPTIONS} گزینه لازم است")
+        elif len(path) == 3 and path[0] == "options":
+            field = path[2]
+            if field == "text" and (not isinstance(value, str) or not value.strip()):
+                raise StreamAbort("متن گزینه خالی است")
+            if field in SCENARIO_NUMERIC_FIELDS and (
+                isinstance(value, bool) or not isinstance(value, (int, float))
+            ):
+                raise StreamAbort(f"{field} باید عدد باشد")
+        elif len(path) == 2 and path[0] == "options":
+            if not isinstance(value, dict) or "text" not in value:
+                raise StreamAbort("گزینه بدون متن")
+        elif path == ():
+            for field in ("title", "description", "options"):
+                if field not in value:
+                    raise StreamAbort(f"فیلد {field} وجود ندارد")
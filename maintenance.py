@@ -0,0 +1,320 @@
+"""Startup Sandbox - SQLite Maintenance
+
+نگهداری دوره‌ای فایل‌های SQLite (همه shardها):
+
+- checkpoint: وقتی فایل WAL از آستانه بزرگ‌تر شد. در حالت عادی PASSIVE (هیچ
+  خواننده/نویسنده‌ای را منتظر نمی‌گذارد)؛ وقتی اپ بیکار است TRUNCATE تا فایل WAL
+  هم کوچک شود.
+- آمار planner (sqlite_stat1): ANALYZE با analysis_limit وقتی آمار نیست یا کهنه است.
+  PRAGMA optimize ساده روی اتصال تازه کاری نمی‌کند (تاریخچه query ندارد)؛ از
+  SQLite 3.46 به بعد optimize=0x10002 همه جدول‌ها را بررسی می‌کند.
+- incremental_vacuum: فقط اگر دیتابیس با auto_vacuum=INCREMENTAL ساخته شده باشد.
+- backup (اختیاری): هر backup_every ثانیه تابع backup (مثلاً db_backup.backup_all).
+
+دو حالت اجرا:
+    python maintenance.py [--db startup.db] [--shards N] [--once | --loop]
+    MaintenanceScheduler: thread کم‌اولویت داخل اپ؛ بین چند worker (gunicorn) با
+    قفل فایل فقط یکی انتخاب می‌شود.
+
+زمان هر کار چاپ و در stats نگه داشته می‌شود (برای /metrics).
+این ماژول به Flask وابسته نیست.
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+from speculation import lower_thread_priority
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+DEFAULT_WAL_BYTES = 4 * 1024 * 1024
+
+
+# ========== Tasks ==========
+
+def _connect(path: str, busy_timeout_ms: int) -> sqlite3.Connection:
+    # busy_timeout کوتاه: نگهداری هرگز مدت زیادی پشت قفل درخواست‌ها منتظر نمی‌ماند
+    conn = sqlite3.connect(path, timeout=busy_timeout_ms / 1000, isolation_level=None)
+    conn.execute(f"PRAGMA busy_timeout = {int(busy_timeout_ms)}")
+    return conn
+
+
+def wal_size(path: str) -> int:
+    try:
+        return os.path.getsize(path + "-wal")
+    except OSError:
+        return 0
+
+
+def checkpoint(conn: sqlite3.Connection, mode: str = "PASSIVE") -> tuple:
+    """(busy, صفحات WAL، صفحات منتقل‌شده)"""
+    return tuple(conn.execute(f"PRAGMA wal_checkpoint({mode})").fetchone())
+
+
+# از این نسخه optimize با بیت 0x10000 همه جدول‌ها را بررسی می‌کند، نه فقط query‌شده‌ها
+OPTIMIZE_ALL_TABLES = (3, 46, 0)
+# رشد تعداد ردیف نسبت به آمار ثبت‌شده که آمار را کهنه می‌کند (معیار optimize قدیمی)
+STALE_GROWTH = 10
+
+
+def _stale_tables(conn: sqlite3.Connection) -> list[str]:
+    """جدول‌های دارای ایندکس که آمار ندارند یا از زمان ANALYZE خیلی بزرگ‌تر شده‌اند."""
+    indexed = [row[0] for row in conn.execute(
+        "SELECT DISTINCT tbl_name FROM sqlite_master WHERE type = 'index' AND tbl_name NOT LIKE 'sqlite_%'"
+    )]
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone():
+        return indexed
+    recorded = {}
+    for tbl, stat in conn.execute("SELECT tbl, stat FROM sqlite_stat1"):
+        try:
+            recorded[tbl] = max(recorded.get(tbl, 0), int(str(stat).split()[0]))
+        except (ValueError, IndexError):
+            pass
+    stale = []
+    for tbl in indexed:
+        if tbl not in recorded:
+            stale.append(tbl)
+            continue
+        try:
+            # MAX(rowid) با یک جستجوی B-tree؛ تخمین تعداد ردیف بدون COUNT(*) کامل
+            (rows,) = conn.execute(f'SELECT MAX(rowid) FROM "{tbl}"').fetchone()
+        except sqlite3.OperationalError:  # WITHOUT ROWID
+            continue
+        if (rows or 0) > STALE_GROWTH * max(recorded[tbl], 1):
+            stale.append(tbl)
+    return stale
+
+
+def optimize(conn: sqlite3.Connection, analysis_limit: int = 400) -> str:
+    """ساخت/تازه کردن آمار planner؛ برمی‌گرداند چه اجرا شد ("analyze"، "optimize" یا "")."""
+    # analysis_limit: ANALYZE تقریبی و سریع روی جدول‌های بزرگ
+    conn.execute(f"PRAGMA analysis_limit = {int(analysis_limit)}")
+    stale = _stale_tables(conn)
+    if stale:
+        for tbl in stale:
+            conn.execute(f'ANALYZE "{tbl}"')
+        return "analyze"
+    if sqlite3.sqlite_version_info >= OPTIMIZE_ALL_TABLES:
+        conn.execute("PRAGMA optimize=0x10002")
+        return "optimize"
+    return ""
+
+
+def incremental_vacuum(conn: sqlite3.Connection, pages: int = 200) -> bool:
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:  # 2 = INCREMENTAL
+        return False
+    conn.execute(f"PRAGMA incremental_vacuum({int(pages)})").fetchall()
+    return True
+
+
+# ========== Election ==========
+
+class FileLock:
+    """قفل انحصاری غیرمسدودکننده روی یک فایل (برای انتخاب یک worker)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fh = None
+
+    def acquire(self) -> bool:
+        if self._fh is not None:
+            return True
+        fh = open(self.path, "a+")
+        try:
+            if fcntl is not None:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                import msvcrt
+                msvcrt.locking(fh.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            fh.close()
+            return False
+        self._fh = fh
+        return True
+
+    def release(self) -> None:
+        if self._fh is not None:
+            # بستن فایل قفل را آزاد می‌کند
+            self._fh.close()
+            self._fh = None
+
+
+# ========== Activity ==========
+
+class RequestActivity:
+    """شمارش درخواست‌های در حال اجرا؛ idle() یعنی مدتی هیچ درخواستی نبوده است."""
+
+    def __init__(self, idle_seconds: float = 30.0):
+        self.idle_seconds = idle_seconds
+        self._active = 0
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def begin(self) -> None:
+        with self._lock:
+            self._active += 1
+            self._last = time.monotonic()
+
+    def end(self) -> None:
+        with self._lock:
+            self._active = max(0, self._active - 1)
+            self._last = time.monotonic()
+
+    def idle(self) -> bool:
+        with self._lock:
+            return self._active == 0 and time.monotonic() - self._last >= self.idle_seconds
+
+
+# ========== Scheduler ==========
+
+class MaintenanceScheduler:
+    """اجرای دوره‌ای کارهای نگهداری روی فایل‌های دیتابیس.
+
+    is_idle: تابعی که True یعنی اپ الان درخواستی ندارد (برای TRUNCATE).
+    """
+
+    def __init__(self, paths: list[str], interval: float = 60.0, wal_bytes: int = DEFAULT_WAL_BYTES,
+                 optimize_every: float = 3600.0, is_idle=None, busy_timeout_ms: int = 100,
+                 lock_path: str | None = None, backup=None, backup_every: float = 6 * 3600):
+        self.paths = list(dict.fromkeys(paths))
+        self.interval = interval
+        self.wal_bytes = wal_bytes
+        self.optimize_every = optimize_every
+        self.is_idle = is_idle or (lambda: False)
+        self.busy_timeout_ms = busy_timeout_ms
+        self.lock = FileLock(lock_path or f"{self.paths[0]}.maintenance.lock")
+        self._last_optimize: dict[str, float] = {}
+        self.backup = backup
+        self.backup_every = backup_every
+        self._last_backup: float | None = None
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._start_lock = threading.Lock()
+        self._retry_at = 0.0
+        self.stats = {"runs": 0, "checkpoints": 0, "optimizes": 0, "vacuums": 0, "backups": 0, "errors": 0,
+                      "last_ms": {}}
+
+    def _timed(self, task: str, path: str, fn):
+        t0 = time.perf_counter()
+        result = fn()
+        ms = round((time.perf_counter() - t0) * 1000, 2)
+        self.stats["last_ms"][task] = ms
+        print(f"🧹 {task} روی {os.path.basename(path)}: {ms} ms")
+        return result
+
+    def run_once(self, force_optimize: bool = False) -> None:
+        """یک دور نگهداری روی همه فایل‌ها (خطای یک فایل بقیه را متوقف نمی‌کند)."""
+        self.stats["runs"] += 1
+        for path in self.paths:
+            if not os.path.exists(path):
+                continue
+            try:
+                conn = _connect(path, self.busy_timeout_ms)
+                try:
+                    self._maintain(conn, path, force_optimize)
+                finally:
+                    conn.close()
+            except sqlite3.Error as e:
+                # معمولاً database is locked؛ دور بعد دوباره امتحان می‌شود
+                self.stats["errors"] += 1
+                print(f"⚠️ خطا در نگهداری {path}: {e}")
+        self._maybe_backup()
+
+    def _maybe_backup(self) -> None:
+        now = time.monotonic()
+        if self.backup is None or (self._last_backup is not None and now - self._last_backup < self.backup_every):
+            return
+        self._last_backup = now
+        try:
+            # db_backup خودش زمان و توان هر فایل را چاپ می‌کند
+            self._timed("backup", self.paths[0], self.backup)
+            self.stats["backups"] += 1
+        except Exception as e:
+            self.stats["errors"] += 1
+            print(f"❌ خطا در backup: {e}")
+
+    def _maintain(self, conn: sqlite3.Connection, path: str, force_optimize: bool) -> None:
+        if wal_size(path) > self.wal_bytes:
+            mode = "TRUNCATE" if self.is_idle() else "PASSIVE"
+            self._timed(f"checkpoint {mode}", path, lambda: checkpoint(conn, mode))
+            self.stats["checkpoints"] += 1
+
+        now = time.monotonic()
+        last = self._last_optimize.get(path)
+        if force_optimize or last is None or now - last >= self.optimize_every:
+            self._timed("optimize", path, lambda: optimize(conn))
+            self._last_optimize[path] = now
+            self.stats["optimizes"] += 1
+            if self._timed("incremental_vacuum", path, lambda: incremental_vacuum(conn)):
+                self.stats["vacuums"] += 1
+
+    # ---------- background thread ----------
+    def start(self) -> bool:
+        """شروع thread (idempotent)؛ False یعنی worker دیگری نگهداری را بر عهده دارد."""
+        with self._start_lock:
+            if self._thread is not None:
+                return True
+            # بازنده انتخاب هر interval دوباره امتحان می‌کند (اگر worker برنده مرده باشد)
+            if time.monotonic() < self._retry_at:
+                return False
+            if not self.lock.acquire():
+                self._retry_at = time.monotonic() + self.interval
+                return False
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="db-maintenance", daemon=True)
+            self._thread.start()
+            return True
+
+    def _loop(self) -> None:
+        lower_thread_priority()
+        while not self._stop.wait(self.interval):
+            self.run_once()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self.lock.release()
+
+
+def main(argv=None) -> int:
+    from storage import shard_paths_for
+
+    parser = argparse.ArgumentParser(description="نگهداری دیتابیس‌های SQLite (checkpoint, optimize)")
+    parser.add_argument("--db", default=os.getenv("STARTUP_DB_PATH", "startup.db"))
+    parser.add_argument("--shards", type=int, default=int(os.getenv("STORAGE_SHARDS", "1") or 1))
+    parser.add_argument("--wal-mb", type=float, default=DEFAULT_WAL_BYTES / 1024 / 1024)
+    parser.add_argument("--once", action="store_true", help="یک دور (پیش‌فرض)")
+    parser.add_argument("--loop", action="store_true", help="اجرای دائمی هر --interval ثانیه")
+    parser.add_argument("--interval", type=float, default=60.0)
+    args = parser.parse_args(argv)
+
+    paths = [args.db] + (shard_paths_for(args.db, args.shards) if args.shards > 1 else [])
+    # اجرای دستی (--once) برای زمان بیکاری است: TRUNCATE و optimize همیشه؛
+    # --loop کنار اپ زنده اجرا می‌شود و فقط PASSIVE می‌زند
+    scheduler = MaintenanceScheduler(paths, interval=args.interval, wal_bytes=int(args.wal_mb * 1024 * 1024),
+                                     is_idle=lambda: not args.loop)
+    if not args.loop:
+        scheduler.run_once(force_optimize=True)
+        return 0
+    if not scheduler.start():
+        print("⚠️ یک فرایند دیگر نگهداری را انجام می‌دهد")
+        return 1
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        scheduler.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
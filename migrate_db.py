@@ -13,6 +13,8 @@ import sqlite3
 import sys
 from datetime import datetime
 
+from db_indexes import ensure_indexes
+
 # Fix encoding for Windows console
 if sys.platform == "win32":
     import codecs
@@ -90,7 +92,10 @@ def migrate_database(db_path: str = "startup.db") -> bool:
                 turn INTEGER DEFAULT 1,
                 score INTEGER DEFAULT 0,
                 created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-                updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+                updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                decisions INTEGER,
+                finished_at TEXT,
+                stat_history BLOB
             )
             """
         )
@@ -105,7 +110,8 @@ def migrate_database(db_path: str = "startup.db") -> bool:
                 description TEXT,
                 difficulty_level TEXT DEFAULT 'medium',
                 turn_number INTEGER DEFAULT 1,
-                created_at TEXT DEFAULT CURRENT_TIMESTAMP
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                minhash BLOB
             )
             """
         )
@@ -137,11 +143,83 @@ def migrate_database(db_path: str = "startup.db") -> bool:
                 cost_impact INTEGER DEFAULT 0,
                 reputation_impact INTEGER DEFAULT 0,
                 morale_impact INTEGER DEFAULT 0,
+                ai_response TEXT,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP
+            )
+            """
+        )
+
+        # پاسخ‌های خام AI برای replay قطعی بازی‌ها (کلید: hash پرامپت)
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS ai_replay_log (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                game_id INTEGER NOT NULL,
+                purpose TEXT,
+                prompt_hash TEXT NOT NULL,
+                response TEXT,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP
+            )
+            """
+        )
+
+        # سناریوهای اضافه تولید batch که در نوبت‌های بعدی همان بازی مصرف می‌شوند
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS scenario_queue (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                game_id INTEGER NOT NULL,
+                scenario_type TEXT NOT NULL,
+                difficulty INTEGER NOT NULL,
+                payload TEXT NOT NULL,
                 created_at TEXT DEFAULT CURRENT_TIMESTAMP
             )
             """
         )
 
+        # هر فراخوانی AI: توکن، latency، نتیجه (ai_accounting.py)
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS ai_calls (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                created_at REAL NOT NULL,
+                game_id INTEGER,
+                purpose TEXT,
+                provider TEXT,
+                model TEXT,
+                outcome TEXT NOT NULL,
+                latency_ms REAL,
+                prompt_tokens INTEGER,
+                response_tokens INTEGER,
+                prompt_chars INTEGER,
+                response_chars INTEGER
+            )
+            """
+        )
+
+        # token bucketهای governor AI (مشترک بین workerها؛ ai_governor.py)
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS ai_buckets (
+                key TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                tokens REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+
+        # کلیدهای LSH امضای MinHash سناریوها (near_duplicates.py)؛ یک ردیف برای هر باند
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS scenario_lsh (
+                band_key INTEGER NOT NULL,
+                game_id INTEGER,
+                scenario_id INTEGER NOT NULL
+            )
+            """
+        )
+
         conn.commit()
 
         # -------------------------
@@ -166,6 +244,24 @@ def migrate_database(db_path: str = "startup.db") -> bool:
                 add_col("games", "updated_at", "TEXT")
                 now = datetime.now().isoformat()
                 cursor.execute("UPDATE games SET updated_at = ? WHERE updated_at IS NULL", (now,))
+            if "is_game_over" not in g:
+                add_col("games", "is_game_over", "INTEGER DEFAULT 0")
+            if "game_over_reason" not in g:
+                add_col("games", "game_over_reason", "TEXT")
+            if "rng_seed" not in g:
+                add_col("games", "rng_seed", "INTEGER")
+            if "mode" not in g:
+                add_col("games", "mode", "TEXT DEFAULT 'classic'")
+            # خلاصه /history که در mark_game_over پر می‌شود
+            if "score" not in g:
+                add_col("games", "score", "INTEGER DEFAULT 0")
+            if "decisions" not in g:
+                add_col("games", "decisions", "INTEGER")
+            if "finished_at" not in g:
+                add_col("games", "finished_at", "TEXT")
+            # مسیر آمار برای نمودار /report (stat_history.py)
+            if "stat_history" not in g:
+                add_col("games", "stat_history", "BLOB")
 
         if table_exists("scenarios"):
             s = cols("scenarios")
@@ -177,6 +273,8 @@ def migrate_database(db_path: str = "startup.db") -> bool:
                 add_col("scenarios", "difficulty_level", "TEXT DEFAULT 'medium'")
             if "turn_number" not in s:
                 add_col("scenarios", "turn_number", "INTEGER DEFAULT 1")
+            if "minhash" not in s:
+                add_col("scenarios", "minhash", "BLOB")
 
         if table_exists("choices"):
             c = cols("choices")
@@ -202,22 +300,13 @@ def migrate_database(db_path: str = "startup.db") -> bool:
                 add_col("logs", "morale_impact", "INTEGER DEFAULT 0")
             if "created_at" not in l:
                 add_col("logs", "created_at", "TEXT")
+            if "ai_response" not in l:
+                add_col("logs", "ai_response", "TEXT")
 
         # -------------------------
-        # Indexes (safe)
+        # Indexes (safe) — لیست کامل در db_indexes.py
         # -------------------------
-        try:
-            cursor.execute("CREATE INDEX IF NOT EXISTS idx_scenarios_game_id ON scenarios(game_id)")
-        except Exception:
-            pass
-        try:
-            cursor.execute("CREATE INDEX IF NOT EXISTS idx_choices_scenario_id ON choices(scenario_id)")
-        except Exception:
-            pass
-        try:
-            cursor.execute("CREATE INDEX IF NOT EXISTS idx_logs_game_id ON logs(game_id)")
-        except Exception:
-            pass
+        ensure_indexes(cursor)
 
         conn.commit()
         print("[OK] ديتابيس با موفقيت به روزرساني شد!")
@@ -232,5 +321,32 @@ def migrate_database(db_path: str = "startup.db") -> bool:
         conn.close()
 
 
+def main(argv=None) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="به‌روزرسانی اسکیمای دیتابیس")
+    parser.add_argument("--db", default=os.getenv("STARTUP_DB_PATH", "startup.db"))
+    parser.add_argument("--shards", type=int, default=int(os.getenv("STORAGE_SHARDS", "1") or 1))
+    parser.add_argument("--backfill-summaries", action="store_true",
+                        help="خلاصه /history (امتیاز، تعداد تصمیم) برای بازی‌های تمام‌شده قدیمی")
+    args = parser.parse_args(argv)
+    if not args.backfill_summaries:
+        return 0 if migrate_database(args.db) else 1
+
+    # storage خودش migrate_db را import می‌کند (و اسکیمای همه shardها را می‌سازد)
+    from storage import GameRepository, make_backend
+
+    repo = GameRepository(make_backend(args.db, args.shards))
+    try:
+        total = repo.backfill_game_summaries()
+    except sqlite3.Error as e:
+        print(f"[ERROR] خطا در ساخت خلاصه بازی‌ها: {e}")
+        return 1
+    finally:
+        repo.close()
+    print(f"[OK] خلاصه {total} بازی تمام‌شده ساخته شد")
+    return 0
+
+
 if __name__ == "__main__":
-    migrate_database()
+    sys.exit(main())
@@ -0,0 +1,268 @@
+"""Startup Sandbox - game_logs -> logs Data Migration
+
+تاریخچه نسخه‌های قدیمی (backup/app.py در game_logs می‌نوشت) به جدول اصلی logs:
+
+- کپی به ترتیب id در تکه‌های chunk تایی با keyset (WHERE id > last_id LIMIT chunk)؛
+  حافظه فقط یک تکه است، هر چقدر هم دیتابیس بزرگ باشد.
+- هر تکه یک تراکنش کوتاه (BEGIN IMMEDIATE): درج در logs، ردیف نگاشت در
+  legacy_log_map و جلو بردن checkpoint در data_migrations با هم commit می‌شوند؛
+  پس kill در هر لحظه نه ردیف تکراری می‌سازد نه ردیفی جا می‌اندازد و اجرای بعدی
+  از همان‌جا ادامه می‌دهد.
+- throttle: بعد از هر تکه به اندازه‌ای می‌خوابد که سهم نگه داشتن قفل writer از
+  duty بیشتر نشود (duty=0.5 یعنی حداقل نصف زمان قفل آزاد است برای /action).
+- بازی‌ای که وقتی اولین بار دیده می‌شود از قبل در logs ردیف دارد (بعد از ارتقا
+  ادامه پیدا کرده) هم کپی می‌شود، ولی با turnهای تازه درست پیش از اولین turn فعلی‌اش
+  (ممکن است صفر یا منفی شوند): تاریخچه قدیمی به ترتیب خودش قبل از نوبت‌های جدید
+  می‌آید و turn تکراری ساخته نمی‌شود. وضعیت هر بازی (داشتن logs و turn بعدی) در
+  legacy_log_games می‌ماند تا در ادامه اجرا ردیف‌های کپی‌شده خودمان آن را عوض نکنند.
+- پایان: اعتبارسنجی تعداد ردیف‌ها (game_logs = نگاشت‌ها + ردشده‌ها، و همه نگاشت‌ها
+  در logs موجود).
+
+نگاشت ستون‌ها: turn_number -> turn (اگر NULL: ادامه بزرگ‌ترین turn همان بازی در logs)،
+user_choice -> choice_text، *_after - *_before -> *_impact. ستون‌هایی که در اسکیمای
+قدیمی نیستند NULL خوانده می‌شوند. ردیف بدون game_id رد و شمرده می‌شود.
+مقصد همان فایل است (game_logs فقط در دیتابیس‌های تک‌فایلی قدیمی وجود دارد).
+
+اجرا:
+    python migrate_game_logs.py [--db startup.db] [--chunk 1000] [--duty 0.5] [--validate-only]
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import time
+
+from migrate_db import migrate_database
+
+NAME = "game_logs_to_logs"
+SOURCE_COLUMNS = (
+    "game_id", "turn_number", "scenario_id", "scenario_title", "choice_id", "user_choice",
+    "budget_before", "reputation_before", "morale_before", "budget_after", "reputation_after",
+    "morale_after", "ai_response", "created_at",
+)
+
+
+def _ensure_tables(conn: sqlite3.Connection) -> None:
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS data_migrations (
+            name TEXT PRIMARY KEY,
+            last_id INTEGER NOT NULL DEFAULT 0,
+            copied INTEGER NOT NULL DEFAULT 0,
+            skipped INTEGER NOT NULL DEFAULT 0,
+            started_at REAL,
+            updated_at REAL,
+            finished_at REAL
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS legacy_log_map (
+            legacy_id INTEGER PRIMARY KEY,
+            log_id INTEGER NOT NULL
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS legacy_log_games (
+            game_id INTEGER PRIMARY KEY,
+            has_logs INTEGER NOT NULL,
+            next_turn INTEGER
+        )
+    ''')
+    if "next_turn" not in {row[1] for row in conn.execute("PRAGMA table_info(legacy_log_games)")}:
+        conn.execute("ALTER TABLE legacy_log_games ADD COLUMN next_turn INTEGER")
+    conn.execute("INSERT OR IGNORE INTO data_migrations (name, started_at) VALUES (?, ?)", (NAME, time.time()))
+    conn.commit()
+
+
+def _select_sql(conn: sqlite3.Connection) -> str:
+    present = {row[1] for row in conn.execute("PRAGMA table_info(game_logs)")}
+    columns = ", ".join(col if col in present else f"NULL AS {col}" for col in SOURCE_COLUMNS)
+    return f"SELECT id, {columns} FROM game_logs WHERE id > ? ORDER BY id LIMIT ?"
+
+
+def _impact(before, after) -> int:
+    return after - before if before is not None and after is not None else 0
+
+
+def _renumbered_turn(conn: sqlite3.Connection, game_id: int, seen: dict) -> int | None:
+    """turn بعدی ردیف قدیمی بازی‌ای که قبل از کپی در logs ردیف داشت؛ None برای بقیه.
+
+    بار اول: has_logs و next_turn = اولین turn فعلی بازی - تعداد ردیف‌های قدیمی‌اش
+    در legacy_log_games ثبت می‌شود؛ next_turn در آخر هر تکه ذخیره می‌شود.
+    """
+    if game_id not in seen:
+        row = conn.execute("SELECT has_logs, next_turn FROM legacy_log_games WHERE game_id = ?",
+                           (game_id,)).fetchone()
+        if row is None:
+            (first_turn,) = conn.execute("SELECT MIN(turn) FROM logs WHERE game_id = ?", (game_id,)).fetchone()
+            next_turn = None
+            if first_turn is not None:
+                (legacy,) = conn.execute("SELECT COUNT(*) FROM game_logs WHERE game_id = ?", (game_id,)).fetchone()
+                next_turn = first_turn - legacy
+            row = (int(first_turn is not None), next_turn)
+            conn.execute("INSERT INTO legacy_log_games (game_id, has_logs, next_turn) VALUES (?, ?, ?)",
+                         (game_id, *row))
+        seen[game_id] = row[1] if row[0] else None
+    turn = seen[game_id]
+    if turn is not None:
+        seen[game_id] = turn + 1
+    return turn
+
+
+def _copy_chunk(conn: sqlite3.Connection, select_sql: str, chunk: int) -> tuple[int, int, int, int]:
+    """یک تکه در یک تراکنش؛ (ردیف‌های خوانده‌شده، کپی‌شده، ردشده، renumber‌شده از میان کپی‌شده‌ها)."""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        (last_id,) = conn.execute("SELECT last_id FROM data_migrations WHERE name = ?", (NAME,)).fetchone()
+        rows = conn.execute(select_sql, (last_id, chunk)).fetchall()
+        if not rows:
+            conn.rollback()
+            return 0, 0, 0, 0
+        next_turn: dict[int, int] = {}
+        seen: dict[int, int | None] = {}
+        copied = skipped = renumbered = 0
+        for (legacy_id, game_id, turn, scenario_id, title, choice_id, choice_text,
+             b0, r0, m0, b1, r1, m1, ai_response, created_at) in rows:
+            if game_id is None:
+                skipped += 1
+                continue
+            shifted = _renumbered_turn(conn, game_id, seen)
+            if shifted is not None:
+                turn = shifted
+                renumbered += 1
+            elif turn is None:
+                if game_id not in next_turn:
+                    (max_turn,) = conn.execute("SELECT MAX(turn) FROM logs WHERE game_id = ?", (game_id,)).fetchone()
+                    next_turn[game_id] = (max_turn or 0) + 1
+                turn = next_turn[game_id]
+            next_turn[game_id] = max(next_turn.get(game_id, 0), turn + 1)
+            cur = conn.execute('''
+                INSERT INTO logs (game_id, turn, scenario_id, scenario_title, choice_id, choice_text,
+                                  cost_impact, reputation_impact, morale_impact, ai_response, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (game_id, turn, scenario_id, title, choice_id, choice_text,
+                  _impact(b0, b1), _impact(r0, r1), _impact(m0, m1), ai_response, created_at))
+            conn.execute("INSERT INTO legacy_log_map (legacy_id, log_id) VALUES (?, ?)", (legacy_id, cur.lastrowid))
+            copied += 1
+        conn.execute('''
+            UPDATE data_migrations
+            SET last_id = ?, copied = copied + ?, skipped = skipped + ?, updated_at = ?
+            WHERE name = ?
+        ''', (rows[-1][0], copied, skipped, time.time(), NAME))
+        conn.executemany("UPDATE legacy_log_games SET next_turn = ? WHERE game_id = ?",
+                         [(turn, game_id) for game_id, turn in seen.items() if turn is not None])
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return len(rows), copied, skipped, renumbered
+
+
+def validate(conn: sqlite3.Connection) -> dict:
+    """شمارش نهایی؛ ok یعنی همه ردیف‌های game_logs یا در logs هستند یا عمداً رد شده‌اند.
+
+    renumbered: ردیف‌های کپی‌شده بازی‌هایی که از قبل logs داشتند (با turn تازه).
+    """
+    (source,) = conn.execute("SELECT COUNT(*) FROM game_logs").fetchone()
+    (mapped,) = conn.execute("SELECT COUNT(*) FROM legacy_log_map").fetchone()
+    (present,) = conn.execute(
+        "SELECT COUNT(*) FROM legacy_log_map m JOIN logs l ON l.id = m.log_id"
+    ).fetchone()
+    (skipped,) = conn.execute("SELECT skipped FROM data_migrations WHERE name = ?", (NAME,)).fetchone()
+    (renumbered,) = conn.execute('''
+        SELECT COUNT(*) FROM legacy_log_map m
+        JOIN game_logs g ON g.id = m.legacy_id
+        JOIN legacy_log_games s ON s.game_id = g.game_id AND s.has_logs = 1
+    ''').fetchone()
+    return {"source": source, "copied": mapped, "in_logs": present, "skipped": skipped, "renumbered": renumbered,
+            "ok": source == mapped + skipped and present == mapped}
+
+
+def migrate_game_logs(db_path: str, chunk: int = 1000, duty: float = 0.5, max_chunks: int | None = None,
+                      timeout: float = 30.0) -> dict:
+    """کپی (ادامه) game_logs به logs؛ آمار اجرا و نتیجه validate (فقط اگر تمام شد)."""
+    duty = min(1.0, max(0.01, duty))
+    conn = sqlite3.connect(db_path, timeout=timeout, isolation_level=None)
+    stats = {"chunks": 0, "rows": 0, "copied": 0, "skipped": 0, "renumbered": 0, "max_chunk_ms": 0.0,
+             "slept_seconds": 0.0, "finished": False, "validation": None}
+    try:
+        conn.execute("PRAGMA journal_mode = WAL")
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        if "game_logs" not in tables:
+            stats["finished"] = True
+            return stats
+        _ensure_tables(conn)
+        select_sql = _select_sql(conn)
+        t_start = time.perf_counter()
+        while max_chunks is None or stats["chunks"] < max_chunks:
+            t0 = time.perf_counter()
+            rows, copied, skipped, renumbered = _copy_chunk(conn, select_sql, chunk)
+            held = time.perf_counter() - t0
+            if not rows:
+                stats["finished"] = True
+                break
+            stats["chunks"] += 1
+            stats["rows"] += rows
+            stats["copied"] += copied
+            stats["skipped"] += skipped
+            stats["renumbered"] += renumbered
+            stats["max_chunk_ms"] = max(stats["max_chunk_ms"], round(held * 1000, 2))
+            pause = held * (1 - duty) / duty
+            if pause > 0:
+                time.sleep(pause)
+                stats["slept_seconds"] += pause
+        stats["seconds"] = round(time.perf_counter() - t_start, 3)
+        stats["slept_seconds"] = round(stats["slept_seconds"], 3)
+        if stats["finished"]:
+            conn.execute("UPDATE data_migrations SET finished_at = ? WHERE name = ?", (time.time(), NAME))
+            stats["validation"] = validate(conn)
+    finally:
+        conn.close()
+    return stats
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="مهاجرت تکه‌ای و قابل ادامه game_logs به logs")
+    parser.add_argument("--db", default=os.getenv("STARTUP_DB_PATH", "startup.db"))
+    parser.add_argument("--chunk", type=int, default=1000, help="ردیف در هر تراکنش")
+    parser.add_argument("--duty", type=float, default=0.5, help="بیشترین سهم زمان با قفل writer (0..1]")
+    parser.add_argument("--validate-only", action="store_true")
+    args = parser.parse_args(argv)
+    if not os.path.exists(args.db):
+        print(f"❌ دیتابیس پیدا نشد: {args.db}")
+        return 1
+
+    # logs و ستون‌هایش باید قبل از کپی وجود داشته باشند
+    migrate_database(args.db)
+    try:
+        if args.validate_only:
+            conn = sqlite3.connect(args.db)
+            try:
+                _ensure_tables(conn)
+                result = validate(conn)
+            finally:
+                conn.close()
+        else:
+            stats = migrate_game_logs(args.db, chunk=args.chunk, duty=args.duty)
+            if stats["validation"] is None:
+                print("✅ جدول game_logs وجود ندارد؛ کاری برای انجام نیست")
+                return 0
+            print(f"📦 {stats['copied']} ردیف در {stats['chunks']} تکه کپی شد ({stats['skipped']} رد شد، "
+                  f"{stats['renumbered']} با turn تازه پیش از logs فعلی)، "
+                  f"{stats['seconds']} s، طولانی‌ترین تکه {stats['max_chunk_ms']} ms")
+            result = stats["validation"]
+    except sqlite3.Error as e:
+        print(f"❌ خطا در مهاجرت game_logs: {e}")
+        return 1
+
+    print(f"🔍 game_logs={result['source']} کپی={result['copied']} در logs={result['in_logs']} "
+          f"رد شده={result['skipped']} با turn تازه={result['renumbered']}")
+    if not result["ok"]:
+        print("❌ تعداد ردیف‌ها نمی‌خواند")
+        return 2
+    print("✅ مهاجرت کامل و معتبر است")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+"""Startup Sandbox - Domain Model
+
+کلاس‌های سبک (با __slots__) برای رکوردهای پرتکرار به جای sqlite3.Row:
+
+- Game, Scenario, Choice, LogEntry: فقط ستون‌های شناخته‌شده هر جدول را نگه می‌دارند.
+- row_factory(model, description): نگاشت ستون‌ها به فیلدها یک بار برای هر
+  description کرسر ساخته (و cache) می‌شود.
+- ستونی که در کوئری نیست None می‌شود؛ پس کد و قالب‌ها دیگر لازم نیست با
+  r.keys() وجود ستون را چک کنند.
+
+برای سازگاری با اسکریپت‌های قدیمی، دسترسی record["field"] هم کار می‌کند.
+"""
+
+
+class Record:
+    """پایه رکوردهای دیتابیس؛ زیرکلاس‌ها فقط __slots__ را تعریف می‌کنند."""
+
+    __slots__ = ()
+    # (tuple نام ستون‌ها) -> تابع ساخت رکورد؛ برای هر زیرکلاس جدا
+    _plans: dict
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._plans = {}
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            setattr(self, name, fields.get(name))
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except (AttributeError, TypeError):
+            raise KeyError(key) from None
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def keys(self) -> tuple:
+        return self.__slots__
+
+    def as_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def replace(self, **changes):
+        """کپی با چند فیلد تغییرکرده (مثلاً وضعیت بازی بعد از یک نوبت)."""
+        return type(self)(**{**self.as_dict(), **changes})
+
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return all(getattr(self, n) == getattr(other, n) for n in self.__slots__)
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(id={getattr(self, 'id', None)!r})"
+
+    @classmethod
+    def _plan(cls, columns: tuple):
+        """تابع ساخت رکورد برای یک ترتیب مشخص از ستون‌ها (cache شده).
+
+        مثل namedtuple/dataclasses، بدنه تابع یک بار تولید و compile می‌شود تا
+        ساخت هر رکورد فقط چند انتساب مستقیم باشد (بدون حلقه و setattr).
+        """
+        build = cls._plans.get(columns)
+        if build is not None:
+            return build
+
+        index = {name: i for i, name in enumerate(columns)}
+        lines = ["def build(row):", "    obj = new(cls)"]
+        for name in cls.__slots__:
+            value = f"row[{index[name]}]" if name in index else "None"
+            lines.append(f"    obj.{name} = {value}")
+        lines.append("    return obj")
+        namespace = {"new": object.__new__, "cls": cls}
+        exec("\n".join(lines), namespace)
+        build = namespace["build"]
+
+        cls._plans[columns] = build
+        return build
+
+
+class Game(Record):
+    __slots__ = (
+        "id", "user_id", "startup_name", "budget", "reputation", "morale", "turn", "score",
+        "is_game_over", "game_over_reason", "rng_seed", "mode", "created_at", "updated_at",
+        "decisions", "finished_at", "stat_history",
+    )
+
+
+class Scenario(Record):
+    __slots__ = (
+        "id", "game_id", "scenario_type", "title", "description",
+        "difficulty_level", "turn_number", "created_at",
+    )
+
+
+class Choice(Record):
+    __slots__ = (
+        "id", "scenario_id", "text", "cost_impact", "reputation_impact", "morale_impact", "risk_level",
+    )
+
+
+class LogEntry(Record):
+    __slots__ = (
+        "id", "game_id", "turn", "scenario_id", "scenario_title", "choice_id", "choice_text",
+        "cost_impact", "reputation_impact", "morale_impact", "ai_response", "created_at",
+    )
+
+
+def row_factory(model: type[Record], description):
+    """row_factory برای یک کرسر: cursor.row_factory = row_factory(Game, cursor.description)"""
+    build = model._plan(tuple(col[0] for col in description))
+    return lambda cursor, row: build(row)
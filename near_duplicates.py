@@ -0,0 +1,152 @@
+"""Startup Sandbox - Near-Duplicate Scenarios
+
+تشخیص سناریوی «تقریباً تکراری» (همان موقعیت با کلمات کمی متفاوت) با MinHash + LSH
+روی title + description:
+
+- نرمال‌سازی فارسی: ي/ى/ئ -> ی، ك -> ک، ة -> ه، أ/إ/آ -> ا، ؤ -> و، حذف اعراب
+  و کشیده، ZWNJ و علائم -> فاصله، ارقام فارسی/عربی -> لاتین.
+- shingleهای k-حرفی متن نرمال‌شده و امضای MinHash یک‌جایگشتی (one-permutation):
+  هر shingle یک بار hash می‌شود و در یکی از NUM_BINS بین، کمینه نگه داشته می‌شود؛
+  بین‌های خالی از بین پرِ بعدی پر می‌شوند (densification). هزینه O(تعداد shingle).
+- LSH: امضا به BANDS باند ROWS تایی تقسیم و هر باند به یک کلید 64 بیتی hash می‌شود.
+  کلیدها در جدول scenario_lsh (ایندکس پوشا) ذخیره‌اند؛ کاندیدها = سناریوهایی که
+  حداقل در یک باند هم‌کلیدند، و شباهت واقعی (کسر بین‌های برابر) با امضای ذخیره‌شده
+  در scenarios.minhash سنجیده می‌شود. با میلیون‌ها سناریو هم هر جستجو چند lookup ایندکس است.
+
+ایندکس کردن سناریوهای قدیمی (بدون minhash)، دسته‌ای و قابل ادامه:
+    python near_duplicates.py [--db startup.db] [--shards N] [--batch 5000]
+"""
+
+import argparse
+import hashlib
+import os
+import re
+import sqlite3
+import struct
+import sys
+import time
+import zlib
+from array import array
+
+SHINGLE = 5
+NUM_BINS = 64
+BANDS = 16
+ROWS = NUM_BINS // BANDS
+# سقف کاندیدها در هر جستجو (باندهای خیلی پرجمعیت، مثلاً متن‌های قالبی، جستجو را کند نکنند)
+MAX_CANDIDATES = 256
+
+_BIN_BITS = 6                       # log2(NUM_BINS)
+_VALUE_MASK = (1 << (32 - _BIN_BITS)) - 1
+_EMPTY = 1 << 32
+_BAND = struct.Struct(f"<B{ROWS}I")
+
+_CHAR_MAP = str.maketrans({
+    "\u064a": "\u06cc", "\u0649": "\u06cc", "\u0626": "\u06cc",      # ي ى ئ -> ی
+    "\u0643": "\u06a9",                                          # ك -> ک
+    "\u0629": "\u0647", "\u06c0": "\u0647",                      # ة ۀ -> ه
+    "\u0623": "\u0627", "\u0625": "\u0627", "\u0622": "\u0627", "\u0671": "\u0627",  # أ إ آ ٱ -> ا
+    "\u0624": "\u0648",                                          # ؤ -> و
+    "\u200c": " ", "\u200d": "", "\u0640": "",                   # ZWNJ، ZWJ، کشیده
+    **{chr(0x06F0 + d): str(d) for d in range(10)},             # ارقام فارسی
+    **{chr(0x0660 + d): str(d) for d in range(10)},             # ارقام عربی
+})
+_DIACRITICS = re.compile("[\u064b-\u065f\u0670\u06d6-\u06ed]")
+_NON_WORD = re.compile(r"[\W_]+")
+
+
+def normalize(text: str) -> str:
+    """متن مقایسه‌پذیر: حروف و ارقام یکسان‌شده، بدون اعراب و علائم، فاصله‌های تکی."""
+    text = _DIACRITICS.sub("", (text or "").translate(_CHAR_MAP)).casefold()
+    return _NON_WORD.sub(" ", text).strip()
+
+
+def shingles(text: str, k: int = SHINGLE) -> set[str]:
+    text = normalize(text)
+    if len(text) <= k:
+        return {text} if text else set()
+    return {text[i:i + k] for i in range(len(text) - k + 1)}
+
+
+def signature(title: str, description: str) -> array | None:
+    """امضای MinHash (NUM_BINS عدد 32 بیتی)؛ None برای متن خالی."""
+    grams = shingles(f"{title or ''} {description or ''}")
+    if not grams:
+        return None
+    mins = [_EMPTY] * NUM_BINS
+    for gram in grams:
+        # hash ضربی (Fibonacci) روی crc32: بیت‌های بالا = بین، بقیه = مقدار
+        h = (zlib.crc32(gram.encode("utf-8")) * 0x9E3779B1) & 0xFFFFFFFF
+        b = h >> (32 - _BIN_BITS)
+        v = h & _VALUE_MASK
+        if v < mins[b]:
+            mins[b] = v
+    # densification: بین خالی مقدار اولین بین پر بعدی (حلقوی) را با فاصله‌اش می‌گیرد
+    if _EMPTY in mins:
+        raw = mins[:]
+        for i in range(NUM_BINS):
+            if raw[i] != _EMPTY:
+                continue
+            step = 1
+            while raw[(i + step) % NUM_BINS] == _EMPTY:
+                step += 1
+            mins[i] = raw[(i + step) % NUM_BINS] + step * (_VALUE_MASK + 1)
+    return array("I", mins)
+
+
+def pack(sig: array | None) -> bytes:
+    """امضا برای ستون minhash؛ متن خالی = b"" (یعنی «بررسی شده»، نه NULL)."""
+    return sig.tobytes() if sig is not None else b""
+
+
+def unpack(blob: bytes) -> array:
+    sig = array("I")
+    sig.frombytes(blob)
+    return sig
+
+
+def band_keys(sig: array) -> list[int]:
+    """یک کلید 64 بیتی (signed، برای ستون INTEGER) برای هر باند."""
+    keys = []
+    for band in range(BANDS):
+        digest = hashlib.blake2b(_BAND.pack(band, *sig[band * ROWS:(band + 1) * ROWS]), digest_size=8).digest()
+        keys.append(int.from_bytes(digest, "little", signed=True))
+    return keys
+
+
+def similarity(a: array, b: array) -> float:
+    """تخمین شباهت Jaccard دو امضا (کسر بین‌های برابر)."""
+    return sum(1 for x, y in zip(a, b) if x == y) / NUM_BINS
+
+
+class NearDuplicateIndex:
+    """تنظیمات و آمار تشخیص تکراری؛ ذخیره و جستجو در GameRepository است."""
+
+    def __init__(self, threshold: float = 0.6):
+        self.threshold = threshold
+        self.stats = {"indexed": 0, "checked": 0, "duplicates": 0, "candidates": 0}
+
+
+def main(argv=None) -> int:
+    from storage import GameRepository, make_backend
+
+    parser = argparse.ArgumentParser(description="ایندکس MinHash/LSH سناریوهای ذخیره‌شده (بدون امضا)")
+    parser.add_argument("--db", default=os.getenv("STARTUP_DB_PATH", "startup.db"))
+    parser.add_argument("--shards", type=int, default=int(os.getenv("STORAGE_SHARDS", "1") or 1))
+    parser.add_argument("--batch", type=int, default=5000)
+    args = parser.parse_args(argv)
+
+    repo = GameRepository(make_backend(args.db, args.shards))
+    t0 = time.perf_counter()
+    try:
+        total = repo.backfill_signatures(args.batch)
+    except sqlite3.Error as e:
+        print(f"❌ خطا در ایندکس سناریوها: {e}")
+        return 1
+    finally:
+        repo.close()
+    print(f"🔎 {total} سناریو ایندکس شد ({time.perf_counter() - t0:.1f} s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+"""Startup Sandbox - Rendered Page Cache
+
+cache پاسخ‌های HTML رندرشده (/game و /report) در حافظه process:
+
+- کلید شامل نسخه داده است (route، game_id، games.turn، games.updated_at، ...)؛
+  با هر نوبت جدید کلید عوض می‌شود، پس invalidation لازم نیست.
+- بدنه به صورت gzip نگه داشته می‌شود؛ سقف حافظه بر اساس بایت فشرده است (LRU).
+- ETag قوی از خود کلید (به‌علاوه نسخه templateها و assetها) ساخته می‌شود، نه از
+  بدنه؛ پس If-None-Match حتی در miss (evict، worker دیگر، restart) بدون رندر
+  جواب 304 می‌گیرد.
+- صفحه‌های final (بازی تمام‌شده) هرگز عوض نمی‌شوند: در evict آخر از همه
+  بیرون می‌روند و به کلاینت هم cache طولانی داده می‌شود.
+
+این ماژول به Flask وابسته نیست؛ ساخت Response در app.py است.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+
+class CachedPage:
+    __slots__ = ("etag", "body_gz", "size", "content_type", "final")
+
+    def __init__(self, etag: str, body_gz: bytes, size: int, content_type: str, final: bool):
+        self.etag = etag
+        self.body_gz = body_gz
+        self.size = size
+        self.content_type = content_type
+        self.final = final
+
+    def body(self) -> bytes:
+        return gzip.decompress(self.body_gz)
+
+
+class PageCache:
+    """LRU با سقف بایت (بدنه‌های فشرده)."""
+
+    def __init__(self, max_bytes: int = 8 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[tuple, CachedPage] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "not_modified": 0, "evictions": 0, "bytes": 0, "entries": 0}
+
+    @staticmethod
+    def etag_for(body: bytes) -> str:
+        return hashlib.sha256(body).hexdigest()[:32]
+
+    @staticmethod
+    def etag_for_key(key: tuple, version: str = "") -> str:
+        """ETag صفحه‌ای که کلیدش key است؛ در همه workerها و بعد از restart یکسان."""
+        return hashlib.sha256(repr((version,) + tuple(key)).encode("utf-8")).hexdigest()[:32]
+
+    @classmethod
+    def entry_for(cls, body: bytes, content_type: str = "text/html; charset=utf-8",
+                  final: bool = False, etag: str | None = None) -> CachedPage:
+        """ساخت entry (ETag + gzip) بدون نگه‌داشتن در cache؛ بدون etag، hash بدنه."""
+        return CachedPage(etag or cls.etag_for(body), gzip.compress(body, compresslevel=6, mtime=0),
+                          len(body), content_type, final)
+
+    def get(self, key: tuple) -> CachedPage | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry
+
+    def put(self, key: tuple, body: bytes, content_type: str = "text/html; charset=utf-8",
+            final: bool = False, etag: str | None = None) -> CachedPage:
+        entry = self.entry_for(body, content_type, final, etag)
+        if len(entry.body_gz) > self.max_bytes:
+            return entry  # بزرگ‌تر از کل cache: فقط همین پاسخ
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old.body_gz)
+            self._entries[key] = entry
+            self._bytes += len(entry.body_gz)
+            self._evict()
+            self.stats["bytes"] = self._bytes
+            self.stats["entries"] = len(self._entries)
+        return entry
+
+    def _evict(self) -> None:
+        """اول قدیمی‌ترین صفحه‌های بازی در جریان، بعد صفحه‌های final."""
+        while self._bytes > self.max_bytes:
+            victim = next((k for k, e in self._entries.items() if not e.final), None)
+            if victim is None:
+                victim = next(iter(self._entries))
+            self._bytes -= len(self._entries.pop(victim).body_gz)
+            self.stats["evictions"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self.stats["bytes"] = self.stats["entries"] = 0
+
+
+def render_version(template_dir: str, manifest: dict | None = None) -> str:
+    """نسخه خروجی رندر: hash محتوای templateها و manifest assetها.
+
+    با deploy تازه (template یا asset عوض‌شده) همه ETagها عوض می‌شوند؛ همه workerهای
+    یک deploy همین مقدار را حساب می‌کنند.
+    """
+    digest = hashlib.sha256(json.dumps(manifest or {}, sort_keys=True).encode("utf-8"))
+    for root, dirs, files in os.walk(template_dir):
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            digest.update(os.path.relpath(path, template_dir).encode("utf-8"))
+            with open(path, "rb") as fh:
+                digest.update(hashlib.sha256(fh.read()).digest())
+    return digest.hexdigest()[:16]
@@ -0,0 +1,186 @@
+"""Startup Sandbox - Procedural Scenario Generator
+
+تولید محلی و فوری سناریو (بدون شبکه) با قالب‌ها و مخزن‌های فارسی:
+
+- بازیگرها (سرمایه‌گذار، مشتری، رقیب، ...)، مسئله‌ها و گزینه‌های هر نوع سناریو
+- جهت تأثیر هر گزینه (بودجه/شهرت/روحیه) ثابت است و شدتش از سختی نوبت
+  (calculate_difficulty) و وزن نوع سناریو در وضعیت فعلی بازی می‌آید
+- قیدهای پرامپت AI هم رعایت می‌شود: EXTREME_CRISIS حداقل یک گزینه بسیار منفی،
+  OPPORTUNITY حداقل یک گزینه با cost مثبت، DILEMMA فقط گزینه‌های trade-off
+
+خروجی همان شکل validate_scenario_data است:
+    {"title", "description", "options": [{"text", "cost", "reputation", "morale", "risk"}]}
+
+این ماژول به Flask وابسته نیست؛ RNG را فراخواننده می‌دهد (برای replay قطعی).
+"""
+
+import random
+
+ACTORS = [
+    "یک سرمایه‌گذار فرشته",
+    "بزرگ‌ترین مشتری شما",
+    "مدیر فنی تیم",
+    "یک رقیب تازه‌وارد",
+    "یک خبرنگار حوزه فناوری",
+    "تأمین‌کننده اصلی سرورها",
+    "یکی از برنامه‌نویس‌های کلیدی",
+    "یک شرکت بزرگ داخلی",
+    "یک شتاب‌دهنده معروف",
+    "یک اینفلوئنسر پرطرفدار",
+]
+
+URGENCY = [
+    "باید تا پایان هفته تصمیم بگیرید.",
+    "تیم منتظر تصمیم شماست.",
+    "هر روز تأخیر هزینه بیشتری دارد.",
+    "خبرش کم‌کم در شبکه‌های اجتماعی هم پخش می‌شود.",
+    "هیئت‌مدیره هم جویای ماجراست.",
+]
+
+# (عنوان، توضیح) — {actor}, {startup}, {days}, {amount} با مقدار پر می‌شوند
+PROBLEMS = {
+    "CRISIS": [
+        ("قطعی گسترده سرویس", "سرویس {startup} چند ساعت است از دسترس خارج شده و {actor} خواستار توضیح فوری است."),
+        ("کمبود نقدینگی", "حساب {startup} برای پرداخت حقوق این ماه کم است و {actor} هم پرداختش را {days} روز عقب انداخته."),
+        ("استعفای ناگهانی", "{actor} خبر داده از {startup} جدا می‌شود و نیمی از کارهای جاری بی‌صاحب مانده است."),
+        ("شکایت رسمی مشتری", "{actor} از کیفیت محصول {startup} شکایت رسمی کرده و تهدید به لغو قرارداد کرده است."),
+        ("افزایش ناگهانی هزینه‌ها", "هزینه زیرساخت {startup} این ماه {amount} دلار بیشتر شده و {actor} قیمت‌ها را باز هم بالا برده."),
+    ],
+    "EXTREME_CRISIS": [
+        ("نشت اطلاعات کاربران", "بخشی از اطلاعات کاربران {startup} در اینترنت منتشر شده و {actor} اولین کسی بود که خبرش را داد."),
+        ("حمله رسانه‌ای", "{actor} گزارشی تند علیه {startup} منتشر کرده و موج لغو اشتراک شروع شده است."),
+        ("توقف موقت فعالیت", "به‌خاطر یک ایراد مجوز، فعالیت {startup} تا {days} روز متوقف شده و {actor} هم عقب کشیده است."),
+        ("خروج هم‌زمان تیم", "{actor} همراه سه نفر از تیم به یک رقیب پیوسته و دانش محصول هم با آن‌ها رفته است."),
+    ],
+    "OPPORTUNITY": [
+        ("پیشنهاد سرمایه‌گذاری", "{actor} حاضر است {amount} دلار در {startup} سرمایه‌گذاری کند، اما سهم قابل‌توجهی می‌خواهد."),
+        ("قرارداد بزرگ", "{actor} می‌خواهد محصول {startup} را برای همه شعبه‌هایش بخرد، به شرط سفارشی‌سازی در {days} روز."),
+        ("غرفه رایگان نمایشگاه", "{actor} یک غرفه رایگان در نمایشگاه فناوری به {startup} پیشنهاد داده؛ آماده‌سازی‌اش اما هزینه دارد."),
+        ("همکاری تبلیغاتی", "{actor} پیشنهاد معرفی {startup} به مخاطبانش را داده و در عوض درصدی از فروش می‌خواهد."),
+    ],
+    "DILEMMA": [
+        ("دوراهی حریم خصوصی", "{actor} حاضر است برای داده‌های ناشناس کاربران {startup} مبلغ خوبی بپردازد."),
+        ("میان‌بر فنی", "تیم می‌تواند با یک میان‌بر فنی محصول {startup} را {days} روز زودتر عرضه کند، اما بدهی فنی سنگینی می‌ماند."),
+        ("اخراج یا حفظ", "{actor} عملکرد ضعیفی داشته، اما روحیه تیم {startup} به او وابسته است."),
+        ("وعده غیرواقعی", "{actor} فقط در صورتی قرارداد می‌بندد که ویژگی‌ای را وعده دهید که هنوز ساخته نشده است."),
+    ],
+    "NORMAL": [
+        ("برنامه‌ریزی فصل بعد", "وقت تعیین اولویت‌های فصل بعد {startup} است و {actor} نظر متفاوتی با تیم دارد."),
+        ("درخواست ویژگی جدید", "{actor} ویژگی جدیدی خواسته که خارج از نقشه راه {startup} است."),
+        ("انتخاب ابزار جدید", "تیم {startup} می‌خواهد ابزار مدیریت پروژه را عوض کند و {actor} هم پیشنهادی دارد."),
+        ("جذب نیروی تازه", "{actor} یک نیروی با تجربه به {startup} معرفی کرده، اما حقوق درخواستی‌اش بالاست."),
+    ],
+}
+
+# (متن، ضریب بودجه، ضریب شهرت، ضریب روحیه، ریسک) — ضریب‌ها در شدت نوبت ضرب می‌شوند
+OPTIONS = {
+    "CRISIS": [
+        ("استقراض کوتاه‌مدت و حل فوری مشکل", 2.0, -1.0, 0.5, 3),
+        ("تأخیر در پرداخت‌ها تا اوضاع آرام شود", 1.0, -1.5, -2.5, 4),
+        ("شفاف‌سازی کامل با {actor} و جبران خسارت", -2.0, 1.5, 0.5, 2),
+        ("کار شبانه تیم برای رفع مشکل", -0.5, 0.5, -2.0, 3),
+        ("فروش بخشی از سهام برای تأمین نقدینگی", 3.5, -1.0, -1.0, 5),
+    ],
+    "EXTREME_CRISIS": [
+        ("سکوت و انتظار تا آب‌ها از آسیاب بیفتد", 0.0, -4.0, -3.0, 5),
+        ("عذرخواهی عمومی و جبران برای همه کاربران", -4.0, 1.5, 1.0, 2),
+        ("مقابله و انکار رسمی", -1.0, -2.5, -1.5, 4),
+        ("استخدام مشاور بحران با هزینه بالا", -3.0, 1.0, 0.5, 3),
+        ("تعدیل نیرو برای زنده ماندن", 2.5, -2.0, -4.0, 5),
+    ],
+    "OPPORTUNITY": [
+        ("قبول کامل پیشنهاد {actor}", 3.0, 1.5, 1.0, 3),
+        ("مذاکره برای شرایط بهتر", 1.5, 0.5, 0.5, 4),
+        ("رد مؤدبانه و تمرکز روی محصول فعلی", 0.0, -0.5, -0.5, 2),
+        ("سرمایه‌گذاری اولیه برای استفاده حداکثری از فرصت", -2.0, 2.0, 1.5, 3),
+        ("پذیرش با تیمی کوچک و آزمایشی", 1.0, 1.0, -0.5, 2),
+    ],
+    "DILEMMA": [
+        ("انتخاب سود کوتاه‌مدت", 2.5, -2.5, -1.5, 4),
+        ("پایبندی به ارزش‌ها حتی با هزینه", -2.0, 2.0, 2.0, 2),
+        ("راه میانه و مذاکره با {actor}", -0.5, 0.5, -0.5, 3),
+        ("سپردن تصمیم به رأی تیم", -1.0, -0.5, 1.5, 3),
+        ("تصمیم سریع و بی‌سروصدا", 1.5, -1.0, -1.0, 4),
+    ],
+    "NORMAL": [
+        ("راه حل سریع اما هزینه‌بر", -1.5, 0.5, 0.5, 2),
+        ("راه حل ارزان و زمان‌بر", -0.5, 0.0, -0.5, 3),
+        ("فعلاً کاری نکن", 0.0, -1.0, -1.0, 4),
+        ("مشورت با {actor} و تصمیم جمعی", -1.0, 0.5, 1.0, 2),
+        ("سپردن کار به یک فریلنسر", -1.0, 0.5, -0.5, 3),
+    ],
+}
+
+# شدت پایه هر نوع: (واحد بودجه، واحد شهرت/روحیه)
+INTENSITY = {
+    "CRISIS": (110, 7),
+    "EXTREME_CRISIS": (130, 9),
+    "OPPORTUNITY": (100, 6),
+    "DILEMMA": (100, 7),
+    "NORMAL": (60, 4),
+}
+
+
+def _clamp(value, low, high):
+    return max(low, min(high, value))
+
+
+class ProceduralScenarioGenerator:
+    """سناریوساز محلی؛ generate() در حد میکروثانیه و بدون I/O است."""
+
+    name = "procedural"
+
+    def __init__(self):
+        self.stats = {"served": 0, "ai_timeouts": 0}
+
+    def generate(self, rng: random.Random, scenario_type: str, difficulty: int,
+                 startup_name: str = "استارتاپ شما", weights: dict | None = None) -> dict:
+        if scenario_type not in PROBLEMS:
+            scenario_type = "CRISIS"
+        difficulty = _clamp(int(difficulty or 1), 1, 5)
+
+        # نوعی که وضعیت بازی بیشتر به سمتش می‌رود، اثر شدیدتری هم دارد
+        pressure = 1.0
+        if weights:
+            pressure = 0.8 + 0.4 * weights.get(scenario_type, 1) / max(weights.values())
+        scale = (1 + 0.35 * (difficulty - 1)) * pressure
+        money_unit, stat_unit = INTENSITY[scenario_type]
+
+        actor = rng.choice(ACTORS)
+        fields = {
+            "actor": actor,
+            "startup": startup_name,
+            "days": rng.choice([3, 5, 7, 10, 14]),
+            "amount": int(round(money_unit * scale * rng.uniform(2, 5), -1)),
+        }
+        title, description = rng.choice(PROBLEMS[scenario_type])
+        description = f"{description.format(**fields)} {rng.choice(URGENCY)}"
+
+        options = []
+        for text, d_cost, d_rep, d_morale, risk in self._pick_options(rng, scenario_type):
+            jitter = rng.uniform(0.75, 1.25)
+            options.append({
+                "text": text.format(**fields),
+                "cost": _clamp(int(round(d_cost * money_unit * scale * jitter, -1)), -1000, 2000),
+                "reputation": _clamp(int(round(d_rep * stat_unit * scale * jitter)), -50, 50),
+                "morale": _clamp(int(round(d_morale * stat_unit * scale * jitter)), -50, 50),
+                "risk": _clamp(risk + (1 if difficulty >= 4 else 0), 1, 5),
+            })
+        self.stats["served"] += 1
+        return {"title": title, "description": description, "options": options}
+
+    @staticmethod
+    def _pick_options(rng: random.Random, scenario_type: str) -> list:
+        """سه گزینه متفاوت با رعایت قید هر نوع سناریو."""
+        pool = OPTIONS[scenario_type]
+        if scenario_type == "EXTREME_CRISIS":
+            required = [o for o in pool if min(o[1:4]) <= -3.0]
+        elif scenario_type == "OPPORTUNITY":
+            required = [o for o in pool if o[1] > 0]
+        else:
+            required = pool
+        first = rng.choice(required)
+        rest = rng.sample([o for o in pool if o is not first], 2)
+        picked = [first, *rest]
+        rng.shuffle(picked)
+        return picked
@@ -0,0 +1,204 @@
+"""Startup Sandbox - Deterministic Replay
+
+بازپخش قطعی بازی‌های ضبط‌شده برای benchmark و تست رگرسیون مسیر نوبت.
+
+- هر بازی یک rng_seed دارد؛ انتخاب نوع سناریو از RNG همان seed و شماره نوبت است.
+- هر پاسخ خام AI با hash پرامپت در جدول ai_replay_log ذخیره می‌شود.
+- replay یک اپ تازه با دیتابیس موقت می‌سازد، همان seed را اجبار می‌کند و بازی را
+  از طریق routeهای واقعی Flask (new_game → mode → game → action → next_turn)
+  دوباره اجرا می‌کند؛ پاسخ AI از log خوانده می‌شود و هیچ درخواست شبکه‌ای زده نمی‌شود.
+
+اجرا:
+    python replay.py list [--db startup.db]
+    python replay.py run GAME_ID [--db startup.db] [--repeat 5]
+"""
+
+import argparse
+import contextlib
+import hashlib
+import io
+import os
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict, deque
+
+
+def prompt_hash(contents: str, json_mode: bool) -> str:
+    """کلید replay: hash پرامپت کامل ارسالی به AI (به همراه حالت JSON)."""
+    return hashlib.sha256(f"{int(bool(json_mode))}|{contents}".encode("utf-8")).hexdigest()
+
+
+class ReplaySource:
+    """پاسخ‌های ضبط‌شده بر اساس hash پرامپت؛ پرامپت‌های تکراری به ترتیب ثبت پخش می‌شوند."""
+
+    def __init__(self, rows):
+        self._responses: dict[str, deque] = defaultdict(deque)
+        for row in rows:
+            self._responses[row["prompt_hash"]].append(row["response"])
+        self.hits = 0
+        self.misses = 0
+
+    def take(self, key: str):
+        queue = self._responses.get(key)
+        if not queue:
+            # پرامپتی که در ضبط نبوده یعنی مسیر بازی واگرا شده است
+            self.misses += 1
+            return None
+        self.hits += 1
+        return queue.popleft()
+
+
+def _choice_positions(repo, game_id: int, logs) -> list[dict]:
+    """برای هر نوبت ضبط‌شده: ایندکس گزینه انتخاب‌شده در سناریوی همان نوبت."""
+    steps = []
+    for log in logs:
+        choices = repo.list_choices(game_id, log.scenario_id) if log.scenario_id else []
+        ids = [c.id for c in choices]
+        if log.choice_id not in ids:
+            raise ValueError(f"نوبت {log.turn}: گزینه {log.choice_id} در سناریو پیدا نشد")
+        steps.append({
+            "turn": log.turn,
+            "position": ids.index(log.choice_id),
+            "scenario_title": log.scenario_title,
+        })
+    return steps
+
+
+def replay_game(db_path: str, game_id: int, shards: int = 1) -> dict:
+    """یک بازی ضبط‌شده را از طریق routeهای واقعی بازپخش می‌کند و نتیجه را مقایسه می‌کند."""
+    from storage import GameRepository, make_backend
+    import app as app_module
+
+    source_repo = GameRepository(make_backend(db_path, shards))
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            recorded = source_repo.get_game(game_id)
+            if not recorded:
+                raise ValueError(f"بازی {game_id} پیدا نشد")
+            if recorded.rng_seed is None:
+                raise ValueError(f"بازی {game_id} seed ندارد و قابل replay نیست")
+            user = source_repo.get_user(recorded.user_id)
+            logs = source_repo.list_logs(game_id)
+            steps = _choice_positions(source_repo, game_id, logs)
+            source = ReplaySource(source_repo.ai_responses(game_id))
+    finally:
+        source_repo.close()
+
+    result = {"game_id": game_id, "turns": len(steps), "divergences": [], "turn_ms": []}
+
+    with tempfile.TemporaryDirectory() as tmp, contextlib.redirect_stdout(io.StringIO()):
+        flask_app = app_module.create_app({
+            "DB_PATH": os.path.join(tmp, "replay.db"),
+            "TESTING": True,
+            "RNG_SEED": recorded.rng_seed,
+            "AI_REPLAY_SOURCE": source,
+            "AI_RECORD": False,
+            # شاخه‌های speculative زمان‌بندی غیرقطعی دارند؛ replay مسیر اصلی را می‌سنجد
+            "SPECULATION_ENABLED": False,
+        })
+        repo = flask_app.extensions["repository"]
+        client = flask_app.test_client()
+
+        t0 = time.perf_counter()
+        client.post("/new_game", data={
+            "username": user["username"] if user else "replay",
+            "startup_name": recorded.startup_name,
+        })
+        with client.session_transaction() as sess:
+            new_id = sess.get("game_id")
+        if new_id is None:
+            raise RuntimeError("ساخت بازی در replay شکست خورد")
+        client.post("/mode", data={"mode": recorded.mode or "classic"})
+
+        for step in steps:
+            t_turn = time.perf_counter()
+            client.get("/game")
+            scenario = repo.latest_scenario(new_id)
+            if scenario is None or scenario.title != step["scenario_title"]:
+                result["divergences"].append({
+                    "turn": step["turn"],
+                    "expected": step["scenario_title"],
+                    "actual": scenario.title if scenario else None,
+                })
+            choices = repo.list_choices(new_id, scenario.id) if scenario else []
+            if step["position"] >= len(choices):
+                result["divergences"].append({"turn": step["turn"], "error": "گزینه موجود نیست"})
+                break
+            client.post("/action", data={"choice_id": str(choices[step["position"]].id)})
+            client.get("/next_turn")
+            result["turn_ms"].append((time.perf_counter() - t_turn) * 1000)
+        result["total_ms"] = (time.perf_counter() - t0) * 1000
+
+        final = repo.get_game(new_id)
+        repo.close()
+
+    expected_stats = (recorded.budget, recorded.reputation, recorded.morale, recorded.turn)
+    actual_stats = (final.budget, final.reputation, final.morale, final.turn)
+    if expected_stats != actual_stats:
+        result["divergences"].append({"final": True, "expected": expected_stats, "actual": actual_stats})
+    result["ai_hits"] = source.hits
+    result["ai_misses"] = source.misses
+    return result
+
+
+def _list_games(db_path: str, shards: int) -> None:
+    from storage import GameRepository, make_backend
+
+    repo = GameRepository(make_backend(db_path, shards))
+    with contextlib.redirect_stdout(io.StringIO()):
+        pool = repo.backend.global_pool()
+    with pool.connection() as conn:
+        rows = conn.execute('''
+            SELECT id, startup_name, turn, mode, rng_seed FROM games
+            WHERE rng_seed IS NOT NULL
+            ORDER BY id DESC
+            LIMIT 50
+        ''').fetchall()
+    repo.close()
+    for r in rows:
+        print(f"{r['id']:>6}  turns={r['turn']:<4} mode={r['mode'] or 'classic':<10} {r['startup_name']}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="replay قطعی بازی‌های ضبط‌شده")
+    parser.add_argument("--db", default=os.getenv("STARTUP_DB_PATH", "startup.db"))
+    parser.add_argument("--shards", type=int, default=int(os.getenv("STORAGE_SHARDS", "1") or 1))
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("list", help="بازی‌های قابل replay")
+    run = sub.add_parser("run", help="replay یک بازی")
+    run.add_argument("game_id", type=int)
+    run.add_argument("--repeat", type=int, default=1, help="تعداد اجرا (برای benchmark)")
+    args = parser.parse_args(argv)
+
+    if args.cmd == "list":
+        _list_games(args.db, args.shards)
+        return 0
+
+    totals, turn_ms = [], []
+    result = None
+    for _ in range(args.repeat):
+        result = replay_game(args.db, args.game_id, args.shards)
+        totals.append(result["total_ms"])
+        turn_ms.extend(result["turn_ms"])
+
+    print("=" * 50)
+    print(f"game {args.game_id}: turns={result['turns']} runs={args.repeat}")
+    print(f"AI served from log: hits={result['ai_hits']} misses={result['ai_misses']}")
+    print(f"total ms: median={statistics.median(totals):.1f} min={min(totals):.1f}")
+    if turn_ms:
+        print(f"turn ms: median={statistics.median(turn_ms):.2f} max={max(turn_ms):.2f}")
+    if result["divergences"]:
+        print("❌ واگرایی از بازی ضبط‌شده:")
+        for d in result["divergences"]:
+            print(f"  {d}")
+        print("=" * 50)
+        return 1
+    print("✅ replay با بازی ضبط‌شده یکسان است")
+    print("=" * 50)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
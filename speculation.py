@@ -0,0 +1,185 @@
+"""Startup Sandbox - Speculative Scenario Generation
+
+وقتی بازیکن روی /game در حال فکر کردن است، سرور بیکار است. این ماژول برای
+شاخه‌های محتمل (هر گزینه‌ای که بازی را تمام نمی‌کند) سناریوی نوبت بعد را
+با اولویت پایین از قبل تولید می‌کند:
+
+- speculate: ثبت کار هر شاخه در یک thread pool کم‌اولویت (با سقف بودجه هر نوبت بازی)
+- commit: بعد از انتخاب بازیکن، شاخه‌های دیگر لغو یا (اگر تمام شده بودند)
+  به corpus سناریوها بازیافت می‌شوند
+- take: /next_turn نتیجه شاخه انتخاب‌شده را برمی‌دارد
+
+این ماژول به Flask وابسته نیست؛ کارها callableهایی هستند که اپ می‌سازد.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+
+def lower_thread_priority() -> None:
+    """nice کردن thread جاری برای کارهای پس‌زمینه (speculation، نگهداری دیتابیس).
+
+    در لینوکس setpriority روی TID فقط همان thread را پایین می‌آورد.
+    """
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 10)
+    except Exception:
+        pass
+
+
+class SpeculationManager:
+    """نگهداری شاخه‌های speculative هر بازی بر اساس (game_id, turn نوبت بعد)."""
+
+    def __init__(self, max_workers: int = 2, budget_per_turn: int = 6, max_games: int = 1024):
+        self.max_workers = max(1, int(max_workers))
+        self.budget_per_turn = max(0, int(budget_per_turn))
+        self.max_games = max_games
+        self._executor: ThreadPoolExecutor | None = None
+        self._lock = threading.Lock()
+        self._pool_lock = threading.Lock()
+        # (game_id, turn) -> {choice_id: Future}
+        self._branches: dict[tuple, dict] = {}
+        # (game_id, turn) -> Future شاخه انتخاب‌شده
+        self._chosen: dict[tuple, Future] = {}
+        # game_id -> (turn، تعداد کار speculative ثبت‌شده برای آن نوبت)؛ با نوبت تازه
+        # بودجه دوباره پر می‌شود. LRU روی بازی‌ها: بازی‌ای که از max_games بیرون
+        # بیفتد (مثلاً رهاشده) شاخه‌هایش هم پاک می‌شود تا حافظه محدود بماند
+        self._spent: OrderedDict = OrderedDict()
+        self.stats = {
+            "submitted": 0, "used": 0, "cancelled": 0,
+            "recycled": 0, "wasted": 0, "over_budget": 0,
+        }
+
+    def _pool(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._pool_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_workers,
+                        thread_name_prefix="speculation",
+                        initializer=lower_thread_priority,
+                    )
+        return self._executor
+
+    def _spent_on(self, game_id: int, turn: int) -> int:
+        spent_turn, spent = self._spent.get(game_id, (turn, 0))
+        return spent if spent_turn == turn else 0
+
+    def remaining_budget(self, game_id: int, turn: int) -> int:
+        with self._lock:
+            return self.budget_per_turn - self._spent_on(game_id, turn)
+
+    def speculate(self, game_id: int, turn: int, branches: list) -> int:
+        """branches: [(choice_id, callable)]؛ تعداد کارهای تازه ثبت‌شده را برمی‌گرداند.
+
+        refresh صفحه کار تکراری ثبت نمی‌کند و بودجه هر نوبت (مثلاً با سناریوی تازه از
+        /next_turn در همان نوبت) هرگز رد نمی‌شود.
+        """
+        key = (game_id, turn)
+        submitted = 0
+        for choice_id, job in branches:
+            with self._lock:
+                existing = self._branches.setdefault(key, {})
+                if choice_id in existing or key in self._chosen:
+                    continue
+                spent = self._spent_on(game_id, turn)
+                if spent >= self.budget_per_turn:
+                    self.stats["over_budget"] += 1
+                    continue
+                if spent == 0:
+                    # نوبت تازه: شاخه‌های نوبت‌های قبلی این بازی دیگر برداشته نمی‌شوند
+                    self._drop(game_id, before_turn=turn)
+                self._spent[game_id] = (turn, spent + 1)
+                self._spent.move_to_end(game_id)
+                while len(self._spent) > self.max_games:
+                    self._drop(self._spent.popitem(last=False)[0])
+                existing[choice_id] = self._pool().submit(job)
+                self.stats["submitted"] += 1
+                submitted += 1
+        return submitted
+
+    def commit(self, game_id: int, turn: int, choice_id, recycle=None) -> bool:
+        """انتخاب نهایی بازیکن؛ بقیه شاخه‌ها لغو یا بازیافت می‌شوند.
+
+        recycle(payload): برای نتیجه‌های آماده شاخه‌های انتخاب‌نشده (مثلاً ذخیره در corpus).
+        """
+        key = (game_id, turn)
+        with self._lock:
+            branches = self._branches.pop(key, {})
+            chosen = branches.pop(choice_id, None)
+            if chosen is not None:
+                self._chosen[key] = chosen
+
+        for future in branches.values():
+            if future.cancel():
+                self.stats["cancelled"] += 1
+                continue
+            future.add_done_callback(lambda f: self._recycle(f, recycle))
+        return chosen is not None
+
+    def _recycle(self, future: Future, recycle) -> None:
+        try:
+            payload = future.result()
+        except Exception:
+            payload = None
+        if payload is None or recycle is None:
+            self.stats["wasted"] += 1
+            return
+        try:
+            recycle(payload)
+            self.stats["recycled"] += 1
+        except Exception as e:
+            self.stats["wasted"] += 1
+            print(f"⚠️ خطا در بازیافت سناریوی speculative: {e}")
+
+    def take(self, game_id: int, turn: int, timeout: float = 0.0):
+        """نتیجه شاخه انتخاب‌شده (یا None).
+
+        اگر هنوز در حال اجراست تا timeout صبر می‌کند؛ چون زودتر شروع شده،
+        صبر کردن از شروع یک فراخوانی تازه ارزان‌تر است.
+        """
+        with self._lock:
+            future = self._chosen.pop((game_id, turn), None)
+        if future is None:
+            return None
+        try:
+            payload = future.result(timeout=timeout)
+        except FutureTimeout:
+            future.add_done_callback(lambda f: self._recycle(f, None))
+            return None
+        except Exception:
+            return None
+        if payload is not None:
+            self.stats["used"] += 1
+        return payload
+
+    def _drop(self, game_id: int, before_turn: int | None = None) -> None:
+        """لغو و حذف شاخه‌های بازی (فقط نوبت‌های قبل از before_turn اگر داده شود)؛ زیر _lock."""
+        def match(key):
+            return key[0] == game_id and (before_turn is None or key[1] < before_turn)
+
+        for key in [k for k in self._branches if match(k)]:
+            for future in self._branches.pop(key).values():
+                if future.cancel():
+                    self.stats["cancelled"] += 1
+        for key in [k for k in self._chosen if match(k)]:
+            if self._chosen.pop(key).cancel():
+                self.stats["cancelled"] += 1
+
+    def forget(self, game_id: int) -> None:
+        """پاک کردن شاخه‌های یک بازی (بعد از پایان بازی یا شروع بازی تازه)."""
+        with self._lock:
+            self._drop(game_id)
+            self._spent.pop(game_id, None)
+
+    def tracked(self) -> int:
+        """تعداد (بازی، نوبت)هایی که شاخه یا نتیجه انتخاب‌شده نگه داشته شده."""
+        with self._lock:
+            return len(self._branches) + len(self._chosen)
+
+    def shutdown(self, wait: bool = False) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,100 @@
+"""Startup Sandbox - Packed Stat History
+
+مسیر کامل بودجه/شهرت/روحیه هر بازی برای نمودار /report، در یک ستون BLOB:
+
+- games.stat_history: آرایه int32 (little-endian) پشت سر هم؛ هر نقطه سه عدد
+  (budget, reputation, morale). create_game نقطه شروع و record_turn در همان
+  تراکنش نوبت یک نقطه (12 بایت) به انتها اضافه می‌کنند.
+- /report: decode با array (یا NumPy اگر نصب باشد)، کاهش به حداکثر CHART_POINTS
+  نقطه با فاصله یکنواخت (اولین و آخرین نقطه همیشه هستند)، و درصد هر نقطه در
+  بازه نمودار به صورت برداری. هزینه رسم نمودار به طول بازی بستگی ندارد.
+- بازی‌های قدیمی بدون ستون: مسیر از وضعیت فعلی و impactهای logs به عقب ساخته می‌شود.
+"""
+
+import sys
+from array import array
+
+try:
+    import numpy as np
+except ImportError:  # NumPy اختیاری است؛ مسیر array همان نتیجه را می‌دهد
+    np = None
+
+FIELDS = ("budget", "reputation", "morale")
+TYPECODE = "i"
+CHART_POINTS = 40
+_SWAP = sys.byteorder != "little"
+
+
+def pack_point(budget: int, reputation: int, morale: int) -> bytes:
+    """یک نقطه برای افزودن به انتهای stat_history."""
+    values = array(TYPECODE, (int(budget), int(reputation), int(morale)))
+    if _SWAP:
+        values.byteswap()
+    return values.tobytes()
+
+
+def decode(blob: bytes | None) -> dict:
+    """stat_history -> {field: دنباله مقادیر} (ndarray با NumPy، وگرنه array)."""
+    blob = blob or b""
+    usable = len(blob) - len(blob) % (len(FIELDS) * 4)
+    if np is not None:
+        flat = np.frombuffer(blob, dtype="<i4", count=usable // 4)
+        return {name: flat[i::len(FIELDS)] for i, name in enumerate(FIELDS)}
+    flat = array(TYPECODE)
+    flat.frombytes(blob[:usable])
+    if _SWAP:
+        flat.byteswap()
+    return {name: flat[i::len(FIELDS)] for i, name in enumerate(FIELDS)}
+
+
+def from_logs(final: tuple, impacts: list) -> bytes:
+    """مسیر تقریبی برای بازی بدون stat_history: از وضعیت پایانی، impactها به عقب کم می‌شوند.
+
+    impacts: (cost, reputation, morale) هر نوبت به ترتیب. با clamp آمار (مثلاً بودجه
+    صفر) ممکن است نقاط قدیمی کمی با واقعیت فرق کنند.
+    """
+    points = [tuple(final)]
+    for delta in reversed(impacts):
+        points.append(tuple(v - (d or 0) for v, d in zip(points[-1], delta)))
+    return b"".join(pack_point(*p) for p in reversed(points))
+
+
+def _sample_indices(n: int, points: int) -> list:
+    if n <= points:
+        return list(range(n))
+    step = (n - 1) / (points - 1)
+    return [round(i * step) for i in range(points)]
+
+
+def chart_series(blob: bytes | None, ranges: dict, points: int = CHART_POINTS) -> dict:
+    """نقاط نمودار هر آمار: {field: {"values", "pct", "polyline", "last"}}.
+
+    ranges: field -> (کمینه، بیشینه)؛ بیشینه None یعنی بزرگ‌ترین مقدار همان سری.
+    polyline برای <svg viewBox="0 0 100 100"> است (محور x نوبت، y درصد).
+    """
+    history = decode(blob)
+    n = len(history[FIELDS[0]])
+    if not n:
+        return {}
+    indices = _sample_indices(n, points)
+    xs = [0.0] if len(indices) == 1 else [i * 100 / (len(indices) - 1) for i in range(len(indices))]
+    out = {}
+    for name in FIELDS:
+        lo, hi = ranges.get(name, (0, None))
+        if np is not None:
+            values = history[name][indices]
+            top = hi if hi is not None else max(int(values.max()), lo + 1)
+            pct = np.clip(np.rint((values - lo) * 100 / ((top - lo) or 1)), 0, 100).astype(int).tolist()
+            values = values.tolist()
+        else:
+            series = history[name]
+            values = [series[i] for i in indices]
+            top = hi if hi is not None else max(max(values), lo + 1)
+            pct = [max(0, min(100, round((v - lo) * 100 / ((top - lo) or 1)))) for v in values]
+        out[name] = {
+            "values": values,
+            "pct": pct,
+            "polyline": " ".join(f"{x:.1f},{100 - p}" for x, p in zip(xs, pct)),
+            "last": values[-1],
+        }
+    return out
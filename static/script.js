@@ -130,6 +130,104 @@
     };
   }
 
+  // نوبت بدون بارگذاری صفحه: POST /api/turn و به‌روزرسانی همین DOM
+  // (اگر fetch نباشد یا خطا بدهد، همان فرم HTML و /action کار می‌کند)
+  function initTurnApi() {
+    const form = document.querySelector("form[data-turn-api]");
+    if (!form || !window.fetch) return;
+
+    form.addEventListener("submit", async (e) => {
+      const btn = e.submitter;
+      if (!btn || !btn.value) return;
+      e.preventDefault();
+
+      const buttons = form.querySelectorAll("button");
+      buttons.forEach((b) => (b.disabled = true));
+      try {
+        const res = await fetch(form.dataset.turnApi, {
+          method: "POST",
+          credentials: "same-origin",
+          headers: { "Content-Type": "application/json", Accept: "application/json" },
+          body: JSON.stringify({ choice_id: btn.value }),
+        });
+        const data = await res.json();
+        if (!res.ok || data.game_over) {
+          window.location.href = data.redirect || window.location.href;
+          return;
+        }
+        applyTurn(form, data);
+      } catch (err) {
+        // وضعیت واقعی را از سرور بگیر
+        window.location.reload();
+      } finally {
+        buttons.forEach((b) => (b.disabled = false));
+      }
+    });
+  }
+
+  function setField(name, value, animate) {
+    const el = document.querySelector(`[data-field="${name}"]`);
+    if (!el) return;
+    if (animate) animateNumber(el, Number(value) || 0);
+    else el.textContent = value;
+  }
+
+  function applyTurn(form, data) {
+    const g = data.game;
+    ["turn", "score", "budget", "reputation", "morale"].forEach((k) => setField(k, g[k], true));
+
+    const bars = {
+      morale: clamp(g.morale, 0, 100),
+      reputation: clamp(g.reputation, 0, 100),
+      budget: clamp((g.budget / 10000) * 100, 0, 100),
+    };
+    Object.entries(bars).forEach(([k, w]) => {
+      const bar = document.querySelector(`[data-bar="${k}"]`);
+      if (bar) bar.style.width = `${w}%`;
+    });
+
+    const result = document.getElementById("turnResult");
+    if (result) {
+      setField("story", data.story);
+      result.hidden = false;
+    }
+    setField("scenario-title", data.scenario.title);
+    setField("scenario-description", data.scenario.description);
+
+    form.replaceChildren(...data.choices.map(choiceButton));
+    initChoiceHoverPreview();
+    window.scrollTo({ top: 0, behavior: "smooth" });
+  }
+
+  function choiceButton(c) {
+    const sign = (n) => `${Number(n) >= 0 ? "+" : ""}${n}`;
+    const btn = document.createElement("button");
+    btn.className = "choice";
+    btn.type = "submit";
+    btn.name = "choice_id";
+    btn.value = c.id;
+    btn.dataset.deltaBudget = c.cost_impact;
+    btn.dataset.deltaRep = c.reputation_impact;
+    btn.dataset.deltaMorale = c.morale_impact;
+
+    const text = document.createElement("div");
+    text.className = "choice__text";
+    text.textContent = c.text;
+
+    const meta = document.createElement("div");
+    meta.className = "choice__meta";
+    [["budget", c.cost_impact], ["rep", c.reputation_impact], ["morale", c.morale_impact]].forEach(([kind, v]) => {
+      const span = document.createElement("span");
+      span.className = "delta";
+      span.dataset.kind = kind;
+      span.textContent = sign(v);
+      meta.appendChild(span);
+    });
+
+    btn.append(text, meta);
+    return btn;
+  }
+
   // Boot
   document.addEventListener("DOMContentLoaded", () => {
     initThemeBtn();
@@ -137,6 +235,7 @@
     initStatBars();
     initChoiceHoverPreview();
     initAnimatedStats();
+    initTurnApi();
     function initChoiceHoverPreview() {
       const choices = document.querySelectorAll(".choice");
       if (!choices.length) return;
@@ -0,0 +1,722 @@
+"""Startup Sandbox - Storage Layer
+
+لایه repository روی SQLite.
+
+- همه SQLهای بازی (games, scenarios, choices, logs) اینجا هستند، نه داخل routeها.
+- backend قابل تعویض است:
+    * SQLiteBackend: یک فایل برای همه‌چیز (رفتار قبلی، پیش‌فرض)
+    * ShardedSQLiteBackend: داده‌های هر بازی بر اساس hash(game_id) در یکی از N فایل
+      ذخیره می‌شود؛ users و رجیستری/لیدربورد games در دیتابیس global می‌مانند.
+- هر فایل (shard) connection pool خودش را دارد، پس writeهای بازی‌های مختلف
+  روی قفل writer یک فایل صف نمی‌کشند.
+- games/scenarios/choices/logs به صورت اشیای models.py (Game, Scenario, ...)
+  برگردانده می‌شوند، نه sqlite3.Row.
+- تاریخچه اخیر هر بازی (برای «سناریوی تکراری نساز» در پرامپت) در حافظه process
+  نگه داشته می‌شود و فقط بار اول با ایندکس (game_id, turn) از logs خوانده می‌شود.
+- هر سناریو با ذخیره شدن امضای MinHash و کلیدهای LSH می‌گیرد (near_duplicates.py)؛
+  find_near_duplicate سناریوی تقریباً تکراری همان بازی یا corpus را پیدا می‌کند.
+- با telemetry (telemetry.py) متن‌های حجیم log از تراکنش نوبت بیرون می‌روند و
+  بعداً loader آن‌ها را با fill_log_details در logs می‌نویسد.
+"""
+
+import json
+import os
+import queue
+import sqlite3
+import threading
+import zlib
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+
+from ai_accounting import AICallRecorder
+from models import Choice, Game, LogEntry, Scenario, row_factory
+from near_duplicates import MAX_CANDIDATES, NearDuplicateIndex, band_keys, pack, signature, similarity, unpack
+from stat_history import pack_point
+import tracing
+
+try:
+    from migrate_db import migrate_database
+except Exception:
+    migrate_database = None
+
+# فیلدهای حجیم log که با telemetry فعال در تراکنش نوبت نوشته نمی‌شوند
+VERBOSE_LOG_FIELDS = ("choice_text", "ai_response")
+
+
+def final_score(budget: int, reputation: int, morale: int, turn: int) -> int:
+    """امتیاز پایانی بازی (خلاصه /history): نوبت‌های دوام آورده + شهرت و روحیه + بودجه باقی‌مانده."""
+    return 10 * max(0, (turn or 1) - 1) + (reputation or 0) + (morale or 0) + max(0, budget or 0) // 100
+
+
+# ========== Connection Pool ==========
+
+class ConnectionPool:
+    """pool ساده و thread-safe از اتصال‌های SQLite برای یک فایل."""
+
+    def __init__(self, db_path: str, size: int = 4, timeout: float = 30.0):
+        self.db_path = db_path
+        self.size = max(1, int(size))
+        self.timeout = timeout
+        self._idle: queue.LifoQueue = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=self.timeout, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA foreign_keys = ON')
+        # WAL: خواننده‌ها writer را بلاک نمی‌کنند و commitها ارزان‌ترند
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('PRAGMA synchronous = NORMAL')
+        return conn
+
+    def _acquire(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                try:
+                    return self._connect()
+                except Exception:
+                    self._created -= 1
+                    raise
+        return self._idle.get(timeout=self.timeout)
+
+    @contextmanager
+    def connection(self):
+        """یک اتصال از pool؛ در صورت خطا rollback و در پایان برگشت به pool.
+
+        با trace فعال، span "db" (شامل انتظار برای pool) و یک span برای هر statement.
+        """
+        with tracing.span("db", **{"db.system": "sqlite", "db.name": os.path.basename(self.db_path)}) as span:
+            conn = self._acquire()
+            statements = None
+            if span is not None:
+                statements = tracing.StatementSpans(span)
+                conn.set_trace_callback(statements)
+            try:
+                yield conn
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                if statements is not None:
+                    conn.set_trace_callback(None)
+                    statements.close()
+                    span.set(**{"db.statements": statements.count})
+                self._idle.put(conn)
+
+    def close_all(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+        with self._lock:
+            self._created = 0
+
+
+# ========== Backends ==========
+
+class SQLiteBackend:
+    """یک فایل SQLite برای داده‌های global و همه بازی‌ها."""
+
+    sharded = False
+
+    def __init__(self, db_path: str, pool_size: int = 4):
+        self.global_path = db_path
+        self.shard_paths = [db_path]
+        self._pool = ConnectionPool(db_path, pool_size)
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+
+    @property
+    def shard_count(self) -> int:
+        return 1
+
+    def ensure_schema(self) -> None:
+        """اجرای migrate_database یک بار برای هر فایل (idempotent)."""
+        if self._schema_ready:
+            return
+        with self._schema_lock:
+            if self._schema_ready:
+                return
+            if migrate_database is not None:
+                for path in dict.fromkeys([self.global_path, *self.shard_paths]):
+                    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+                    migrate_database(path)
+            self._schema_ready = True
+
+    def global_pool(self) -> ConnectionPool:
+        self.ensure_schema()
+        return self._pool
+
+    def shard_pool(self, game_id: int) -> ConnectionPool:
+        self.ensure_schema()
+        return self._pool
+
+    def pools(self) -> list[ConnectionPool]:
+        return [self._pool]
+
+    def shard_pools(self) -> list[ConnectionPool]:
+        """فایل‌هایی که داده بازی‌ها (games کامل، logs، ...) را دارند."""
+        self.ensure_schema()
+        return [self._pool]
+
+    def close(self) -> None:
+        self._pool.close_all()
+
+
+class ShardedSQLiteBackend(SQLiteBackend):
+    """داده‌های هر بازی در shard = hash(game_id) % N؛ users/لیدربورد در global."""
+
+    sharded = True
+
+    def __init__(self, global_path: str, shard_paths: list[str], pool_size: int = 4):
+        if not shard_paths:
+            raise ValueError("حداقل یک shard لازم است")
+        self.global_path = global_path
+        self.shard_paths = list(shard_paths)
+        self._pool = ConnectionPool(global_path, pool_size)
+        self._shard_pools = [ConnectionPool(p, pool_size) for p in self.shard_paths]
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+
+    @property
+    def shard_count(self) -> int:
+        return len(self._shard_pools)
+
+    def shard_index(self, game_id: int) -> int:
+        # hash پایدار بین پروسس‌ها (hash() پایتون برای رشته‌ها salt دارد)
+        return zlib.crc32(str(int(game_id)).encode()) % len(self._shard_pools)
+
+    def shard_pool(self, game_id: int) -> ConnectionPool:
+        self.ensure_schema()
+        return self._shard_pools[self.shard_index(game_id)]
+
+    def pools(self) -> list[ConnectionPool]:
+        return [self._pool, *self._shard_pools]
+
+    def shard_pools(self) -> list[ConnectionPool]:
+        self.ensure_schema()
+        return list(self._shard_pools)
+
+    def close(self) -> None:
+        for pool in self.pools():
+            pool.close_all()
+
+
+def shard_paths_for(db_path: str, shards: int) -> list[str]:
+    """مسیر فایل‌های shard کنار دیتابیس اصلی: startup.shard0.db, ..."""
+    base, ext = os.path.splitext(db_path)
+    return [f"{base}.shard{i}{ext or '.db'}" for i in range(shards)]
+
+
+def make_backend(db_path: str, shards: int = 1, pool_size: int = 4) -> SQLiteBackend:
+    """ساخت backend بر اساس تنظیمات (shards <= 1 یعنی همان یک فایل قبلی)."""
+    shards = int(shards or 1)
+    if shards <= 1:
+        return SQLiteBackend(db_path, pool_size)
+    return ShardedSQLiteBackend(db_path, shard_paths_for(db_path, shards), pool_size)
+
+
+# ========== Repository ==========
+
+def _query(conn: sqlite3.Connection, model, sql: str, params=()) -> sqlite3.Cursor:
+    """اجرای SELECT که ردیف‌هایش به جای sqlite3.Row، نمونه model (models.py) هستند."""
+    cur = conn.execute(sql, params)
+    cur.row_factory = row_factory(model, cur.description)
+    return cur
+
+
+class RecentHistory:
+    """cache تاریخچه اخیر بازی‌ها: game_id -> deque از (عنوان، نوع سناریو)، جدیدترین اول.
+
+    تعداد بازی‌ها محدود است (LRU)؛ بازی‌ای که بیرون رفته دوباره از دیتابیس خوانده می‌شود.
+    """
+
+    def __init__(self, depth: int = 5, max_games: int = 2048):
+        self.depth = depth
+        self.max_games = max_games
+        self._games: OrderedDict[int, deque] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, game_id: int):
+        with self._lock:
+            entries = self._games.get(game_id)
+            if entries is None:
+                return None
+            self._games.move_to_end(game_id)
+            return list(entries)
+
+    def put(self, game_id: int, entries: list) -> None:
+        with self._lock:
+            self._games[game_id] = deque(entries[:self.depth], maxlen=self.depth)
+            self._games.move_to_end(game_id)
+            while len(self._games) > self.max_games:
+                self._games.popitem(last=False)
+
+    def push(self, game_id: int, title: str | None, scenario_type: str | None) -> None:
+        """نوبت جدید؛ فقط اگر بازی در cache باشد (وگرنه بار بعد از دیتابیس خوانده می‌شود)."""
+        with self._lock:
+            entries = self._games.get(game_id)
+            if entries is not None:
+                entries.appendleft((title, scenario_type))
+
+    def discard(self, game_id: int) -> None:
+        with self._lock:
+            self._games.pop(game_id, None)
+
+
+class GameRepository:
+    """عملیات داده‌ای بازی؛ routeها فقط با این کلاس کار می‌کنند."""
+
+    def __init__(self, backend: SQLiteBackend):
+        self.backend = backend
+        self.recent = RecentHistory()
+        # ردیف‌های ai_calls در صف حافظه؛ یک thread دسته‌ای در دیتابیس global می‌نویسد
+        self.ai_calls = AICallRecorder(backend.global_pool)
+        # آستانه و آمار تشخیص سناریوی تقریباً تکراری
+        self.dedup = NearDuplicateIndex()
+        # TelemetryLog (telemetry.py) یا None: همه log در همان تراکنش نوبت
+        self.telemetry = None
+
+    # ---------- users (global) ----------
+    def get_or_create_user(self, username: str) -> int:
+        with self.backend.global_pool().connection() as conn:
+            row = conn.execute('SELECT id FROM users WHERE username = ?', (username,)).fetchone()
+            if row:
+                return row['id']
+            cur = conn.execute('INSERT INTO users (username) VALUES (?)', (username,))
+            conn.commit()
+            return cur.lastrowid
+
+    def find_user_id(self, username: str) -> int | None:
+        with self.backend.global_pool().connection() as conn:
+            row = conn.execute('SELECT id FROM users WHERE username = ?', (username,)).fetchone()
+            return row['id'] if row else None
+
+    def get_user(self, user_id: int):
+        with self.backend.global_pool().connection() as conn:
+            return conn.execute('SELECT * FROM users WHERE id = ?', (user_id,)).fetchone()
+
+    # ---------- games ----------
+    def create_game(self, user_id: int, startup_name: str, budget: int, reputation: int, morale: int,
+                    rng_seed: int | None = None) -> int:
+        """id بازی از دیتابیس global گرفته می‌شود تا بین shardها یکتا باشد."""
+        history = pack_point(budget, reputation, morale)
+        with self.backend.global_pool().connection() as conn:
+            cur = conn.execute('''
+                INSERT INTO games (user_id, startup_name, budget, reputation, morale, turn, rng_seed, stat_history)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (user_id, startup_name, budget, reputation, morale, 1, rng_seed,
+                  None if self.backend.sharded else history))
+            game_id = cur.lastrowid
+            conn.commit()
+
+        if self.backend.sharded:
+            with self.backend.shard_pool(game_id).connection() as conn:
+                conn.execute('''
+                    INSERT INTO games (id, user_id, startup_name, budget, reputation, morale, turn, rng_seed,
+                                       stat_history)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (game_id, user_id, startup_name, budget, reputation, morale, 1, rng_seed, history))
+                conn.commit()
+        return game_id
+
+    def set_game_mode(self, game_id: int, mode: str) -> None:
+        with self.backend.shard_pool(game_id).connection() as conn:
+            conn.execute('UPDATE games SET mode = ? WHERE id = ?', (mode, game_id))
+            conn.commit()
+        if self.backend.sharded:
+            with self.backend.global_pool().connection() as conn:
+                conn.execute('UPDATE games SET mode = ? WHERE id = ?', (mode, game_id))
+                conn.commit()
+
+    def get_game(self, game_id: int) -> Game | None:
+        with self.backend.shard_pool(game_id).connection() as conn:
+            return _query(conn, Game, 'SELECT * FROM games WHERE id = ?', (game_id,)).fetchone()
+
+    def mark_game_over(self, game_id: int, reason: str) -> None:
+        """پایان بازی؛ خلاصه /history (score، decisions، finished_at) همین‌جا یک بار حساب می‌شود.
+
+        در حالت shard رجیستری global (لیدربورد و /history) هم به‌روز می‌شود.
+        """
+        sql = '''
+            UPDATE games
+            SET budget = ?, reputation = ?, morale = ?, turn = ?, score = ?, decisions = ?,
+                is_game_over = 1, game_over_reason = ?,
+                finished_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+            WHERE id = ?
+        '''
+        with self.backend.shard_pool(game_id).connection() as conn:
+            final = conn.execute(
+                'SELECT budget, reputation, morale, turn FROM games WHERE id = ?', (game_id,)
+            ).fetchone()
+            if not final:
+                return
+            (decisions,) = conn.execute('SELECT COUNT(*) FROM logs WHERE game_id = ?', (game_id,)).fetchone()
+            summary = (final['budget'], final['reputation'], final['morale'], final['turn'],
+                       final_score(*final), decisions, reason, game_id)
+            conn.execute(sql, summary)
+            conn.commit()
+
+        if self.backend.sharded:
+            with self.backend.global_pool().connection() as conn:
+                conn.execute(sql, summary)
+                conn.commit()
+
+    def list_user_games(self, user_id: int, before_id: int | None = None, limit: int = 20) -> list[Game]:
+        """یک صفحه از بازی‌های کاربر، جدیدترین اول (keyset روی id، نه OFFSET).
+
+        صفحه بعد با before_id = id آخرین بازی همین صفحه؛ با ایندکس (user_id, id DESC)
+        هزینه هر صفحه به تعداد کل بازی‌های کاربر بستگی ندارد. بازی‌های تمام‌نشده در
+        حالت shard فقط وضعیت شروع را در رجیستری global دارند.
+        """
+        with self.backend.global_pool().connection() as conn:
+            return _query(conn, Game, '''
+                SELECT id, startup_name, mode, budget, reputation, morale, turn, score, decisions,
+                       is_game_over, game_over_reason, created_at, finished_at
+                FROM games
+                WHERE user_id = ? AND id < ?
+                ORDER BY id DESC
+                LIMIT ?
+            ''', (user_id, before_id if before_id is not None else 2 ** 63 - 1, limit)).fetchall()
+
+    def backfill_game_summaries(self, batch: int = 500) -> int:
+        """خلاصه /history برای بازی‌هایی که قبل از mark_game_over جدید تمام شده‌اند.
+
+        دسته‌ای به ترتیب id روی هر shard (is_game_over = 1 AND decisions IS NULL)؛ قابل
+        ادامه. finished_at همان updated_at (آخرین تغییر بازی) گذاشته می‌شود.
+        """
+        sql = 'UPDATE games SET score = ?, decisions = ?, finished_at = ? WHERE id = ?'
+        done = 0
+        for pool in self.backend.shard_pools():
+            last_id = 0
+            while True:
+                with pool.connection() as conn:
+                    rows = conn.execute('''
+                        SELECT g.id, g.budget, g.reputation, g.morale, g.turn,
+                               COALESCE(g.finished_at, g.updated_at, g.created_at),
+                               (SELECT COUNT(*) FROM logs l WHERE l.game_id = g.id)
+                        FROM games g
+                        WHERE g.id > ? AND g.is_game_over = 1 AND g.decisions IS NULL
+                        ORDER BY g.id
+                        LIMIT ?
+                    ''', (last_id, batch)).fetchall()
+                    if not rows:
+                        break
+                    summaries = [(final_score(*row[1:5]), row[6], row[5], row[0]) for row in rows]
+                    conn.executemany(sql, summaries)
+                    conn.commit()
+                if self.backend.sharded:
+                    with self.backend.global_pool().connection() as conn:
+                        conn.executemany(sql, summaries)
+                        conn.commit()
+                last_id = rows[-1][0]
+                done += len(rows)
+        return done
+
+    def record_turn(self, game_id: int, budget: int, reputation: int, morale: int, turn: int, log: dict) -> bool:
+        """اعمال نتیجه یک تصمیم: به‌روزرسانی games و ثبت log در یک تراکنش کوتاه.
+
+        به‌روزرسانی شرطی است (turn فعلی بازی باید همان log["turn"] باشد): ارسال دوباره
+        همان تصمیم (double-click، resubmit مرورگر) هیچ چیزی نمی‌نویسد و False برمی‌گرداند.
+        با telemetry، متن‌های حجیم (VERBOSE_LOG_FIELDS) به جای تراکنش به رویداد "turn"
+        می‌روند؛ اگر صف telemetry پر باشد ردیف کامل مثل قبل نوشته می‌شود.
+        """
+        with self.backend.shard_pool(game_id).connection() as conn:
+            # || روی BLOB در دیتابیس UTF-8 بایت‌ها را دست‌نخورده می‌چسباند؛ CAST نوع را BLOB نگه می‌دارد
+            updated = conn.execute('''
+                UPDATE games
+                SET budget = ?, reputation = ?, morale = ?, turn = ?, updated_at = CURRENT_TIMESTAMP,
+                    stat_history = CAST(COALESCE(stat_history, X'') || ? AS BLOB)
+                WHERE id = ? AND turn = ?
+            ''', (budget, reputation, morale, turn, pack_point(budget, reputation, morale), game_id,
+                  log["turn"])).rowcount
+            if not updated:
+                conn.rollback()
+                return False
+            row = log
+            if self.telemetry is not None and self.telemetry.emit(
+                    "turn", game_id=game_id, budget=budget, reputation=reputation, morale=morale, **log):
+                row = {k: v for k, v in log.items() if k not in VERBOSE_LOG_FIELDS}
+            self._insert_log(conn, game_id, row)
+            conn.commit()
+        self._remember(game_id, log)
+        return True
+
+    def _remember(self, game_id: int, log: dict) -> None:
+        """به‌روزرسانی تاریخچه اخیر؛ بدون scenario_type در log، cache آن بازی کنار گذاشته می‌شود."""
+        if "scenario_type" in log:
+            self.recent.push(game_id, log.get("scenario_title"), log["scenario_type"])
+        else:
+            self.recent.discard(game_id)
+
+    # ---------- scenarios / choices ----------
+    def latest_scenario(self, game_id: int) -> Scenario | None:
+        with self.backend.shard_pool(game_id).connection() as conn:
+            return _query(conn, Scenario, '''
+                SELECT * FROM scenarios
+                WHERE game_id = ?
+                ORDER BY id DESC
+                LIMIT 1
+            ''', (game_id,)).fetchone()
+
+    def get_scenario(self, game_id: int, scenario_id: int) -> Scenario | None:
+        with self.backend.shard_pool(game_id).connection() as conn:
+            return _query(conn, Scenario, 'SELECT * FROM scenarios WHERE id = ?', (scenario_id,)).fetchone()
+
+    def get_choice(self, game_id: int, choice_id) -> Choice | None:
+        with self.backend.shard_pool(game_id).connection() as conn:
+            return _query(conn, Choice, 'SELECT * FROM choices WHERE id = ?', (choice_id,)).fetchone()
+
+    def list_choices(self, game_id: int, scenario_id: int) -> list[Choice]:
+        with self.backend.shard_pool(game_id).connection() as conn:
+            return _query(conn, Choice, '''
+                SELECT * FROM choices
+                WHERE scenario_id = ?
+                ORDER BY id
+            ''', (scenario_id,)).fetchall()
+
+    def add_scenario(self, game_id: int, scenario_type: str, title: str, description: str,
+                     difficulty: int, turn_number: int, options: list[dict]) -> int:
+        """ذخیره سناریو و گزینه‌هایش (و امضای MinHash آن) در یک تراکنش.
+
+        options: [{"text", "cost", "reputation", "morale", "risk"}, ...]
+        """
+        sig = signature(title, description)
+        with self.backend.shard_pool(game_id).connection() as conn:
+            scenario_id = self._insert_scenario(conn, game_id, scenario_type, title, description,
+                                                difficulty, turn_number, options, sig)
+            conn.commit()
+            return scenario_id
+
+    def add_corpus_scenario(self, scenario_type: str, title: str, description: str,
+                            difficulty: int, options: list[dict]) -> int:
+        """سناریوی عمومی (game_id IS NULL) در دیتابیس global؛ مثلاً شاخه‌های speculative بازیافتی."""
+        sig = signature(title, description)
+        with self.backend.global_pool().connection() as conn:
+            scenario_id = self._insert_scenario(conn, None, scenario_type, title, description,
+                                                difficulty, None, options, sig)
+            conn.commit()
+            return scenario_id
+
+    def _insert_scenario(self, conn: sqlite3.Connection, game_id, scenario_type: str, title: str,
+                         description: str, difficulty: int, turn_number, options: list[dict], sig) -> int:
+        cur = conn.execute('''
+            INSERT INTO scenarios (game_id, scenario_type, title, description, difficulty_level, turn_number, minhash)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (game_id, scenario_type, title, description, difficulty, turn_number, pack(sig)))
+        scenario_id = cur.lastrowid
+        conn.executemany('''
+            INSERT INTO choices (scenario_id, text, cost_impact, reputation_impact, morale_impact, risk_level)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', [
+            (scenario_id, opt["text"], opt["cost"], opt["reputation"], opt["morale"], opt["risk"])
+            for opt in options
+        ])
+        self._insert_band_keys(conn, scenario_id, game_id, sig)
+        return scenario_id
+
+    # ---------- near-duplicate index ----------
+    def _insert_band_keys(self, conn: sqlite3.Connection, scenario_id: int, game_id, sig) -> None:
+        """یک ردیف scenario_lsh برای هر باند امضا (متن خالی = بدون ردیف)."""
+        if sig is not None:
+            conn.executemany(
+                'INSERT INTO scenario_lsh (band_key, game_id, scenario_id) VALUES (?, ?, ?)',
+                [(key, game_id, scenario_id) for key in band_keys(sig)],
+            )
+            self.dedup.stats["indexed"] += 1
+
+    def find_near_duplicate(self, game_id: int | None, title: str, description: str,
+                            corpus: bool = True) -> dict | None:
+        """سناریوی تقریباً تکراری همین بازی یا (با corpus=True) corpus عمومی؛ شباهت >= dedup.threshold.
+
+        {"scenario_id", "title", "similarity", "scope": "game" | "corpus"} یا None.
+        """
+        sig = signature(title, description)
+        self.dedup.stats["checked"] += 1
+        if sig is None:
+            return None
+        keys = band_keys(sig)
+        scopes = [("corpus", None, self.backend.global_pool())] if corpus else []
+        if game_id is not None:
+            scopes.insert(0, ("game", game_id, self.backend.shard_pool(game_id)))
+        for scope, owner, pool in scopes:
+            with pool.connection() as conn:
+                candidates = {row[0] for row in conn.execute(f'''
+                    SELECT scenario_id FROM scenario_lsh
+                    WHERE band_key IN ({", ".join("?" * len(keys))}) AND game_id IS ?
+                    LIMIT ?
+                ''', (*keys, owner, MAX_CANDIDATES))}
+                if not candidates:
+                    continue
+                self.dedup.stats["candidates"] += len(candidates)
+                rows = conn.execute(
+                    f'SELECT id, title, minhash FROM scenarios WHERE id IN ({", ".join("?" * len(candidates))})',
+                    tuple(candidates),
+                ).fetchall()
+            best = max(((similarity(sig, unpack(row[2])), row) for row in rows if row[2]),
+                       key=lambda pair: pair[0], default=None)
+            if best and best[0] >= self.dedup.threshold:
+                self.dedup.stats["duplicates"] += 1
+                return {"scenario_id": best[1][0], "title": best[1][1], "similarity": best[0], "scope": scope}
+        return None
+
+    def backfill_signatures(self, batch: int = 5000) -> int:
+        """امضا برای سناریوهای قدیمی بدون minhash (همه فایل‌ها)، دسته‌ای به ترتیب id؛ قابل ادامه."""
+        done = 0
+        for pool in self.backend.pools():
+            last_id = 0
+            while True:
+                with pool.connection() as conn:
+                    rows = conn.execute('''
+                        SELECT id, game_id, title, description FROM scenarios
+                        WHERE id > ? AND minhash IS NULL
+                        ORDER BY id
+                        LIMIT ?
+                    ''', (last_id, batch)).fetchall()
+                    if not rows:
+                        break
+                    for row in rows:
+                        sig = signature(row[2], row[3])
+                        conn.execute('UPDATE scenarios SET minhash = ? WHERE id = ?', (pack(sig), row[0]))
+                        self._insert_band_keys(conn, row[0], row[1], sig)
+                    conn.commit()
+                last_id = rows[-1][0]
+                done += len(rows)
+        return done
+
+    # ---------- scenario queue (اضافه‌های batch) ----------
+    def enqueue_scenarios(self, game_id: int, scenarios: list[dict]) -> None:
+        """سناریوهای اضافه یک batch برای نوبت‌های بعدی همین بازی."""
+        with self.backend.shard_pool(game_id).connection() as conn:
+            conn.executemany('''
+                INSERT INTO scenario_queue (game_id, scenario_type, difficulty, payload)
+                VALUES (?, ?, ?, ?)
+            ''', [
+                (game_id, sc["scenario_type"], sc["difficulty"], json.dumps(sc, ensure_ascii=False))
+                for sc in scenarios
+            ])
+            conn.commit()
+
+    def pop_queued_scenario(self, game_id: int, scenario_type: str, difficulty: int):
+        """قدیمی‌ترین سناریوی صف با همین نوع و سختی (و حذف آن از صف)."""
+        with self.backend.shard_pool(game_id).connection() as conn:
+            row = conn.execute('''
+                SELECT id, payload FROM scenario_queue
+                WHERE game_id = ? AND scenario_type = ? AND difficulty = ?
+                ORDER BY id
+                LIMIT 1
+            ''', (game_id, scenario_type, difficulty)).fetchone()
+            if row is None:
+                return None
+            conn.execute('DELETE FROM scenario_queue WHERE id = ?', (row['id'],))
+            conn.commit()
+            return json.loads(row['payload'])
+
+    # ---------- logs ----------
+    @staticmethod
+    def _insert_log(conn: sqlite3.Connection, game_id: int, log: dict) -> None:
+        conn.execute('''
+            INSERT INTO logs (game_id, turn, scenario_id, scenario_title, choice_id, choice_text,
+                              cost_impact, reputation_impact, morale_impact, ai_response)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            game_id, log["turn"], log.get("scenario_id"), log.get("scenario_title"),
+            log.get("choice_id"), log.get("choice_text"),
+            log.get("cost_impact", 0), log.get("reputation_impact", 0), log.get("morale_impact", 0),
+            log.get("ai_response"),
+        ))
+
+    def add_log(self, game_id: int, log: dict) -> None:
+        with self.backend.shard_pool(game_id).connection() as conn:
+            self._insert_log(conn, game_id, log)
+            conn.commit()
+        self._remember(game_id, log)
+
+    def list_logs(self, game_id: int, limit: int | None = None) -> list[LogEntry]:
+        """logهای بازی به ترتیب نوبت (turn)؛ با limit فقط limit تای آخر.
+
+        choice_text هنوز بارگذاری‌نشده از telemetry از خود choices خوانده می‌شود.
+        """
+        order = "ASC" if limit is None else "DESC"
+        with self.backend.shard_pool(game_id).connection() as conn:
+            rows = _query(conn, LogEntry, f'''
+                SELECT l.id, l.game_id, l.turn, l.scenario_id, l.scenario_title, l.choice_id,
+                       COALESCE(l.choice_text, c.text) AS choice_text,
+                       l.cost_impact, l.reputation_impact, l.morale_impact, l.ai_response, l.created_at
+                FROM logs l
+                LEFT JOIN choices c ON c.id = l.choice_id
+                WHERE l.game_id = ?
+                ORDER BY l.turn {order}
+                LIMIT ?
+            ''', (game_id, -1 if limit is None else limit)).fetchall()
+        return rows if limit is None else rows[::-1]
+
+    def fill_log_details(self, events: list[dict]) -> int:
+        """نوشتن متن‌های حجیم رویدادهای "turn" در logs (loader telemetry)؛ هر shard یک تراکنش."""
+        by_shard: dict[int, tuple] = {}
+        for e in events:
+            pool = self.backend.shard_pool(e["game_id"])
+            by_shard.setdefault(id(pool), (pool, []))[1].append(
+                (e.get("choice_text"), e.get("ai_response"), e["game_id"], e["turn"]))
+        for pool, rows in by_shard.values():
+            with pool.connection() as conn:
+                conn.executemany('''
+                    UPDATE logs SET choice_text = ?, ai_response = ?
+                    WHERE game_id = ? AND turn = ?
+                ''', rows)
+                conn.commit()
+        return len(events)
+
+    def recent_history(self, game_id: int, limit: int = 5) -> list[tuple]:
+        """(عنوان، نوع سناریو) نوبت‌های اخیر، جدیدترین اول.
+
+        بار اول از logs با ایندکس idx_logs_game_turn (فقط limit ردیف، بدون sort) و
+        lookup کلید اصلی scenarios خوانده می‌شود؛ بعد از آن از cache در حافظه.
+        """
+        cached = self.recent.get(game_id)
+        if cached is not None and (len(cached) >= limit or len(cached) < self.recent.depth):
+            return cached[:limit]
+        with self.backend.shard_pool(game_id).connection() as conn:
+            rows = conn.execute('''
+                SELECT l.scenario_title, s.scenario_type
+                FROM logs l
+                LEFT JOIN scenarios s ON s.id = l.scenario_id
+                WHERE l.game_id = ?
+                ORDER BY l.turn DESC
+                LIMIT ?
+            ''', (game_id, max(limit, self.recent.depth))).fetchall()
+        entries = [(row[0], row[1]) for row in rows]
+        self.recent.put(game_id, entries)
+        return entries[:limit]
+
+    # ---------- replay log ----------
+    def record_ai_response(self, game_id: int, purpose: str | None, prompt_hash: str, response: str | None) -> None:
+        """پاسخ خام AI (یا None برای خطا) با hash پرامپت؛ برای replay قطعی."""
+        with self.backend.shard_pool(game_id).connection() as conn:
+            conn.execute('''
+                INSERT INTO ai_replay_log (game_id, purpose, prompt_hash, response)
+                VALUES (?, ?, ?, ?)
+            ''', (game_id, purpose, prompt_hash, response))
+            conn.commit()
+
+    def ai_responses(self, game_id: int) -> list:
+        with self.backend.shard_pool(game_id).connection() as conn:
+            return conn.execute('''
+                SELECT prompt_hash, purpose, response FROM ai_replay_log
+                WHERE game_id = ?
+                ORDER BY id
+            ''', (game_id,)).fetchall()
+
+    def close(self) -> None:
+        # ردیف‌های ai_calls در صف قبل از بستن poolها نوشته می‌شوند
+        self.ai_calls.close()
+        if self.telemetry is not None:
+            self.telemetry.close()
+        self.backend.close()
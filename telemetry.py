@@ -0,0 +1,231 @@
+"""Startup Sandbox - Turn Telemetry
+
+جریان رویدادهای نوبت (append-only) به جای نوشتن متن‌های حجیم در تراکنش داغ:
+
+- تراکنش /action فقط وضعیت لازم را می‌نویسد (UPDATE games و ردیف کوچک logs)؛
+  متن‌های حجیم (ai_response، choice_text) به صورت یک رویداد "turn" به این لاگ می‌روند.
+- emit() فقط در صف محدود می‌گذارد (بدون I/O)؛ thread پس‌زمینه (BatchWriter) صف را به صورت
+  NDJSON در فایل segment همین process می‌نویسد و برای هر دسته یک fsync می‌زند.
+  اگر صف پر باشد emit() False برمی‌گرداند و صدا زننده ردیف کامل را در دیتابیس می‌نویسد.
+- segment بعد از رسیدن به segment_bytes (یا در close) بسته و با rename مهر می‌شود:
+      turns-<time_ns>-<pid>.ndjson.open  ->  turns-<time_ns>-<pid>.ndjson
+- loader (همین فایل، خارج از مسیر درخواست) segmentهای مهرشده را در logs ادغام می‌کند
+  و به زیرپوشه loaded/ منتقل می‌کند. UPDATE تکرارپذیر است؛ اجرای دوباره ضرری ندارد.
+
+اجرا (مثلاً با cron):
+    python telemetry.py --dir telemetry [--db startup.db] [--shards N] [--stale-hours 24]
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+
+from batch_writer import BatchWriter
+from storage import GameRepository, make_backend
+
+OPEN_SUFFIX = ".ndjson.open"
+SEALED_SUFFIX = ".ndjson"
+LOADED_DIR = "loaded"
+
+
+# ========== Writer ==========
+
+class TelemetryLog:
+    """segmentهای NDJSON در directory، نوشته‌شده با BatchWriter.
+
+    thread و فایل segment در اولین emit() ساخته می‌شوند (در worker، بعد از fork)،
+    پس هر process segment جدای خودش را دارد و خط‌ها در هم نمی‌روند.
+    """
+
+    def __init__(self, directory: str, segment_bytes: int = 4 * 1024 * 1024, batch_size: int = 200,
+                 flush_interval: float = 1.0, max_pending: int = 10000):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        # ValueError: فایل segment از زیر دست بسته شده؛ دسته بعد segment تازه می‌گیرد
+        self._writer = BatchWriter(
+            self._write, "telemetry", batch_size, flush_interval, max_pending,
+            errors=(OSError, ValueError), accepted="emitted", batches="fsyncs", extra_stats=("segments",),
+            what="telemetry", unit="رویداد",
+        )
+        self.stats = self._writer.stats
+        # فایل segment فقط زیر _writer.lock (thread نویسنده یا flush/close دستی)
+        self._file = None
+        self._path: str | None = None
+
+    def emit(self, event: str, **fields) -> bool:
+        """ثبت یک رویداد (بدون I/O)؛ False یعنی صف پر بود و رویداد ثبت نشد."""
+        fields.setdefault("ts", time.time())
+        return self._writer.put(json.dumps({"event": event, **fields}, ensure_ascii=False, separators=(",", ":")))
+
+    def _open_segment(self) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        self._path = os.path.join(self.directory, f"turns-{time.time_ns()}-{os.getpid()}{OPEN_SUFFIX}")
+        self._file = open(self._path, "ab")
+        self._writer.count("segments")
+
+    def _seal_segment(self) -> None:
+        """بستن segment فعلی و rename به .ndjson (از این به بعد مال loader است)."""
+        if self._file is None:
+            return
+        try:
+            self._file.close()
+            os.replace(self._path, self._path[:-len(OPEN_SUFFIX)] + SEALED_SUFFIX)
+        finally:
+            # حتی اگر rename نشد (مثلاً loader زودتر مهرش کرده)، flush بعدی segment تازه باز کند
+            self._file = self._path = None
+
+    def _drop_segment(self) -> None:
+        """رها کردن segment خراب بدون rename؛ loader بعد از مرگ process مهرش می‌کند."""
+        if self._file is not None:
+            try:
+                self._file.close()
+            except OSError:
+                pass
+        self._file = self._path = None
+
+    def _write(self, batch: list[str]) -> None:
+        """یک write و یک fsync برای هر دسته."""
+        try:
+            if self._file is None:
+                self._open_segment()
+            self._file.write(("\n".join(batch) + "\n").encode("utf-8"))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        except (OSError, ValueError):
+            self._drop_segment()
+            raise
+        if self._file.tell() >= self.segment_bytes:
+            try:
+                self._seal_segment()
+            except OSError as e:
+                # دسته قبلاً fsync شده؛ فقط rename انجام نشد
+                self._writer.count("errors")
+                print(f"⚠️ خطا در مهر کردن segment telemetry: {e}")
+
+    def flush(self) -> int:
+        """نوشتن همه رویدادهای صف؛ تعداد نوشته‌شده."""
+        return self._writer.flush()
+
+    def close(self) -> None:
+        self._writer.close()
+        with self._writer.lock:
+            try:
+                self._seal_segment()
+            except OSError as e:
+                self._writer.count("errors")
+                print(f"⚠️ خطا در بستن segment telemetry: {e}")
+
+
+# ========== Loader ==========
+
+def _segment_pid(name: str) -> int | None:
+    """pid از نام turns-<time_ns>-<pid>.ndjson.open (None اگر نام این شکل نباشد)."""
+    try:
+        return int(name[:-len(OPEN_SUFFIX)].rsplit("-", 1)[1])
+    except (IndexError, ValueError):
+        return None
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # هست ولی مال کاربر دیگری است
+    except OSError:
+        return False
+    return True
+
+
+def seal_stale_segments(directory: str, older_than: float) -> list[str]:
+    """segmentهای .open که process صاحبشان مرده (و قدیمی‌تر از older_than ثانیه‌اند) مهر می‌شوند.
+
+    segment یک worker زنده هرگز rename نمی‌شود، هر قدر هم بی‌کار مانده باشد.
+    """
+    sealed = []
+    cutoff = time.time() - older_than
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if not name.endswith(OPEN_SUFFIX) or os.path.getmtime(path) >= cutoff:
+            continue
+        pid = _segment_pid(name)
+        if pid is None or not _pid_alive(pid):
+            target = path[:-len(OPEN_SUFFIX)] + SEALED_SUFFIX
+            os.replace(path, target)
+            sealed.append(target)
+    return sealed
+
+
+def sealed_segments(directory: str) -> list[str]:
+    """segmentهای مهرشده و هنوز بارگذاری‌نشده، به ترتیب زمان ساخت."""
+    if not os.path.isdir(directory):
+        return []
+    return [os.path.join(directory, name) for name in sorted(os.listdir(directory))
+            if name.endswith(SEALED_SUFFIX)]
+
+
+def read_events(path: str) -> tuple[list[dict], int]:
+    """(رویدادها، تعداد خط خراب)؛ خط نیمه‌کاره آخر یک segment رهاشده خراب شمرده می‌شود."""
+    events, bad = [], 0
+    with open(path, "rb") as fh:
+        for line in fh:
+            if not line.strip():
+                continue
+            try:
+                events.append(json.loads(line))
+            except ValueError:
+                bad += 1
+    return events, bad
+
+
+def load_segments(directory: str, repo: GameRepository) -> dict:
+    """ادغام segmentهای مهرشده در logs (از طریق GameRepository) و انتقال به loaded/."""
+    stats = {"segments": 0, "events": 0, "turns": 0, "bad_lines": 0}
+    done_dir = os.path.join(directory, LOADED_DIR)
+    for path in sealed_segments(directory):
+        events, bad = read_events(path)
+        turns = [e for e in events if e.get("event") == "turn" and e.get("game_id") is not None]
+        repo.fill_log_details(turns)
+        os.makedirs(done_dir, exist_ok=True)
+        os.replace(path, os.path.join(done_dir, os.path.basename(path)))
+        stats["segments"] += 1
+        stats["events"] += len(events)
+        stats["turns"] += len(turns)
+        stats["bad_lines"] += bad
+    return stats
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="بارگذاری segmentهای telemetry نوبت‌ها در logs")
+    parser.add_argument("--dir", default=os.getenv("TELEMETRY_DIR") or "telemetry")
+    parser.add_argument("--db", default=os.getenv("STARTUP_DB_PATH", "startup.db"))
+    parser.add_argument("--shards", type=int, default=int(os.getenv("STORAGE_SHARDS", "1") or 1))
+    parser.add_argument("--stale-hours", type=float, default=24.0,
+                        help="segment باز قدیمی‌تر از این (process مرده) مهر و بارگذاری می‌شود")
+    args = parser.parse_args(argv)
+    if not os.path.isdir(args.dir):
+        print(f"❌ پوشه telemetry پیدا نشد: {args.dir}")
+        return 1
+
+    repo = GameRepository(make_backend(args.db, args.shards))
+    try:
+        stale = seal_stale_segments(args.dir, args.stale_hours * 3600)
+        stats = load_segments(args.dir, repo)
+    except (OSError, sqlite3.Error) as e:
+        print(f"❌ خطا در بارگذاری telemetry: {e}")
+        return 1
+    finally:
+        repo.close()
+    if stale:
+        print(f"⚠️ {len(stale)} segment رهاشده مهر شد")
+    print(f"📥 {stats['segments']} segment، {stats['events']} رویداد ({stats['turns']} نوبت)"
+          f"، {stats['bad_lines']} خط خراب")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
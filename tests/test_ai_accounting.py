@@ -0,0 +1,167 @@
+import contextlib
+import io
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import ai_accounting
+import app as app_module
+from ai_accounting import AICallRecorder, build_report, percentile
+from ai_providers import CallableProvider, Usage
+from migrate_db import migrate_database
+from storage import ConnectionPool
+
+SCENARIO_TEXT = json.dumps({
+    "title": "سناریو",
+    "description": "توضیح " * 20,
+    "options": [{"text": f"گزینه {i}", "cost": -10, "reputation": 1, "morale": 1, "risk_level": 2} for i in range(3)],
+}, ensure_ascii=False)
+
+
+def _stub(name, *chunks, error=None):
+    def stream(contents, temperature):
+        yield from chunks
+        if error is not None:
+            raise error
+    return CallableProvider(name, stream, model=f"{name}-model")
+
+
+class RecorderTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, 'startup.db')
+        with contextlib.redirect_stdout(io.StringIO()):
+            migrate_database(self.db_path)
+        self.pool = ConnectionPool(self.db_path, 1)
+
+    def tearDown(self):
+        self.pool.close_all()
+        self.tmpdir.cleanup()
+
+    def test_rows_are_written_in_batches(self):
+        recorder = AICallRecorder(lambda: self.pool, batch_size=4, flush_interval=60)
+        for i in range(10):
+            recorder.record(game_id=i, purpose="story", outcome="ok", latency_ms=float(i))
+        recorder.close()
+        self.assertEqual(recorder.stats["written"], 10)
+        self.assertEqual(recorder.stats["batches"], 3)
+        conn = sqlite3.connect(self.db_path)
+        rows = conn.execute("SELECT game_id, purpose, outcome FROM ai_calls ORDER BY id").fetchall()
+        conn.close()
+        self.assertEqual(rows[0], (0, "story", "ok"))
+        self.assertEqual(len(rows), 10)
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        recorder = AICallRecorder(lambda: self.pool, flush_interval=60, max_pending=2)
+        recorder._writer._ensure_thread = lambda: None  # بدون thread: صف خالی نمی‌شود
+        for _ in range(3):
+            recorder.record(outcome="ok")
+        self.assertEqual((recorder.stats["recorded"], recorder.stats["dropped"]), (2, 1))
+        self.assertEqual(recorder.flush(), 2)
+
+
+class AppAccountingTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, 'startup.db')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _calls(self, providers, config=None, call=None):
+        flask_app = app_module.create_app({
+            'DB_PATH': self.db_path, 'TESTING': True, 'SPECULATION_ENABLED': False,
+            'AI_HEDGE_ENABLED': False, 'AI_PROVIDERS': providers, **(config or {}),
+        })
+        with flask_app.app_context(), contextlib.redirect_stdout(io.StringIO()):
+            (call or (lambda: app_module.request_scenario("prompt", game_id=7)))()
+            flask_app.extensions['ai_router'].shutdown(wait=True)
+            flask_app.extensions['repository'].close()
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        rows = [dict(r) for r in conn.execute("SELECT * FROM ai_calls ORDER BY id")]
+        conn.close()
+        return rows
+
+    def test_successful_call_records_usage(self):
+        usage = Usage(120, 80, "gemini-2.0-flash-001")
+        [row] = self._calls([_stub("gemini", usage, SCENARIO_TEXT)])
+        self.assertEqual((row['game_id'], row['purpose'], row['outcome']), (7, "scenario", "ok"))
+        self.assertEqual((row['prompt_tokens'], row['response_tokens']), (120, 80))
+        self.assertEqual((row['provider'], row['model']), ("gemini", "gemini-2.0-flash-001"))
+        self.assertEqual(row['response_chars'], len(SCENARIO_TEXT))
+        self.assertGreater(row['prompt_chars'], len("prompt"))
+        self.assertGreaterEqual(row['latency_ms'], 0)
+
+    def test_failure_outcomes(self):
+        [row] = self._calls([_stub("gemini", '{"title": 5')])
+        self.assertEqual((row['outcome'], row['model'], row['prompt_tokens']), ("invalid_json", "gemini-model", None))
+
+        os.remove(self.db_path)
+        [row] = self._calls([_stub("gemini", error=TimeoutError("read timed out"))])
+        self.assertEqual(row['outcome'], "timeout")
+
+        os.remove(self.db_path)
+        [row] = self._calls([_stub("gemini", error=ConnectionError("reset"))],
+                            call=lambda: app_module.call_ai_api("prompt", purpose="story"))
+        self.assertEqual((row['outcome'], row['purpose']), ("error", "story"))
+
+    def test_governor_denial_is_recorded_as_fallback(self):
+        rows = self._calls([_stub("gemini", SCENARIO_TEXT)], {'AI_BUDGET_GLOBAL': (1, 0.001)},
+                           call=lambda: [app_module.request_scenario("prompt", game_id=7) for _ in range(2)])
+        self.assertEqual([r['outcome'] for r in rows], ["ok", "fallback"])
+        self.assertIsNone(rows[1]['provider'])
+
+
+class ReportTest(unittest.TestCase):
+    def _row(self, game_id, outcome="ok", latency=100.0, tokens=(1000, 500), chars=(4000, 2000), purpose="scenario"):
+        return {"game_id": game_id, "purpose": purpose, "outcome": outcome, "latency_ms": latency,
+                "prompt_tokens": tokens[0], "response_tokens": tokens[1],
+                "prompt_chars": chars[0], "response_chars": chars[1]}
+
+    def test_percentile_is_nearest_rank(self):
+        self.assertEqual(percentile(list(range(1, 101)), 0.9), 90)
+        self.assertEqual(percentile([5], 0.99), 5)
+        self.assertIsNone(percentile([], 0.5))
+
+    def test_cost_per_game_and_mode(self):
+        calls = [
+            self._row(1), self._row(1, purpose="story"),
+            self._row(2, tokens=(None, None)),  # بدون usage: تخمین از کاراکتر
+            self._row(3, outcome="fallback", latency=0, tokens=(None, None), chars=(0, 0)),
+        ]
+        report = build_report(calls, {1: "crisis", 2: "classic"}, prompt_price=1.0, response_price=2.0)
+        self.assertEqual(report["estimated_tokens"], 2)
+        self.assertEqual(report["modes"]["crisis"], {"games": 1, "cost_total": 0.004, "cost_per_game": 0.004})
+        self.assertEqual(report["modes"]["classic"]["games"], 2)  # بازی 3 بدون mode
+        self.assertEqual(report["purposes"]["scenario"]["outcomes"], {"ok": 2, "fallback": 1})
+        self.assertAlmostEqual(report["purposes"]["scenario"]["fallback_rate"], 1 / 3, places=3)
+        self.assertEqual(report["purposes"]["scenario"]["latency_ms"]["p50"], 100.0)
+
+    def test_cli_reads_calls_and_game_modes(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, 'startup.db')
+            with contextlib.redirect_stdout(io.StringIO()):
+                migrate_database(db_path)
+            conn = sqlite3.connect(db_path)
+            conn.execute("INSERT INTO games (id, mode) VALUES (1, 'investor')")
+            conn.execute("INSERT INTO ai_calls (created_at, game_id, purpose, outcome, latency_ms, "
+                         "prompt_tokens, response_tokens) VALUES (0, 1, 'story', 'ok', 50, 10, 10)")
+            conn.commit()
+            conn.close()
+            out = io.StringIO()
+            with contextlib.redirect_stdout(out):
+                self.assertEqual(ai_accounting.main(['--db', db_path, '--prompt-price', '1']), 0)
+        self.assertIn("investor", out.getvalue())
+        self.assertIn("story", out.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,175 @@
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import app as app_module
+from ai_governor import AIGovernor, Bucket, SQLiteBucketStore
+from ai_providers import CallableProvider
+from migrate_db import migrate_database
+from storage import ConnectionPool
+
+SCENARIO_TEXT = json.dumps({
+    "title": "سناریوی AI",
+    "description": "توضیح " * 20,
+    "options": [{"text": f"گزینه {i}", "cost": -10, "reputation": 1, "morale": 1, "risk_level": 2} for i in range(3)],
+}, ensure_ascii=False)
+
+
+class BucketStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, 'startup.db')
+        with contextlib.redirect_stdout(io.StringIO()):
+            migrate_database(self.db_path)
+        self.pools = []
+
+    def tearDown(self):
+        for pool in self.pools:
+            pool.close_all()
+        self.tmpdir.cleanup()
+
+    def _store(self):
+        # هر store با pool خودش = یک worker جدا روی همان فایل
+        pool = ConnectionPool(self.db_path, 2)
+        self.pools.append(pool)
+        return SQLiteBucketStore(lambda: pool)
+
+    def test_take_until_empty_then_refill(self):
+        store = self._store()
+        bucket = Bucket("user:ali", capacity=3, rate=0.5)
+        self.assertEqual([store.take([bucket], now=100.0) for _ in range(4)], [None, None, None, bucket])
+        self.assertIs(store.take([bucket], now=101.0), bucket)  # 0.5 توکن
+        self.assertIsNone(store.take([bucket], now=102.0))
+
+    def test_denied_call_takes_nothing_from_other_buckets(self):
+        store = self._store()
+        glob, user = Bucket("global:", 5, 0), Bucket("user:ali", 1, 0)
+        self.assertIsNone(store.take([glob, user], now=0))
+        self.assertIs(store.take([glob, user], now=0), user)
+        self.assertEqual(dict((k, t) for k, t, _ in store.lowest("global")), {"global:": 4})
+
+    def test_workers_share_one_limit(self):
+        stores = [self._store() for _ in range(4)]
+        bucket = Bucket("global:", capacity=20, rate=0)
+        admitted = []
+
+        def worker(store):
+            for _ in range(10):
+                if store.take([bucket], now=0) is None:
+                    admitted.append(1)
+
+        threads = [threading.Thread(target=worker, args=(s,)) for s in stores]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(admitted), 20)
+
+    def test_governor_stats_and_levels(self):
+        governor = AIGovernor(self._store(), {"global": (10, 60), "user": (2, 0.6), "ip": (5, 0)})
+        self.assertEqual([b.key for b in governor.buckets("ali", "1.2.3.4")], ["global:", "user:ali"])
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = [governor.admit("ali", "1.2.3.4") for _ in range(3)]
+        self.assertEqual(results, [True, True, False])
+        self.assertTrue(governor.admit("sara"))
+        snap = governor.snapshot()
+        self.assertEqual((snap["admitted"], snap["denied"]), (3, {"global": 0, "user": 1}))
+        self.assertEqual(snap["levels"]["global"]["capacity"], 10)
+        lowest = snap["levels"]["user"]["lowest"]
+        self.assertEqual(len(lowest), 2)
+        self.assertLess(lowest[0], 1)
+        self.assertGreaterEqual(lowest[1], 1)
+        # /metrics عمومی است: نه username نه IP
+        self.assertNotIn("ali", repr(snap))
+        self.assertNotIn("1.2.3.4", repr(snap))
+
+    def test_background_calls_leave_reserve_for_foreground(self):
+        governor = AIGovernor(self._store(), {"user": (20, 0.001)}, background_reserve=0.5)
+        with contextlib.redirect_stdout(io.StringIO()):
+            background = [governor.admit("ali", background=True) for _ in range(15)]
+            foreground = [governor.admit("ali") for _ in range(11)]
+        self.assertEqual(background.count(True), 10)
+        self.assertEqual(foreground, [True] * 10 + [False])
+        snap = governor.snapshot()
+        self.assertEqual((snap["admitted"], snap["deferred"], snap["denied"]["user"]), (20, 5, 1))
+
+
+class AppGovernorTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.calls = []
+
+        def stream(contents, temperature):
+            self.calls.append(contents)
+            yield SCENARIO_TEXT
+
+        self.app = app_module.create_app({
+            'DB_PATH': os.path.join(self.tmpdir.name, 'startup.db'),
+            'TESTING': True,
+            'SPECULATION_ENABLED': False,
+            'AI_HEDGE_ENABLED': False,
+            'AI_PROVIDERS': [CallableProvider("stub", stream)],
+            'AI_BUDGET_USER': (1, 0.001),
+        })
+        self.repo = self.app.extensions['repository']
+        self.quiet = contextlib.redirect_stdout(io.StringIO())
+        self.quiet.__enter__()
+
+    def tearDown(self):
+        self.quiet.__exit__(None, None, None)
+        self.app.extensions['ai_router'].shutdown(wait=True)
+        self.repo.close()
+        self.tmpdir.cleanup()
+
+    def _new_game(self, username):
+        client = self.app.test_client()
+        client.post('/new_game', data={'username': username, 'startup_name': 'GovCo'})
+        with client.session_transaction() as sess:
+            return self.repo.latest_scenario(sess['game_id'])
+
+    def test_over_budget_user_gets_fallback_scenario(self):
+        self.assertEqual(self._new_game('ali').title, "سناریوی AI")
+        self.assertNotEqual(self._new_game('ali').title, "سناریوی AI")  # سهمیه ali تمام شد
+        self.assertEqual(self._new_game('sara').title, "سناریوی AI")
+        self.assertEqual(len(self.calls), 2)
+
+        metrics = self.app.test_client().get('/metrics').get_json()['ai_governor']
+        self.assertEqual(metrics['denied']['user'], 1)
+        self.assertLess(metrics['levels']['user']['lowest'][0], 1)
+        self.assertNotIn('ali', repr(metrics))
+
+    def test_background_job_keeps_request_client(self):
+        with self.app.test_request_context(environ_base={'REMOTE_ADDR': '10.0.0.9'}):
+            app_module.session['username'] = 'ali'
+            job = app_module._with_ai_client(app_module.current_ai_client)
+        result = []
+        thread = threading.Thread(target=lambda: result.append(job()))
+        thread.start()
+        thread.join()
+        self.assertEqual(result, [('ali', '10.0.0.9')])
+
+    def test_speculation_does_not_starve_foreground_calls(self):
+        self.app.extensions['ai_governor'].limits['user'] = (4.0, 0.0001)
+        with self.app.test_request_context():
+            app_module.session['username'] = 'ali'
+            speculative = app_module._with_ai_client(app_module.admit_ai_call, background=True)
+            foreground = app_module._with_ai_client(app_module.admit_ai_call)
+        with self.app.app_context():
+            self.assertEqual([speculative() for _ in range(6)], [True, True, False, False, False, False])
+            self.assertEqual([foreground() for _ in range(2)], [True, True])
+        snap = self.app.extensions['ai_governor'].snapshot()
+        self.assertEqual((snap['deferred'], snap['denied']['user']), (4, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
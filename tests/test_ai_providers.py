@@ -0,0 +1,168 @@
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import app as app_module
+from ai_providers import CallableProvider, HedgedRouter, LatencyTracker
+
+SCENARIO_TEXT = json.dumps({
+    "title": "سناریو",
+    "description": "توضیح " * 20,
+    "options": [{"text": f"گزینه {i}", "cost": -10, "reputation": 1, "morale": 1, "risk_level": 2} for i in range(3)],
+}, ensure_ascii=False)
+
+
+class StubProvider(CallableProvider):
+    """provider محلی با توزیع تأخیر مشخص (تأخیر قبل از اولین تکه)."""
+
+    def __init__(self, name, latencies, text=SCENARIO_TEXT, chunk=40):
+        super().__init__(name, self._stream)
+        self.latencies = latencies
+        self.text = text
+        self.chunk = chunk
+        self.calls = 0
+        self.closed = 0
+
+    def _stream(self, contents, temperature):
+        delay = self.latencies() if callable(self.latencies) else self.latencies
+        self.calls += 1
+        try:
+            time.sleep(delay)
+            for i in range(0, len(self.text), self.chunk):
+                yield self.text[i:i + self.chunk]
+                time.sleep(0.002)
+        finally:
+            self.closed += 1
+
+
+def _attempt(provider, cancelled):
+    parts = []
+    stream = provider.stream("prompt", 0.5)
+    try:
+        for chunk in stream:
+            if cancelled.is_set():
+                return False, "".join(parts), None
+            parts.append(chunk)
+    finally:
+        stream.close()
+    text = "".join(parts)
+    try:
+        json.loads(text)
+        return True, text, None
+    except ValueError:
+        return False, text, None
+
+
+class HedgedRouterTest(unittest.TestCase):
+    def test_slow_primary_is_hedged_and_cancelled(self):
+        slow, fast = StubProvider("slow", 0.6), StubProvider("fast", 0.01)
+        router = HedgedRouter([slow, fast], default_delay=0.05)
+        t0 = time.perf_counter()
+        winner, text, _ = router.call("prompt", _attempt)
+        elapsed = time.perf_counter() - t0
+        router.shutdown(wait=True)
+
+        self.assertEqual(winner, "fast")
+        self.assertEqual(text, SCENARIO_TEXT)
+        self.assertLess(elapsed, 0.5)
+        self.assertEqual(slow.closed, 1)
+        stats = router.snapshot()
+        self.assertEqual((stats["hedged"], stats["cancelled"], stats["wins"]), (1, 1, {"fast": 1}))
+        self.assertGreater(stats["extra_chars"], 0)
+
+    def test_fast_primary_is_not_hedged(self):
+        primary, backup = StubProvider("primary", 0.0), StubProvider("backup", 0.0)
+        router = HedgedRouter([primary, backup], default_delay=0.5)
+        self.assertEqual(router.call("prompt", _attempt)[0], "primary")
+        router.shutdown(wait=True)
+        self.assertEqual(backup.calls, 0)
+        self.assertEqual(router.snapshot()["hedge_rate"], 0)
+
+    def test_invalid_primary_fails_over_immediately(self):
+        broken, backup = StubProvider("broken", 0.0, text="not json"), StubProvider("backup", 0.0)
+        router = HedgedRouter([broken, backup], default_delay=5)
+        t0 = time.perf_counter()
+        self.assertEqual(router.call("prompt", _attempt)[0], "backup")
+        self.assertLess(time.perf_counter() - t0, 1)
+        router.shutdown(wait=True)
+        self.assertEqual(router.snapshot()["failover"], 1)
+
+    def test_concurrent_calls_are_not_queued_into_hedges(self):
+        # هر تلاش thread خودش را دارد: ۸ فراخوانی همزمان پشت یک pool کوچک صف نمی‌شوند
+        primary, backup = StubProvider("primary", 0.3), StubProvider("backup", 0.0)
+        router = HedgedRouter([primary, backup], default_delay=0.45)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(router.call("prompt", _attempt)[0]))
+                   for _ in range(8)]
+        t0 = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        router.shutdown(wait=True)
+        self.assertLess(time.perf_counter() - t0, 0.6)
+        self.assertEqual(results, ["primary"] * 8)
+        self.assertEqual((router.snapshot()["hedged"], backup.calls), (0, 0))
+
+    def test_cancelled_loser_is_not_a_latency_sample(self):
+        slow, fast = StubProvider("slow", 0.3), StubProvider("fast", 0.0)
+        router = HedgedRouter([slow, fast], tracker=LatencyTracker(min_samples=1), default_delay=0.05)
+        self.assertEqual(router.call("prompt", _attempt)[0], "fast")
+        router.shutdown(wait=True)
+        self.assertEqual(slow.closed, 1)
+        self.assertIsNone(router.tracker.p90("slow"))
+        self.assertIsNotNone(router.tracker.p90("fast"))
+
+    def test_hedge_delay_follows_tracked_p90(self):
+        rnd = random.Random(3)
+        # بیش از ۹۰٪ درخواست‌ها ۱۰۰ms، دم کند ۱s
+        tracker = LatencyTracker(min_samples=20)
+        for _ in range(200):
+            tracker.record("primary", 1.0 if rnd.random() < 0.08 else 0.1)
+        router = HedgedRouter([StubProvider("primary", 0)], tracker=tracker, default_delay=2)
+        self.assertAlmostEqual(router.hedge_delay(router.providers[0]), 0.1)
+
+
+class AppHedgingTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.slow = StubProvider("gemini-stub", 0.8)
+        self.fast = StubProvider("backup-stub", lambda: random.uniform(0.0, 0.02))
+        self.app = app_module.create_app({
+            'DB_PATH': os.path.join(self.tmpdir.name, 'startup.db'),
+            'TESTING': True,
+            'SPECULATION_ENABLED': False,
+            'AI_PROVIDERS': [self.slow, self.fast],
+            'AI_HEDGE_DEFAULT_DELAY': 0.05,
+        })
+
+    def tearDown(self):
+        self.app.extensions['ai_router'].shutdown(wait=True)
+        self.app.extensions['repository'].close()
+        self.tmpdir.cleanup()
+
+    def test_scenario_comes_from_first_valid_provider_and_metrics_expose_it(self):
+        with self.app.app_context(), contextlib.redirect_stdout(io.StringIO()):
+            scenario = app_module.request_scenario("prompt")
+        self.assertEqual(scenario["title"], "سناریو")
+        self.assertEqual(len(scenario["options"]), 3)
+
+        metrics = self.app.test_client().get('/metrics').get_json()
+        self.assertEqual(metrics["ai"]["wins"], {"backup-stub": 1})
+        self.assertEqual(metrics["ai"]["hedged"], 1)
+        self.assertIn("speculation", metrics)
+
+
+if __name__ == '__main__':
+    unittest.main()
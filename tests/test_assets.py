@@ -0,0 +1,78 @@
+import contextlib
+import gzip
+import io
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import app as app_module
+import build_assets
+
+
+class AssetPipelineTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.static = os.path.join(self.tmpdir.name, 'static')
+        shutil.copytree(os.path.join(PROJECT_ROOT, 'static'), self.static,
+                        ignore=shutil.ignore_patterns(build_assets.DIST_DIR))
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.manifest = build_assets.build(self.static)
+        self.app = app_module.create_app({
+            'DB_PATH': os.path.join(self.tmpdir.name, 'startup.db'), 'TESTING': True,
+        })
+        # اپ را به static ساخته‌شده در پوشه موقت وصل کن
+        self.app.static_folder = self.static
+        self.app.extensions['asset_manifest'].clear()
+        self.app.extensions['asset_manifest'].update(build_assets.load_manifest(self.static))
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        self.app.extensions['repository'].close()
+        self.tmpdir.cleanup()
+
+    def test_build_is_deterministic_and_smaller(self):
+        self.assertEqual(set(self.manifest), {'style.css', 'script.js'})
+        for name, built in self.manifest.items():
+            path = os.path.join(self.static, built)
+            self.assertLess(os.path.getsize(path), os.path.getsize(os.path.join(self.static, name)))
+            with open(path, 'rb') as fh, gzip.open(path + '.gz') as gz:
+                self.assertEqual(fh.read(), gz.read())
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(build_assets.build(self.static), self.manifest)
+
+    def test_pages_link_hashed_names(self):
+        body = self.client.get('/').get_data(as_text=True)
+        for built in self.manifest.values():
+            self.assertIn(f'/static/{built}', body)
+        self.assertNotIn('/static/style.css', body)
+
+    def test_precompressed_variant_with_immutable_cache(self):
+        url = f"/static/{self.manifest['style.css']}"
+        r = self.client.get(url, headers={'Accept-Encoding': 'gzip, deflate'})
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.headers['Content-Encoding'], 'gzip')
+        self.assertTrue(r.headers['Content-Type'].startswith('text/css'))
+        self.assertIn('immutable', r.headers['Cache-Control'])
+        self.assertEqual(r.headers['Vary'], 'Accept-Encoding')
+        with open(os.path.join(self.static, self.manifest['style.css']), 'rb') as fh:
+            self.assertEqual(gzip.decompress(r.get_data()), fh.read())
+
+        plain = self.client.get(url, headers={'Accept-Encoding': 'identity'})
+        self.assertNotIn('Content-Encoding', plain.headers)
+        self.assertEqual(self.client.get('/static/dist/missing.js').status_code, 404)
+
+    def test_minifiers_keep_strings_and_line_breaks(self):
+        css = build_assets.minify_css('a  >  b { color: red ; }\n/* x */ .c { background: url("a  b.svg") }')
+        self.assertEqual(css, 'a>b{color: red}.c{background: url("a  b.svg")}')
+        js = build_assets.minify_js('  // comment\n  const a = 1\n\n  const b = `x  y`\n')
+        self.assertEqual(js, 'const a = 1\nconst b = `x  y`\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import app as app_module
+
+
+def _item(scenario_type, difficulty, title):
+    return {
+        "type": scenario_type, "difficulty": difficulty, "title": title,
+        "description": "توضیح " * 20,
+        "options": [{"text": f"گزینه {i}", "cost": -100, "reputation": 1, "morale": -1, "risk_level": 2} for i in range(3)],
+    }
+
+
+class BatchGenerationTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.env = mock.patch.dict(os.environ, {'GEMINI_API_KEY': 'test-key'})
+        self.env.start()
+        self.app = app_module.create_app({
+            'DB_PATH': os.path.join(self.tmpdir.name, 'startup.db'),
+            'TESTING': True,
+            'SPECULATION_ENABLED': False,
+            'SCENARIO_BATCH_SIZE': 3,
+        })
+        self.repo = self.app.extensions['repository']
+
+    def tearDown(self):
+        self.repo.close()
+        self.env.stop()
+        self.tmpdir.cleanup()
+
+    def test_invalid_items_are_dropped_individually(self):
+        raw = json.dumps({"scenarios": [
+            _item("CRISIS", 2, "درست"),
+            {"type": "CRISIS", "title": "بدون گزینه"},
+            _item("UNKNOWN", 2, "نوع نامعتبر"),
+        ]})
+        with contextlib.redirect_stdout(io.StringIO()):
+            items = app_module.parse_scenario_batch(raw)
+        self.assertEqual([it["title"] for it in items], ["درست"])
+
+    def test_surplus_is_queued_and_served_without_new_call(self):
+        calls = []
+
+        def generate(contents, temperature):
+            calls.append(contents)
+            specs = [line.split("type=")[1] for line in contents.splitlines() if "type=" in line]
+            return json.dumps({"scenarios": [
+                _item(spec.split(",")[0], int(spec.split("difficulty=")[1]), f"سناریو {i}")
+                for i, spec in enumerate(specs)
+            ]}, ensure_ascii=False)
+
+        with self.app.app_context(), mock.patch.object(app_module, '_stream_text', generate), \
+                contextlib.redirect_stdout(io.StringIO()):
+            user_id = self.repo.get_or_create_user('ali')
+            game_id = self.repo.create_game(user_id, 'TestCo', 1000, 50, 80, rng_seed=7)
+            _, difficulty, _ = app_module.plan_scenario(game_id, 'TestCo', 2, 1000, 50, 80, rng_seed=7)
+            weights = app_module.get_scenario_type_weights(2, 1000, 50, 80)
+            specs = app_module.batch_specs('NORMAL', difficulty, weights, 3)
+            primary = app_module.generate_scenario_batch(game_id, 'NORMAL', difficulty, weights, 'prompt', 3)
+            self.assertEqual(primary['title'], 'سناریو 0')
+            self.assertEqual(len(calls), 1)
+
+            queued_type, queued_difficulty = specs[1]
+            queued = self.repo.pop_queued_scenario(game_id, queued_type, queued_difficulty)
+            self.assertEqual(queued['title'], 'سناریو 1')
+            self.assertIsNone(self.repo.pop_queued_scenario(game_id, queued_type, queued_difficulty))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import contextlib
+import io
+import os
+import sys
+import time
+import unittest
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from batch_writer import BatchWriter
+
+
+class BatchWriterTest(unittest.TestCase):
+    def test_batches_and_stats_keys(self):
+        batches = []
+        writer = BatchWriter(batches.append, "test", batch_size=4, flush_interval=60,
+                             accepted="emitted", batches="fsyncs", extra_stats=("segments",))
+        writer._ensure_thread = lambda: None
+        for i in range(10):
+            self.assertTrue(writer.put(i))
+        self.assertEqual(writer.flush(), 10)
+        self.assertEqual(batches, [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9]])
+        self.assertEqual(writer.stats, {"emitted": 10, "written": 10, "fsyncs": 3, "dropped": 0,
+                                        "errors": 0, "segments": 0})
+
+    def test_full_queue_rejects_item(self):
+        writer = BatchWriter(lambda batch: None, "test", flush_interval=60, max_pending=1)
+        writer._ensure_thread = lambda: None
+        self.assertTrue(writer.put(1))
+        self.assertFalse(writer.put(2))
+        self.assertEqual((writer.stats["queued"], writer.stats["dropped"]), (1, 1))
+
+    def test_thread_survives_failing_writes(self):
+        written = []
+
+        def write(batch):
+            if batch == ["os"]:
+                raise OSError("disk")
+            if batch == ["bug"]:
+                raise RuntimeError("bug")
+            written.extend(batch)
+
+        writer = BatchWriter(write, "test", batch_size=1, flush_interval=0.01)
+        with contextlib.redirect_stdout(io.StringIO()):
+            for item in ("os", "bug", "ok"):
+                writer.put(item)
+                deadline = time.time() + 5
+                while writer._queue.qsize() and time.time() < deadline:
+                    time.sleep(0.01)
+            writer.close()
+        self.assertEqual(written, ["ok"])
+        self.assertEqual(writer.stats["errors"], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import app as app_module
+import corpus_snapshot
+from corpus_snapshot import CorpusSnapshot, SnapshotError, SnapshotReader, build_snapshot
+from storage import GameRepository, make_backend
+
+
+def _options(cost):
+    return [{"text": f"گزینه {i} ✓", "cost": cost - i, "reputation": -i, "morale": i, "risk": i + 1}
+            for i in range(3)]
+
+
+class CorpusSnapshotTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, 'startup.db')
+        self.out = os.path.join(self.tmpdir.name, 'corpus.snapshot')
+        self.repo = GameRepository(make_backend(self.db_path))
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.repo.add_corpus_scenario("CRISIS", "بحران اول", "توضیح بحران", 3, _options(-100))
+            self.repo.add_corpus_scenario("CRISIS", "بحران دوم", "توضیح دیگر", 3, _options(-50))
+            self.repo.add_corpus_scenario("OPPORTUNITY", "فرصت", "توضیح فرصت", 2, _options(200))
+
+    def tearDown(self):
+        self.repo.close()
+        self.tmpdir.cleanup()
+
+    def test_roundtrip_and_bucket_lookup(self):
+        stats = build_snapshot(self.db_path, self.out)
+        self.assertEqual(stats["scenarios"], 3)
+        snap = CorpusSnapshot(self.out)
+        self.assertEqual(snap.count("CRISIS", 3), 2)
+        self.assertEqual(snap.count("CRISIS", 2), 0)
+
+        data = snap.pick("OPPORTUNITY", 2, random.Random(1))
+        self.assertEqual(data, {
+            "title": "فرصت", "description": "توضیح فرصت", "scenario_type": "OPPORTUNITY", "difficulty": 2,
+            "options": _options(200),
+        })
+        titles = {snap.pick("CRISIS", 3, random.Random(seed))["title"] for seed in range(20)}
+        self.assertEqual(titles, {"بحران اول", "بحران دوم"})
+        self.assertEqual(snap.pick("CRISIS", 3, random.Random(1), exclude_titles={"بحران اول"})["title"], "بحران دوم")
+        self.assertIsNone(snap.pick("CRISIS", 3, random.Random(1), exclude_titles={"بحران اول", "بحران دوم"}))
+        self.assertIsNone(snap.pick("DILEMMA", 1, random.Random(1)))
+
+    def test_reader_picks_up_atomic_rebuild(self):
+        build_snapshot(self.db_path, self.out)
+        reader = SnapshotReader(self.out, check_interval=0)
+        old = reader.current()
+        self.assertEqual(old.count("DILEMMA", 1), 0)
+
+        self.repo.add_corpus_scenario("DILEMMA", "دوراهی", "توضیح", 1, _options(0))
+        build_snapshot(self.db_path, self.out)
+        self.assertEqual(reader.pick("DILEMMA", 1, random.Random(0))["title"], "دوراهی")
+        self.assertEqual(reader.stats["loads"], 2)
+        # map قبلی هنوز قابل خواندن است (threadی که وسط کار بود)
+        self.assertEqual(old.count("CRISIS", 3), 2)
+        self.assertEqual(old.pick("CRISIS", 3, random.Random(0))["difficulty"], 3)
+
+    def test_rejects_foreign_file(self):
+        with open(self.out, "wb") as fh:
+            fh.write(b"x" * 64)
+        with self.assertRaises(SnapshotError):
+            CorpusSnapshot(self.out)
+        reader = SnapshotReader(self.out, check_interval=0)
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertIsNone(reader.pick("CRISIS", 3, random.Random(0)))
+        self.assertEqual(reader.stats["errors"], 1)
+
+    def test_cli(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(corpus_snapshot.main(['--db', self.db_path, '--out', self.out]), 0)
+        self.assertEqual(CorpusSnapshot(self.out).count("CRISIS", 3), 2)
+
+
+class FallbackFromCorpusTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, 'startup.db')
+        self.out = os.path.join(self.tmpdir.name, 'corpus.snapshot')
+        self.env = mock.patch.dict(os.environ, {'GEMINI_API_KEY': '', 'OPENROUTER_API_KEY': ''})
+        self.env.start()
+        self.app = app_module.create_app({
+            'DB_PATH': self.db_path, 'TESTING': True, 'SPECULATION_ENABLED': False, 'CORPUS_SNAPSHOT': self.out,
+        })
+        self.repo = self.app.extensions['repository']
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.repo.add_corpus_scenario("CRISIS", "بحران corpus", "توضیح", 3, _options(-100))
+        build_snapshot(self.db_path, self.out)
+
+    def tearDown(self):
+        self.repo.close()
+        self.env.stop()
+        self.tmpdir.cleanup()
+
+    def test_fallback_prefers_corpus_then_procedural(self):
+        user_id = self.repo.get_or_create_user('ali')
+        game_id = self.repo.create_game(user_id, 'CorpusCo', 1000, 50, 80, rng_seed=7)
+        with self.app.app_context(), contextlib.redirect_stdout(io.StringIO()):
+            app_module.create_fallback_scenario(game_id, "CRISIS", 3, 1, rng_seed=7)
+            first = self.repo.latest_scenario(game_id)
+            self.assertEqual(first.title, "بحران corpus")
+            self.assertEqual([c.cost_impact for c in self.repo.list_choices(game_id, first.id)], [-100, -101, -102])
+
+            # بعد از ثبت نوبت، همان عنوان دوباره انتخاب نمی‌شود
+            self.repo.record_turn(game_id, 900, 50, 80, 2, {
+                "turn": 1, "scenario_id": first.id, "scenario_title": first.title, "scenario_type": "CRISIS",
+            })
+            app_module.create_fallback_scenario(game_id, "CRISIS", 3, 2, rng_seed=7)
+            self.assertNotEqual(self.repo.latest_scenario(game_id).title, "بحران corpus")
+        self.assertEqual(self.app.extensions['corpus'].stats["hits"], 1)
+        self.assertEqual(self.app.extensions['corpus'].stats["misses"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+import contextlib
+import io
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from db_backup import backup_all, backup_database, rotate
+from maintenance import MaintenanceScheduler
+
+
+class OnlineBackupTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, 'startup.db')
+        self.dest = os.path.join(self.tmpdir.name, 'backups')
+        conn = sqlite3.connect(self.db_path)
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('CREATE TABLE logs (id INTEGER PRIMARY KEY, game_id INTEGER, body TEXT)')
+        conn.executemany('INSERT INTO logs (game_id, body) VALUES (?, ?)', [(i, 'x' * 500) for i in range(4000)])
+        conn.commit()
+        conn.close()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _count(self, path):
+        conn = sqlite3.connect(path)
+        try:
+            return conn.execute('SELECT COUNT(*) FROM logs').fetchone()[0]
+        finally:
+            conn.close()
+
+    def test_backup_during_writes_is_consistent_and_writers_keep_going(self):
+        stop = threading.Event()
+        stalls = []
+
+        def writer():
+            conn = sqlite3.connect(self.db_path, timeout=5)
+            while not stop.is_set():
+                t0 = time.perf_counter()
+                conn.execute('INSERT INTO logs (game_id, body) VALUES (1, ?)', ('y' * 100,))
+                conn.commit()
+                stalls.append(time.perf_counter() - t0)
+                time.sleep(0.002)
+            conn.close()
+
+        thread = threading.Thread(target=writer)
+        thread.start()
+        try:
+            stats = backup_database(self.db_path, os.path.join(self.dest, 'copy.db'), pages=16, sleep=0.002)
+        finally:
+            stop.set()
+            thread.join()
+
+        self.assertGreaterEqual(self._count(os.path.join(self.dest, 'copy.db')), 4000)
+        self.assertFalse(os.path.exists(os.path.join(self.dest, 'copy.db.part')))
+        self.assertGreater(stats['steps'], 1)
+        self.assertGreater(len(stalls), 0)
+        self.assertLess(max(stalls), 0.5)
+
+    def test_writer_wait_is_measured_not_step_time(self):
+        holder = sqlite3.connect(self.db_path, isolation_level=None, check_same_thread=False)
+        holder.execute('BEGIN IMMEDIATE')  # writer دیگری قفل نوشتن را نگه داشته
+        release = threading.Timer(0.3, lambda: holder.execute('ROLLBACK'))
+        release.start()
+        try:
+            stats = backup_database(self.db_path, os.path.join(self.dest, 'copy.db'), pages=16, sleep=0)
+        finally:
+            release.join()
+            holder.close()
+        self.assertGreater(stats['max_writer_wait_ms'], 100)
+        self.assertLess(stats['max_step_ms'], stats['max_writer_wait_ms'])
+        self.assertEqual(self._count(os.path.join(self.dest, 'copy.db')), 4000)
+
+        # تراکنشی که رها نمی‌شود: یک بار probe_timeout ثبت و probe خاموش می‌شود
+        holder = sqlite3.connect(self.db_path, isolation_level=None)
+        holder.execute('BEGIN IMMEDIATE')
+        try:
+            t0 = time.perf_counter()
+            stats = backup_database(self.db_path, os.path.join(self.dest, 'stuck.db'), pages=16, sleep=0,
+                                    probe_timeout=0.05)
+        finally:
+            holder.close()
+        self.assertGreaterEqual(stats['max_writer_wait_ms'], 50)
+        self.assertLess(time.perf_counter() - t0, 1.0)
+
+    def test_backup_all_rotates_old_copies(self):
+        for stamp in ('20240101-000000', '20240102-000000', '20240103-000000'):
+            open(os.path.join(self.tmpdir.name, f'startup-{stamp}.db'), 'w').close()
+        self.assertEqual(len(rotate(self.tmpdir.name, 'startup', 2)), 1)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = backup_all([self.db_path], self.dest, keep=1)
+        self.assertEqual(len(results), 1)
+        self.assertEqual(self._count(results[0]['path']), 4000)
+        self.assertGreater(results[0]['mb_per_s'], 0)
+        self.assertEqual(len(os.listdir(self.dest)), 1)
+
+    def test_scheduler_runs_backup_on_its_own_period(self):
+        calls = []
+        scheduler = MaintenanceScheduler([self.db_path], backup=lambda: calls.append(1), backup_every=3600)
+        with contextlib.redirect_stdout(io.StringIO()):
+            scheduler.run_once()
+            scheduler.run_once()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(scheduler.stats['backups'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
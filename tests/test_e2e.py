@@ -9,7 +9,7 @@ PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 if PROJECT_ROOT not in sys.path:
     sys.path.insert(0, PROJECT_ROOT)
 
-# نکته: قبل از import کردن app باید مسیر دیتابیس تست را ست کنیم
+# نکته: مسیر دیتابیس تست از طریق create_app به اپ داده می‌شود
 
 
 def create_test_db(db_path: str):
@@ -28,14 +28,10 @@ class StartupSandboxE2E(unittest.TestCase):
 
         create_test_db(self.db_path)
 
-        # import بعد از ست کردن env
-        import importlib
-        if 'app' in sys.modules:
-            self.app_module = importlib.reload(sys.modules['app'])
-        else:
-            self.app_module = importlib.import_module('app')
-        self.app = self.app_module.app
-        self.app.config.update(TESTING=True)
+        # به جای reload کل ماژول، برای هر تست یک اپ تازه می‌سازیم
+        import app as app_module
+        self.app_module = app_module
+        self.app = app_module.create_app({'DB_PATH': self.db_path, 'TESTING': True})
         self.client = self.app.test_client()
 
     def tearDown(self):
@@ -69,6 +65,13 @@ class StartupSandboxE2E(unittest.TestCase):
         r = self.client.post('/action', data={'choice_id': str(choice['id'])}, follow_redirects=True)
         self.assertEqual(r.status_code, 200)
 
+        conn = sqlite3.connect(self.db_path)
+        turn = conn.execute('SELECT turn FROM games WHERE id = ?', (game_id,)).fetchone()[0]
+        log_count = conn.execute('SELECT COUNT(*) FROM logs WHERE game_id = ?', (game_id,)).fetchone()[0]
+        conn.close()
+        self.assertEqual(turn, 2)
+        self.assertEqual(log_count, 1)
+
         # 5) Next turn
         r = self.client.get('/next_turn', follow_redirects=True)
         self.assertEqual(r.status_code, 200)
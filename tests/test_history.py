@@ -0,0 +1,124 @@
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import app as app_module
+from storage import GameRepository, final_score, make_backend
+
+
+class HistoryRepositoryTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.repo = GameRepository(make_backend(os.path.join(self.tmpdir.name, 'startup.db'), shards=2))
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.user_id = self.repo.get_or_create_user('ali')
+        other = self.repo.get_or_create_user('sara')
+        self.games = []
+        for i in range(7):
+            self.games.append(self.repo.create_game(self.user_id, f'Co{i}', 1000, 50, 80))
+            self.repo.create_game(other, f'Other{i}', 1000, 50, 80)
+
+    def tearDown(self):
+        self.repo.close()
+        self.tmpdir.cleanup()
+
+    def test_keyset_pages_cover_all_games_newest_first(self):
+        seen, before = [], None
+        while True:
+            page = self.repo.list_user_games(self.user_id, before_id=before, limit=3)
+            if not page:
+                break
+            seen += [g.id for g in page]
+            before = page[-1].id
+        self.assertEqual(seen, self.games[::-1])
+        self.assertIsNone(self.repo.find_user_id('nobody'))
+
+    def test_summary_is_precomputed_in_global_registry(self):
+        game_id = self.games[2]
+        log = {"scenario_id": None, "scenario_title": "s", "choice_id": None, "choice_text": "c",
+               "cost_impact": -200, "reputation_impact": 5, "morale_impact": -10, "ai_response": "x"}
+        self.repo.record_turn(game_id, 800, 55, 70, 2, {**log, "turn": 1})
+        self.repo.record_turn(game_id, 600, 60, 60, 3, {**log, "turn": 2})
+        self.repo.mark_game_over(game_id, 'BUDGET')
+
+        (game,) = [g for g in self.repo.list_user_games(self.user_id) if g.id == game_id]
+        self.assertTrue(game.is_game_over)
+        self.assertEqual((game.budget, game.turn, game.decisions, game.game_over_reason), (600, 3, 2, 'BUDGET'))
+        self.assertEqual(game.score, final_score(600, 60, 60, 3))
+        self.assertIsNotNone(game.finished_at)
+
+    def test_backfill_summarizes_games_finished_before_summaries(self):
+        game_id = self.games[4]
+        log = {"scenario_id": None, "scenario_title": "s", "choice_id": None, "choice_text": "c",
+               "cost_impact": -100, "reputation_impact": 0, "morale_impact": 0, "ai_response": "x", "turn": 1}
+        self.repo.record_turn(game_id, 900, 50, 80, 2, log)
+        # پایان بازی به روش قدیمی: بدون score/decisions/finished_at
+        for pool in (self.repo.backend.shard_pool(game_id), self.repo.backend.global_pool()):
+            with pool.connection() as conn:
+                conn.execute("UPDATE games SET is_game_over = 1, game_over_reason = 'BUDGET' WHERE id = ?", (game_id,))
+                conn.commit()
+        self.repo.mark_game_over(self.games[5], 'MORALE')
+        (before,) = [g for g in self.repo.list_user_games(self.user_id) if g.id == game_id]
+        self.assertIsNone(before.decisions)
+
+        self.assertEqual(self.repo.backfill_game_summaries(batch=1), 1)
+        self.assertEqual(self.repo.backfill_game_summaries(), 0)
+        (game,) = [g for g in self.repo.list_user_games(self.user_id) if g.id == game_id]
+        self.assertEqual((game.decisions, game.score), (1, final_score(900, 50, 80, 2)))
+        self.assertIsNotNone(game.finished_at)
+
+
+class HistoryRouteTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.env = mock.patch.dict(os.environ, {'GEMINI_API_KEY': '', 'OPENROUTER_API_KEY': ''})
+        self.env.start()
+        self.app = app_module.create_app({
+            'DB_PATH': os.path.join(self.tmpdir.name, 'startup.db'), 'TESTING': True, 'SPECULATION_ENABLED': False,
+        })
+        self.repo = self.app.extensions['repository']
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        self.repo.close()
+        self.env.stop()
+        self.tmpdir.cleanup()
+
+    def test_pages_link_to_reports_and_older_games(self):
+        user_id = self.repo.get_or_create_user('ali')
+        games = [self.repo.create_game(user_id, f'Co{i}', 1000, 50, 80)
+                 for i in range(app_module.HISTORY_PAGE_SIZE + 2)]
+
+        first = self.client.get('/history/ali').get_data(as_text=True)
+        self.assertIn(f'/report/{games[-1]}', first)
+        self.assertNotIn(f'/report/{games[1]}"', first)
+        older = f'/history/ali?before={games[2]}'
+        self.assertIn(older, first)
+
+        second = self.client.get(older).get_data(as_text=True)
+        self.assertIn(f'/report/{games[1]}"', second)
+        self.assertIn(f'/report/{games[0]}"', second)
+        self.assertNotIn('?before=', second)
+        self.assertEqual(self.client.get('/history/nobody').status_code, 404)
+
+    def test_finished_game_without_summary_shows_dash(self):
+        user_id = self.repo.get_or_create_user('ali')
+        game_id = self.repo.create_game(user_id, 'OldCo', 1000, 50, 80)
+        with self.repo.backend.global_pool().connection() as conn:
+            conn.execute("UPDATE games SET is_game_over = 1 WHERE id = ?", (game_id,))
+            conn.commit()
+        page = self.client.get('/history/ali').get_data(as_text=True)
+        self.assertIn('🏆 -', page)
+        self.assertNotIn('🏆 0', page)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import contextlib
+import io
+import json
+import os
+import sys
+import unittest
+from unittest import mock
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import app as app_module
+from json_stream import ScenarioStreamValidator, StreamAbort
+
+SCENARIO = {
+    "title": "بحران سرور",
+    "description": "سرورها \"ناگهان\" از کار افتادند.\nمشتری‌ها منتظرند.",
+    "options": [
+        {"text": f"گزینه {i}", "cost": -100 * i, "reputation": 2.5, "morale": -i, "risk_level": 3}
+        for i in range(3)
+    ],
+}
+
+
+def _chunks(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+class ScenarioStreamValidatorTest(unittest.TestCase):
+    def test_any_chunking_matches_json_loads(self):
+        text = "```json\n" + json.dumps(SCENARIO, ensure_ascii=False, indent=2) + "\n```"
+        for size in (1, 7, 64, len(text)):
+            validator = ScenarioStreamValidator()
+            for chunk in _chunks(text, size):
+                if validator.feed(chunk):
+                    break
+            validator.finish()
+            self.assertEqual(validator.value, SCENARIO)
+
+    def test_aborts_as_soon_as_a_field_is_invalid(self):
+        text = json.dumps({**SCENARIO, "options": [{"text": "الف", "cost": "زیاد"}] * 3}, ensure_ascii=False)
+        validator = ScenarioStreamValidator()
+        with self.assertRaises(StreamAbort):
+            for chunk in _chunks(text, 4):
+                validator.feed(chunk)
+        # بلافاصله بعد از اولین مقدار نامعتبر، نه در پایان متن
+        self.assertLessEqual(validator.consumed, text.index('"زیاد"') + len('"زیاد"') + 4)
+        self.assertLess(validator.consumed, len(text))
+
+    def test_prose_instead_of_json_is_rejected(self):
+        with self.assertRaises(StreamAbort):
+            ScenarioStreamValidator(max_preamble=50).feed("متاسفانه نمی‌توانم این درخواست را انجام دهم. " * 3)
+
+
+class CallAIStreamingTest(unittest.TestCase):
+    def test_invalid_stream_is_cancelled_and_returns_none(self):
+        consumed = []
+
+        def stream(contents, temperature):
+            try:
+                for chunk in _chunks('{"title": "x", "description": "y", "options": "هیچ"' + " ..." * 500, 8):
+                    consumed.append(chunk)
+                    yield chunk
+            finally:
+                consumed.append("<closed>")
+
+        with mock.patch.dict(os.environ, {'GEMINI_API_KEY': 'test-key'}), \
+                mock.patch.object(app_module, '_stream_text', stream), \
+                contextlib.redirect_stdout(io.StringIO()):
+            self.assertIsNone(app_module.request_scenario("prompt"))
+        self.assertEqual(consumed[-1], "<closed>")
+        self.assertLess(len(consumed), 20)
+
+
+if __name__ == '__main__':
+    unittest.main()
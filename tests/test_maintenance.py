@@ -0,0 +1,122 @@
+import contextlib
+import io
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import unittest
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import maintenance
+from maintenance import MaintenanceScheduler, RequestActivity, wal_size
+
+
+class MaintenanceTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, 'startup.db')
+        self.conn = sqlite3.connect(self.db_path)
+        self.conn.execute('PRAGMA journal_mode = WAL')
+        # checkpoint خودکار خاموش تا WAL واقعاً بزرگ شود
+        self.conn.execute('PRAGMA wal_autocheckpoint = 0')
+        self.conn.execute('CREATE TABLE logs (id INTEGER PRIMARY KEY, game_id INTEGER, body TEXT)')
+        self.conn.execute('CREATE INDEX idx_logs_game_id ON logs(game_id)')
+        self.conn.executemany('INSERT INTO logs (game_id, body) VALUES (?, ?)',
+                              [(i % 50, 'x' * 200) for i in range(5000)])
+        self.conn.commit()
+
+    def tearDown(self):
+        self.conn.close()
+        self.tmpdir.cleanup()
+
+    def _scheduler(self, **kwargs):
+        return MaintenanceScheduler([self.db_path], wal_bytes=64 * 1024, **kwargs)
+
+    def test_checkpoint_mode_depends_on_idle(self):
+        self.assertGreater(wal_size(self.db_path), 64 * 1024)
+        busy = self._scheduler(is_idle=lambda: False)
+        with contextlib.redirect_stdout(io.StringIO()):
+            busy.run_once()
+        self.assertIn("checkpoint PASSIVE", busy.stats["last_ms"])
+        self.assertGreater(wal_size(self.db_path), 0)
+
+        idle = self._scheduler(is_idle=lambda: True)
+        with contextlib.redirect_stdout(io.StringIO()):
+            idle.run_once()
+        self.assertIn("checkpoint TRUNCATE", idle.stats["last_ms"])
+        self.assertEqual(wal_size(self.db_path), 0)
+
+    def test_passive_checkpoint_does_not_block_open_reader(self):
+        reader = sqlite3.connect(self.db_path)
+        reader.execute('BEGIN')
+        reader.execute('SELECT COUNT(*) FROM logs').fetchone()
+        try:
+            scheduler = self._scheduler()
+            t0 = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                scheduler.run_once()
+            self.assertLess(time.perf_counter() - t0, 1.0)
+            self.assertEqual(scheduler.stats["errors"], 0)
+            # نوشتن هم‌زمان همچنان ممکن است
+            self.conn.execute('INSERT INTO logs (game_id, body) VALUES (1, ?)', ('y',))
+            self.conn.commit()
+        finally:
+            reader.close()
+
+    def test_optimize_runs_periodically(self):
+        scheduler = self._scheduler(optimize_every=3600)
+        with contextlib.redirect_stdout(io.StringIO()):
+            scheduler.run_once()
+            scheduler.run_once()
+            self.assertEqual(scheduler.stats["optimizes"], 1)
+            scheduler.run_once(force_optimize=True)
+        self.assertEqual(scheduler.stats["optimizes"], 2)
+        self.assertIn("optimize", scheduler.stats["last_ms"])
+        # آمار planner واقعاً ساخته شده است (PRAGMA optimize روی اتصال تازه هیچ کاری نمی‌کرد)
+        stats = dict(self.conn.execute("SELECT idx, stat FROM sqlite_stat1 WHERE tbl = 'logs'").fetchall())
+        self.assertIn('idx_logs_game_id', stats)
+
+    def test_stale_statistics_are_refreshed(self):
+        self.conn.execute('ANALYZE')
+        self.conn.commit()
+        self.assertEqual(maintenance._stale_tables(self.conn), [])
+        self.conn.executemany('INSERT INTO logs (game_id, body) VALUES (?, ?)',
+                              [(i % 50, 'x') for i in range(60000)])
+        self.conn.commit()
+        self.assertEqual(maintenance._stale_tables(self.conn), ['logs'])
+        with contextlib.redirect_stdout(io.StringIO()):
+            self._scheduler().run_once(force_optimize=True)
+        (stat,) = self.conn.execute(
+            "SELECT stat FROM sqlite_stat1 WHERE idx = 'idx_logs_game_id'").fetchone()
+        self.assertGreater(int(stat.split()[0]), 5000)
+
+    def test_only_one_worker_is_elected(self):
+        first = self._scheduler(interval=3600)
+        second = self._scheduler(interval=3600)
+        try:
+            self.assertTrue(first.start())
+            self.assertFalse(second.start())
+            first.stop()
+            second._retry_at = 0
+            self.assertTrue(second.start())
+        finally:
+            first.stop()
+            second.stop()
+
+    def test_request_activity(self):
+        activity = RequestActivity(idle_seconds=0.05)
+        activity.begin()
+        time.sleep(0.06)
+        self.assertFalse(activity.idle())
+        activity.end()
+        self.assertFalse(activity.idle())
+        time.sleep(0.06)
+        self.assertTrue(activity.idle())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+import contextlib
+import io
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import migrate_game_logs
+from db_setup import create_database
+from migrate_db import migrate_database
+from migrate_game_logs import migrate_game_logs as run_migration
+from storage import GameRepository, make_backend
+
+
+class MigrateGameLogsTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, 'legacy.db')
+        with contextlib.redirect_stdout(io.StringIO()):
+            create_database(self.db_path)
+            migrate_database(self.db_path)
+        conn = sqlite3.connect(self.db_path)
+        conn.executemany('''
+            INSERT INTO game_logs (game_id, turn_number, scenario_title, user_choice,
+                                   budget_before, budget_after, reputation_before, reputation_after, ai_response)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', [(1 + i % 2, 1 + i // 2, f"سناریو {i}", f"گزینه {i}", 1000, 1000 - i, 50, 55, f"داستان {i}")
+              for i in range(10)])
+        conn.commit()
+        conn.close()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _logs(self):
+        conn = sqlite3.connect(self.db_path)
+        rows = conn.execute('''
+            SELECT game_id, turn, scenario_title, choice_text, cost_impact, reputation_impact, ai_response
+            FROM logs ORDER BY id
+        ''').fetchall()
+        conn.close()
+        return rows
+
+    def test_resumes_from_checkpoint_and_validates(self):
+        partial = run_migration(self.db_path, chunk=3, duty=1.0, max_chunks=2)
+        self.assertEqual((partial["copied"], partial["finished"]), (6, False))
+        self.assertEqual(len(self._logs()), 6)
+
+        stats = run_migration(self.db_path, chunk=3, duty=1.0)
+        self.assertTrue(stats["finished"])
+        self.assertEqual(stats["copied"], 4)
+        self.assertEqual(stats["validation"], {"source": 10, "copied": 10, "in_logs": 10, "skipped": 0, "renumbered": 0, "ok": True})
+        logs = self._logs()
+        self.assertEqual(logs[3], (2, 2, "سناریو 3", "گزینه 3", -3, 5, "داستان 3"))
+        # اجرای دوباره چیزی را تکرار نمی‌کند
+        self.assertEqual(run_migration(self.db_path, chunk=3, duty=1.0)["copied"], 0)
+        self.assertEqual(len(self._logs()), 10)
+
+    def test_kill_mid_chunk_rolls_back_that_chunk_only(self):
+        calls = {"n": 0}
+        original = migrate_game_logs._impact
+
+        def failing(before, after):
+            calls["n"] += 1
+            if calls["n"] == 3 * 5:  # وسط تکه دوم
+                raise KeyboardInterrupt
+            return original(before, after)
+
+        with mock.patch.object(migrate_game_logs, '_impact', failing), self.assertRaises(KeyboardInterrupt):
+            run_migration(self.db_path, chunk=4, duty=1.0)
+        self.assertEqual(len(self._logs()), 4)
+        stats = run_migration(self.db_path, chunk=4, duty=1.0)
+        self.assertTrue(stats["validation"]["ok"])
+        self.assertEqual([row[2] for row in self._logs()], [f"سناریو {i}" for i in range(10)])
+
+    def test_games_that_already_have_logs_keep_history_before_new_turns(self):
+        conn = sqlite3.connect(self.db_path)
+        # بازی 2 بعد از ارتقا ادامه پیدا کرده: turn 1 و 2 در logs هست
+        conn.executemany("INSERT INTO logs (game_id, turn, scenario_title, choice_text) VALUES (2, ?, ?, 'جدید')",
+                         [(1, "فعلی 1"), (2, "فعلی 2")])
+        conn.commit()
+        conn.close()
+
+        # تکه کوچک: ردیف‌های کپی‌شده بازی 1 در تکه‌های بعد آن را «دارای logs» نمی‌کنند و
+        # turn تازه بازی 2 بین تکه‌ها ادامه پیدا می‌کند
+        stats = run_migration(self.db_path, chunk=3, duty=1.0)
+        self.assertEqual((stats["copied"], stats["renumbered"]), (10, 5))
+        self.assertEqual(stats["validation"], {"source": 10, "copied": 10, "in_logs": 10, "skipped": 0,
+                                               "renumbered": 5, "ok": True})
+        logs = self._logs()
+        self.assertEqual([t for g, t, *_ in logs if g == 1], [1, 2, 3, 4, 5])
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            repo = GameRepository(make_backend(self.db_path))
+        try:
+            history = [(log.turn, log.scenario_title) for log in repo.list_logs(2)]
+            self.assertEqual(repo.list_logs(2, limit=2)[0].scenario_title, "فعلی 1")
+        finally:
+            repo.close()
+        self.assertEqual(history, [(-4, "سناریو 1"), (-3, "سناریو 3"), (-2, "سناریو 5"), (-1, "سناریو 7"),
+                                   (0, "سناریو 9"), (1, "فعلی 1"), (2, "فعلی 2")])
+
+    def test_minimal_legacy_schema_derives_turns(self):
+        path = os.path.join(self.tmpdir.name, 'oldest.db')
+        conn = sqlite3.connect(path)
+        # اسکیمای backup/app.py: بدون turn_number و ستون‌های before/after
+        conn.execute('''CREATE TABLE game_logs (id INTEGER PRIMARY KEY AUTOINCREMENT, game_id INTEGER,
+                        scenario_title TEXT, user_choice TEXT, ai_response TEXT)''')
+        conn.executemany("INSERT INTO game_logs (game_id, scenario_title, user_choice, ai_response) VALUES (?, ?, ?, ?)",
+                         [(7, "الف", "x", "s"), (8, "ب", "y", "s"), (7, "ج", "z", "s"), (None, "?", "?", "?")])
+        conn.commit()
+        conn.close()
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            self.assertEqual(migrate_game_logs.main(['--db', path, '--chunk', '2', '--duty', '1']), 0)
+        conn = sqlite3.connect(path)
+        rows = conn.execute("SELECT game_id, turn, scenario_title, cost_impact FROM logs ORDER BY id").fetchall()
+        conn.close()
+        self.assertEqual(rows, [(7, 1, "الف", 0), (8, 1, "ب", 0), (7, 2, "ج", 0)])
+        self.assertIn("رد شده=1", out.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import os
+import sqlite3
+import sys
+import unittest
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from models import Game, LogEntry, row_factory
+
+
+class RowFactoryTest(unittest.TestCase):
+    def setUp(self):
+        self.conn = sqlite3.connect(':memory:')
+        self.conn.execute('CREATE TABLE logs (id INTEGER, turn INTEGER, choice_text TEXT, extra TEXT)')
+        self.conn.executemany('INSERT INTO logs VALUES (?, ?, ?, ?)', [(1, 1, 'الف', 'x'), (2, 2, 'ب', 'y')])
+
+    def tearDown(self):
+        self.conn.close()
+
+    def _fetch(self, sql):
+        cur = self.conn.execute(sql)
+        cur.row_factory = row_factory(LogEntry, cur.description)
+        return cur.fetchall()
+
+    def test_columns_mapped_by_name_and_missing_are_none(self):
+        entries = self._fetch('SELECT choice_text, extra, turn, id FROM logs ORDER BY id')
+        self.assertEqual([(e.id, e.turn, e.choice_text) for e in entries], [(1, 1, 'الف'), (2, 2, 'ب')])
+        self.assertIsNone(entries[0].scenario_title)
+        self.assertFalse(hasattr(entries[0], 'extra'))
+        self.assertFalse(hasattr(entries[0], '__dict__'))
+        # دسترسی قدیمی با کلید هنوز کار می‌کند
+        self.assertEqual(entries[1]['choice_text'], 'ب')
+        with self.assertRaises(KeyError):
+            entries[1]['extra']
+
+    def test_replace_returns_updated_copy(self):
+        game = Game(id=3, budget=1000, turn=1)
+        after = game.replace(budget=900, turn=2)
+        self.assertEqual((game.budget, game.turn), (1000, 1))
+        self.assertEqual((after.id, after.budget, after.turn), (3, 900, 2))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+import contextlib
+import io
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import app as app_module
+import near_duplicates
+from near_duplicates import normalize, signature, similarity
+from storage import GameRepository, make_backend
+
+TITLE = "مشکل نقدینگی فوری"
+DESCRIPTION = ("یک هزینه غیرمنتظره پیش آمده و شما باید فوراً تصمیم بگیرید. تیم شما منتظر حقوق است "
+               "و مشتریان هم درخواست بازگشت وجه دارند.")
+# همان موقعیت با چند کلمه متفاوت و املای عربی
+REWORDED = ("يك هزينه غيرمنتظره پيش آمده و شما بايد سريعاً تصميم بگيريد. تيم شما منتظر حقوق است "
+            "و كاربران هم درخواست بازگشت وجه دارند!")
+OTHER = ("یک شرکت بزرگ پیشنهاد همکاری داده که می‌تواند درآمد خوبی داشته باشد، اما نیاز به "
+         "سرمایه‌گذاری اولیه دارد.")
+
+
+def _options():
+    return [{"text": f"گزینه {i}", "cost": -10, "reputation": 1, "morale": 1, "risk": 2} for i in range(3)]
+
+
+class SignatureTest(unittest.TestCase):
+    def test_normalize_persian_variants(self):
+        self.assertEqual(normalize("كتاب‌هاي «جديد» ۱۲۳ و ٤٥"), "کتاب های جدید 123 و 45")
+        self.assertEqual(normalize("مُدیرِ  تـیم"), "مدیر تیم")
+
+    def test_similarity_separates_rewording_from_other_text(self):
+        sig = signature(TITLE, DESCRIPTION)
+        self.assertEqual(len(sig), near_duplicates.NUM_BINS)
+        self.assertEqual(similarity(sig, signature(TITLE, DESCRIPTION)), 1.0)
+        self.assertGreater(similarity(sig, signature(TITLE, REWORDED)), 0.6)
+        self.assertLess(similarity(sig, signature("فرصت همکاری", OTHER)), 0.2)
+        self.assertIsNone(signature("", "  !! "))
+
+
+class RepositoryDedupTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, 'startup.db')
+        self.repo = GameRepository(make_backend(self.db_path, shards=2))
+        with contextlib.redirect_stdout(io.StringIO()):
+            user_id = self.repo.get_or_create_user('ali')
+        self.game_a = self.repo.create_game(user_id, 'A', 1000, 50, 80)
+        self.game_b = self.repo.create_game(user_id, 'B', 1000, 50, 80)
+
+    def tearDown(self):
+        self.repo.close()
+        self.tmpdir.cleanup()
+
+    def test_scope_is_own_game_and_corpus(self):
+        self.repo.add_scenario(self.game_a, "CRISIS", TITLE, DESCRIPTION, 3, 1, _options())
+        dup = self.repo.find_near_duplicate(self.game_a, TITLE, REWORDED)
+        self.assertEqual((dup["title"], dup["scope"]), (TITLE, "game"))
+        # بازی دیگر (حتی در shard دیگر) تکراری حساب نمی‌شود
+        self.assertIsNone(self.repo.find_near_duplicate(self.game_b, TITLE, REWORDED))
+        self.assertIsNone(self.repo.find_near_duplicate(self.game_a, "فرصت همکاری", OTHER))
+
+        self.repo.add_corpus_scenario("OPPORTUNITY", "فرصت همکاری", OTHER, 2, _options())
+        self.assertEqual(self.repo.find_near_duplicate(self.game_b, "فرصت همکاری", OTHER)["scope"], "corpus")
+        self.assertIsNone(self.repo.find_near_duplicate(self.game_b, "فرصت همکاری", OTHER, corpus=False))
+
+    def test_backfill_indexes_old_rows_once(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("INSERT INTO scenarios (game_id, title, description) VALUES (NULL, ?, ?)", (TITLE, DESCRIPTION))
+        conn.execute("INSERT INTO scenarios (game_id, title, description) VALUES (NULL, '', '')")
+        conn.commit()
+        conn.close()
+        self.assertIsNone(self.repo.find_near_duplicate(None, TITLE, REWORDED))
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(near_duplicates.main(['--db', self.db_path, '--shards', '2']), 0)
+        self.assertEqual(self.repo.find_near_duplicate(None, TITLE, REWORDED)["scope"], "corpus")
+        self.assertEqual(self.repo.backfill_signatures(), 0)
+
+
+class GenerationDedupTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.env = mock.patch.dict(os.environ, {'GEMINI_API_KEY': '', 'OPENROUTER_API_KEY': ''})
+        self.env.start()
+        self.app = app_module.create_app({
+            'DB_PATH': os.path.join(self.tmpdir.name, 'startup.db'), 'TESTING': True, 'SPECULATION_ENABLED': False,
+        })
+        self.repo = self.app.extensions['repository']
+
+    def tearDown(self):
+        self.repo.close()
+        self.env.stop()
+        self.tmpdir.cleanup()
+
+    def test_near_duplicate_ai_scenario_is_replaced(self):
+        game_id = self.repo.create_game(self.repo.get_or_create_user('ali'), 'DupCo', 1000, 50, 80, rng_seed=3)
+        self.repo.add_scenario(game_id, "CRISIS", TITLE, DESCRIPTION, 3, 1, _options())
+        reworded = {"title": TITLE, "description": REWORDED, "options": _options()}
+        with self.app.app_context(), contextlib.redirect_stdout(io.StringIO()), \
+                mock.patch.object(app_module, 'request_scenario', return_value=reworded):
+            app_module.generate_dynamic_scenario(game_id, 'DupCo', 2, 1000, 50, 80, rng_seed=3)
+        latest = self.repo.latest_scenario(game_id)
+        self.assertEqual(latest.turn_number, 2)
+        self.assertNotEqual(latest.description, REWORDED)
+        self.assertEqual(self.app.extensions['dedup'].stats["duplicates"], 1)
+
+    def test_generated_scenarios_are_checked_against_own_game_only(self):
+        game_id = self.repo.create_game(self.repo.get_or_create_user('ali'), 'DupCo', 1000, 50, 80, rng_seed=3)
+        self.repo.add_corpus_scenario("CRISIS", TITLE, REWORDED, 3, _options())
+        fresh = {"title": TITLE, "description": DESCRIPTION, "options": _options()}
+        with self.app.app_context(), contextlib.redirect_stdout(io.StringIO()), \
+                mock.patch.object(app_module, 'request_scenario', return_value=fresh):
+            app_module.generate_dynamic_scenario(game_id, 'DupCo', 1, 1000, 50, 80, rng_seed=3)
+            self.assertEqual(self.repo.latest_scenario(game_id).description, DESCRIPTION)
+            # ولی چیزی که به corpus اضافه می‌شود با corpus مقایسه می‌شود
+            self.assertTrue(app_module.is_near_duplicate(None, fresh, "recycle", corpus=True))
+        self.assertEqual(self.app.extensions['dedup'].stats["duplicates"], 1)
+
+    def test_speculated_scenario_ignores_recycled_siblings(self):
+        # شاخه هم‌نوبت (بازنده) در commit به corpus رفته و تقریباً همان سناریوی برنده است
+        game_id = self.repo.create_game(self.repo.get_or_create_user('ali'), 'DupCo', 1000, 50, 80, rng_seed=3)
+        self.repo.add_corpus_scenario("CRISIS", TITLE, REWORDED, 3, _options())
+        winner = {"scenario_type": "CRISIS", "title": TITLE, "description": DESCRIPTION,
+                  "difficulty": 3, "options": _options()}
+        with self.app.app_context(), contextlib.redirect_stdout(io.StringIO()), \
+                mock.patch.object(app_module, 'take_speculated_scenario', return_value=winner), \
+                mock.patch.object(app_module, 'request_scenario') as request_scenario:
+            app_module.generate_dynamic_scenario(game_id, 'DupCo', 2, 1000, 50, 80, rng_seed=3)
+        self.assertEqual(self.repo.latest_scenario(game_id).description, DESCRIPTION)
+        request_scenario.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
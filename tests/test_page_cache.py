@@ -0,0 +1,141 @@
+import contextlib
+import gzip
+import io
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import app as app_module
+from page_cache import PageCache
+
+
+class PageCacheTest(unittest.TestCase):
+    def test_etag_is_content_hash_and_body_roundtrips(self):
+        cache = PageCache()
+        a = cache.put(('k', 1), b'<html>a</html>')
+        b = cache.put(('k', 2), b'<html>a</html>')
+        self.assertEqual(a.etag, b.etag)
+        self.assertNotEqual(a.etag, cache.put(('k', 3), b'<html>b</html>').etag)
+        self.assertEqual(cache.get(('k', 1)).body(), b'<html>a</html>')
+        self.assertIsNone(cache.get(('missing',)))
+        self.assertEqual((cache.stats['hits'], cache.stats['misses']), (1, 1))
+
+    def test_byte_limit_evicts_live_pages_before_final(self):
+        body = os.urandom(400)  # تصادفی: gzip کوچکش نمی‌کند
+        size = len(PageCache.entry_for(body).body_gz)
+        cache = PageCache(max_bytes=size * 3)
+        cache.put(('final',), body, final=True)
+        for i in range(4):
+            cache.put(('live', i), os.urandom(400))
+        self.assertLessEqual(cache.stats['bytes'], size * 3)
+        self.assertIsNotNone(cache.get(('final',)))
+        self.assertIsNone(cache.get(('live', 0)))
+        self.assertIsNotNone(cache.get(('live', 3)))
+        self.assertEqual(cache.stats['evictions'], 2)
+
+
+class PageCacheRoutesTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, 'startup.db')
+        self.env = mock.patch.dict(os.environ, {'GEMINI_API_KEY': '', 'OPENROUTER_API_KEY': ''})
+        self.env.start()
+        self.app = app_module.create_app({'DB_PATH': self.db_path, 'TESTING': True, 'SPECULATION_ENABLED': False})
+        self.repo = self.app.extensions['repository']
+        self.cache = self.app.extensions['page_cache']
+        self.client = self.app.test_client()
+        self.quiet = contextlib.redirect_stdout(io.StringIO())
+        self.quiet.__enter__()
+        self.client.post('/new_game', data={'username': 'ali', 'startup_name': 'TestCo'})
+        with self.client.session_transaction() as sess:
+            self.game_id = sess['game_id']
+
+    def tearDown(self):
+        self.quiet.__exit__(None, None, None)
+        self.repo.close()
+        self.env.stop()
+        self.tmpdir.cleanup()
+
+    def _counting_render(self):
+        return mock.patch.object(app_module, 'render_template', wraps=app_module.render_template)
+
+    def test_game_page_revalidates_without_rendering(self):
+        first = self.client.get('/game')
+        self.assertEqual(first.status_code, 200)
+        etag = first.headers['ETag']
+        self.assertEqual(first.headers['Cache-Control'], app_module.LIVE_PAGE_CACHE)
+
+        with self._counting_render() as render:
+            again = self.client.get('/game')
+            not_modified = self.client.get('/game', headers={'If-None-Match': etag})
+        self.assertEqual(again.data, first.data)
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified.data, b'')
+        render.assert_not_called()
+        self.assertEqual(self.cache.stats['not_modified'], 1)
+
+    def test_cache_miss_still_answers_304_without_rendering(self):
+        etag = self.client.get('/game').headers['ETag']
+        self.cache.clear()  # مثل evict، worker دیگر یا restart
+        with self._counting_render() as render:
+            r = self.client.get('/game', headers={'If-None-Match': etag})
+        self.assertEqual(r.status_code, 304)
+        render.assert_not_called()
+        self.assertEqual(self.cache.stats['entries'], 0)
+
+        other = app_module.create_app({'DB_PATH': self.db_path, 'TESTING': True, 'SPECULATION_ENABLED': False})
+        self.addCleanup(other.extensions['repository'].close)
+        self.assertEqual(other.extensions['page_version'], self.app.extensions['page_version'])
+
+    def test_gzip_variant_has_its_own_etag(self):
+        plain = self.client.get('/game')
+        gz = self.client.get('/game', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(gz.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(gz.data), plain.data)
+        self.assertNotEqual(gz.headers['ETag'], plain.headers['ETag'])
+        self.assertIn('Accept-Encoding', gz.headers['Vary'])
+        r = self.client.get('/game', headers={'Accept-Encoding': 'gzip', 'If-None-Match': plain.headers['ETag']})
+        self.assertEqual(r.status_code, 200)
+
+    def test_new_turn_and_next_turn_change_the_page(self):
+        etag = self.client.get('/game').headers['ETag']
+        scenario = self.repo.latest_scenario(self.game_id)
+        choice = self.repo.list_choices(self.game_id, scenario.id)[0]
+        self.client.post('/api/turn', json={'choice_id': choice.id})
+        after_turn = self.client.get('/game', headers={'If-None-Match': etag})
+        self.assertEqual(after_turn.status_code, 200)
+
+        # /next_turn سناریوی تازه می‌سازد بدون اینکه turn عوض شود
+        self.client.get('/next_turn')
+        after_next = self.client.get('/game', headers={'If-None-Match': after_turn.headers['ETag']})
+        self.assertEqual(after_next.status_code, 200)
+        self.assertNotEqual(after_next.headers['ETag'], after_turn.headers['ETag'])
+
+    def test_finished_report_is_cached_indefinitely(self):
+        live = self.client.get(f'/report/{self.game_id}')
+        self.assertEqual(live.headers['Cache-Control'], app_module.LIVE_PAGE_CACHE)
+
+        self.repo.mark_game_over(self.game_id, 'test')
+        final = self.client.get(f'/report/{self.game_id}')
+        self.assertEqual(final.headers['Cache-Control'], app_module.FINAL_PAGE_CACHE)
+        with self._counting_render() as render:
+            self.assertEqual(self.client.get(f'/report/{self.game_id}').data, final.data)
+            r = self.client.get(f'/report/{self.game_id}', headers={'If-None-Match': final.headers['ETag']})
+        self.assertEqual(r.status_code, 304)
+        render.assert_not_called()
+
+    def test_disabled_still_sends_etag(self):
+        self.app.config['PAGE_CACHE_ENABLED'] = False
+        etag = self.client.get('/game').headers['ETag']
+        self.assertEqual(self.client.get('/game', headers={'If-None-Match': etag}).status_code, 304)
+        self.assertEqual(self.cache.stats['entries'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import app as app_module
+from ai_providers import CallableProvider
+from procedural import ProceduralScenarioGenerator
+
+
+def _magnitude(scenario):
+    return sum(abs(o["reputation"]) + abs(o["morale"]) for o in scenario["options"])
+
+
+class ProceduralGeneratorTest(unittest.TestCase):
+    def setUp(self):
+        self.gen = ProceduralScenarioGenerator()
+
+    def test_output_is_valid_and_varied(self):
+        seen = set()
+        for i in range(60):
+            scenario_type = app_module.SCENARIO_TYPES[i % 5]
+            data = self.gen.generate(random.Random(i), scenario_type, 1 + i % 5, "TestCo")
+            self.assertTrue(data["title"] and data["description"])
+            self.assertEqual(len(data["options"]), 3)
+            for o in data["options"]:
+                self.assertEqual(set(o), {"text", "cost", "reputation", "morale", "risk"})
+                self.assertTrue(-1000 <= o["cost"] <= 2000 and 1 <= o["risk"] <= 5)
+            seen.add(data["description"])
+        self.assertGreater(len(seen), 40)
+
+    def test_type_constraints(self):
+        for seed in range(30):
+            rng = random.Random(seed)
+            extreme = self.gen.generate(rng, "EXTREME_CRISIS", 3)
+            self.assertTrue(any(min(o["reputation"], o["morale"]) <= -20 for o in extreme["options"]))
+            opportunity = self.gen.generate(rng, "OPPORTUNITY", 3)
+            self.assertTrue(any(o["cost"] > 0 for o in opportunity["options"]))
+            dilemma = self.gen.generate(rng, "DILEMMA", 3)
+            for o in dilemma["options"]:
+                impacts = [o["cost"], o["reputation"], o["morale"]]
+                self.assertTrue(min(impacts) < 0 < max(impacts) or 0 in impacts)
+
+    def test_difficulty_scales_impacts_and_same_seed_is_deterministic(self):
+        easy = sum(_magnitude(self.gen.generate(random.Random(s), "CRISIS", 1)) for s in range(40))
+        hard = sum(_magnitude(self.gen.generate(random.Random(s), "CRISIS", 5)) for s in range(40))
+        self.assertGreater(hard, easy * 1.8)
+        self.assertEqual(self.gen.generate(random.Random(7), "NORMAL", 2),
+                         self.gen.generate(random.Random(7), "NORMAL", 2))
+
+    def test_generation_is_fast(self):
+        rng = random.Random(1)
+        t0 = time.perf_counter()
+        for _ in range(1000):
+            self.gen.generate(rng, "DILEMMA", 3, "TestCo")
+        self.assertLess((time.perf_counter() - t0) / 1000, 0.001)
+
+
+class ProceduralPolicyTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.env = mock.patch.dict(os.environ, {'GEMINI_API_KEY': 'test-key'})
+        self.env.start()
+
+    def tearDown(self):
+        self.env.stop()
+        self.tmpdir.cleanup()
+
+    def _app(self, **config):
+        return app_module.create_app({
+            'DB_PATH': os.path.join(self.tmpdir.name, 'startup.db'),
+            'TESTING': True,
+            'SPECULATION_ENABLED': False,
+            **config,
+        })
+
+    def test_always_policy_never_calls_ai(self):
+        def no_network(contents, temperature):
+            raise AssertionError("AI نباید فراخوانی شود")
+
+        flask_app = self._app(PROCEDURAL_POLICY='always')
+        repo = flask_app.extensions['repository']
+        with mock.patch.object(app_module, '_stream_text', no_network), \
+                flask_app.app_context(), contextlib.redirect_stdout(io.StringIO()):
+            user_id = repo.get_or_create_user('ali')
+            game_id = repo.create_game(user_id, 'TestCo', 1000, 50, 80, rng_seed=5)
+            first = app_module.generate_dynamic_scenario(game_id, 'TestCo', 1, 1000, 50, 80, rng_seed=5)
+            second = app_module.generate_dynamic_scenario(game_id, 'TestCo', 2, 1000, 50, 80, rng_seed=5)
+        self.assertNotEqual(first, second)
+        self.assertEqual(len(repo.ai_responses(game_id)), 0)
+        self.assertEqual(flask_app.extensions['procedural'].stats['served'], 2)
+
+    def test_on_timeout_serves_local_scenario_and_keeps_late_ai_answer(self):
+        import json
+        answer = json.dumps({
+            "title": "سناریوی دیررس", "description": "توضیح " * 20,
+            "options": [{"text": f"گزینه {i}", "cost": -10, "reputation": 1, "morale": 1, "risk_level": 2}
+                        for i in range(3)],
+        }, ensure_ascii=False)
+
+        def slow(contents, temperature):
+            time.sleep(0.3)
+            yield answer
+
+        flask_app = self._app(
+            PROCEDURAL_POLICY='on_timeout', PROCEDURAL_AI_TIMEOUT=0.05,
+            AI_PROVIDERS=[CallableProvider('slow', slow)],
+        )
+        repo = flask_app.extensions['repository']
+        with flask_app.app_context(), contextlib.redirect_stdout(io.StringIO()):
+            user_id = repo.get_or_create_user('ali')
+            game_id = repo.create_game(user_id, 'TestCo', 1000, 50, 80, rng_seed=9)
+            t0 = time.perf_counter()
+            scenario_id = app_module.generate_dynamic_scenario(game_id, 'TestCo', 1, 1000, 50, 80, rng_seed=9)
+            self.assertLess(time.perf_counter() - t0, 0.25)
+            self.assertNotEqual(repo.get_scenario(game_id, scenario_id).title, "سناریوی دیررس")
+            selected_type, difficulty, _ = app_module.plan_scenario(game_id, 'TestCo', 1, 1000, 50, 80, rng_seed=9)
+            time.sleep(0.5)
+            queued = repo.pop_queued_scenario(game_id, selected_type, difficulty)
+        self.assertEqual(queued["title"], "سناریوی دیررس")
+        self.assertEqual(flask_app.extensions['procedural'].stats['ai_timeouts'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
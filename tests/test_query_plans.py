@@ -0,0 +1,169 @@
+import contextlib
+import io
+import os
+import random
+import re
+import sqlite3
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import app as app_module
+import replay
+import storage
+from db_indexes import INDEXES
+from db_setup import create_database
+from migrate_db import migrate_database
+
+# اسکن ترتیبی روی این ایندکس‌ها با LIMIT محدود است (نه full scan)
+BOUNDED_SCANS = {"idx_games_seeded"}
+CHECKED = re.compile(r"^\s*(SELECT|UPDATE|DELETE)\b", re.IGNORECASE)
+
+
+def _seed(db_path: str, games: int = 3000) -> None:
+    """دیتابیس بزرگ: بدون ایندکس درست، کوئری‌ها روی ده‌ها هزار ردیف scan می‌کنند."""
+    rng = random.Random(1)
+    conn = sqlite3.connect(db_path)
+    conn.executemany("INSERT INTO users (username) VALUES (?)", [(f"user{i}",) for i in range(games)])
+    conn.executemany(
+        "INSERT INTO games (user_id, startup_name, turn, rng_seed) VALUES (?, ?, ?, ?)",
+        [(i + 1, f"Co{i}", 5, i if i % 2 else None) for i in range(games)],
+    )
+    scenario_rows, choice_rows, log_rows = [], [], []
+    scenario_id = 0
+    for game_id in range(1, games + 1):
+        for turn in range(1, 5):
+            scenario_id += 1
+            scenario_rows.append((game_id, "CRISIS", f"s{scenario_id}", "d", 2, turn))
+            choice_rows += [(scenario_id, f"c{k}", -10, 1, 1, 2) for k in range(3)]
+            log_rows.append((game_id, turn, scenario_id, f"s{scenario_id}", "c0", rng.randint(-50, 50)))
+    conn.executemany(
+        "INSERT INTO scenarios (game_id, scenario_type, title, description, difficulty_level, turn_number) "
+        "VALUES (?, ?, ?, ?, ?, ?)", scenario_rows)
+    conn.executemany(
+        "INSERT INTO choices (scenario_id, text, cost_impact, reputation_impact, morale_impact, risk_level) "
+        "VALUES (?, ?, ?, ?, ?, ?)", choice_rows)
+    conn.executemany(
+        "INSERT INTO logs (game_id, turn, scenario_id, scenario_title, choice_text, cost_impact) "
+        "VALUES (?, ?, ?, ?, ?, ?)", log_rows)
+    conn.executemany(
+        "INSERT INTO ai_replay_log (game_id, purpose, prompt_hash, response) VALUES (?, 'scenario', ?, '{}')",
+        [(g, f"h{g}") for g in range(1, games + 1)])
+    conn.executemany(
+        "INSERT INTO scenario_queue (game_id, scenario_type, difficulty, payload) VALUES (?, 'CRISIS', 2, '{}')",
+        [(g,) for g in range(1, games + 1, 3)])
+    conn.commit()
+    conn.close()
+
+
+def _plan_problems(conn: sqlite3.Connection, sql: str) -> list[str]:
+    problems = []
+    for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}"):
+        detail = row[3]
+        if "TEMP B-TREE" in detail:
+            problems.append(detail)
+        elif detail.startswith("SCAN"):
+            index = re.search(r"USING (?:COVERING )?INDEX (\w+)", detail)
+            if not index or index.group(1) not in BOUNDED_SCANS:
+                problems.append(detail)
+    return problems
+
+
+class QueryPlanTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.db_path = os.path.join(cls.tmpdir.name, 'startup.db')
+        # db_setup + migrate: اسکیمای db_setup (users بدون UNIQUE) بدترین حالت است
+        with contextlib.redirect_stdout(io.StringIO()):
+            create_database(cls.db_path)
+            migrate_database(cls.db_path)
+        _seed(cls.db_path)
+        cls.statements = cls._capture_workload()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmpdir.cleanup()
+
+    @classmethod
+    def _capture_workload(cls) -> set[str]:
+        """همه statementهایی که اپ در یک بازی کامل (و اسکریپت replay) اجرا می‌کند."""
+        statements = set()
+        original_connect = storage.ConnectionPool._connect
+
+        def traced_connect(pool):
+            conn = original_connect(pool)
+            conn.set_trace_callback(statements.add)
+            return conn
+
+        with mock.patch.object(storage.ConnectionPool, '_connect', traced_connect), \
+                mock.patch.dict(os.environ, {'GEMINI_API_KEY': ''}), \
+                contextlib.redirect_stdout(io.StringIO()):
+            flask_app = app_module.create_app({
+                'DB_PATH': cls.db_path, 'TESTING': True, 'SPECULATION_ENABLED': False,
+            })
+            repo = flask_app.extensions['repository']
+            client = flask_app.test_client()
+            client.post('/new_game', data={'username': 'user7', 'startup_name': 'PlanCo'})
+            with client.session_transaction() as sess:
+                game_id = sess['game_id']
+            for _ in range(3):
+                client.get('/game')
+                choice_id = repo.list_choices(game_id, repo.latest_scenario(game_id).id)[0].id
+                client.post('/action', data={'choice_id': str(choice_id)})
+                client.get('/next_turn')
+            client.get(f'/report/{game_id}')
+            client.get('/metrics')
+            client.get('/history/user7')
+            client.get(f'/history/user7?before={game_id}')
+
+            repo.get_user(1)
+            repo.recent.discard(game_id)
+            repo.recent_history(game_id)
+            repo.pop_queued_scenario(4, 'CRISIS', 2)
+            repo.ai_responses(5)
+            scenario = repo.latest_scenario(game_id)
+            repo.find_near_duplicate(game_id, scenario.title, scenario.description)
+            repo.mark_game_over(game_id, 'BUDGET')
+            repo.close()
+            replay._list_games(cls.db_path, 1)
+        return {s for s in statements if CHECKED.match(s) and "sqlite_master" not in s}
+
+    def test_workload_covers_hot_statements(self):
+        joined = "\n".join(self.statements)
+        for fragment in ("FROM users WHERE username", "FROM scenarios", "FROM choices",
+                         "FROM logs", "FROM ai_replay_log", "FROM scenario_queue", "FROM scenario_lsh", "rng_seed IS NOT NULL",
+                         "created_at, finished_at"):
+            self.assertIn(fragment, joined)
+
+    def test_no_full_scan_or_temp_sort(self):
+        conn = sqlite3.connect(self.db_path)
+        try:
+            failures = {sql: p for sql in sorted(self.statements) if (p := _plan_problems(conn, sql))}
+        finally:
+            conn.close()
+        self.assertEqual(failures, {}, "کوئری بدون ایندکس مناسب؛ ایندکسش را به db_indexes.py اضافه کنید")
+
+    def test_misplaced_legacy_index_is_moved(self):
+        path = os.path.join(self.tmpdir.name, 'legacy.db')
+        conn = sqlite3.connect(path)
+        conn.execute("CREATE TABLE game_logs (id INTEGER PRIMARY KEY, game_id INTEGER)")
+        conn.execute("CREATE INDEX idx_logs_game_id ON game_logs(game_id)")
+        conn.commit()
+        conn.close()
+        with contextlib.redirect_stdout(io.StringIO()):
+            migrate_database(path)
+        conn = sqlite3.connect(path)
+        indexes = dict(conn.execute("SELECT name, tbl_name FROM sqlite_master WHERE type = 'index'").fetchall())
+        conn.close()
+        for name, table, _ in INDEXES:
+            self.assertEqual(indexes.get(name), table)
+
+
+if __name__ == '__main__':
+    unittest.main()
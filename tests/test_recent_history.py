@@ -0,0 +1,81 @@
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import app as app_module
+
+
+class RecentHistoryTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.env = mock.patch.dict(os.environ, {'GEMINI_API_KEY': 'test-key'})
+        self.env.start()
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.app = app_module.create_app({
+                'DB_PATH': os.path.join(self.tmpdir.name, 'startup.db'),
+                'TESTING': True,
+                'SPECULATION_ENABLED': False,
+            })
+            self.repo = self.app.extensions['repository']
+            user_id = self.repo.get_or_create_user('ali')
+            self.game_id = self.repo.create_game(user_id, 'TestCo', 1000, 50, 80, rng_seed=3)
+
+    def tearDown(self):
+        self.repo.close()
+        self.env.stop()
+        self.tmpdir.cleanup()
+
+    def _play(self, turn, title, scenario_type):
+        scenario_id = self.repo.add_scenario(self.game_id, scenario_type, title, "توضیح", 2, turn, [
+            {"text": "گزینه", "cost": 0, "reputation": 0, "morale": 0, "risk": 2},
+        ])
+        self.repo.record_turn(self.game_id, 1000, 50, 80, turn + 1, {
+            "turn": turn, "scenario_id": scenario_id, "scenario_title": title, "scenario_type": scenario_type,
+        })
+
+    def test_history_is_newest_first_with_types(self):
+        for turn in range(1, 8):
+            self._play(turn, f"سناریو {turn}", "CRISIS" if turn % 2 else "DILEMMA")
+        history = self.repo.recent_history(self.game_id, 5)
+        self.assertEqual(history[0], ("سناریو 7", "CRISIS"))
+        self.assertEqual([t for t, _ in history], [f"سناریو {t}" for t in range(7, 2, -1)])
+
+        # از دیتابیس خوانده شود (بدون cache) و همان نتیجه بدهد
+        self.repo.recent.discard(self.game_id)
+        self.assertEqual(self.repo.recent_history(self.game_id, 5), history)
+
+    def test_cache_serves_turns_without_queries(self):
+        self._play(1, "اول", "CRISIS")
+        self.repo.recent_history(self.game_id)
+        self._play(2, "دوم", "OPPORTUNITY")
+        with mock.patch.object(self.repo.backend, 'shard_pool', side_effect=AssertionError("کوئری نباید اجرا شود")):
+            self.assertEqual(self.repo.recent_history(self.game_id), [("دوم", "OPPORTUNITY"), ("اول", "CRISIS")])
+
+    def test_query_uses_game_turn_index(self):
+        with self.repo.backend.shard_pool(self.game_id).connection() as conn:
+            plan = " ".join(row[3] for row in conn.execute('''
+                EXPLAIN QUERY PLAN
+                SELECT l.scenario_title, s.scenario_type FROM logs l
+                LEFT JOIN scenarios s ON s.id = l.scenario_id
+                WHERE l.game_id = ? ORDER BY l.turn DESC LIMIT 5
+            ''', (self.game_id,)))
+        self.assertIn("COVERING INDEX idx_logs_game_turn", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_prompt_lists_previous_scenarios(self):
+        self._play(1, "نشت اطلاعات", "EXTREME_CRISIS")
+        with self.app.app_context():
+            _, _, prompt = app_module.plan_scenario(self.game_id, 'TestCo', 2, 1000, 50, 80, rng_seed=3)
+        self.assertIn("نشت اطلاعات (EXTREME_CRISIS)", prompt)
+
+
+if __name__ == '__main__':
+    unittest.main()
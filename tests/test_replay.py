@@ -0,0 +1,78 @@
+import contextlib
+import io
+import itertools
+import json
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import app as app_module
+from replay import replay_game
+
+
+def _fake_generate(counter):
+    """پاسخ‌های متفاوت در هر فراخوانی؛ replay باید دقیقاً همان‌ها را پخش کند."""
+    def generate(contents, temperature):
+        n = next(counter)
+        if 'JSON' in contents and '"options"' in contents:
+            return json.dumps({
+                "title": f"سناریو {n}",
+                "description": "توضیح " * 20,
+                "options": [
+                    {"text": f"گزینه {i}", "cost": -50 * (i + 1) + n, "reputation": i - 2, "morale": 3 - i, "risk_level": 2}
+                    for i in range(3)
+                ],
+            }, ensure_ascii=False)
+        return f"داستان {n}"
+    return generate
+
+
+class ReplayTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, 'startup.db')
+        self.env = mock.patch.dict(os.environ, {'GEMINI_API_KEY': 'test-key'})
+        self.env.start()
+
+    def tearDown(self):
+        self.env.stop()
+        self.tmpdir.cleanup()
+
+    def test_recorded_game_replays_identically_without_network(self):
+        flask_app = app_module.create_app({'DB_PATH': self.db_path, 'TESTING': True, 'SPECULATION_ENABLED': False})
+        client = flask_app.test_client()
+        repo = flask_app.extensions['repository']
+
+        with mock.patch.object(app_module, '_stream_text', _fake_generate(itertools.count())), \
+                contextlib.redirect_stdout(io.StringIO()):
+            client.post('/new_game', data={'username': 'ali', 'startup_name': 'TestCo'})
+            client.post('/mode', data={'mode': 'crisis'})
+            with client.session_transaction() as sess:
+                game_id = sess['game_id']
+            for position in (0, 2, 1):
+                scenario = repo.latest_scenario(game_id)
+                choices = repo.list_choices(game_id, scenario['id'])
+                client.post('/action', data={'choice_id': str(choices[position]['id'])})
+                client.get('/next_turn')
+        repo.close()
+
+        def no_network(*args, **kwargs):
+            raise AssertionError('replay نباید به AI واقعی درخواست بزند')
+
+        with mock.patch.object(app_module, '_stream_text', no_network):
+            result = replay_game(self.db_path, game_id)
+
+        self.assertEqual(result['turns'], 3)
+        self.assertEqual(result['divergences'], [])
+        self.assertEqual(result['ai_misses'], 0)
+        self.assertEqual(result['ai_hits'], 7)
+
+
+if __name__ == '__main__':
+    unittest.main()
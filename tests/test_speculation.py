@@ -0,0 +1,181 @@
+import contextlib
+import io
+import itertools
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import app as app_module
+from speculation import SpeculationManager
+
+WORDS = ["بازار", "سرمایه", "رقیب", "مشتری", "تیم", "محصول", "قرارداد", "سرور", "رسانه", "بودجه",
+         "استخدام", "شریک", "قیمت", "کیفیت", "نسخه", "کاربر", "حقوق", "وام", "تبلیغ", "بحران"]
+_calls = itertools.count()
+
+
+def _fake_generate(contents, temperature):
+    if '"options"' in contents:
+        # هر فراخوانی سناریوی متفاوت (سناریوی تقریباً تکراری رد می‌شود)
+        rng = random.Random(next(_calls))
+        return json.dumps({
+            "title": f"سناریو آزمایشی {rng.randrange(10 ** 6)}",
+            "description": " ".join(rng.choice(WORDS) for _ in range(30)),
+            "options": [{"text": f"گزینه {i}", "cost": -10, "reputation": 1, "morale": 1, "risk_level": 2}
+                        for i in range(3)],
+        }, ensure_ascii=False)
+    return "داستان"
+
+
+class SpeculationManagerTest(unittest.TestCase):
+    def test_budget_caps_submissions_and_losers_are_recycled(self):
+        manager = SpeculationManager(max_workers=1, budget_per_turn=2)
+        release = threading.Event()
+
+        def job(name):
+            def run():
+                release.wait(5)
+                return {"name": name}
+            return run
+
+        submitted = manager.speculate(1, 2, [(10, job("a")), (11, job("b")), (12, job("c"))])
+        self.assertEqual(submitted, 2)
+        self.assertEqual(manager.stats["over_budget"], 1)
+        # refresh صفحه کار تکراری ثبت نمی‌کند
+        self.assertEqual(manager.speculate(1, 2, [(10, job("a"))]), 0)
+
+        recycled = []
+        self.assertTrue(manager.commit(1, 2, 11, recycle=recycled.append))
+        release.set()
+        self.assertEqual(manager.take(1, 2, timeout=5), {"name": "b"})
+        manager.shutdown(wait=True)
+        # شاخه بازنده یا قبل از شروع لغو شده یا بعد از اتمام بازیافت شده است
+        self.assertEqual(manager.stats["cancelled"] + manager.stats["recycled"], 1)
+        self.assertIn(recycled, ([], [{"name": "a"}]))
+        self.assertEqual(manager.stats["used"], 1)
+
+    def test_budget_refills_every_turn(self):
+        manager = SpeculationManager(max_workers=1, budget_per_turn=3)
+        self.addCleanup(manager.shutdown, True)
+        for turn in range(2, 8):
+            branches = [(turn * 10 + i, lambda: None) for i in range(4)]
+            self.assertEqual(manager.speculate(1, turn, branches), 3)
+            self.assertEqual(manager.remaining_budget(1, turn), 0)
+            manager.commit(1, turn, turn * 10)
+        self.assertEqual(manager.stats["submitted"], 18)
+        self.assertEqual(manager.stats["over_budget"], 6)
+
+    def test_abandoned_games_and_turns_are_released(self):
+        manager = SpeculationManager(max_workers=1, budget_per_turn=2, max_games=3)
+        self.addCleanup(manager.shutdown, True)
+        release = threading.Event()
+        self.addCleanup(release.set)
+        manager.speculate(0, 1, [(0, release.wait)])  # worker را مشغول نگه می‌دارد
+        for game_id in range(1, 6):
+            manager.speculate(game_id, 2, [(1, lambda: None), (2, lambda: None)])
+        # فقط max_games بازی آخر نگه داشته می‌شوند
+        self.assertEqual(manager.tracked(), 3)
+        manager.commit(5, 2, 1)  # بازیکن انتخاب کرد ولی /next_turn را باز نکرد
+        manager.speculate(5, 3, [(3, lambda: None)])
+        self.assertNotIn((5, 2), manager._chosen)
+        manager.forget(5)
+        self.assertEqual(manager.tracked(), 2)
+        self.assertGreaterEqual(manager.stats["cancelled"], 6)
+
+
+class SpeculativeTurnTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, 'startup.db')
+        patches = [
+            mock.patch.dict(os.environ, {'GEMINI_API_KEY': 'test-key'}),
+            mock.patch.object(app_module, '_stream_text', _fake_generate),
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+        # یک worker برای هر شاخه؛ با این حال شاخه بازنده‌ای که worker هنوز برنداشته
+        # ممکن است با commit لغو شود (در stats['cancelled'] شمرده می‌شود).
+        # سهمیه governor باز است: اینجا فقط بودجه خود speculation آزموده می‌شود
+        self.app = app_module.create_app({
+            'DB_PATH': self.db_path, 'TESTING': True, 'SPECULATION_WAIT': 5, 'SPECULATION_WORKERS': 3,
+            'AI_BUDGET_USER': (100, 60),
+        })
+        self.addCleanup(self.tmpdir.cleanup)
+        # threadها باید قبل از برداشتن mock تمام شوند
+        self.addCleanup(lambda: self.app.extensions['speculation'].shutdown(wait=True))
+
+    def test_next_turn_uses_speculated_branch(self):
+        client = self.app.test_client()
+        repo = self.app.extensions['repository']
+        with contextlib.redirect_stdout(io.StringIO()):
+            client.post('/new_game', data={'username': 'ali', 'startup_name': 'TestCo'})
+            with client.session_transaction() as sess:
+                game_id = sess['game_id']
+            client.get('/game')
+            choice = repo.list_choices(game_id, repo.latest_scenario(game_id)['id'])[0]
+            client.post('/action', data={'choice_id': str(choice['id'])})
+            client.get('/next_turn')
+            # شاخه‌های بازنده ممکن است هنوز در حال ثبت پاسخ خود باشند
+            self.app.extensions['speculation'].shutdown(wait=True)
+
+        purposes = [r['purpose'] for r in repo.ai_responses(game_id)]
+        # فقط سناریوی نوبت اول مستقیم تولید شده؛ نوبت دوم از شاخه speculative آمده
+        self.assertEqual(purposes.count('scenario'), 1)
+        stats = self.app.extensions['speculation'].stats
+        self.assertEqual(purposes.count('speculative_scenario') + stats['cancelled'], 3)
+        self.assertEqual(stats['used'], 1)
+        self.assertEqual(repo.latest_scenario(game_id)['turn_number'], 2)
+
+    def test_every_turn_is_speculated(self):
+        # بودجه پیش‌فرض (6) با سه شاخه در هر نوبت: قبلاً فقط دو نوبت اول speculate می‌شد
+        client = self.app.test_client()
+        repo = self.app.extensions['repository']
+        with contextlib.redirect_stdout(io.StringIO()):
+            client.post('/new_game', data={'username': 'ali', 'startup_name': 'TestCo'})
+            with client.session_transaction() as sess:
+                game_id = sess['game_id']
+            for _ in range(4):
+                client.get('/game')
+                choice = repo.list_choices(game_id, repo.latest_scenario(game_id)['id'])[0]
+                client.post('/action', data={'choice_id': str(choice['id'])})
+                client.get('/next_turn')
+            self.app.extensions['speculation'].shutdown(wait=True)
+
+        stats = self.app.extensions['speculation'].stats
+        self.assertEqual(stats['over_budget'], 0)
+        self.assertEqual(stats['used'], 4)
+        self.assertEqual(repo.latest_scenario(game_id)['turn_number'], 5)
+
+    def test_finished_and_abandoned_games_release_branches(self):
+        client = self.app.test_client()
+        repo = self.app.extensions['repository']
+        speculation = self.app.extensions['speculation']
+        with contextlib.redirect_stdout(io.StringIO()):
+            client.post('/new_game', data={'username': 'ali', 'startup_name': 'TestCo'})
+            client.get('/game')
+            self.assertEqual(speculation.tracked(), 1)
+            # بازی قبلی رها شد
+            client.post('/new_game', data={'username': 'ali', 'startup_name': 'TestCo2'})
+            self.assertEqual(speculation.tracked(), 0)
+            client.get('/game')
+            self.assertEqual(speculation.tracked(), 1)
+            with client.session_transaction() as sess:
+                game_id = sess['game_id']
+            with repo.backend.shard_pool(game_id).connection() as conn:
+                conn.execute("UPDATE games SET budget = -1000000 WHERE id = ?", (game_id,))
+                conn.commit()
+            client.get('/game')
+        self.assertEqual(speculation.tracked(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import contextlib
+import io
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import app as app_module
+import stat_history
+from stat_history import chart_series, decode, from_logs, pack_point
+from storage import GameRepository, make_backend
+
+RANGES = {"budget": (0, None), "reputation": (0, 100), "morale": (0, 100)}
+
+
+class PackedHistoryTest(unittest.TestCase):
+    def test_roundtrip_and_downsample_keep_endpoints(self):
+        blob = b"".join(pack_point(1000 + 10 * i, i % 101, 80) for i in range(500))
+        history = decode(blob + b"\x01")  # نقطه ناقص انتها نادیده گرفته می‌شود
+        self.assertEqual(list(history["budget"][:3]), [1000, 1010, 1020])
+        self.assertEqual(len(history["morale"]), 500)
+
+        series = chart_series(blob, RANGES)
+        budget = series["budget"]
+        self.assertEqual(len(budget["values"]), stat_history.CHART_POINTS)
+        self.assertEqual((budget["values"][0], budget["last"]), (1000, 5990))
+        self.assertEqual((budget["pct"][0], budget["pct"][-1]), (17, 100))
+        self.assertTrue(budget["polyline"].startswith("0.0,83 ") and budget["polyline"].endswith("100.0,0"))
+        self.assertEqual(chart_series(b"", RANGES), {})
+
+    def test_array_fallback_matches_numpy_path(self):
+        blob = b"".join(pack_point(i * 37 % 3000, i % 100, 100 - i % 100) for i in range(333))
+        with mock.patch.object(stat_history, 'np', None):
+            pure = chart_series(blob, RANGES)
+        self.assertEqual(chart_series(blob, RANGES), pure)
+
+    def test_from_logs_rebuilds_trajectory_backwards(self):
+        blob = from_logs((900, 60, 70), [(-50, 5, 0), (-50, 5, -10)])
+        self.assertEqual(list(decode(blob)["budget"]), [1000, 950, 900])
+        self.assertEqual(list(decode(blob)["morale"]), [80, 80, 70])
+
+
+class RecordedHistoryTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, 'startup.db')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_each_turn_appends_a_point_in_shard(self):
+        repo = GameRepository(make_backend(self.db_path, shards=2))
+        with contextlib.redirect_stdout(io.StringIO()):
+            user_id = repo.get_or_create_user('ali')
+        game_id = repo.create_game(user_id, 'Co', 1000, 50, 80)
+        repo.record_turn(game_id, 800, 55, 70, 2, {"turn": 1, "cost_impact": -200})
+        repo.record_turn(game_id, 1200, 0, 65, 3, {"turn": 2, "cost_impact": 400})
+        history = decode(repo.get_game(game_id).stat_history)
+        repo.close()
+        self.assertEqual(list(history["budget"]), [1000, 800, 1200])
+        self.assertEqual(list(history["reputation"]), [50, 55, 0])
+
+    def test_report_charts_full_game_and_legacy_games(self):
+        with mock.patch.dict(os.environ, {'GEMINI_API_KEY': '', 'OPENROUTER_API_KEY': ''}):
+            flask_app = app_module.create_app({'DB_PATH': self.db_path, 'TESTING': True, 'SPECULATION_ENABLED': False})
+        repo = flask_app.extensions['repository']
+        client = flask_app.test_client()
+        user_id = repo.get_or_create_user('ali')
+        game_id = repo.create_game(user_id, 'Co', 1000, 50, 80)
+        for turn in range(1, 60):
+            repo.record_turn(game_id, 1000 + turn, 50, 80 - turn % 3, turn + 1, {"turn": turn, "cost_impact": 1})
+        page = client.get(f'/report/{game_id}').get_data(as_text=True)
+        self.assertIn('<polyline points="0.0,', page)
+        self.assertIn('>1059</span>', page)
+        self.assertEqual(page.count('class="titem"'), app_module.REPORT_TIMELINE)
+
+        # بازی قبل از stat_history: مسیر از impactهای logs ساخته می‌شود
+        legacy = repo.create_game(user_id, 'Old', 1000, 50, 80)
+        repo.record_turn(legacy, 900, 50, 80, 2, {"turn": 1, "cost_impact": -100})
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("UPDATE games SET stat_history = NULL WHERE id = ?", (legacy,))
+        conn.commit()
+        conn.close()
+        page = client.get(f'/report/{legacy}').get_data(as_text=True)
+        self.assertIn('<polyline points="0.0,0 100.0,10" />', page)
+        repo.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from storage import GameRepository, ShardedSQLiteBackend, make_backend
+
+
+class ShardedStorageTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, 'startup.db')
+        self.backend = make_backend(self.db_path, shards=3, pool_size=2)
+        self.repo = GameRepository(self.backend)
+
+    def tearDown(self):
+        self.repo.close()
+        self.tmpdir.cleanup()
+
+    def test_games_are_spread_across_shards(self):
+        self.assertIsInstance(self.backend, ShardedSQLiteBackend)
+        user_id = self.repo.get_or_create_user('ali')
+        self.assertEqual(self.repo.get_or_create_user('ali'), user_id)
+
+        game_ids = [self.repo.create_game(user_id, f'Co{i}', 1000, 50, 80) for i in range(12)]
+        self.assertEqual(len(set(game_ids)), 12)
+        used = {self.backend.shard_index(g) for g in game_ids}
+        self.assertGreater(len(used), 1)
+
+        for game_id in game_ids:
+            scenario_id = self.repo.add_scenario(game_id, 'CRISIS', 't', 'd', 1, 1, [
+                {"text": f"o{i}", "cost": -10, "reputation": 1, "morale": 2, "risk": 3} for i in range(3)
+            ])
+            choices = self.repo.list_choices(game_id, scenario_id)
+            self.assertEqual(len(choices), 3)
+            self.repo.record_turn(game_id, 990, 51, 82, 2, {
+                "turn": 1, "scenario_id": scenario_id, "choice_id": choices[0]['id'], "cost_impact": -10,
+            })
+            game = self.repo.get_game(game_id)
+            self.assertEqual((game['budget'], game['turn']), (990, 2))
+            self.assertEqual(len(self.repo.list_logs(game_id)), 1)
+
+        # داده هر بازی فقط در shard خودش است
+        for i, path in enumerate(self.backend.shard_paths):
+            conn = sqlite3.connect(path)
+            ids = {r[0] for r in conn.execute('SELECT id FROM games')}
+            conn.close()
+            self.assertEqual(ids, {g for g in game_ids if self.backend.shard_index(g) == i})
+
+        # پایان بازی در رجیستری global هم دیده می‌شود
+        self.repo.mark_game_over(game_ids[0], 'BUDGET')
+        conn = sqlite3.connect(self.db_path)
+        row = conn.execute('SELECT is_game_over, budget FROM games WHERE id = ?', (game_ids[0],)).fetchone()
+        conn.close()
+        self.assertEqual(tuple(row), (1, 990))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,173 @@
+import contextlib
+import io
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import app as app_module
+import telemetry
+from storage import GameRepository, make_backend
+from telemetry import TelemetryLog, load_segments, read_events, sealed_segments
+
+
+class TelemetryLogTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.dir = os.path.join(self.tmpdir.name, 'telemetry')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_batches_are_fsynced_and_segments_rotate(self):
+        log = TelemetryLog(self.dir, segment_bytes=200, batch_size=3, flush_interval=60)
+        log._writer._ensure_thread = lambda: None  # flush دستی
+        for i in range(7):
+            self.assertTrue(log.emit("turn", game_id=1, turn=i, ai_response="داستان " * 5))
+        self.assertEqual(log.flush(), 7)
+        self.assertEqual(log.stats["fsyncs"], 3)
+        # segment پر شده مهر شده؛ آخری تا close باز می‌ماند
+        self.assertTrue(all(p.endswith(".ndjson") for p in sealed_segments(self.dir)))
+        log.close()
+        paths = sealed_segments(self.dir)
+        self.assertEqual(len(paths), log.stats["segments"])
+        self.assertFalse([name for name in os.listdir(self.dir) if name.endswith(telemetry.OPEN_SUFFIX)])
+        events = [e for p in paths for e in read_events(p)[0]]
+        self.assertEqual([e["turn"] for e in events], list(range(7)))
+        self.assertEqual(events[0]["ai_response"], "داستان " * 5)
+
+    def test_full_queue_rejects_event(self):
+        log = TelemetryLog(self.dir, flush_interval=60, max_pending=1)
+        log._writer._ensure_thread = lambda: None
+        self.assertTrue(log.emit("turn", game_id=1, turn=1))
+        self.assertFalse(log.emit("turn", game_id=1, turn=2))
+        self.assertEqual(log.stats["dropped"], 1)
+        log.close()
+
+    def test_writer_recovers_when_segment_is_taken_away(self):
+        log = TelemetryLog(self.dir, segment_bytes=10, batch_size=10, flush_interval=60)
+        log._writer._ensure_thread = lambda: None
+        log.emit("turn", game_id=1, turn=1)
+        log._open_segment()
+        os.replace(log._path, log._path + '.moved')  # مثل loader قدیمی که segment زنده را مهر می‌کرد
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            self.assertEqual(log.flush(), 1)  # fsync شده؛ فقط rename شکست خورد
+        self.assertNotIn("از دست رفت", out.getvalue())
+        self.assertIsNone(log._file)
+        self.assertEqual((log.stats["written"], log.stats["errors"]), (1, 1))
+
+        log.emit("turn", game_id=1, turn=2)
+        log._open_segment()
+        log._file.close()
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(log.flush(), 0)  # ValueError روی فایل بسته، نه مرگ thread
+        log.emit("turn", game_id=1, turn=3)
+        self.assertEqual(log.flush(), 1)
+        log.close()
+        turns = [e["turn"] for p in sealed_segments(self.dir) for e in read_events(p)[0]]
+        self.assertEqual(turns, [3])
+
+    def test_loader_seals_only_segments_of_dead_processes(self):
+        log = TelemetryLog(self.dir, flush_interval=60)
+        log._writer._ensure_thread = lambda: None
+        log.emit("turn", game_id=1, turn=1)
+        log.flush()
+        dead = os.path.join(self.dir, f'turns-1-99999999{telemetry.OPEN_SUFFIX}')
+        with open(dead, 'w') as fh:
+            fh.write(json.dumps({"event": "turn", "game_id": 2, "turn": 1}) + '\n')
+        for path in (log._path, dead):
+            os.utime(path, (0, 0))
+        self.assertEqual(telemetry.seal_stale_segments(self.dir, 3600), [dead[:-len('.open')]])
+        self.assertTrue(os.path.exists(log._path))
+        log.close()
+
+    def test_truncated_line_is_skipped(self):
+        os.makedirs(self.dir)
+        path = os.path.join(self.dir, 'turns-1-1.ndjson')
+        with open(path, 'w') as fh:
+            fh.write(json.dumps({"event": "turn", "game_id": 1, "turn": 1}) + '\n{"event": "tu')
+        events, bad = read_events(path)
+        self.assertEqual((len(events), bad), (1, 1))
+
+
+class TurnTelemetryTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, 'startup.db')
+        self.dir = os.path.join(self.tmpdir.name, 'telemetry')
+        self.env = mock.patch.dict(os.environ, {'GEMINI_API_KEY': '', 'OPENROUTER_API_KEY': ''})
+        self.env.start()
+        self.app = app_module.create_app({
+            'DB_PATH': self.db_path, 'TESTING': True, 'SPECULATION_ENABLED': False,
+            'TELEMETRY_DIR': self.dir, 'TELEMETRY_FLUSH_INTERVAL': 60, 'STORAGE_SHARDS': 2,
+        })
+        self.repo = self.app.extensions['repository']
+
+    def tearDown(self):
+        self.repo.close()
+        self.env.stop()
+        self.tmpdir.cleanup()
+
+    def _logs(self, game_id):
+        conn = sqlite3.connect(self.repo.backend.shard_pool(game_id).db_path)
+        rows = conn.execute("SELECT choice_text, ai_response FROM logs WHERE game_id = ?", (game_id,)).fetchall()
+        conn.close()
+        return rows
+
+    def test_verbose_fields_leave_hot_transaction_and_loader_backfills(self):
+        client = self.app.test_client()
+        with contextlib.redirect_stdout(io.StringIO()):
+            client.post('/new_game', data={'username': 'ali', 'startup_name': 'TelemetryCo'})
+            with client.session_transaction() as sess:
+                game_id = sess['game_id']
+            client.get('/game')
+            choice = self.repo.list_choices(game_id, self.repo.latest_scenario(game_id).id)[0]
+            client.post('/action', data={'choice_id': str(choice.id)})
+
+        self.assertEqual(self._logs(game_id), [(None, None)])
+        # گزارش منتظر loader نمی‌ماند: متن گزینه از choices
+        self.assertEqual(self.repo.list_logs(game_id)[0].choice_text, choice.text)
+        self.assertIn(choice.text, client.get(f'/report/{game_id}').get_data(as_text=True))
+
+        self.repo.telemetry.close()
+        with contextlib.redirect_stdout(io.StringIO()):
+            stats = load_segments(self.dir, self.repo)
+        self.assertEqual((stats["segments"], stats["turns"]), (1, 1))
+        [(choice_text, story)] = self._logs(game_id)
+        self.assertEqual(choice_text, choice.text)
+        self.assertIn("تصمیم شما اعمال شد", story)
+        self.assertEqual(sealed_segments(self.dir), [])
+        self.assertEqual(len(os.listdir(os.path.join(self.dir, telemetry.LOADED_DIR))), 1)
+
+    def test_cli_loads_segments(self):
+        user_id = self.repo.get_or_create_user('sara')
+        game_id = self.repo.create_game(user_id, 'CliCo', 1000, 50, 80)
+        self.repo.record_turn(game_id, 900, 50, 80, 2, {"turn": 1, "choice_text": "گزینه", "ai_response": "داستان"})
+        self.repo.telemetry.close()
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(telemetry.main(['--dir', self.dir, '--db', self.db_path, '--shards', '2']), 0)
+        self.assertEqual(self._logs(game_id), [("گزینه", "داستان")])
+
+
+class WithoutTelemetryTest(unittest.TestCase):
+    def test_full_row_in_transaction(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            repo = GameRepository(make_backend(os.path.join(tmp, 'startup.db')))
+            with contextlib.redirect_stdout(io.StringIO()):
+                game_id = repo.create_game(repo.get_or_create_user('ali'), 'Co', 1000, 50, 80)
+            repo.record_turn(game_id, 900, 50, 80, 2, {"turn": 1, "choice_text": "گزینه", "ai_response": "داستان"})
+            [log] = repo.list_logs(game_id)
+            repo.close()
+        self.assertEqual((log.choice_text, log.ai_response), ("گزینه", "داستان"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,149 @@
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import app as app_module
+import tracing
+from ai_providers import CallableProvider
+from tracing import JSONLExporter, Tracer, read_spans, render_trace
+
+SCENARIO_TEXT = json.dumps({
+    "title": "سناریوی AI",
+    "description": "توضیح " * 20,
+    "options": [{"text": f"گزینه {i}", "cost": -10, "reputation": 1, "morale": 1, "risk_level": 2} for i in range(3)],
+}, ensure_ascii=False)
+
+
+class SpanTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.exporter = JSONLExporter(self.tmpdir.name)
+
+    def tearDown(self):
+        self.exporter.close()
+        self.tmpdir.cleanup()
+
+    def test_nested_spans_are_exported_as_otlp(self):
+        self.assertIsNone(tracing.current())
+        with tracing.span("outside") as none:
+            self.assertIsNone(none)
+
+        root = Tracer(self.exporter).begin("GET /x", **{"http.method": "GET"})
+        with tracing.span("db", rows=3) as db:
+            self.assertIs(tracing.current(), db)
+            with self.assertRaises(KeyError), tracing.span("json.parse"):
+                raise KeyError("x")
+        root.end()
+        self.assertIsNone(tracing.current())
+        self.exporter.flush()
+
+        with open(self.exporter.path, encoding="utf-8") as fh:
+            [line] = fh.read().splitlines()
+        request = json.loads(line)
+        spans = {s["name"]: s for s in request["resourceSpans"][0]["scopeSpans"][0]["spans"]}
+        self.assertEqual(set(spans), {"GET /x", "db", "json.parse"})
+        self.assertEqual(spans["db"]["parentSpanId"], root.span_id)
+        self.assertEqual(spans["json.parse"]["parentSpanId"], spans["db"]["spanId"])
+        self.assertEqual(spans["json.parse"]["status"]["code"], tracing.STATUS_ERROR)
+        self.assertIn({"key": "rows", "value": {"intValue": "3"}}, spans["db"]["attributes"])
+        self.assertEqual(spans["GET /x"]["kind"], tracing.SERVER)
+        self.assertLessEqual(int(spans["GET /x"]["startTimeUnixNano"]), int(spans["db"]["startTimeUnixNano"]))
+
+    def test_unsampled_trace_keeps_ids_but_records_nothing(self):
+        tracer = Tracer(self.exporter, sample_rate=0.0)
+        root = tracer.begin("GET /x")
+        self.assertEqual(len(root.trace_id), 32)
+        with tracing.span("db") as db:
+            self.assertIsNone(db)
+        root.end()
+        self.assertEqual(self.exporter.flush(), 0)
+        self.assertEqual(tracer.stats, {"requests": 1, "sampled": 0})
+        self.assertTrue(Tracer(self.exporter, 1.0).should_sample("f" * 32))
+
+
+class TurnTraceTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.trace_dir = os.path.join(self.tmpdir.name, 'traces')
+
+        def stream(contents, temperature):
+            yield SCENARIO_TEXT
+
+        self.env = mock.patch.dict(os.environ, {'GEMINI_API_KEY': '', 'OPENROUTER_API_KEY': ''})
+        self.env.start()
+        self.app = app_module.create_app({
+            'DB_PATH': os.path.join(self.tmpdir.name, 'startup.db'), 'TESTING': True, 'SPECULATION_ENABLED': False,
+            'AI_HEDGE_ENABLED': False, 'AI_PROVIDERS': [CallableProvider("stub", stream)],
+            'DEDUP_ENABLED': False, 'TRACING_DIR': self.trace_dir,
+        })
+        self.repo = self.app.extensions['repository']
+        self.quiet = contextlib.redirect_stdout(io.StringIO())
+        self.quiet.__enter__()
+
+    def tearDown(self):
+        self.quiet.__exit__(None, None, None)
+        self.app.extensions['ai_router'].shutdown(wait=True)
+        self.repo.close()
+        self.env.stop()
+        self.tmpdir.cleanup()
+
+    def _play_turn(self):
+        client = self.app.test_client()
+        client.post('/new_game', data={'username': 'ali', 'startup_name': 'TraceCo'}, follow_redirects=True)
+        with client.session_transaction() as sess:
+            game_id = sess['game_id']
+        choice = self.repo.list_choices(game_id, self.repo.latest_scenario(game_id).id)[0]
+        client.post('/action', data={'choice_id': str(choice.id)})
+        client.get('/next_turn', follow_redirects=True)
+        with client.session_transaction() as sess:
+            self.assertNotIn('trace', sess)
+        self.app.extensions['tracer'].exporter.flush()
+
+    def test_turn_is_one_trace_across_redirects(self):
+        self._play_turn()
+        spans = read_spans(self.trace_dir)
+        trace_id = tracing.pick_trace(spans)
+        trace = [s for s in spans if s["traceId"] == trace_id]
+        by_name = {}
+        for s in trace:
+            by_name.setdefault(s["name"], []).append(s)
+
+        action, = by_name["POST /action"]
+        next_turn, = by_name["GET /next_turn"]
+        game, = by_name["GET /game"]
+        self.assertEqual((next_turn["parentSpanId"], game["parentSpanId"]), (action["spanId"], next_turn["spanId"]))
+        self.assertEqual(action["attrs"]["http.status_code"], "200")
+        self.assertEqual({s["attrs"]["ai.purpose"] for s in by_name["ai.request"]}, {"story", "scenario"})
+        self.assertEqual(by_name["ai.attempt"][0]["attrs"]["ai.provider"], "stub")
+        self.assertIn("json.validate", by_name)
+        self.assertEqual(by_name["scenario.generate"][0]["attrs"]["scenario.source"], "ai")
+        self.assertEqual({s["attrs"]["template"] for s in by_name["template.render"]}, {"result.html", "game.html"})
+        self.assertTrue(any("UPDATE games" in s["attrs"]["db.statement"] for s in by_name["db.statement"]))
+
+        lines = render_trace(spans, trace_id)
+        self.assertTrue(lines[1].startswith("*") and "POST /action" in lines[1])
+        self.assertIn("critical path", lines[-1])
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            self.assertEqual(tracing.main(['--dir', self.trace_dir, '--trace', trace_id]), 0)
+        self.assertIn("GET /game", out.getvalue())
+        self.assertEqual(self.app.test_client().get('/metrics').get_json()["tracing"]["sampled"],
+                         self.app.extensions['tracer'].stats["sampled"])
+
+    def test_sample_rate_zero_writes_no_spans(self):
+        self.app.extensions['tracer'].sample_rate = 0.0
+        self._play_turn()
+        self.assertFalse(os.path.exists(self.trace_dir))
+
+
+if __name__ == '__main__':
+    unittest.main()
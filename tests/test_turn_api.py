@@ -0,0 +1,165 @@
+import contextlib
+import io
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import app as app_module
+
+
+class TurnApiTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, 'startup.db')
+        # بدون کلید AI: سناریو و داستان از fallback می‌آیند
+        self.env = mock.patch.dict(os.environ, {'GEMINI_API_KEY': '', 'OPENROUTER_API_KEY': ''})
+        self.env.start()
+        self.app = app_module.create_app({'DB_PATH': self.db_path, 'TESTING': True, 'SPECULATION_ENABLED': False})
+        self.repo = self.app.extensions['repository']
+        self.client = self.app.test_client()
+        self.quiet = contextlib.redirect_stdout(io.StringIO())
+        self.quiet.__enter__()
+
+    def tearDown(self):
+        self.quiet.__exit__(None, None, None)
+        self.repo.close()
+        self.env.stop()
+        self.tmpdir.cleanup()
+
+    def _start(self):
+        self.client.post('/new_game', data={'username': 'ali', 'startup_name': 'TestCo'})
+        with self.client.session_transaction() as sess:
+            game_id = sess['game_id']
+        r = self.client.get('/game')
+        self.assertIn(b'data-turn-api="/api/turn"', r.data)
+        return game_id
+
+    def _first_choice(self, game_id):
+        return self.repo.list_choices(game_id, self.repo.latest_scenario(game_id).id)[0]
+
+    def test_turn_returns_story_stats_and_next_scenario(self):
+        game_id = self._start()
+        first = self.repo.latest_scenario(game_id)
+        choice = self._first_choice(game_id)
+
+        r = self.client.post('/api/turn', json={'choice_id': choice.id})
+        self.assertEqual(r.status_code, 200)
+        data = r.get_json()
+        self.assertFalse(data['game_over'])
+        self.assertTrue(data['story'])
+        game = self.repo.get_game(game_id)
+        self.assertEqual(data['game'], {
+            'turn': 2, 'budget': game.budget, 'reputation': game.reputation,
+            'morale': game.morale, 'score': game.score or 0,
+        })
+        latest = self.repo.latest_scenario(game_id)
+        self.assertNotEqual(latest.id, first.id)
+        self.assertEqual(data['scenario']['id'], latest.id)
+        self.assertEqual([c['id'] for c in data['choices']],
+                         [c.id for c in self.repo.list_choices(game_id, latest.id)])
+        self.assertEqual(len(self.repo.list_logs(game_id)), 1)
+
+    def test_errors_are_json(self):
+        r = self.client.post('/api/turn', json={'choice_id': 1})
+        self.assertEqual(r.status_code, 401)
+        self._start()
+        self.assertEqual(self.client.post('/api/turn', json={}).status_code, 400)
+        r = self.client.post('/api/turn', json={'choice_id': 999999})
+        self.assertEqual(r.status_code, 404)
+        self.assertIn('error', r.get_json())
+
+    def test_rejects_non_object_body_and_non_numeric_choice(self):
+        self._start()
+        for body in ([1], 'x', 7):
+            r = self.client.post('/api/turn', json=body)
+            self.assertEqual(r.status_code, 400, body)
+            self.assertIn('error', r.get_json())
+        self.assertEqual(self.client.post('/api/turn', json={'choice_id': 'abc'}).status_code, 400)
+
+    def test_stale_choice_is_rejected(self):
+        game_id = self._start()
+        old_choice = self._first_choice(game_id)
+        self.assertEqual(self.client.post('/api/turn', json={'choice_id': old_choice.id}).status_code, 200)
+
+        r = self.client.post('/api/turn', json={'choice_id': old_choice.id})
+        self.assertEqual(r.status_code, 409)
+        self.client.post('/action', data={'choice_id': old_choice.id})
+        self.assertEqual(self.repo.get_game(game_id).turn, 2)
+        self.assertEqual(len(self.repo.list_logs(game_id)), 1)
+
+    def test_resubmitted_choice_is_applied_once(self):
+        # double-click / resubmit مرورگر: قبل از /next_turn سناریوی آخر هنوز همان است
+        game_id = self._start()
+        choice = self._first_choice(game_id)
+        self.assertEqual(self.client.post('/action', data={'choice_id': choice.id}).status_code, 200)
+        after_first = self.repo.get_game(game_id)
+
+        r = self.client.post('/action', data={'choice_id': choice.id})
+        self.assertEqual(r.status_code, 302)
+        self.assertEqual(self.client.post('/api/turn', json={'choice_id': choice.id}).status_code, 409)
+        game = self.repo.get_game(game_id)
+        self.assertEqual((game.turn, game.budget), (2, after_first.budget))
+        self.assertEqual(len(self.repo.list_logs(game_id)), 1)
+
+    def test_record_turn_is_conditional_on_current_turn(self):
+        # دو درخواست همزمان که هر دو از چک play_turn رد شده‌اند: فقط اولی ثبت می‌شود
+        game_id = self._start()
+        log = {"turn": 1, "choice_text": "c", "ai_response": "s", "cost_impact": -10}
+        self.assertTrue(self.repo.record_turn(game_id, 990, 50, 80, 2, log))
+        self.assertFalse(self.repo.record_turn(game_id, 980, 50, 80, 2, log))
+        self.assertEqual(self.repo.get_game(game_id).budget, 990)
+        self.assertEqual(len(self.repo.list_logs(game_id)), 1)
+
+    def test_foreign_choice_is_rejected(self):
+        other_game = self._start()
+        foreign = self._first_choice(other_game)
+        game_id = self._start()
+        self.assertNotEqual(game_id, other_game)
+
+        r = self.client.post('/api/turn', json={'choice_id': foreign.id})
+        self.assertEqual(r.status_code, 404)
+        self.client.post('/action', data={'choice_id': foreign.id})
+        self.assertEqual(self.repo.get_game(game_id).turn, 1)
+        self.assertEqual(self.repo.list_logs(game_id), [])
+
+    def test_finished_or_missing_game_is_rejected(self):
+        game_id = self._start()
+        choice = self._first_choice(game_id)
+        self.repo.mark_game_over(game_id, 'BUDGET')
+
+        r = self.client.post('/api/turn', json={'choice_id': choice.id})
+        self.assertEqual(r.status_code, 409)
+        self.client.post('/action', data={'choice_id': choice.id})
+        self.assertEqual(self.repo.list_logs(game_id), [])
+
+        with self.client.session_transaction() as sess:
+            sess['game_id'] = 999999
+        self.assertEqual(self.client.post('/api/turn', json={'choice_id': choice.id}).status_code, 404)
+        r = self.client.post('/action', data={'choice_id': choice.id})
+        self.assertEqual(r.status_code, 302)
+        self.assertTrue(r.headers['Location'].endswith('/'))
+
+    def test_game_over_points_back_to_game_page(self):
+        game_id = self._start()
+        choice = self._first_choice(game_id)
+        conn = sqlite3.connect(self.db_path)
+        conn.execute('UPDATE games SET budget = ? WHERE id = ?', (app_module.MIN_BUDGET - 5000, game_id))
+        conn.commit()
+        conn.close()
+
+        data = self.client.post('/api/turn', json={'choice_id': choice.id}).get_json()
+        self.assertTrue(data['game_over'])
+        self.assertIn('BUDGET', data['reasons'])
+        self.assertEqual(data['redirect'], '/game')
+        self.assertEqual(self.repo.get_game(game_id).is_game_over, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,402 @@
+"""Startup Sandbox - Request Tracing
+
+spanهای سبک برای دیدن زمان‌بندی علّی یک نوبت در چند درخواست:
+
+    POST /action -> call_ai_api -> logs -> redirect -> GET /next_turn
+                 -> generate_dynamic_scenario -> redirect -> GET /game
+
+- trace id (و span id درخواست قبلی به عنوان parent) در session می‌ماند، پس
+  درخواست‌های بعد از redirect در همان trace و زیر درخواست قبلی قرار می‌گیرند.
+- span جاری در یک ContextVar است؛ span() و traced() بدون span جاری هیچ کاری
+  نمی‌کنند (درخواست sample‌نشده یا کد خارج از درخواست تقریباً هزینه‌ای ندارد).
+- sampling: تصمیم فقط از روی trace id (مثل TraceIdRatioBased در OpenTelemetry)؛
+  همه درخواست‌های یک نوبت با هم sample می‌شوند یا نمی‌شوند.
+- JSONLExporter: صف محدود + thread نویسنده (BatchWriter)؛ هر خط یک ExportTraceServiceRequest
+  به فرمت OTLP/JSON (همان خروجی file exporter در OpenTelemetry Collector) در
+  فایل spans-<pid>.jsonl همین process.
+
+این ماژول به Flask وابسته نیست؛ hookهای درخواست در app.py هستند.
+
+نمایش مسیر بحرانی یک نوبت (آخرین trace شامل POST /action، یا --trace):
+    python tracing.py --dir traces [--trace <trace id>] [--statements]
+"""
+
+import argparse
+import contextvars
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from batch_writer import BatchWriter
+
+# SpanKind در OTLP
+INTERNAL, SERVER, CLIENT = 1, 2, 3
+STATUS_ERROR = 2
+SERVICE_NAME = "startup-sandbox"
+FILE_PREFIX, FILE_SUFFIX = "spans-", ".jsonl"
+MAX_STATEMENT_CHARS = 200
+
+_current = contextvars.ContextVar("trace_span", default=None)
+
+
+def new_trace_id() -> str:
+    return os.urandom(16).hex()
+
+
+def new_span_id() -> str:
+    return os.urandom(8).hex()
+
+
+# ========== Spans ==========
+
+class Span:
+    """یک بازه زمانی؛ span غیرضبطی (recording=False) فقط شناسه‌ها را برای session دارد."""
+
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "kind", "start_ns", "end_ns",
+                 "attributes", "error", "recording", "_exporter", "_token")
+
+    def __init__(self, name: str, trace_id: str, parent_id: str | None, kind: int = INTERNAL,
+                 attributes: dict | None = None, exporter=None, recording: bool = True):
+        self.trace_id = trace_id
+        self.span_id = new_span_id()
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = attributes or {}
+        self.error = None
+        self.recording = recording
+        self._exporter = exporter
+        self._token = None
+
+    def child(self, name: str, kind: int = INTERNAL, **attributes) -> "Span":
+        return Span(name, self.trace_id, self.span_id, kind, attributes, self._exporter)
+
+    def set(self, **attributes) -> None:
+        self.attributes.update(attributes)
+
+    def end(self, error: BaseException | str | None = None) -> None:
+        """پایان span (یک بار)؛ اگر current بوده، span قبلی دوباره current می‌شود."""
+        if self.end_ns is not None:
+            return
+        self.end_ns = time.time_ns()
+        if error is not None:
+            self.error = error if isinstance(error, str) else f"{type(error).__name__}: {error}"
+        if self._token is not None:
+            try:
+                _current.reset(self._token)
+            except ValueError:  # context دیگری (مثلاً thread دیگر)
+                pass
+            self._token = None
+        if self.recording and self._exporter is not None:
+            self._exporter.export(self)
+
+    def to_otlp(self) -> dict:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id or "",
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or self.start_ns),
+            "attributes": [_otlp_attribute(k, v) for k, v in self.attributes.items() if v is not None],
+        }
+        if self.error:
+            span["status"] = {"code": STATUS_ERROR, "message": self.error}
+        return span
+
+
+def _otlp_attribute(key: str, value) -> dict:
+    if isinstance(value, bool):
+        typed = {"boolValue": value}
+    elif isinstance(value, int):
+        typed = {"intValue": str(value)}  # int64 در OTLP/JSON رشته است
+    elif isinstance(value, float):
+        typed = {"doubleValue": value}
+    else:
+        typed = {"stringValue": str(value)}
+    return {"key": key, "value": typed}
+
+
+def current() -> Span | None:
+    return _current.get()
+
+
+def annotate(**attributes) -> None:
+    """افزودن attribute به span جاری (اگر باشد)."""
+    span = _current.get()
+    if span is not None:
+        span.set(**attributes)
+
+
+def start_span(name: str, parent: Span | None = None, kind: int = INTERNAL, **attributes) -> Span | None:
+    """span فرزند parent (پیش‌فرض: span جاری) که تا end() خودش current است؛ None بدون trace."""
+    parent = parent or _current.get()
+    if parent is None:
+        return None
+    span = parent.child(name, kind, **attributes)
+    span._token = _current.set(span)
+    return span
+
+
+@contextmanager
+def span(name: str, parent: Span | None = None, kind: int = INTERNAL, **attributes):
+    """with span("db"): ... — بدون trace جاری فقط None می‌دهد."""
+    opened = start_span(name, parent, kind, **attributes)
+    if opened is None:
+        yield None
+        return
+    try:
+        yield opened
+    except BaseException as e:
+        opened.end(error=e)
+        raise
+    opened.end()
+
+
+def traced(name: str):
+    """decorator: کل تابع داخل یک span (برای تابع‌هایی که چند return دارند)."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _current.get() is None:
+                return fn(*args, **kwargs)
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+class StatementSpans:
+    """trace callback اتصال SQLite: یک span فرزند برای هر statement.
+
+    SQLite فقط شروع statement را خبر می‌دهد؛ هر span تا شروع statement بعدی (یا
+    برگشت اتصال به pool) طول می‌کشد، پس fetch ردیف‌ها هم جزو همان statement است.
+    متن statement با مقدار پارامترهاست (sqlite3 نسخه expand‌شده را می‌دهد) و کوتاه می‌شود.
+    """
+
+    def __init__(self, parent: Span):
+        self.parent = parent
+        self.count = 0
+        self._open: Span | None = None
+
+    def __call__(self, sql: str) -> None:
+        self.close()
+        self.count += 1
+        self._open = self.parent.child("db.statement", CLIENT, **{
+            "db.system": "sqlite", "db.statement": " ".join(sql.split())[:MAX_STATEMENT_CHARS],
+        })
+
+    def close(self) -> None:
+        if self._open is not None:
+            self._open.end()
+            self._open = None
+
+
+# ========== Tracer ==========
+
+class Tracer:
+    """شروع/پایان span ریشه هر درخواست و تصمیم sampling."""
+
+    def __init__(self, exporter, sample_rate: float = 1.0):
+        self.exporter = exporter
+        self.sample_rate = min(1.0, max(0.0, sample_rate))
+        self._stats_lock = threading.Lock()
+        self.stats = {"requests": 0, "sampled": 0}
+
+    def should_sample(self, trace_id: str) -> bool:
+        # 64 بیت پایین trace id (تصادفی) با نسبت مقایسه می‌شود
+        return int(trace_id[16:], 16) < self.sample_rate * 2 ** 64
+
+    def begin(self, name: str, trace_id: str | None = None, parent_id: str | None = None,
+              kind: int = SERVER, **attributes) -> Span:
+        """span ریشه درخواست (همیشه با شناسه؛ فقط اگر sample شده باشد ضبط و current می‌شود)."""
+        trace_id = trace_id or new_trace_id()
+        recording = self.should_sample(trace_id)
+        root = Span(name, trace_id, parent_id, kind, attributes, self.exporter, recording=recording)
+        if recording:
+            root._token = _current.set(root)
+        with self._stats_lock:
+            self.stats["requests"] += 1
+            self.stats["sampled"] += recording
+        return root
+
+    def close(self) -> None:
+        self.exporter.close()
+
+
+# ========== Exporter ==========
+
+class JSONLExporter:
+    """spanهای تمام‌شده روی BatchWriter، به صورت OTLP/JSON در directory/spans-<pid>.jsonl.
+
+    thread و فایل در اولین export() ساخته می‌شوند (در worker، بعد از fork).
+    صف پر: span دور ریخته و در stats شمرده می‌شود (tracing هرگز درخواست را کند نمی‌کند).
+    """
+
+    def __init__(self, directory: str, batch_size: int = 512, flush_interval: float = 1.0,
+                 max_pending: int = 20000, service: str = SERVICE_NAME):
+        self.directory = directory
+        self.service = service
+        self._writer = BatchWriter(
+            self._write, "tracing", batch_size, flush_interval, max_pending,
+            accepted="exported", what="trace", unit="span",
+        )
+        self.stats = self._writer.stats
+
+    def export(self, span: Span) -> None:
+        self._writer.put(span)
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.directory, f"{FILE_PREFIX}{os.getpid()}{FILE_SUFFIX}")
+
+    def _line(self, spans: list[Span]) -> str:
+        return json.dumps({"resourceSpans": [{
+            "resource": {"attributes": [_otlp_attribute("service.name", self.service)]},
+            "scopeSpans": [{"scope": {"name": "tracing"}, "spans": [s.to_otlp() for s in spans]}],
+        }]}, ensure_ascii=False, separators=(",", ":"))
+
+    def _write(self, batch: list[Span]) -> None:
+        # هر دسته یک خط
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as fh:
+            fh.write(self._line(batch) + "\n")
+
+    def flush(self) -> int:
+        """نوشتن همه spanهای صف؛ هر دسته یک خط. تعداد نوشته‌شده."""
+        return self._writer.flush()
+
+    def close(self) -> None:
+        self._writer.close()
+
+
+# ========== Viewer ==========
+
+def read_spans(directory: str) -> list[dict]:
+    """همه spanهای فایل‌های spans-*.jsonl (خط خراب نادیده گرفته می‌شود)."""
+    spans = []
+    for name in sorted(os.listdir(directory)):
+        if not (name.startswith(FILE_PREFIX) and name.endswith(FILE_SUFFIX)):
+            continue
+        with open(os.path.join(directory, name), encoding="utf-8") as fh:
+            for line in fh:
+                try:
+                    request = json.loads(line)
+                except ValueError:
+                    continue
+                for resource in request.get("resourceSpans", []):
+                    for scope in resource.get("scopeSpans", []):
+                        for s in scope.get("spans", []):
+                            s["start"] = int(s["startTimeUnixNano"])
+                            s["end"] = int(s["endTimeUnixNano"])
+                            s["attrs"] = {a["key"]: next(iter(a["value"].values())) for a in s.get("attributes", [])}
+                            spans.append(s)
+    return spans
+
+
+def critical_path(span_id: str, by_id: dict, children: dict) -> list[str]:
+    """spanهایی که زمان پایان trace را تعیین کرده‌اند (از آخر به اول، فرزندِ دیرتر تمام‌شده).
+
+    فرزندی که بعد از پایان والد تمام می‌شود (درخواست بعد از redirect) هم حساب است.
+    """
+    path = [span_id]
+    kids = sorted(children.get(span_id, ()), key=lambda i: by_id[i]["end"], reverse=True)
+    cursor = max([by_id[span_id]["end"]] + [by_id[i]["end"] for i in kids])
+    for kid in kids:
+        if by_id[kid]["end"] <= cursor:
+            path += critical_path(kid, by_id, children)
+            cursor = by_id[kid]["start"]
+    return path
+
+
+def pick_trace(spans: list[dict], trace_id: str | None = None) -> str | None:
+    """trace داده‌شده، یا آخرین trace که درخواست POST /action دارد (وگرنه آخرین trace)."""
+    if trace_id:
+        return trace_id if any(s["traceId"] == trace_id for s in spans) else None
+    turns = [s for s in spans if s["name"] == "POST /action"]
+    candidates = turns or spans
+    return max(candidates, key=lambda s: s["start"])["traceId"] if candidates else None
+
+
+def render_trace(spans: list[dict], trace_id: str, statements: bool = False) -> list[str]:
+    """درخت spanها با زمان شروع نسبی و مدت؛ * یعنی روی مسیر بحرانی.
+
+    spanهای db.statement فقط با statements=True چاپ می‌شوند (در خلاصه همیشه حساب‌اند).
+    """
+    trace = [s for s in spans if s["traceId"] == trace_id]
+    by_id = {s["spanId"]: s for s in trace}
+    children: dict = {}
+    roots = []
+    for s in sorted(trace, key=lambda s: s["start"]):
+        parent = s.get("parentSpanId")
+        if parent and parent in by_id:
+            children.setdefault(parent, []).append(s["spanId"])
+        else:
+            roots.append(s["spanId"])
+    origin = min(s["start"] for s in trace)
+    end = max(s["end"] for s in trace)
+    critical = set()
+    for root in roots:
+        critical.update(critical_path(root, by_id, children))
+
+    lines = [f"trace {trace_id}  {len(trace)} span  {(end - origin) / 1e6:.1f} ms"]
+
+    def walk(span_id, depth):
+        s = by_id[span_id]
+        attrs = s["attrs"]
+        detail = (attrs.get("db.statement") or attrs.get("ai.provider") or attrs.get("template")
+                  or attrs.get("scenario.source") or "")
+        if "db.statements" in attrs:
+            detail = f"{attrs.get('db.name')}, {attrs['db.statements']} statement"
+        status = " ❌" if s.get("status", {}).get("code") == STATUS_ERROR else ""
+        lines.append(f"{'*' if span_id in critical else ' '} {(s['start'] - origin) / 1e6:9.1f} ms "
+                     f"{(s['end'] - s['start']) / 1e6:9.2f} ms  {'  ' * depth}{s['name']}"
+                     f"{'  ' + str(detail)[:70] if detail else ''}{status}")
+        for kid in children.get(span_id, ()):
+            if statements or by_id[kid]["name"] != "db.statement":
+                walk(kid, depth + 1)
+
+    for root in roots:
+        walk(root, 0)
+
+    # زمان بین درخواست‌ها (redirect مرورگر) روی مسیر بحرانی
+    requests = sorted((by_id[i] for i in critical if by_id[i]["kind"] == SERVER), key=lambda s: s["start"])
+    gaps = sum(max(0, b["start"] - a["end"]) for a, b in zip(requests, requests[1:]))
+    by_kind: dict = {}
+    for i in critical:
+        s = by_id[i]
+        if not children.get(i):  # فقط برگ‌ها (زمان بدون شمارش دوباره والد)
+            group = s["name"].split(".")[0].split(" ")[0]
+            by_kind[group] = by_kind.get(group, 0) + s["end"] - s["start"]
+    summary = "  ".join(f"{k} {v / 1e6:.1f} ms" for k, v in sorted(by_kind.items(), key=lambda kv: -kv[1]))
+    lines.append(f"critical path: {len(critical)} span، بین درخواست‌ها {gaps / 1e6:.1f} ms؛ {summary}")
+    return lines
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="نمایش مسیر بحرانی یک نوبت از spanهای tracing")
+    parser.add_argument("--dir", default=os.getenv("TRACING_DIR") or "traces")
+    parser.add_argument("--trace", help="trace id (پیش‌فرض: آخرین نوبت)")
+    parser.add_argument("--statements", action="store_true", help="چاپ تک‌تک statementهای SQL")
+    args = parser.parse_args(argv)
+    if not os.path.isdir(args.dir):
+        print(f"❌ پوشه trace پیدا نشد: {args.dir}")
+        return 1
+    spans = read_spans(args.dir)
+    trace_id = pick_trace(spans, args.trace)
+    if trace_id is None:
+        print("❌ traceی پیدا نشد")
+        return 1
+    print("\n".join(render_trace(spans, trace_id, statements=args.statements)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())